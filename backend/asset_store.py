@@ -0,0 +1,160 @@
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import Request, Response
+
+from change_versions import etag_matches
+
+ASSET_URL_PREFIX = "/api/assets/"
+ASSET_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Inline images as written by the document formatter before assets existed
+INLINE_IMAGE_PATTERN = re.compile(r"data:(image/(?:png|jpeg|gif|svg\+xml));base64,([A-Za-z0-9+/=\s]+)")
+
+# Content never changes under a given hash, so clients may cache it forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Assets come from user and LLM content and are served from the API origin: an SVG opened
+# directly must not run scripts, and no asset may be sniffed into another type
+ASSET_SECURITY_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "Content-Security-Policy": "default-src 'none'; style-src 'unsafe-inline'",
+}
+
+
+class Asset:
+    """Stored binary content addressed by its sha256"""
+
+    __slots__ = ("id", "content", "mime_type")
+
+    def __init__(self, asset_id: str, content: bytes, mime_type: str):
+        self.id = asset_id
+        self.content = content
+        self.mime_type = mime_type
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.id}"'
+
+
+class AssetStore:
+    """Content-addressed store for generated images (document charts).
+
+    Each asset is written once to MongoDB under the sha256 of its bytes, so
+    identical charts share one copy and documents only carry a short URL.
+    Recently served assets are kept in a small in-process LRU.
+    """
+
+    def __init__(self, collection_name: str = "assets", cache_size: int = None):
+        self.collection_name = collection_name
+        self.cache_size = cache_size or int(os.environ.get('ASSET_CACHE_SIZE', 128))
+        self.cache: "OrderedDict[str, Asset]" = OrderedDict()
+        self.db = None
+
+    def bind(self, database):
+        """Attach the Motor database the assets live in"""
+        self.db = database
+
+    @staticmethod
+    def asset_id(content: bytes) -> str:
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def url(asset_id: str) -> str:
+        return f"{ASSET_URL_PREFIX}{asset_id}"
+
+    async def put(self, content: bytes, mime_type: str) -> str:
+        """Store content (a no-op if it already exists) and return its id"""
+        asset_id = self.asset_id(content)
+        await self.db[self.collection_name].update_one(
+            {"_id": asset_id},
+            {"$setOnInsert": {
+                "content": content,
+                "mime_type": mime_type,
+                "size": len(content),
+                "created_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+        self._remember(Asset(asset_id, content, mime_type))
+        return asset_id
+
+    async def publish(self, content: bytes, mime_type: str) -> str:
+        """Store content and return a URL for it.
+
+        Without a database (standalone scripts) the content is returned as a
+        data: URI so the HTML still renders.
+        """
+        if self.db is None:
+            return f"data:{mime_type};base64,{base64.b64encode(content).decode()}"
+        return self.url(await self.put(content, mime_type))
+
+    async def get(self, asset_id: str) -> Optional[Asset]:
+        """Load an asset by id, or None if unknown"""
+        if not ASSET_ID_PATTERN.match(asset_id or ""):
+            return None
+
+        cached = self.cache.get(asset_id)
+        if cached is not None:
+            self.cache.move_to_end(asset_id)
+            return cached
+
+        if self.db is None:
+            return None
+
+        doc = await self.db[self.collection_name].find_one({"_id": asset_id})
+        if not doc:
+            return None
+
+        asset = Asset(asset_id, bytes(doc["content"]), doc.get("mime_type", "application/octet-stream"))
+        self._remember(asset)
+        return asset
+
+    def _remember(self, asset: Asset):
+        self.cache[asset.id] = asset
+        self.cache.move_to_end(asset.id)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def extract_inline_images(self, html: str) -> Tuple[str, int]:
+        """Replace inline base64 images in HTML with asset URLs; returns (html, images moved)"""
+        if not html or "data:image/" not in html:
+            return html, 0
+
+        parts = []
+        position = 0
+        moved = 0
+        for match in INLINE_IMAGE_PATTERN.finditer(html):
+            mime_type, payload = match.group(1), match.group(2)
+            try:
+                content = base64.b64decode("".join(payload.split()), validate=True)
+            except (binascii.Error, ValueError):
+                logging.warning(f"Skipping malformed inline {mime_type} image")
+                continue
+
+            parts.append(html[position:match.start()])
+            parts.append(self.url(await self.put(content, mime_type)))
+            position = match.end()
+            moved += 1
+
+        parts.append(html[position:])
+        return "".join(parts), moved
+
+
+def asset_response(request: Request, asset: Asset) -> Response:
+    """Serve an asset with immutable caching, answering 304 for a matching If-None-Match"""
+    headers = {"ETag": asset.etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL, **ASSET_SECURITY_HEADERS}
+    if etag_matches(request, asset.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=asset.content, media_type=asset.mime_type, headers=headers)
+
+
+# Global asset store instance
+asset_store = AssetStore()
@@ -0,0 +1,381 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+# Auto jobs: simulation state flag that enables the job, field holding its interval (seconds), default interval
+AUTO_JOBS = {
+    "conversation": ("auto_conversations", "conversation_interval", 10),
+    "time": ("auto_time", "time_interval", 60),
+    "weekly_report": ("auto_weekly_reports", None, None),
+}
+
+AUTO_FLAGS = [flag for flag, _, _ in AUTO_JOBS.values()]
+
+
+def job_interval(kind: str, state: dict, min_interval: float) -> float:
+    """Seconds between runs of an auto job for this simulation"""
+    _, field, default = AUTO_JOBS[kind]
+    if field is None:
+        return float(state.get("report_interval_hours") or 168) * 3600
+    return max(min_interval, float(state.get(field) or default))
+
+
+def report_due(state: dict, now: datetime) -> bool:
+    """Whether the weekly report interval has passed since the last automatic report"""
+    last_report = state.get("last_auto_report")
+    if not last_report:
+        return True
+    last_report_time = datetime.fromisoformat(last_report.replace('Z', '+00:00')).replace(tzinfo=None)
+    interval_hours = state.get("report_interval_hours", 168)
+    return (now - last_report_time).total_seconds() >= interval_hours * 3600
+
+
+class MongoLease:
+    """Leader lease stored in one MongoDB document.
+
+    Whoever holds an unexpired lease is the leader; the holder renews it before it
+    expires, and any worker may take it over once it has. Taking or renewing is a
+    single findAndModify, so two workers can never both succeed for the same term.
+    """
+
+    def __init__(self, name: str, ttl: float = None, holder: str = None):
+        self.name = name
+        self.ttl = ttl or float(os.environ.get('AUTO_SCHEDULER_LEASE_TTL', 15))
+        self.holder = holder or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.collection = None
+        self.expires_at: Optional[datetime] = None
+
+    def bind(self, collection):
+        self.collection = collection
+
+    @property
+    def held(self) -> bool:
+        return self.expires_at is not None and datetime.utcnow() < self.expires_at
+
+    async def acquire(self, status: dict = None) -> bool:
+        """Take or renew the lease; `status` is published on the lease document for other workers"""
+        now = datetime.utcnow()
+        update = {"holder": self.holder, "expires_at": now + timedelta(seconds=self.ttl), "updated_at": now}
+        if status is not None:
+            update["status"] = status
+
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"_id": self.name, "$or": [{"holder": self.holder}, {"expires_at": {"$lte": now}}]},
+                {"$set": update},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another worker holds an unexpired lease, so the upsert collided with its document
+            doc = None
+        except Exception as e:
+            logging.warning(f"Lease {self.name} could not be renewed: {e}")
+            doc = None
+
+        if doc is not None and doc.get("holder") == self.holder:
+            self.expires_at = update["expires_at"]
+            return True
+        self.expires_at = None
+        return False
+
+    async def release(self):
+        """Give up the lease so another worker can take over without waiting for it to expire"""
+        if self.collection is None or self.expires_at is None:
+            return
+        self.expires_at = None
+        try:
+            await self.collection.update_one(
+                {"_id": self.name, "holder": self.holder},
+                {"$set": {"expires_at": datetime.utcnow()}}
+            )
+        except Exception as e:
+            logging.warning(f"Lease {self.name} could not be released: {e}")
+
+    async def read(self) -> Optional[dict]:
+        if self.collection is None:
+            return None
+        return await self.collection.find_one({"_id": self.name})
+
+
+class AutoJob:
+    """Schedule and counters for one auto job of one simulation"""
+
+    def __init__(self, interval: float, now: float):
+        self.interval = interval
+        # A new leader waits one interval instead of firing everything at once on takeover
+        self.next_run = now + interval
+        self.task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_run_at = None
+        self.last_duration = None
+
+    @property
+    def in_flight(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def snapshot(self, now: float) -> dict:
+        next_run_in = max(0.0, round(self.next_run - now, 1))
+        return {
+            "interval_seconds": self.interval,
+            "next_run_in": next_run_in,
+            "next_run_at": datetime.utcnow() + timedelta(seconds=next_run_in),
+            "in_flight": self.in_flight,
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_run_at": self.last_run_at,
+            "last_duration_seconds": self.last_duration,
+        }
+
+
+class AutoScheduler:
+    """Runs auto conversations, time advancement and weekly reports on the server.
+
+    Every worker runs the tick loop, but only the holder of the leader lease starts
+    jobs. A job whose previous run is still in flight skips its tick instead of
+    piling up another round behind it. The leader stores each simulation's job
+    status in its own document, so any worker can report it.
+    """
+
+    def __init__(self, lease: MongoLease = None, tick_interval: float = None, min_interval: float = None,
+                 report_retry: float = None, enabled: bool = None, max_simulations: int = None):
+        self.lease = lease or MongoLease("auto_mode")
+        self.tick_interval = tick_interval or float(os.environ.get('AUTO_SCHEDULER_TICK', 2))
+        self.min_interval = min_interval or float(os.environ.get('AUTO_SCHEDULER_MIN_INTERVAL', 5))
+        # Failed or empty reports don't update last_auto_report; don't retry them every tick
+        self.report_retry = report_retry or float(os.environ.get('AUTO_SCHEDULER_REPORT_RETRY', 600))
+        # Optional cap on simulations in auto mode per tick (0: all of them); reported when hit
+        self.max_simulations = max_simulations if max_simulations is not None else int(
+            os.environ.get('AUTO_SCHEDULER_MAX_SIMULATIONS', 0))
+        self.scheduled = 0
+        self.truncated = False
+        if enabled is None:
+            enabled = os.environ.get('AUTO_SCHEDULER_ENABLED', 'true').lower() == 'true'
+        self.enabled = enabled
+        self.states = None
+        self.job_status = None
+        # Simulations whose job status changed since it was last stored
+        self.changed = set()
+        self.actions: Dict[str, Callable[[dict], Awaitable[Any]]] = {}
+        self.jobs: Dict[Tuple[str, str], AutoJob] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def bind(self, db):
+        self.states = db.simulation_state
+        # One document per simulation (keyed by its id) with the status of its auto jobs
+        self.job_status = db.auto_job_status
+        self.lease.bind(db.scheduler_leases)
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self, actions: Dict[str, Callable[[dict], Awaitable[Any]]]):
+        """Start ticking; `actions` maps a job kind to a coroutine function taking the simulation state"""
+        if not self.enabled or self.running:
+            return
+        self.actions = actions
+        self.task = asyncio.create_task(self._run())
+        logging.info(f"Auto-mode scheduler started as {self.lease.holder}")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        in_flight = [job.task for job in self.jobs.values() if job.in_flight]
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+        await self.lease.release()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                logging.error(f"Auto-mode scheduler tick failed: {e}")
+            await asyncio.sleep(self.tick_interval)
+
+    async def tick(self):
+        """Renew the lease and start every due job (leader only)"""
+        now = time.monotonic()
+        if not await self.lease.acquire(self.snapshot(now)):
+            # Not the leader (any more): forget schedules; runs already started finish on their own
+            self.jobs = {key: job for key, job in self.jobs.items() if job.in_flight}
+            return
+
+        cursor = self.states.find({"$or": [{flag: True} for flag in AUTO_FLAGS]}).sort("id", 1)
+        if self.max_simulations:
+            cursor = cursor.limit(self.max_simulations + 1)
+
+        active = set()
+        scheduled = 0
+        truncated = False
+        async for state in cursor:
+            if self.max_simulations and scheduled >= self.max_simulations:
+                truncated = True
+                break
+            scheduled += 1
+            for kind, (flag, _, _) in AUTO_JOBS.items():
+                if state.get(flag) and kind in self.actions:
+                    key = (state.get("id", ""), kind)
+                    active.add(key)
+                    self._tick_job(key, state, now)
+
+        if truncated and not self.truncated:
+            logging.warning(f"Auto mode is on for more than {self.max_simulations} simulations; "
+                            f"only the first {self.max_simulations} are scheduled (AUTO_SCHEDULER_MAX_SIMULATIONS)")
+        self.scheduled, self.truncated = scheduled, truncated
+
+        # Jobs switched off since the last tick
+        for key in list(self.jobs):
+            if key not in active and not self.jobs[key].in_flight:
+                del self.jobs[key]
+                self.changed.add(key[0])
+
+        await self.store_job_status(now)
+
+    def _tick_job(self, key: Tuple[str, str], state: dict, now: float):
+        kind = key[1]
+        interval = job_interval(kind, state, self.min_interval)
+        job = self.jobs.get(key)
+        if job is None:
+            job = self.jobs[key] = AutoJob(interval, now)
+            self.changed.add(key[0])
+            if kind == "weekly_report":
+                job.next_run = now
+        elif job.interval != interval:
+            job.next_run = min(job.next_run, now + interval)
+            job.interval = interval
+            self.changed.add(key[0])
+
+        if now < job.next_run:
+            return
+        if job.in_flight:
+            job.skipped += 1
+            job.next_run = now + interval
+            self.changed.add(key[0])
+            return
+        if kind == "weekly_report":
+            if not report_due(state, datetime.utcnow()):
+                return
+            interval = min(interval, self.report_retry)
+
+        job.next_run = now + interval
+        job.task = asyncio.create_task(self._run_job(job, kind, state))
+        self.changed.add(key[0])
+
+    async def _run_job(self, job: AutoJob, kind: str, state: dict):
+        started = time.monotonic()
+        job.last_run_at = datetime.utcnow().isoformat()
+        try:
+            await self.actions[kind](state)
+            job.runs += 1
+            job.last_error = None
+        except asyncio.CancelledError:
+            raise
+        except HTTPException as e:
+            # e.g. fewer than two agents; the next tick tries again
+            job.failures += 1
+            job.last_error = str(e.detail)
+        except Exception as e:
+            logging.error(f"Auto {kind} for simulation {state.get('id')} failed: {e}")
+            job.failures += 1
+            job.last_error = str(e)
+        finally:
+            job.last_duration = round(time.monotonic() - started, 2)
+            self.changed.add(state.get("id", ""))
+
+    def snapshot(self, now: float = None) -> dict:
+        """Scheduler-wide counts, published on the lease document"""
+        return {"scheduled": self.scheduled, "truncated": self.truncated}
+
+    async def store_job_status(self, now: float):
+        """Write the job status of simulations that changed since the last tick"""
+        if not self.changed or self.job_status is None:
+            return
+        changed, self.changed = self.changed, set()
+        jobs: Dict[str, dict] = {simulation_id: {} for simulation_id in changed}
+        for (simulation_id, kind), job in self.jobs.items():
+            if simulation_id in jobs:
+                jobs[simulation_id][kind] = job.snapshot(now)
+
+        updated_at = datetime.utcnow()
+        requests = [
+            UpdateOne({"_id": simulation_id}, {"$set": {"jobs": simulation_jobs, "updated_at": updated_at}},
+                      upsert=True)
+            if simulation_jobs else DeleteOne({"_id": simulation_id})
+            for simulation_id, simulation_jobs in jobs.items()
+        ]
+        try:
+            await self.job_status.bulk_write(requests, ordered=False)
+        except Exception as e:
+            logging.warning(f"Auto-mode job status could not be stored: {e}")
+            self.changed |= changed
+
+    async def simulation_status(self, simulation_id: str) -> dict:
+        """Auto jobs of one simulation, as last stored by the leader"""
+        status = {"enabled": self.enabled, "updated_at": None, "jobs": {}}
+        if self.job_status is None:
+            return status
+        doc = await self.job_status.find_one({"_id": simulation_id})
+        if doc is None:
+            return status
+
+        now = datetime.utcnow()
+        for kind, job in doc.get("jobs", {}).items():
+            next_run_at = job.get("next_run_at")
+            if next_run_at:
+                job["next_run_in"] = max(0.0, round((next_run_at - now).total_seconds(), 1))
+                job["next_run_at"] = next_run_at.isoformat()
+            status["jobs"][kind] = job
+        status["updated_at"] = doc["updated_at"].isoformat() if doc.get("updated_at") else None
+        return status
+
+    async def get_status(self) -> dict:
+        """Scheduler status as seen by any worker (read from the leader's lease document)"""
+        status = {
+            "enabled": self.enabled,
+            "worker": self.lease.holder,
+            "is_leader": self.lease.held,
+            "leader": None,
+            "lease_expires_in": None,
+            "updated_at": None,
+            "scheduled": 0,
+            "truncated": False,
+            "max_simulations": self.max_simulations,
+        }
+        doc = await self.lease.read()
+        if doc is None:
+            return status
+
+        now = datetime.utcnow()
+        expires_at = doc.get("expires_at")
+        if expires_at and expires_at > now:
+            status["leader"] = doc.get("holder")
+            status["lease_expires_in"] = round((expires_at - now).total_seconds(), 1)
+            published = doc.get("status") or {}
+            status["scheduled"] = published.get("scheduled", 0)
+            status["truncated"] = published.get("truncated", False)
+        status["updated_at"] = doc["updated_at"].isoformat() if doc.get("updated_at") else None
+        if status["is_leader"]:
+            status.update(self.snapshot())
+        return status
+
+# Global auto-mode scheduler instance
+auto_scheduler = AutoScheduler()
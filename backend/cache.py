@@ -1,10 +1,7 @@
-import redis
 import json
 import os
 from typing import Optional, Any
-from datetime import timedelta
-import asyncio
-import aioredis
+import redis.asyncio as aioredis
 
 class CacheManager:
     def __init__(self):
@@ -28,6 +25,13 @@ class CacheManager:
             print(f"❌ Redis connection failed: {e}")
             self.connected = False
     
+    async def close(self):
+        """Release the connection pool"""
+        if self.redis_client is not None:
+            await self.redis_client.aclose()
+        self.redis_client = None
+        self.connected = False
+    
     async def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
         if not self.connected:
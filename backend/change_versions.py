@@ -0,0 +1,117 @@
+import hashlib
+import logging
+from typing import Dict, Iterable, Optional
+
+from fastapi import Request, Response
+
+
+class ChangeVersions:
+    """Cheap per-collection change counters used to build ETags for polled endpoints.
+
+    Every write to a tracked collection bumps a small counter document in MongoDB,
+    so all workers and replicas agree on the current version. Reading the versions
+    is a single indexed lookup, which lets polling endpoints answer 304 without
+    loading or serializing the underlying collection.
+    """
+
+    def __init__(self, collection_name: str = "change_versions"):
+        self.collection_name = collection_name
+        self.db = None
+
+    def bind(self, database):
+        """Attach the Motor database the counters live in"""
+        self.db = database
+
+    @staticmethod
+    def _key(collection: str, scope: str) -> str:
+        return f"{scope}:{collection}"
+
+    async def bump(self, *collections: str, scope: str = "global"):
+        """Mark collections as changed so cached responses are revalidated"""
+        if self.db is None:
+            return
+
+        for collection in collections:
+            try:
+                await self.db[self.collection_name].update_one(
+                    {"_id": self._key(collection, scope)},
+                    {"$inc": {"version": 1}},
+                    upsert=True
+                )
+            except Exception as e:
+                # A missed bump only costs a stale poll; never fail the write path
+                logging.warning(f"Could not bump change version for {collection}: {e}")
+
+    async def get(self, collections: Iterable[str], scope: str = "global") -> Dict[str, int]:
+        """Get the current version of each collection (0 if never written)"""
+        collections = list(collections)
+        versions = {collection: 0 for collection in collections}
+        if self.db is None:
+            return versions
+
+        keys = {self._key(collection, scope): collection for collection in collections}
+        cursor = self.db[self.collection_name].find({"_id": {"$in": list(keys)}})
+        async for doc in cursor:
+            versions[keys[doc["_id"]]] = doc.get("version", 0)
+        return versions
+
+    async def etag(self, collections: Iterable[str], *parts, scope: str = "global") -> str:
+        """Build a weak ETag from collection versions plus request-specific parts"""
+        versions = await self.get(collections, scope=scope)
+        return make_etag(versions, scope, *parts)
+
+
+def make_etag(versions: Dict[str, int], *parts) -> str:
+    """Hash versions and request parts (user, filters) into a weak ETag"""
+    material = "|".join(f"{name}={versions[name]}" for name in sorted(versions))
+    material += "|" + "|".join(str(part) for part in parts)
+    digest = hashlib.sha1(material.encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check the request's If-None-Match header against an ETag (weak comparison)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+
+    if header.strip() == "*":
+        return True
+
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+def apply_etag(response: Response, etag: str):
+    """Attach ETag and revalidation headers to a 200 response"""
+    response.headers["ETag"] = etag
+    # Browsers may store the body but must revalidate on every poll
+    response.headers["Cache-Control"] = "private, no-cache"
+
+
+def not_modified(etag: str) -> Response:
+    """Build an empty 304 response for a matching ETag"""
+    return Response(
+        status_code=304,
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+    )
+
+
+async def conditional_response(request: Request, response: Response, collections: Iterable[str],
+                               *parts, scope: str = "global") -> Optional[Response]:
+    """Return a 304 if the client's copy is current, otherwise tag the response and return None"""
+    etag = await change_versions.etag(collections, request.url.path, request.url.query, *parts, scope=scope)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    apply_etag(response, etag)
+    return None
+
+
+# Global change version tracker
+change_versions = ChangeVersions()
@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Tuple
+
+CHART_COLORS = ['#3498db', '#e74c3c', '#2ecc71', '#f39c12', '#9b59b6', '#1abc9c']
+
+# Resolution presets for raster output; SVG ignores them
+DPI_PRESETS = {
+    "screen": 96,
+    "hidpi": 192,
+    "print": 300,
+}
+
+DEFAULT_SIZES = {
+    "pie": (8, 6),
+    "bar": (10, 6),
+    "timeline": (12, 6),
+}
+
+MIME_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+
+def _init_worker():
+    """Process pool initializer: headless backend and the document chart style"""
+    import matplotlib
+    import matplotlib.style
+    matplotlib.use("Agg")
+    matplotlib.style.use('seaborn-v0_8')
+    # Deterministic SVG element ids, so identical charts produce identical bytes
+    matplotlib.rcParams['svg.hashsalt'] = 'observer-ai-charts'
+
+
+def _draw_pie(ax, data: Dict[str, float], title: str, options: Dict[str, Any]):
+    labels = list(data.keys())
+    sizes = list(data.values())
+
+    wedges, texts, autotexts = ax.pie(sizes, labels=labels, autopct='%1.1f%%',
+                                      colors=CHART_COLORS[:len(labels)], startangle=90)
+    ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
+
+    # Make text more readable
+    for autotext in autotexts:
+        autotext.set_color('white')
+        autotext.set_fontweight('bold')
+
+
+def _draw_bar(ax, data: Dict[str, float], title: str, options: Dict[str, Any]):
+    labels = list(data.keys())
+    values = list(data.values())
+
+    bars = ax.bar(labels, values, color=CHART_COLORS[:len(labels)])
+    ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
+    ax.set_xlabel(options.get("x_label", ""), fontsize=12)
+    ax.set_ylabel(options.get("y_label", ""), fontsize=12)
+
+    # Add value labels on bars
+    for bar in bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width() / 2., height,
+                f'{height:,.0f}', ha='center', va='bottom', fontweight='bold')
+
+    for label in ax.get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment('right')
+
+
+def _draw_timeline(ax, milestones: List[Dict], title: str, options: Dict[str, Any]):
+    dates = [milestone['date'] for milestone in milestones]
+    labels = [milestone['label'] for milestone in milestones]
+
+    y_pos = 0
+    for i, (date, label) in enumerate(zip(dates, labels)):
+        color = CHART_COLORS[i % len(CHART_COLORS)]
+        ax.scatter(i, y_pos, s=200, c=color, alpha=0.8, zorder=2)
+        ax.text(i, y_pos + 0.1, label, ha='center', va='bottom',
+                fontsize=10, fontweight='bold', rotation=45)
+        ax.text(i, y_pos - 0.1, date, ha='center', va='top',
+                fontsize=9, color='gray')
+
+    # Connect points
+    for i in range(len(dates) - 1):
+        ax.plot([i, i + 1], [y_pos, y_pos], 'k-', alpha=0.3, zorder=1)
+
+    ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
+    ax.set_xlim(-0.5, len(dates) - 0.5)
+    ax.set_ylim(-0.3, 0.3)
+    ax.set_xticks([])
+    ax.set_yticks([])
+    for side in ('top', 'right', 'bottom', 'left'):
+        ax.spines[side].set_visible(False)
+
+
+DRAWERS = {
+    "pie": _draw_pie,
+    "bar": _draw_bar,
+    "timeline": _draw_timeline,
+}
+
+
+def render_chart(chart_type: str, data: Any, title: str, options: Dict[str, Any],
+                 size: Tuple[float, float], fmt: str, dpi: int) -> bytes:
+    """Render one chart to PNG or SVG bytes using the object-oriented Figure API.
+
+    Runs in a worker process; no pyplot global state is touched, so figures are
+    freed as soon as they go out of scope.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=size)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    DRAWERS[chart_type](ax, data, title, options)
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    metadata = {"Date": None} if fmt == "svg" else None
+    fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight', metadata=metadata)
+    return buffer.getvalue()
+
+
+class RenderedChart:
+    """Rendered chart bytes plus the cache key they were stored under"""
+
+    __slots__ = ("key", "content", "format")
+
+    def __init__(self, key: str, content: bytes, fmt: str):
+        self.key = key
+        self.content = content
+        self.format = fmt
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES[self.format]
+
+
+class ChartRenderer:
+    """Renders charts in a process pool, with an LRU cache keyed by chart content"""
+
+    def __init__(self, max_workers: int = None, cache_size: int = None):
+        self.max_workers = max_workers or int(os.environ.get('CHART_WORKERS', 2))
+        self.cache_size = cache_size or int(os.environ.get('CHART_CACHE_SIZE', 256))
+        self.default_preset = os.environ.get('CHART_DPI_PRESET', 'hidpi')
+        self.cache: "OrderedDict[str, RenderedChart]" = OrderedDict()
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.executor = None
+        self.hits = 0
+        self.misses = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker)
+        return self.executor
+
+    @staticmethod
+    def cache_key(chart_type: str, data: Any, title: str, options: Dict[str, Any],
+                  size: Tuple[float, float], fmt: str, dpi: int) -> str:
+        # Data keeps its order (bars and slices are drawn in it); keyword options don't have one
+        material = json.dumps([chart_type, data, title, sorted(options.items()), list(size), fmt, dpi],
+                              default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def render(self, chart_type: str, data: Any, title: str, fmt: str = "png",
+                     dpi_preset: str = None, size: Tuple[float, float] = None, **options) -> RenderedChart:
+        """Render a chart (or return the cached rendering of an identical one)"""
+        if chart_type not in DRAWERS:
+            raise ValueError(f"Unknown chart type: {chart_type}")
+        if fmt not in MIME_TYPES:
+            raise ValueError(f"Unsupported chart format: {fmt}")
+
+        dpi = DPI_PRESETS[dpi_preset or self.default_preset]
+        size = tuple(size or DEFAULT_SIZES[chart_type])
+        key = self.cache_key(chart_type, data, title, options, size, fmt, dpi)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        # Identical charts requested concurrently are rendered once
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            content = await self._render_in_pool(chart_type, data, title, options, size, fmt, dpi)
+            chart = RenderedChart(key, content, fmt)
+            self._store(key, chart)
+            future.set_result(chart)
+            return chart
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; mark the exception as retrieved
+            future.exception()
+            raise
+        finally:
+            self.in_flight.pop(key, None)
+
+    async def _render_in_pool(self, *args) -> bytes:
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            return await loop.run_in_executor(executor, render_chart, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); start a fresh pool and retry once. Concurrent renders
+            # see the same broken pool; only the first one replaces it.
+            if self.executor is executor:
+                logging.warning("Chart worker pool broke, restarting it")
+                self.executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+            return await loop.run_in_executor(self._get_executor(), render_chart, *args)
+
+    def _store(self, key: str, chart: RenderedChart):
+        self.cache[key] = chart
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def shutdown(self, wait: bool = False):
+        """Stop worker processes (`wait` blocks until they have exited)"""
+        if self.executor is not None:
+            executor, self.executor = self.executor, None
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "cached": len(self.cache),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+# Global chart renderer instance
+chart_renderer = ChartRenderer()
@@ -4,6 +4,8 @@ from pymongo import MongoClient
 from pymongo.errors import ServerSelectionTimeoutError
 import asyncio
 from typing import Optional
+from query_monitor import query_monitor
+from tracing import mongo_tracing_listener
 
 class DatabaseManager:
     def __init__(self):
@@ -12,32 +14,44 @@ class DatabaseManager:
         self.db = None
         self.connected = False
         
+    def create_client(self, mongo_url: str = None, db_name: str = None):
+        """Create the pooled client (connects lazily); the app shares it for every query"""
+        if self.client is not None:
+            return self.db
+        
+        self.mongo_url = mongo_url or self.mongo_url
+        
+        # Configure connection with optimization for high load
+        self.client = motor.motor_asyncio.AsyncIOMotorClient(
+            self.mongo_url,
+            maxPoolSize=100,  # Maximum connections in pool
+            minPoolSize=10,   # Minimum connections in pool
+            maxIdleTimeMS=30000,  # Close connections after 30s idle
+            waitQueueTimeoutMS=5000,  # Wait 5s for connection from pool
+            serverSelectionTimeoutMS=3000,  # 3s timeout for server selection
+            socketTimeoutMS=20000,  # 20s socket timeout
+            connectTimeoutMS=10000,  # 10s connection timeout
+            retryWrites=True,
+            retryReads=True,
+            readPreference='primaryPreferred',
+            w='majority',  # Write concern for data safety
+            journal=True,  # Ensure writes are journaled
+            event_listeners=[query_monitor, mongo_tracing_listener]  # Per-request query stats and spans
+        )
+        
+        # Get database name from URL or use default
+        if not db_name:
+            db_name = 'observer_ai'
+            if '/' in self.mongo_url:
+                db_name = self.mongo_url.split('/')[-1].split('?')[0] or db_name
+        
+        self.db = self.client[db_name]
+        return self.db
+    
     async def connect(self):
         """Initialize MongoDB connection with connection pooling"""
         try:
-            # Configure connection with optimization for high load
-            self.client = motor.motor_asyncio.AsyncIOMotorClient(
-                self.mongo_url,
-                maxPoolSize=100,  # Maximum connections in pool
-                minPoolSize=10,   # Minimum connections in pool
-                maxIdleTimeMS=30000,  # Close connections after 30s idle
-                waitQueueTimeoutMS=5000,  # Wait 5s for connection from pool
-                serverSelectionTimeoutMS=3000,  # 3s timeout for server selection
-                socketTimeoutMS=20000,  # 20s socket timeout
-                connectTimeoutMS=10000,  # 10s connection timeout
-                retryWrites=True,
-                retryReads=True,
-                readPreference='primaryPreferred',
-                w='majority',  # Write concern for data safety
-                journal=True   # Ensure writes are journaled
-            )
-            
-            # Get database name from URL or use default
-            db_name = 'observer_ai'
-            if '/' in self.mongo_url:
-                db_name = self.mongo_url.split('/')[-1].split('?')[0]
-            
-            self.db = self.client[db_name]
+            self.create_client()
             
             # Test connection
             await self.client.admin.command('ping')
@@ -53,6 +67,12 @@ class DatabaseManager:
             self.connected = False
             raise
     
+    def close(self):
+        """Close the connection pool"""
+        if self.client is not None:
+            self.client.close()
+        self.connected = False
+    
     async def create_indexes(self):
         """Create database indexes for optimal performance"""
         if not self.connected:
@@ -88,10 +108,6 @@ class DatabaseManager:
             await self.db.saved_agents.create_index("id", unique=True)
             await self.db.saved_agents.create_index([("user_id", 1), ("created_at", -1)])
             
-            # Simulation state indexes
-            await self.db.simulation_state.create_index("user_id")
-            await self.db.simulation_state.create_index("created_at")
-            
             print("✅ Database indexes created successfully")
             
         except Exception as e:
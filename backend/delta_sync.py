@@ -0,0 +1,173 @@
+import base64
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+
+# Collections a client can sync; every write to them stamps `updated_at`
+SYNC_COLLECTIONS = ("agents", "conversations", "relationships", "summaries", "documents")
+
+# Stamp for documents written before sync existed (and without a creation time)
+EPOCH = datetime(1970, 1, 1)
+
+
+def touch(fields: dict) -> dict:
+    """Fields plus a fresh `updated_at`, for inserts and `$set` updates of synced collections"""
+    return {**fields, "updated_at": datetime.utcnow()}
+
+
+def user_scope(user_id: str) -> str:
+    """Tombstone scope of a user's own documents (simulation data uses the simulation id)"""
+    return f"user:{user_id}"
+
+
+def encode_cursor(cursor: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(cursor, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(text: str) -> dict:
+    """Parse a cursor from a client; raises ValueError if it isn't one of ours"""
+    try:
+        cursor = json.loads(base64.urlsafe_b64decode(text + "=" * (-len(text) % 4)))
+        datetime.fromisoformat(cursor["at"])
+        if not isinstance(cursor["c"], dict):
+            raise TypeError
+        return cursor
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid sync cursor: {e}")
+
+
+class DeltaSync:
+    """Everything that changed in a set of collections since a client's cursor.
+
+    Writes stamp `updated_at`; a cursor remembers, per collection, the last
+    (updated_at, _id) the client has seen, so each collection is read with an
+    indexed range query and a bounded page. Deletions leave tombstones that are
+    kept for SYNC_TOMBSTONE_DAYS; a client whose cursor is older than that, or
+    from before a simulation reset, gets a full reload instead of a delta.
+
+    Timestamps come from the app servers' clocks and a write is stamped shortly
+    before it is committed, so reads start SYNC_OVERLAP_SECONDS before the
+    previous response. A client may see a document twice; applying changes is
+    an upsert by id.
+    """
+
+    def __init__(self, page_size: int = None, overlap_seconds: float = None, tombstone_days: float = None):
+        self.page_size = page_size or int(os.environ.get('SYNC_PAGE_SIZE', 500))
+        self.overlap = timedelta(seconds=overlap_seconds if overlap_seconds is not None else float(
+            os.environ.get('SYNC_OVERLAP_SECONDS', 5)))
+        self.retention = timedelta(days=tombstone_days or float(os.environ.get('SYNC_TOMBSTONE_DAYS', 7)))
+        self.db = None
+
+    def bind(self, db):
+        self.db = db
+
+    async def create_indexes(self):
+        """Backfill `updated_at` on existing data, then index the range queries"""
+        if self.db is None:
+            return
+
+        try:
+            for name in SYNC_COLLECTIONS:
+                await self.db[name].update_many(
+                    {"updated_at": {"$exists": False}},
+                    [{"$set": {"updated_at": {"$ifNull": ["$created_at", {"$ifNull": ["$metadata.created_at", EPOCH]}]}}}]
+                )
+                await self.db[name].create_index([("simulation_id", 1), ("updated_at", 1), ("_id", 1)])
+            await self.db.documents.create_index([("metadata.user_id", 1), ("updated_at", 1), ("_id", 1)])
+
+            await self.db.sync_tombstones.create_index([("scope", 1), ("deleted_at", 1)])
+            await self.db.sync_tombstones.create_index(
+                "deleted_at", expireAfterSeconds=int(self.retention.total_seconds())
+            )
+        except Exception as e:
+            logging.error(f"Error creating sync indexes: {e}")
+
+    async def tombstone(self, scope: str, collection: str, ids: Iterable[str]):
+        """Record deletions so clients holding the documents can drop them"""
+        now = datetime.utcnow()
+        docs = [{"scope": scope, "collection": collection, "id": doc_id, "deleted_at": now} for doc_id in ids if doc_id]
+        if not docs or self.db is None:
+            return
+        try:
+            await self.db.sync_tombstones.insert_many(docs)
+        except Exception as e:
+            # A missed tombstone leaves a stale entry until the client's next full reload
+            logging.warning(f"Could not record deletions from {collection}: {e}")
+
+    @staticmethod
+    def _after(mark: list) -> dict:
+        """Filter for documents after a cursor position"""
+        updated_at, last_id = datetime.fromisoformat(mark[0]), mark[1]
+        if last_id is None:
+            return {"updated_at": {"$gte": updated_at}}
+        last_id = ObjectId(last_id) if ObjectId.is_valid(last_id) else last_id
+        return {"$or": [
+            {"updated_at": {"$gt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$gt": last_id}},
+        ]}
+
+    async def changes(self, filters: Dict[str, dict], scopes: List[str], cursor: Optional[str] = None,
+                      reset_at: Optional[datetime] = None) -> dict:
+        """Changed documents per collection (matching `filters`), deleted ids, and the next cursor.
+
+        `full` tells the client to replace its copy instead of merging; `has_more` that
+        a collection had more than a page of changes and it should ask again right away.
+        """
+        started = datetime.utcnow()
+        position = decode_cursor(cursor) if cursor else None
+        issued_at = datetime.fromisoformat(position["at"]) if position else None
+        full = (
+            position is None
+            or issued_at < started - self.retention
+            or (reset_at is not None and reset_at >= issued_at - self.overlap)
+        )
+
+        deleted: Dict[str, List[str]] = {}
+        if not full:
+            tombstones = await self.db.sync_tombstones.find({
+                "scope": {"$in": scopes},
+                "deleted_at": {"$gte": issued_at - self.overlap}
+            }).to_list(self.page_size + 1)
+            if len(tombstones) > self.page_size:
+                full = True
+            else:
+                for tombstone in tombstones:
+                    deleted.setdefault(tombstone["collection"], []).append(tombstone["id"])
+
+        changes: Dict[str, List[dict]] = {}
+        marks = {}
+        has_more = False
+        for collection, base in filters.items():
+            mark = None if full else position["c"].get(collection)
+            query = base if mark is None else {"$and": [base, self._after(mark)]}
+            docs = await self.db[collection].find(query).sort(
+                [("updated_at", 1), ("_id", 1)]
+            ).limit(self.page_size + 1).to_list(self.page_size + 1)
+
+            if len(docs) > self.page_size:
+                docs = docs[:self.page_size]
+                last = docs[-1]
+                marks[collection] = [last["updated_at"].isoformat(), str(last["_id"])]
+                has_more = True
+            else:
+                marks[collection] = [(started - self.overlap).isoformat(), None]
+            changes[collection] = docs
+
+        # A delta still paging keeps `at` behind, so its tombstones aren't skipped meanwhile. A full
+        # load moves it to now: the client replaces its copy, so earlier tombstones don't matter,
+        # and an old `at` would make the next page a full load again.
+        next_cursor = {"at": (started if not has_more or full else issued_at).isoformat(), "c": marks}
+        return {
+            "full": full,
+            "has_more": has_more,
+            "changes": changes,
+            "deleted": deleted,
+            "cursor": encode_cursor(next_cursor),
+        }
+
+# Global delta sync instance
+delta_sync = DeltaSync()
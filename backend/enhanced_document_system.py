@@ -5,19 +5,11 @@ Enhanced Document Generation System
 - Chart and graphic generation capabilities
 """
 
-import json
 import re
-import base64
 from typing import List, Dict, Any, Optional
 from datetime import datetime
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-import seaborn as sns
-import numpy as np
-import io
-from PIL import Image, ImageDraw, ImageFont
-import pandas as pd
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from chart_renderer import ChartRenderer, chart_renderer
+from asset_store import AssetStore, asset_store
 
 class DocumentQualityGate:
     """Ensures only high-quality, well-thought-out documents are created"""
@@ -114,112 +106,30 @@ class DocumentQualityGate:
         }
 
 class ChartGenerator:
-    """Generate charts and visualizations for documents"""
+    """Generate charts and visualizations for documents (rendered off the event loop)"""
     
-    def __init__(self):
-        plt.style.use('seaborn-v0_8')
-        self.colors = ['#3498db', '#e74c3c', '#2ecc71', '#f39c12', '#9b59b6', '#1abc9c']
+    def __init__(self, renderer: ChartRenderer = None, assets: AssetStore = None):
+        self.renderer = renderer or chart_renderer
+        self.assets = assets or asset_store
     
-    def create_pie_chart(self, data: Dict[str, float], title: str) -> str:
-        """Create a pie chart and return base64 encoded image"""
-        fig, ax = plt.subplots(figsize=(8, 6))
-        
-        labels = list(data.keys())
-        sizes = list(data.values())
-        
-        wedges, texts, autotexts = ax.pie(sizes, labels=labels, autopct='%1.1f%%', 
-                                         colors=self.colors[:len(labels)], startangle=90)
-        
-        ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
-        
-        # Make text more readable
-        for autotext in autotexts:
-            autotext.set_color('white')
-            autotext.set_fontweight('bold')
-        
-        plt.tight_layout()
-        
-        # Convert to base64
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-        
-        return image_base64
+    async def _publish(self, chart) -> str:
+        # Documents reference the stored image by URL instead of embedding it
+        return await self.assets.publish(chart.content, chart.mime_type)
     
-    def create_bar_chart(self, data: Dict[str, float], title: str, x_label: str, y_label: str) -> str:
-        """Create a bar chart and return base64 encoded image"""
-        fig, ax = plt.subplots(figsize=(10, 6))
-        
-        labels = list(data.keys())
-        values = list(data.values())
-        
-        bars = ax.bar(labels, values, color=self.colors[:len(labels)])
-        
-        ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
-        ax.set_xlabel(x_label, fontsize=12)
-        ax.set_ylabel(y_label, fontsize=12)
-        
-        # Add value labels on bars
-        for bar in bars:
-            height = bar.get_height()
-            ax.text(bar.get_x() + bar.get_width()/2., height,
-                   f'{height:,.0f}', ha='center', va='bottom', fontweight='bold')
-        
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
-        
-        # Convert to base64
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-        
-        return image_base64
+    async def create_pie_chart(self, data: Dict[str, float], title: str) -> str:
+        """Create a pie chart and return its image URL"""
+        chart = await self.renderer.render("pie", data, title)
+        return await self._publish(chart)
+    
+    async def create_bar_chart(self, data: Dict[str, float], title: str, x_label: str, y_label: str) -> str:
+        """Create a bar chart and return its image URL"""
+        chart = await self.renderer.render("bar", data, title, x_label=x_label, y_label=y_label)
+        return await self._publish(chart)
     
-    def create_timeline_chart(self, milestones: List[Dict], title: str) -> str:
-        """Create a timeline chart for project milestones"""
-        fig, ax = plt.subplots(figsize=(12, 6))
-        
-        dates = [milestone['date'] for milestone in milestones]
-        labels = [milestone['label'] for milestone in milestones]
-        
-        # Create timeline
-        y_pos = 0
-        for i, (date, label) in enumerate(zip(dates, labels)):
-            color = self.colors[i % len(self.colors)]
-            ax.scatter(i, y_pos, s=200, c=color, alpha=0.8, zorder=2)
-            ax.text(i, y_pos + 0.1, label, ha='center', va='bottom', 
-                   fontsize=10, fontweight='bold', rotation=45)
-            ax.text(i, y_pos - 0.1, date, ha='center', va='top', 
-                   fontsize=9, color='gray')
-        
-        # Connect points
-        for i in range(len(dates) - 1):
-            ax.plot([i, i+1], [y_pos, y_pos], 'k-', alpha=0.3, zorder=1)
-        
-        ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
-        ax.set_xlim(-0.5, len(dates) - 0.5)
-        ax.set_ylim(-0.3, 0.3)
-        ax.set_xticks([])
-        ax.set_yticks([])
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['bottom'].set_visible(False)
-        ax.spines['left'].set_visible(False)
-        
-        plt.tight_layout()
-        
-        # Convert to base64
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.getvalue()).decode()
-        plt.close()
-        
-        return image_base64
+    async def create_timeline_chart(self, milestones: List[Dict], title: str) -> str:
+        """Create a timeline chart for project milestones and return its image URL"""
+        chart = await self.renderer.render("timeline", milestones, title)
+        return await self._publish(chart)
 
 class ProfessionalDocumentFormatter:
     """Create professional, PDF-style document formatting"""
@@ -227,12 +137,12 @@ class ProfessionalDocumentFormatter:
     def __init__(self):
         self.chart_generator = ChartGenerator()
     
-    def format_document(self, content: str, title: str, authors: List[str], 
-                       document_type: str, context: str) -> str:
+    async def format_document(self, content: str, title: str, authors: List[str], 
+                             document_type: str, context: str) -> str:
         """Format document with professional styling and embedded charts"""
         
         # Extract data for potential charts from content
-        charts = self._identify_chart_opportunities(content, context)
+        charts = await self._identify_chart_opportunities(content, context)
         
         # Build the formatted document
         formatted_doc = self._build_document_structure(
@@ -241,7 +151,7 @@ class ProfessionalDocumentFormatter:
         
         return formatted_doc
     
-    def _identify_chart_opportunities(self, content: str, context: str) -> List[Dict]:
+    async def _identify_chart_opportunities(self, content: str, context: str) -> List[Dict]:
         """Identify opportunities to add charts based on content"""
         charts = []
         
@@ -250,13 +160,13 @@ class ProfessionalDocumentFormatter:
             # Extract budget data if available
             budget_data = self._extract_budget_data(content, context)
             if budget_data:
-                chart_b64 = self.chart_generator.create_pie_chart(
+                chart_url = await self.chart_generator.create_pie_chart(
                     budget_data, "Budget Allocation"
                 )
                 charts.append({
                     'type': 'pie',
                     'title': 'Budget Allocation',
-                    'data': chart_b64,
+                    'url': chart_url,
                     'position': 'after_budget_section'
                 })
         
@@ -264,13 +174,13 @@ class ProfessionalDocumentFormatter:
         if any(word in content.lower() for word in ['timeline', 'schedule', 'milestone', 'phase', 'deadline', 'duration', 'time']):
             timeline_data = self._extract_timeline_data(content, context)
             if timeline_data:
-                chart_b64 = self.chart_generator.create_timeline_chart(
+                chart_url = await self.chart_generator.create_timeline_chart(
                     timeline_data, "Project Timeline"
                 )
                 charts.append({
                     'type': 'timeline',
                     'title': 'Project Timeline',
-                    'data': chart_b64,
+                    'url': chart_url,
                     'position': 'after_timeline_section'
                 })
         
@@ -278,13 +188,13 @@ class ProfessionalDocumentFormatter:
         if any(word in content.lower() for word in ['risk', 'assessment', 'probability', 'impact', 'threat', 'challenge', 'issue']):
             risk_data = self._extract_risk_data(content, context)
             if risk_data:
-                chart_b64 = self.chart_generator.create_bar_chart(
+                chart_url = await self.chart_generator.create_bar_chart(
                     risk_data, "Risk Assessment", "Risk Categories", "Impact Level"
                 )
                 charts.append({
                     'type': 'bar',
                     'title': 'Risk Assessment',
-                    'data': chart_b64,
+                    'url': chart_url,
                     'position': 'after_risk_section'
                 })
         
@@ -586,7 +496,7 @@ class ProfessionalDocumentFormatter:
                             formatted_section += f'''
 <div class="chart-container">
     <div class="chart-title">{chart['title']}</div>
-    <img src="data:image/png;base64,{chart['data']}" style="max-width: 100%; height: auto;" alt="{chart['title']}">
+    <img src="{chart['url']}" style="max-width: 100%; height: auto;" alt="{chart['title']}">
 </div>
 '''
                             chart_inserted[chart_position] = True
@@ -630,7 +540,7 @@ class ProfessionalDocumentFormatter:
                 formatted_sections.append(f'''
 <div class="chart-container">
     <div class="chart-title">{chart['title']}</div>
-    <img src="data:image/png;base64,{chart['data']}" style="max-width: 100%; height: auto;" alt="{chart['title']}">
+    <img src="{chart['url']}" style="max-width: 100%; height: auto;" alt="{chart['title']}">
 </div>
 ''')
         
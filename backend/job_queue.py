@@ -0,0 +1,377 @@
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobFailed(Exception):
+    """Raised by a handler for errors that retrying won't fix"""
+
+
+class JobInterrupted(BaseException):
+    """Raised inside a handler when its job was cancelled or its lease was lost.
+
+    A BaseException (like asyncio.CancelledError) so the handlers' own
+    `except Exception` blocks don't swallow it.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class JobContext:
+    """What a handler sees of its job: parameters, the last checkpoint and progress reporting.
+
+    A handler resumes from `checkpoint` (saved with the last progress report) when a
+    retry or another worker picks the job up again. Contexts created by
+    `inline_job()` have no queue behind them, so the same handler also runs inside a
+    plain request.
+    """
+
+    def __init__(self, queue: "JobQueue" = None, doc: dict = None):
+        doc = doc or {}
+        self.queue = queue
+        self.id = doc.get("_id")
+        self.kind = doc.get("kind")
+        self.params = doc.get("params") or {}
+        self.user_id = doc.get("user_id") or ""
+        self.checkpoint = doc.get("checkpoint") or {}
+        self.attempt = doc.get("attempts", 1)
+        self.stop_reason = None
+
+    async def progress(self, done: int, total: int, message: str = None, checkpoint: dict = None):
+        """Record progress and (optionally) a resume point; raises JobInterrupted if the job should stop"""
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+        if self.queue is None:
+            return
+        reason = await self.queue._report(self, done, total, message, checkpoint)
+        if reason:
+            self.stop_reason = reason
+            raise JobInterrupted(reason)
+
+
+def inline_job(params: dict = None) -> JobContext:
+    """Context for running a job handler directly inside a request"""
+    return JobContext(doc={"params": params or {}})
+
+
+def job_view(doc: dict) -> dict:
+    """Public status of a job, as returned by /api/jobs/{id}"""
+    progress = dict(doc.get("progress") or {})
+    if progress.get("total"):
+        progress["percent"] = round(100 * progress.get("done", 0) / progress["total"], 1)
+    return {
+        "id": doc["_id"],
+        "kind": doc.get("kind"),
+        "status": doc.get("status"),
+        "progress": progress,
+        "attempts": doc.get("attempts", 0),
+        "max_attempts": doc.get("max_attempts"),
+        "cancel_requested": doc.get("cancel_requested", False),
+        "result": doc.get("result"),
+        "error": doc.get("error"),
+        "next_attempt_at": doc.get("run_after") if doc.get("status") == QUEUED else None,
+        "created_at": doc.get("created_at"),
+        "started_at": doc.get("started_at"),
+        "finished_at": doc.get("finished_at"),
+    }
+
+
+class JobQueue:
+    """Durable background jobs stored in MongoDB (no broker needed).
+
+    Each worker process claims due jobs with a findAndModify that leases the job to
+    it for `lease_seconds`, and renews the lease with heartbeats while the handler
+    runs. A job whose lease expires (the worker died) is claimed again by another
+    worker and resumes from its last checkpoint. Failures are retried with
+    exponential backoff up to `max_attempts`; 4xx HTTPExceptions and JobFailed are
+    not retried.
+    """
+
+    def __init__(self, collection_name: str = "jobs", workers: int = None, lease_seconds: float = None,
+                 heartbeat_seconds: float = None, poll_seconds: float = None, max_attempts: int = None,
+                 retry_backoff: float = None, retry_backoff_max: float = None, retention_days: int = None):
+        self.collection_name = collection_name
+        self.workers = workers or int(os.environ.get('JOB_WORKERS', 2))
+        self.lease_seconds = lease_seconds or float(os.environ.get('JOB_LEASE_SECONDS', 60))
+        self.heartbeat_seconds = heartbeat_seconds or float(os.environ.get('JOB_HEARTBEAT_SECONDS', 15))
+        self.poll_seconds = poll_seconds or float(os.environ.get('JOB_POLL_SECONDS', 5))
+        self.max_attempts = max_attempts or int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+        self.retry_backoff = retry_backoff or float(os.environ.get('JOB_RETRY_BACKOFF', 5))
+        self.retry_backoff_max = retry_backoff_max or float(os.environ.get('JOB_RETRY_BACKOFF_MAX', 300))
+        self.retention_days = retention_days or int(os.environ.get('JOB_RETENTION_DAYS', 7))
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.collection = None
+        self.handlers: Dict[str, Callable[[JobContext], Awaitable[Any]]] = {}
+        self.tasks: List[asyncio.Task] = []
+        self.wakeup: Optional[asyncio.Event] = None
+        self.stats = {"claimed": 0, "succeeded": 0, "retried": 0, "failed": 0, "cancelled": 0}
+
+    def bind(self, db):
+        self.collection = db[self.collection_name]
+
+    def register(self, kind: str, handler: Callable[[JobContext], Awaitable[Any]]):
+        self.handlers[kind] = handler
+
+    async def create_indexes(self):
+        await self.collection.create_index([("status", 1), ("run_after", 1)])
+        await self.collection.create_index([("status", 1), ("lease_expires_at", 1)])
+        # Finished jobs are kept for polling, then expire
+        await self.collection.create_index("finished_at", expireAfterSeconds=self.retention_days * 86400)
+
+    async def start(self):
+        """Start the worker tasks for this process (idempotent)"""
+        if self.tasks:
+            return
+        try:
+            await self.create_indexes()
+        except Exception as e:
+            logging.warning(f"Job queue indexes could not be created: {e}")
+        self.wakeup = asyncio.Event()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logging.info(f"Job queue started with {self.workers} workers as {self.worker_id}")
+
+    async def stop(self):
+        """Stop the workers; jobs they were running are handed back to the queue"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    # Submitting and polling
+
+    def job_id(self, kind: str, idempotency_key: str = None, user_id: str = None) -> str:
+        """Random id, or a stable one derived from the caller's idempotency key"""
+        if not idempotency_key:
+            return uuid.uuid4().hex
+        return hashlib.sha256(f"{kind}:{user_id or ''}:{idempotency_key}".encode()).hexdigest()[:32]
+
+    async def submit(self, kind: str, params: dict = None, idempotency_key: str = None,
+                     user_id: str = None, max_attempts: int = None) -> dict:
+        """Queue a job. Submitting again with the same idempotency key returns the existing job"""
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for job kind {kind}")
+        now = datetime.utcnow()
+        doc = {
+            "_id": self.job_id(kind, idempotency_key, user_id),
+            "kind": kind,
+            "params": jsonable_encoder(params or {}),
+            "user_id": user_id,
+            "status": QUEUED,
+            "attempts": 0,
+            "max_attempts": max_attempts or self.max_attempts,
+            "run_after": now,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "cancel_requested": False,
+            "progress": {"done": 0, "total": None, "message": None},
+            "checkpoint": {},
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "started_at": None,
+            "finished_at": None,
+        }
+        try:
+            await self.collection.insert_one(doc)
+        except DuplicateKeyError:
+            return await self.collection.find_one({"_id": doc["_id"]})
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return doc
+
+    @staticmethod
+    def _owned(job_id: str, user_id: Optional[str]) -> dict:
+        # With a user id, another user's job looks like a missing one
+        return {"_id": job_id} if user_id is None else {"_id": job_id, "user_id": user_id}
+
+    async def get(self, job_id: str, user_id: str = None) -> Optional[dict]:
+        """A job by id, only if it belongs to `user_id` when one is given"""
+        return await self.collection.find_one(self._owned(job_id, user_id))
+
+    async def cancel(self, job_id: str, user_id: str = None) -> Optional[dict]:
+        """Cancel a queued job now, or ask the worker running it to stop at its next progress report"""
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {**self._owned(job_id, user_id), "status": QUEUED},
+            {"$set": {"status": CANCELLED, "cancel_requested": True, "finished_at": now, "updated_at": now}}
+        )
+        await self.collection.update_one(
+            {**self._owned(job_id, user_id), "status": RUNNING},
+            {"$set": {"cancel_requested": True, "updated_at": now}}
+        )
+        return await self.get(job_id, user_id)
+
+    # Worker side
+
+    async def _worker(self):
+        while True:
+            try:
+                doc = await self._claim()
+            except Exception as e:
+                logging.warning(f"Job queue claim failed: {e}")
+                doc = None
+            if doc is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(doc)
+
+    async def _claim(self) -> Optional[dict]:
+        """Lease the next due job: queued ones whose backoff has passed, or running ones whose worker died"""
+        now = datetime.utcnow()
+        doc = await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": QUEUED, "run_after": {"$lte": now}},
+                {"status": RUNNING, "lease_expires_at": {"$lte": now}},
+            ]},
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "lease_owner": self.worker_id,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "started_at": now,
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_after", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is not None:
+            self.stats["claimed"] += 1
+        return doc
+
+    async def _execute(self, doc: dict):
+        job = JobContext(self, doc)
+        handler = self.handlers.get(job.kind)
+        if doc.get("cancel_requested"):
+            await self._finish(job, CANCELLED)
+            return
+        if handler is None:
+            await self._finish(job, FAILED, error=f"No handler registered for job kind {job.kind}")
+            return
+        if job.attempt > doc.get("max_attempts", self.max_attempts):
+            await self._finish(job, FAILED, error=doc.get("error") or "Worker died too many times running this job")
+            return
+
+        task = asyncio.create_task(handler(job))
+        heartbeat = asyncio.create_task(self._heartbeat(job, task))
+        try:
+            result = await task
+        except (JobInterrupted, asyncio.CancelledError):
+            if job.stop_reason == CANCELLED:
+                await self._finish(job, CANCELLED)
+            elif job.stop_reason is None:
+                # Shutting down: hand the job back without charging an attempt
+                await self._release(job)
+                raise
+            # Lease lost: another worker owns the job now
+        except Exception as e:
+            await self._failed(job, doc, e)
+        else:
+            await self._finish(job, SUCCEEDED, result=jsonable_encoder(result))
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job: JobContext, task: asyncio.Task):
+        while not task.done():
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                reason = await self._renew(job, {})
+            except Exception as e:
+                logging.warning(f"Heartbeat for job {job.id} failed: {e}")
+                continue
+            if reason:
+                job.stop_reason = reason
+                task.cancel()
+                return
+
+    async def _renew(self, job: JobContext, fields: dict) -> Optional[str]:
+        """Extend the lease (with extra fields); returns why the job must stop, if it must"""
+        now = datetime.utcnow()
+        doc = await self.collection.find_one_and_update(
+            {"_id": job.id, "lease_owner": self.worker_id, "status": RUNNING},
+            {"$set": dict(fields, lease_expires_at=now + timedelta(seconds=self.lease_seconds), updated_at=now)},
+            projection={"cancel_requested": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is None:
+            return "lease_lost"
+        if doc.get("cancel_requested"):
+            return CANCELLED
+        return None
+
+    async def _report(self, job: JobContext, done: int, total: int, message: str, checkpoint: dict) -> Optional[str]:
+        fields = {"progress": {"done": done, "total": total, "message": message}}
+        if checkpoint is not None:
+            fields["checkpoint"] = jsonable_encoder(checkpoint)
+        return await self._renew(job, fields)
+
+    async def _failed(self, job: JobContext, doc: dict, error: Exception):
+        permanent = isinstance(error, JobFailed) or (isinstance(error, HTTPException) and error.status_code < 500)
+        message = str(error.detail) if isinstance(error, HTTPException) else str(error)
+        if permanent or job.attempt >= doc.get("max_attempts", self.max_attempts):
+            logging.error(f"Job {job.id} ({job.kind}) failed: {message}")
+            await self._finish(job, FAILED, error=message)
+            return
+
+        delay = min(self.retry_backoff * 2 ** (job.attempt - 1), self.retry_backoff_max)
+        logging.warning(f"Job {job.id} ({job.kind}) attempt {job.attempt} failed, retrying in {delay:.0f}s: {message}")
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"_id": job.id, "lease_owner": self.worker_id},
+            {"$set": {"status": QUEUED, "error": message, "run_after": now + timedelta(seconds=delay),
+                      "lease_owner": None, "lease_expires_at": None, "updated_at": now}}
+        )
+        self.stats["retried"] += 1
+
+    async def _finish(self, job: JobContext, status: str, result: Any = None, error: str = None):
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"_id": job.id, "lease_owner": self.worker_id},
+            {"$set": {"status": status, "result": result, "error": error, "finished_at": now, "updated_at": now,
+                      "lease_owner": None, "lease_expires_at": None}}
+        )
+        self.stats[status] += 1
+
+    async def _release(self, job: JobContext):
+        now = datetime.utcnow()
+        try:
+            await self.collection.update_one(
+                {"_id": job.id, "lease_owner": self.worker_id},
+                {"$set": {"status": QUEUED, "run_after": now, "lease_owner": None, "lease_expires_at": None,
+                          "updated_at": now},
+                 "$inc": {"attempts": -1}}
+            )
+        except Exception as e:
+            logging.warning(f"Job {job.id} could not be released: {e}")
+
+    def get_stats(self) -> dict:
+        return dict(self.stats, workers=len(self.tasks), worker_id=self.worker_id,
+                    handlers=sorted(self.handlers))
+
+# Global job queue instance
+job_queue = JobQueue()
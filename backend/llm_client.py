@@ -0,0 +1,20 @@
+"""
+Lazy access to the emergentintegrations LLM client.
+
+emergentintegrations pulls in litellm and, through it, openai; importing it at
+module level would load both into every worker at startup. These factories keep
+the call sites unchanged (`LlmChat(...)`, `UserMessage(text=...)`) and import the
+library on first use.
+"""
+
+
+def LlmChat(*args, **kwargs):
+    """emergentintegrations.llm.chat.LlmChat, imported on first call"""
+    from emergentintegrations.llm.chat import LlmChat as _LlmChat
+    return _LlmChat(*args, **kwargs)
+
+
+def UserMessage(*args, **kwargs):
+    """emergentintegrations.llm.chat.UserMessage, imported on first call"""
+    from emergentintegrations.llm.chat import UserMessage as _UserMessage
+    return _UserMessage(*args, **kwargs)
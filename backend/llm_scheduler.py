@@ -0,0 +1,256 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+
+# Priority classes - lower values are always dispatched first
+PRIORITY_INTERACTIVE = 0   # User-facing turns (conversation rounds, voice field summaries)
+PRIORITY_OBSERVER = 1      # Agent replies to observer messages
+PRIORITY_DOCUMENT = 2      # Action triggers, votes, document generation and review
+PRIORITY_BACKGROUND = 3    # Fast-forward batches, translation, summaries, memory upkeep
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_OBSERVER: "observer",
+    PRIORITY_DOCUMENT: "document",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# Share of the RPM/TPM budget each class is allowed to fill. Lower classes stop
+# short of the full budget so a 30-day fast-forward can never use the headroom
+# that interactive turns need.
+PRIORITY_CEILINGS = {
+    PRIORITY_INTERACTIVE: 1.0,
+    PRIORITY_OBSERVER: 0.9,
+    PRIORITY_DOCUMENT: 0.75,
+    PRIORITY_BACKGROUND: 0.5,
+}
+
+BUDGET_WINDOW_SECONDS = 60
+
+# Two-dimensional GCRA with per-call cost: requests and tokens each keep a
+# theoretical arrival time, and a call is admitted only if both stay within
+# `ceiling_ms` of now. Returns 0 when admitted, otherwise milliseconds to wait.
+BUDGET_LUA = """
+local request_interval = tonumber(ARGV[1])
+local token_interval = tonumber(ARGV[2])
+local tokens = tonumber(ARGV[3])
+local ceiling = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + tonumber(clock[2]) / 1000
+local request_tat = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now)
+local token_tat = math.max(tonumber(redis.call('GET', KEYS[2])) or now, now)
+local new_request_tat = request_tat + request_interval
+local new_token_tat = token_tat + tokens * token_interval
+local wait = math.max(new_request_tat - now - ceiling, new_token_tat - now - ceiling)
+if wait > 0 then
+    return tostring(wait)
+end
+redis.call('SET', KEYS[1], tostring(new_request_tat), 'PX', math.ceil(new_request_tat - now))
+redis.call('SET', KEYS[2], tostring(new_token_tat), 'PX', math.ceil(new_token_tat - now))
+return '0'
+"""
+
+
+# User an LLM call is made for. Set where a request, job or scheduled tick knows whose
+# simulation it is working on, so calls deep inside generation paths are queued fairly
+# without each one passing the user along.
+llm_user: ContextVar[str] = ContextVar('llm_user', default="")
+
+
+@contextmanager
+def acting_for(user_id: str):
+    """Attribute LLM calls made inside the block to `user_id`"""
+    token = llm_user.set(user_id or "")
+    try:
+        yield
+    finally:
+        llm_user.reset(token)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate for budgeting (about 4 characters per token)"""
+    return max(1, len(text or "") // 4)
+
+
+class LLMBudget:
+    """Requests-per-minute and tokens-per-minute budget, local or shared via Redis"""
+
+    def __init__(self, rpm: int, tpm: int, clock: Callable[[], float] = time.monotonic):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.clock = clock
+        self.request_tat = 0.0
+        self.token_tat = 0.0
+        self.redis_script = None
+        self.keys = ["llm_budget:requests", "llm_budget:tokens"]
+
+    def use_redis(self, redis_client):
+        """Share the budget across workers and replicas"""
+        self.redis_script = redis_client.register_script(BUDGET_LUA) if redis_client is not None else None
+
+    def _cost(self, tokens: int, ceiling: float) -> int:
+        # A single call larger than the class share would otherwise never fit
+        return min(tokens, int(self.tpm * ceiling))
+
+    async def try_acquire(self, tokens: int, ceiling: float = 1.0) -> float:
+        """Reserve budget for one call. Returns 0 if reserved, otherwise seconds to wait"""
+        tokens = self._cost(tokens, ceiling)
+
+        if self.redis_script is not None:
+            try:
+                wait_ms = await self.redis_script(
+                    keys=self.keys,
+                    args=[
+                        BUDGET_WINDOW_SECONDS * 1000 / self.rpm,
+                        BUDGET_WINDOW_SECONDS * 1000 / self.tpm,
+                        tokens,
+                        BUDGET_WINDOW_SECONDS * 1000 * ceiling,
+                    ]
+                )
+                return float(wait_ms) / 1000
+            except Exception as e:
+                logging.warning(f"Shared LLM budget unavailable, using local budget: {e}")
+
+        now = self.clock()
+        limit = BUDGET_WINDOW_SECONDS * ceiling
+        new_request_tat = max(self.request_tat, now) + BUDGET_WINDOW_SECONDS / self.rpm
+        new_token_tat = max(self.token_tat, now) + tokens * BUDGET_WINDOW_SECONDS / self.tpm
+
+        wait = max(new_request_tat - now - limit, new_token_tat - now - limit)
+        if wait > 0:
+            return wait
+
+        self.request_tat = new_request_tat
+        self.token_tat = new_token_tat
+        return 0.0
+
+    def utilization(self) -> Dict[str, float]:
+        """Fraction of each local budget currently committed"""
+        now = self.clock()
+        return {
+            "requests": round(max(0.0, self.request_tat - now) / BUDGET_WINDOW_SECONDS, 3),
+            "tokens": round(max(0.0, self.token_tat - now) / BUDGET_WINDOW_SECONDS, 3),
+        }
+
+
+class LLMScheduler:
+    """Dispatches LLM calls by priority class, with weighted fair queuing per user inside a class"""
+
+    def __init__(self, rpm: int = None, tpm: int = None, clock: Callable[[], float] = time.monotonic):
+        rpm = rpm or int(os.environ.get('LLM_RPM_LIMIT', 1000))
+        tpm = tpm or int(os.environ.get('LLM_TPM_LIMIT', 1000000))
+        self.budget = LLMBudget(rpm, tpm, clock=clock)
+
+        # Heap of (priority, virtual_finish, seq, future, tokens)
+        self.queue = []
+        self.seq = itertools.count()
+        self.virtual_time: Dict[int, float] = {}
+        self.user_finish: Dict[Tuple[int, str], float] = {}
+        self.user_weights: Dict[str, float] = {}
+
+        self.dispatched = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.wakeup = None
+        self.dispatcher = None
+        self.loop = None
+
+    def use_redis(self, redis_client):
+        """Share the RPM/TPM budget through Redis"""
+        self.budget.use_redis(redis_client)
+
+    def set_user_weight(self, user_id: str, weight: float):
+        """Give a user a larger (or smaller) share of their priority class"""
+        self.user_weights[user_id] = max(0.01, weight)
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE, user_id: Optional[str] = None,
+                      estimated_tokens: int = 500):
+        """Queue for budget and return once this call has been admitted (for `llm_user` by default)"""
+        self._ensure_dispatcher()
+        if user_id is None:
+            user_id = llm_user.get()
+
+        # Weighted fair queuing: each user's calls are stamped with a virtual finish
+        # time, so a user with a long backlog does not delay other users in the class
+        weight = self.user_weights.get(user_id, 1.0)
+        start = max(self.virtual_time.get(priority, 0.0), self.user_finish.get((priority, user_id), 0.0))
+        finish = start + estimated_tokens / weight
+        self.user_finish[(priority, user_id)] = finish
+
+        future = self.loop.create_future()
+        heapq.heappush(self.queue, (priority, finish, next(self.seq), future, estimated_tokens))
+        self.wakeup.set()
+        await future
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self.dispatcher is None or self.dispatcher.done() or self.loop is not loop:
+            self.loop = loop
+            self.queue = []
+            self.wakeup = asyncio.Event()
+            self.dispatcher = loop.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while True:
+            # Drop callers that gave up while waiting
+            while self.queue and self.queue[0][3].done():
+                heapq.heappop(self.queue)
+
+            if not self.queue:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            priority, finish, _, future, tokens = self.queue[0]
+            try:
+                wait = await self.budget.try_acquire(tokens, PRIORITY_CEILINGS.get(priority, 1.0))
+            except Exception as e:
+                logging.error(f"LLM budget check failed, admitting call: {e}")
+                wait = 0
+
+            if wait <= 0:
+                heapq.heappop(self.queue)
+                self.virtual_time[priority] = finish
+                self.dispatched[PRIORITY_NAMES.get(priority, str(priority))] += 1
+                if not future.done():
+                    future.set_result(None)
+                self._prune_finished_users()
+                continue
+
+            # Sleep until budget frees up, or earlier if a higher priority call arrives
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=min(wait, 1.0))
+            except asyncio.TimeoutError:
+                pass
+
+    def _prune_finished_users(self):
+        if len(self.user_finish) < 10000:
+            return
+        self.user_finish = {
+            key: finish for key, finish in self.user_finish.items()
+            if finish > self.virtual_time.get(key[0], 0.0)
+        }
+
+    def get_stats(self) -> Dict[str, object]:
+        """Queue depth per class, dispatch counts and local budget use"""
+        waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, future, _ in self.queue:
+            if not future.done():
+                waiting[PRIORITY_NAMES.get(priority, str(priority))] += 1
+
+        return {
+            "rpm_limit": self.budget.rpm,
+            "tpm_limit": self.budget.tpm,
+            "shared_budget": self.budget.redis_script is not None,
+            "waiting": waiting,
+            "dispatched": dict(self.dispatched),
+            "local_utilization": self.budget.utilization(),
+        }
+
+# Global LLM scheduler instance
+llm_scheduler = LLMScheduler()
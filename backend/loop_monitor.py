@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from monitoring import EVENT_LOOP_LAG, EVENT_LOOP_STALLS
+
+
+class LoopLagMonitor:
+    """Measures event loop scheduling delay and captures the stack of whatever blocks it.
+
+    A coroutine on the loop sleeps for `interval` and records how late it wakes up.
+    A watchdog thread checks the coroutine's heartbeat; when the loop has not run for
+    longer than `threshold`, it samples the loop thread's current stack, which is the
+    blocking call (sync bcrypt, TTS, matplotlib, ...) while the stall is still going on.
+    """
+
+    def __init__(self, interval: float = None, threshold: float = None, max_captures: int = 50):
+        self.interval = interval or float(os.environ.get('LOOP_LAG_INTERVAL', 0.1))
+        self.threshold = threshold or float(os.environ.get('LOOP_LAG_THRESHOLD', 0.25))
+        self.captures = deque(maxlen=max_captures)
+        self.max_lag = 0.0
+        self.stall_count = 0
+
+        self.loop = None
+        self.loop_thread_id = None
+        self.heartbeat = time.monotonic()
+        self.task = None
+        self.watchdog = None
+        self.stop_event = threading.Event()
+        self.current_capture: Optional[Dict[str, Any]] = None
+        self.lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        """Start measuring on the running loop (idempotent)"""
+        if self.running:
+            return
+
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.stop_event.clear()
+        self.task = self.loop.create_task(self._measure())
+
+        self.watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self.watchdog.start()
+        logging.info(f"Event loop lag monitor started (threshold {self.threshold * 1000:.0f}ms)")
+
+    async def stop(self):
+        """Stop the measuring task and the watchdog thread"""
+        self.stop_event.set()
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _measure(self):
+        while True:
+            scheduled = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.heartbeat = now
+
+            lag = max(0.0, now - scheduled - self.interval)
+            EVENT_LOOP_LAG.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+            if lag >= self.threshold or self.current_capture is not None:
+                self._finish_stall(lag)
+
+    def _watch(self):
+        # Check several times per threshold so the capture lands inside the stall
+        check_every = self.threshold / 4
+        while not self.stop_event.wait(check_every):
+            blocked_for = time.monotonic() - self.heartbeat - self.interval
+            if blocked_for < self.threshold:
+                continue
+
+            with self.lock:
+                if self.current_capture is not None:
+                    continue
+                frame = sys._current_frames().get(self.loop_thread_id)
+                if frame is None:
+                    continue
+                self.current_capture = {
+                    "captured_at": datetime.utcnow().isoformat(),
+                    "blocked_ms_at_capture": round(blocked_for * 1000, 1),
+                    "lag_ms": None,
+                    "stack": traceback.format_stack(frame),
+                }
+                del frame
+
+    def _finish_stall(self, lag: float):
+        """Called on the loop once it runs again after a stall"""
+        self.stall_count += 1
+        EVENT_LOOP_STALLS.inc()
+
+        with self.lock:
+            capture = self.current_capture
+            self.current_capture = None
+
+        if capture is None:
+            # The stall ended between watchdog checks; record it without a stack
+            capture = {
+                "captured_at": datetime.utcnow().isoformat(),
+                "blocked_ms_at_capture": None,
+                "stack": [],
+            }
+        capture["lag_ms"] = round(lag * 1000, 1)
+        self.captures.append(capture)
+
+        culprit = capture["stack"][-1].strip().splitlines()[0] if capture["stack"] else "unknown"
+        logging.warning(f"Event loop blocked for {lag * 1000:.0f}ms at {culprit}")
+
+    def get_captures(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent stall captures, newest first"""
+        return list(reversed(self.captures))[:limit]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Summary of loop health since startup"""
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stall_count": self.stall_count,
+        }
+
+# Global loop lag monitor instance
+loop_monitor = LoopLagMonitor()
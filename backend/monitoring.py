@@ -1,3 +1,4 @@
+import os
 import time
 import psutil
 import asyncio
@@ -15,6 +16,61 @@ SYSTEM_CPU = Gauge('system_cpu_percent', 'System CPU usage')
 SYSTEM_MEMORY = Gauge('system_memory_percent', 'System memory usage')
 ACTIVE_USERS = Gauge('active_users_count', 'Number of active users')
 
+# LLM metrics, labelled by what the call is for (agent_turn, vote, memory, translate, document, review, summary)
+LLM_CALL_DURATION = Histogram(
+    'llm_call_duration_seconds', 'LLM call latency', ['purpose', 'outcome'],
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 10, 20, 30, 60)
+)
+LLM_TIMEOUTS = Counter('llm_timeouts_total', 'LLM calls that hit their timeout', ['purpose'])
+LLM_FALLBACKS = Counter('llm_fallbacks_total', 'Canned responses used instead of LLM output', ['purpose'])
+LLM_PROMPT_CHARS = Histogram(
+    'llm_prompt_chars', 'LLM prompt size in characters', ['purpose'],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+)
+LLM_RESPONSE_CHARS = Histogram(
+    'llm_response_chars', 'LLM response size in characters', ['purpose'],
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000)
+)
+LLM_QUOTA_REQUESTS = Counter('llm_quota_requests_total', 'LLM requests charged against the daily quota', ['purpose'])
+LLM_QUOTA_TOKENS = Counter('llm_quota_tokens_total', 'Estimated LLM tokens consumed', ['purpose'])
+
+# MongoDB metrics
+MONGO_COMMANDS = Counter('mongo_commands_total', 'MongoDB commands', ['command', 'outcome'])
+MONGO_OPS_PER_REQUEST = Histogram(
+    'mongo_ops_per_request', 'MongoDB commands issued while serving one request', ['method', 'endpoint'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250)
+)
+MONGO_ROUND_TRIPS_PER_REQUEST = Histogram(
+    'mongo_round_trips_per_request', 'MongoDB round-trips (commands plus getMore) per request', ['method', 'endpoint'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250)
+)
+MONGO_DOCS_PER_REQUEST = Histogram(
+    'mongo_docs_returned_per_request', 'Documents returned by MongoDB per request', ['method', 'endpoint'],
+    buckets=(0, 1, 10, 50, 100, 500, 1000, 5000, 10000)
+)
+MONGO_N_PLUS_ONE = Counter(
+    'mongo_n_plus_one_total', 'Requests that repeated the same query shape past the N+1 threshold',
+    ['endpoint', 'command', 'collection']
+)
+
+# Event loop health
+EVENT_LOOP_LAG = Histogram(
+    'event_loop_lag_seconds', 'Delay between when a loop callback was due and when it ran',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+EVENT_LOOP_STALLS = Counter('event_loop_stalls_total', 'Event loop stalls longer than the lag threshold')
+
+
+def route_template(request) -> str:
+    """Matched route path (e.g. /api/documents/{document_id}) so metrics stay low-cardinality"""
+    route = request.scope.get("route")
+    path = getattr(route, "path", None)
+    if path:
+        return path
+    # Unmatched paths (404s, scanners) are arbitrary strings; never use them as labels
+    return "unmatched"
+
+
 # Structured logging
 logger = structlog.get_logger()
 
@@ -24,23 +80,38 @@ class PerformanceMonitor:
         self.request_count = 0
         self.error_count = 0
         self.active_requests = 0
+        self.slow_request_seconds = float(os.environ.get('SLOW_REQUEST_SECONDS', 1.0))
+        self.metrics_task = None
         
-    async def start_monitoring(self):
+    async def start_monitoring(self, port: int = None):
         """Start background monitoring tasks"""
-        # Start Prometheus metrics server
-        start_http_server(8000)
+        port = port or int(os.environ.get('METRICS_PORT', 8000))
+        
+        # Start Prometheus metrics server; with several workers only the first one gets the port
+        try:
+            start_http_server(port)
+        except OSError as e:
+            logger.warning("Prometheus metrics port unavailable", port=port, error=str(e))
         
         # Start system metrics collection
-        asyncio.create_task(self._collect_system_metrics())
+        if self.metrics_task is None:
+            self.metrics_task = asyncio.create_task(self._collect_system_metrics())
         
-        logger.info("Performance monitoring started", port=8000)
+        logger.info("Performance monitoring started", port=port)
+    
+    async def stop_monitoring(self):
+        """Stop the system metrics task"""
+        if self.metrics_task is not None:
+            self.metrics_task.cancel()
+            await asyncio.gather(self.metrics_task, return_exceptions=True)
+            self.metrics_task = None
     
     async def _collect_system_metrics(self):
         """Collect system metrics periodically"""
         while True:
             try:
-                # CPU and memory usage
-                cpu_percent = psutil.cpu_percent(interval=1)
+                # CPU and memory usage (non-blocking: measured since the previous call)
+                cpu_percent = psutil.cpu_percent(interval=None)
                 memory = psutil.virtual_memory()
                 
                 SYSTEM_CPU.set(cpu_percent)
@@ -68,6 +139,23 @@ class PerformanceMonitor:
         if status_code >= 400:
             self.error_count += 1
     
+    def record_llm_call(self, purpose: str, duration: float, outcome: str, prompt_chars: int,
+                        response_chars: int = 0, tokens: int = 0):
+        """Record one LLM call (outcome: success, timeout or error)"""
+        LLM_CALL_DURATION.labels(purpose=purpose, outcome=outcome).observe(duration)
+        LLM_PROMPT_CHARS.labels(purpose=purpose).observe(prompt_chars)
+        LLM_QUOTA_REQUESTS.labels(purpose=purpose).inc()
+        LLM_QUOTA_TOKENS.labels(purpose=purpose).inc(tokens)
+
+        if outcome == "success":
+            LLM_RESPONSE_CHARS.labels(purpose=purpose).observe(response_chars)
+        elif outcome == "timeout":
+            LLM_TIMEOUTS.labels(purpose=purpose).inc()
+
+    def record_llm_fallback(self, purpose: str):
+        """Record a canned response used instead of LLM output"""
+        LLM_FALLBACKS.labels(purpose=purpose).inc()
+
     def record_cache_hit(self, operation: str):
         """Record cache hit"""
         CACHE_HITS.labels(operation=operation).inc()
@@ -89,10 +177,28 @@ class PerformanceMonitor:
             "total_requests": self.request_count,
             "total_errors": self.error_count,
             "error_rate": self.error_count / max(self.request_count, 1),
+            "active_requests": self.active_requests,
             "cpu_percent": psutil.cpu_percent(),
             "memory_percent": psutil.virtual_memory().percent,
             "disk_usage": psutil.disk_usage('/').percent,
         }
 
 # Global monitor instance
-monitor = PerformanceMonitor()
\ No newline at end of file
+monitor = PerformanceMonitor()
+
+async def track_request(request, call_next):
+    """HTTP middleware recording request count, latency by route template and in-flight requests"""
+    start_time = time.time()
+    status_code = 500
+    monitor.active_requests += 1
+
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        monitor.active_requests -= 1
+        duration = time.time() - start_time
+        monitor.record_request(request.method, route_template(request), status_code, duration)
+        if duration > monitor.slow_request_seconds:
+            logger.warning("Slow request detected", path=request.url.path, method=request.method, duration=duration)
\ No newline at end of file
@@ -0,0 +1,108 @@
+import asyncio
+import itertools
+import logging
+import os
+from typing import Dict, Iterable, List, Tuple
+
+from tts_service import TTSService, VoiceNotSupported, tts_service
+
+
+class NarrationPrefetcher:
+    """Synthesizes narration for new conversation rounds before anyone presses play.
+
+    Each round's messages are queued as soon as the round is persisted. The newest
+    round is always synthesized first (and within a round, messages in playback
+    order), so the round a listener is about to hear is ready first. The queue is
+    capped at `max_queued` clips; when it overflows the oldest rounds are dropped,
+    since they will just be synthesized on demand if anyone replays them.
+
+    A small number of workers share the TTS service's concurrency limit, leaving
+    room for interactive synthesis requests.
+    """
+
+    def __init__(self, service: TTSService = None, max_queued: int = None, workers: int = None,
+                 enabled: bool = None):
+        self.service = service or tts_service
+        self.max_queued = max_queued or int(os.environ.get('TTS_PREFETCH_MAX_QUEUED', 200))
+        self.workers = workers or int(os.environ.get('TTS_PREFETCH_WORKERS', 1))
+        if enabled is None:
+            enabled = os.environ.get('TTS_PREFETCH_ENABLED', 'false').lower() == 'true'
+        self.enabled = enabled
+        # Sorted ascending by (-round sequence, message index); a sorted list is also a valid heap
+        self.queue: List[Tuple[int, int, str, str, str]] = []
+        self.round_sequence = itertools.count(1)
+        self.wakeup = None
+        self.tasks: List[asyncio.Task] = []
+        self.synthesized = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def enqueue_round(self, messages: Iterable, language: str) -> int:
+        """Queue every message of a newly persisted round; returns how many were queued"""
+        if not self.enabled:
+            return 0
+
+        round_priority = -next(self.round_sequence)
+        queued = 0
+        for index, message in enumerate(messages):
+            if not message.message:
+                continue
+            self.queue.append((round_priority, index, message.message, message.agent_name, language))
+            queued += 1
+
+        self.queue.sort()
+        if len(self.queue) > self.max_queued:
+            self.dropped += len(self.queue) - self.max_queued
+            del self.queue[self.max_queued:]
+
+        self._ensure_workers()
+        self.wakeup.set()
+        return queued
+
+    def _ensure_workers(self):
+        if self.wakeup is None:
+            self.wakeup = asyncio.Event()
+        self.tasks = [task for task in self.tasks if not task.done()]
+        while len(self.tasks) < self.workers:
+            self.tasks.append(asyncio.create_task(self._worker()))
+
+    async def _worker(self):
+        while True:
+            if not self.queue:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            _, _, text, agent_name, language = self.queue.pop(0)
+            try:
+                result = await self.service.synthesize(text, agent_name, language)
+                if not result.cached:
+                    self.synthesized += 1
+            except VoiceNotSupported:
+                # The frontend falls back to browser speech for these languages
+                continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logging.warning(f"Narration pre-synthesis failed for {agent_name}: {e}")
+
+    async def stop(self):
+        """Cancel the workers and drop anything still queued"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.queue.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "enabled": self.enabled,
+            "queued": len(self.queue),
+            "synthesized": self.synthesized,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+# Global narration prefetcher instance
+narration_prefetcher = NarrationPrefetcher()
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import bcrypt
+
+BCRYPT_COST_PATTERN = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+
+class CryptoBusy(Exception):
+    """Too many password hashes are already queued; the caller should retry later"""
+
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool so hashing never blocks the event loop.
+
+    bcrypt releases the GIL, so each worker thread hashes in parallel. At most
+    `max_pending` operations may be queued or running; beyond that callers get
+    CryptoBusy instead of piling up behind a login storm.
+    """
+
+    def __init__(self, rounds: int = None, max_workers: int = None, max_pending: int = None):
+        self.rounds = rounds or int(os.environ.get('BCRYPT_ROUNDS', 12))
+        self.max_workers = max_workers or int(os.environ.get('CRYPTO_WORKERS', min(4, os.cpu_count() or 1)))
+        self.max_pending = max_pending or int(os.environ.get('CRYPTO_MAX_PENDING', 64))
+        self.pending = 0
+        self.rejected = 0
+        self.executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="crypto")
+        return self.executor
+
+    async def _run(self, func, *args):
+        # The counter is only touched on the event loop thread, so no lock is needed
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise CryptoBusy("Password hashing is at capacity")
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+
+    def _hash(self, password: str) -> str:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=self.rounds)).decode('utf-8')
+
+    @staticmethod
+    def _verify(password: str, hashed_password: str) -> bool:
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+        except ValueError:
+            # Malformed or non-bcrypt hash
+            return False
+
+    async def hash(self, password: str) -> str:
+        """Hash a password with the configured cost"""
+        return await self._run(self._hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Verify a password against a bcrypt hash"""
+        return await self._run(self._verify, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """True if the hash was made with a different cost than the configured one"""
+        match = BCRYPT_COST_PATTERN.match(hashed_password or "")
+        return match is None or int(match.group(1)) != self.rounds
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password; if it matches but the cost changed, also return a new hash to store"""
+        if not await self.verify(password, hashed_password):
+            return False, None
+        if not self.needs_rehash(hashed_password):
+            return True, None
+        try:
+            return True, await self.hash(password)
+        except CryptoBusy:
+            # Upgrading the hash can wait until the next login
+            return True, None
+
+    def get_stats(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+        }
+
+# Global password hasher instance
+password_hasher = PasswordHasher()
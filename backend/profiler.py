@@ -0,0 +1,223 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+MAX_STACK_DEPTH = 128
+
+# Profiling sessions are capped so a forgotten session cannot run forever
+MAX_PROFILE_SECONDS = 120
+
+
+def frame_label(code) -> str:
+    """Stable label for a function: name plus file and first line"""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def thread_stack(frame) -> Tuple[str, ...]:
+    """Labels for a thread's stack, outermost call first"""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return tuple(reversed(labels))
+
+
+def task_frames(task) -> list:
+    """Frames of a task's await chain, outermost coroutine first"""
+    frames = []
+    coro = task.get_coro()
+    while coro is not None and len(frames) < MAX_STACK_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is not None:
+            frames.append(frame)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return frames
+
+
+def scope_route(scope: dict) -> str:
+    """Method and matched FastAPI route of an ASGI scope ("unmatched" until routing is done)"""
+    route = scope.get("route")
+    return f"{scope.get('method', '')} {getattr(route, 'path', None) or 'unmatched'}".strip()
+
+
+class SamplingProfiler:
+    """Low-overhead wall-clock sampler over sys._current_frames for on-demand production profiling.
+
+    Two views are recorded per sample: `threads` (every thread's Python stack, with the
+    event loop thread labelled by the route of the request it is running) and `tasks`
+    (every in-flight request's await chain, attributed to its FastAPI route).
+
+    The sampler thread never touches loop-owned structures: requests are registered on
+    the loop by ProfilerMiddleware, and the sampler only copies that registry.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.loop = None
+        self.loop_thread_id = None
+        # In-flight requests: task -> (frame of the middleware call running in it, ASGI scope)
+        self.requests: Dict[asyncio.Task, Tuple[Any, dict]] = {}
+        self._reset(0.0, 0.0)
+
+    def _reset(self, duration: float, interval: float):
+        self.duration = duration
+        self.interval = interval
+        self.started_at = None
+        self.finished_at = None
+        self.sample_count = 0
+        self.samples = {"threads": Counter(), "tasks": Counter()}
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, duration: float = 30, interval: float = 0.01):
+        """Start sampling for `duration` seconds; call from the event loop to enable the task view"""
+        with self.lock:
+            if self.running:
+                raise RuntimeError("A profiling session is already running")
+
+            self._reset(min(duration, MAX_PROFILE_SECONDS), max(interval, 0.001))
+            try:
+                self.loop = asyncio.get_running_loop()
+                self.loop_thread_id = threading.get_ident()
+            except RuntimeError:
+                self.loop = None
+                self.loop_thread_id = None
+
+            self.stop_event.clear()
+            self.started_at = time.time()
+            self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop sampling (if still running) and wait for the sampler thread"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _run(self):
+        deadline = time.monotonic() + self.duration
+        while not self.stop_event.wait(self.interval) and time.monotonic() < deadline:
+            try:
+                self._sample()
+            except Exception:
+                # A racing thread or task exit must never kill the session
+                continue
+        self.finished_at = time.time()
+
+    @staticmethod
+    def _loop_route(frame, request_frames: Dict[int, dict]) -> str:
+        # The loop is running a request if that request's middleware frame is on its stack
+        while frame is not None:
+            scope = request_frames.get(id(frame))
+            if scope is not None:
+                return scope_route(scope)
+            frame = frame.f_back
+        return "<background>"
+
+    def _sample(self):
+        own_ident = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        requests = dict(self.requests)
+        request_frames = {id(frame): scope for frame, scope in requests.values()}
+
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            label = f"thread:{names.get(ident, ident)}"
+            if ident == self.loop_thread_id:
+                label = "event-loop:" + self._loop_route(frame, request_frames)
+            self.samples["threads"][(label,) + thread_stack(frame)] += 1
+
+        for task, (_, scope) in requests.items():
+            stack = tuple(frame_label(frame.f_code) for frame in task_frames(task))
+            self.samples["tasks"][(scope_route(scope),) + stack] += 1
+
+        self.sample_count += 1
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_seconds": self.duration,
+            "interval_ms": self.interval * 1000,
+            "sample_count": self.sample_count,
+            "async_view": self.loop is not None,
+        }
+
+    def collapsed(self, view: str = "threads") -> str:
+        """Brendan Gregg collapsed-stack format (input for flamegraph.pl / speedscope)"""
+        samples = self.samples.get(view, Counter())
+        return "\n".join(
+            ";".join(part.replace(";", ":") for part in stack) + f" {count}"
+            for stack, count in samples.most_common()
+        ) + "\n"
+
+    def speedscope(self, view: str = "threads") -> Dict[str, Any]:
+        """Speedscope file format, one sampled profile per thread (or per route for the task view)"""
+        frames = []
+        frame_index: Dict[str, int] = {}
+        profiles: Dict[str, Dict[str, Any]] = {}
+        weight_ms = self.interval * 1000
+
+        for stack, count in self.samples.get(view, Counter()).items():
+            owner, calls = stack[0], stack[1:]
+            indexes = []
+            for label in calls:
+                if label not in frame_index:
+                    frame_index[label] = len(frames)
+                    name, _, location = label.partition(" (")
+                    file, _, line = location.rstrip(")").rpartition(":")
+                    frames.append({"name": name, "file": file, "line": int(line) if line.isdigit() else 0})
+                indexes.append(frame_index[label])
+
+            profile = profiles.setdefault(owner, {
+                "type": "sampled", "name": owner, "unit": "milliseconds",
+                "startValue": 0, "endValue": 0, "samples": [], "weights": [],
+            })
+            profile["samples"].append(indexes)
+            profile["weights"].append(count * weight_ms)
+            profile["endValue"] += count * weight_ms
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"observer-ai {view} profile",
+            "exporter": "observer-ai sampling profiler",
+            "shared": {"frames": frames},
+            "profiles": sorted(profiles.values(), key=lambda p: p["endValue"], reverse=True),
+        }
+
+class ProfilerMiddleware:
+    """Registers each in-flight HTTP request with the profiler, from the event loop.
+
+    Add it before any other middleware so it is the innermost layer and the endpoint
+    runs in the task it registers.
+    """
+
+    def __init__(self, app, profiler: SamplingProfiler = None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        task = asyncio.current_task()
+        if scope["type"] != "http" or task is None:
+            await self.app(scope, receive, send)
+            return
+
+        requests = (self.profiler or profiler).requests
+        requests[task] = (sys._getframe(), scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            requests.pop(task, None)
+
+# Global profiler instance
+profiler = SamplingProfiler()
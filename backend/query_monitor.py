@@ -0,0 +1,185 @@
+import logging
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from pymongo import monitoring as mongo_monitoring
+
+from monitoring import (
+    MONGO_COMMANDS, MONGO_OPS_PER_REQUEST, MONGO_ROUND_TRIPS_PER_REQUEST,
+    MONGO_DOCS_PER_REQUEST, MONGO_N_PLUS_ONE, route_template
+)
+
+# Cursor continuation and cleanup are round-trips, but not separate queries
+CURSOR_COMMANDS = {"getMore", "killCursors"}
+
+# Where each command keeps the filter that defines its shape
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+}
+
+# Per-request query stats. Motor copies the context into its executor threads,
+# so the listener sees the stats of the request (or test) that issued the command.
+_current_stats: ContextVar[Optional["QueryStats"]] = ContextVar('mongo_query_stats', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A block of code issued more MongoDB queries than its budget allows"""
+
+
+def query_shape(value) -> Any:
+    """Replace literal values with '?' so queries differing only by ids compare equal"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = [query_shape(item) for item in value]
+        # $in lists of different lengths are still the same query
+        if all(shape == "?" for shape in shapes):
+            return ["?"]
+        return shapes
+    return "?"
+
+
+def command_shape(command_name: str, command: dict) -> str:
+    """Normalized description of a command: name, collection and filter structure"""
+    collection = command.get(command_name)
+    collection = collection if isinstance(collection, str) else ""
+
+    if command_name in FILTER_FIELDS:
+        shape = query_shape(command.get(FILTER_FIELDS[command_name], {}))
+    elif command_name == "aggregate":
+        shape = [query_shape(stage) for stage in command.get("pipeline", [])]
+    elif command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes", [])
+        shape = query_shape(statements[0].get("q", {})) if statements else {}
+    else:
+        shape = ""
+
+    return f"{command_name} {collection} {shape}".strip()
+
+
+class QueryStats:
+    """MongoDB commands, round-trips and documents returned within one request"""
+
+    def __init__(self):
+        self.commands = 0
+        self.round_trips = 0
+        self.docs_returned = 0
+        self.shapes = Counter()
+        self.lock = threading.Lock()
+
+    def record_started(self, command_name: str, command: dict):
+        with self.lock:
+            self.round_trips += 1
+            if command_name not in CURSOR_COMMANDS:
+                self.commands += 1
+                self.shapes[command_shape(command_name, command)] += 1
+
+    def record_reply(self, reply: dict):
+        cursor = reply.get("cursor") if isinstance(reply, dict) else None
+        if not isinstance(cursor, dict):
+            return
+        batch = cursor.get("firstBatch", cursor.get("nextBatch", []))
+        with self.lock:
+            self.docs_returned += len(batch)
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """Query shapes issued at least `threshold` times (N+1 candidates)"""
+        return {shape: count for shape, count in self.shapes.most_common() if count >= threshold}
+
+    def check_budget(self, max_commands: int = None, max_repeats: int = None):
+        """Raise QueryBudgetExceeded if the commands or same-shape repeats exceed the budget"""
+        problems = []
+        if max_commands is not None and self.commands > max_commands:
+            problems.append(f"{self.commands} commands (budget {max_commands})")
+        if max_repeats is not None:
+            for shape, count in self.repeated(max_repeats + 1).items():
+                problems.append(f"{count}x {shape} (budget {max_repeats})")
+        if problems:
+            raise QueryBudgetExceeded("MongoDB query budget exceeded: " + "; ".join(problems))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "commands": self.commands,
+            "round_trips": self.round_trips,
+            "docs_returned": self.docs_returned,
+            "top_shapes": dict(self.shapes.most_common(5)),
+        }
+
+
+class MongoQueryMonitor(mongo_monitoring.CommandListener):
+    """Counts MongoDB commands globally and per request, and flags N+1 query patterns"""
+
+    def __init__(self):
+        self.n_plus_one_threshold = int(os.environ.get('MONGO_N_PLUS_ONE_THRESHOLD', 5))
+        # Route budgets, e.g. {"GET /api/agents": 3}; violations are logged and kept for tests
+        self.budgets: Dict[str, int] = {}
+        self.budget_violations: List[Dict[str, Any]] = []
+
+    def started(self, event):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.record_started(event.command_name, event.command)
+
+    def succeeded(self, event):
+        MONGO_COMMANDS.labels(command=event.command_name, outcome="success").inc()
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.record_reply(event.reply)
+
+    def failed(self, event):
+        MONGO_COMMANDS.labels(command=event.command_name, outcome="error").inc()
+
+    def set_budget(self, method: str, path: str, max_commands: int):
+        """Set the maximum number of commands a route may issue per request"""
+        self.budgets[f"{method} {path}"] = max_commands
+
+    def finish_request(self, method: str, endpoint: str, stats: QueryStats):
+        """Record per-request metrics, N+1 patterns and budget violations"""
+        MONGO_OPS_PER_REQUEST.labels(method=method, endpoint=endpoint).observe(stats.commands)
+        MONGO_ROUND_TRIPS_PER_REQUEST.labels(method=method, endpoint=endpoint).observe(stats.round_trips)
+        MONGO_DOCS_PER_REQUEST.labels(method=method, endpoint=endpoint).observe(stats.docs_returned)
+
+        route = f"{method} {endpoint}"
+        for shape, count in stats.repeated(self.n_plus_one_threshold).items():
+            command, _, rest = shape.partition(" ")
+            MONGO_N_PLUS_ONE.labels(endpoint=endpoint, command=command, collection=rest.split(" ")[0]).inc()
+            logging.warning(f"Possible N+1 query in {route}: {count}x {shape}")
+
+        budget = self.budgets.get(route)
+        if budget is not None and stats.commands > budget:
+            violation = {"route": route, "commands": stats.commands, "budget": budget}
+            self.budget_violations.append(violation)
+            logging.warning(f"MongoDB query budget exceeded in {route}: {stats.commands} commands (budget {budget})")
+
+
+# Global query monitor instance; pass to the Motor client via event_listeners
+query_monitor = MongoQueryMonitor()
+
+@contextmanager
+def query_budget(max_commands: int = None, max_repeats: int = None):
+    """Count queries issued inside the block and fail if it exceeds the budget (for tests)"""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+    stats.check_budget(max_commands, max_repeats)
+
+async def track_queries(request, call_next):
+    """HTTP middleware collecting MongoDB query stats for each request"""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    request.state.query_stats = stats
+    try:
+        return await call_next(request)
+    finally:
+        _current_stats.reset(token)
+        query_monitor.finish_request(request.method, route_template(request), stats)
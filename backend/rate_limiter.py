@@ -1,16 +1,49 @@
-import time
-import asyncio
-from collections import defaultdict
-from typing import Dict, Tuple
 import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from jose import JWTError, jwt
+
+# GCRA (generic cell rate algorithm): each key stores only its "theoretical arrival
+# time" (TAT). A request is allowed if it does not push the TAT further than one
+# window ahead of now, which admits `requests` per `window` with bursts up to the
+# full limit. Both the local and the Redis implementation are O(1) per request.
+GCRA_LUA = """
+local key = KEYS[1]
+local interval = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local tat = tonumber(redis.call('GET', key))
+if not tat or tat < now then
+    tat = now
+end
+local new_tat = tat + interval
+local allow_at = new_tat - window
+if now < allow_at then
+    return {0, allow_at - now, tat - now}
+end
+redis.call('SET', key, new_tat, 'PX', new_tat - now)
+return {1, 0, new_tat - now}
+"""
 
 class RateLimiter:
-    def __init__(self):
-        # In-memory rate limiting (in production, use Redis)
-        self.requests: Dict[str, list] = defaultdict(list)
-        self.cleanup_interval = 60  # Clean up old entries every 60 seconds
-        self.last_cleanup = time.time()
-        
+    def __init__(self, max_local_keys: int = 100000, clock: Callable[[], float] = time.time):
+        # Local fallback state: one TAT per key, least recently used keys evicted first.
+        # An evicted key has the same meaning as an expired one (a full bucket).
+        self.tats: "OrderedDict[str, float]" = OrderedDict()
+        self.max_local_keys = max_local_keys
+        self.clock = clock
+        self.enabled = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+
+        # Shared state across workers/replicas when Redis is available
+        self.redis_client = None
+        self.redis_script = None
+        self.key_prefix = "ratelimit"
+
         # Rate limits per endpoint type
         self.limits = {
             'auth': {'requests': 5, 'window': 60},      # 5 requests per minute for auth
@@ -19,67 +52,160 @@ class RateLimiter:
             'create': {'requests': 20, 'window': 60},   # 20 creates per minute
             'admin': {'requests': 200, 'window': 60},   # 200 requests per minute for admin
         }
-    
+
+    def use_redis(self, redis_client):
+        """Share limiter state through Redis (e.g. cache_manager.redis_client)"""
+        self.redis_client = redis_client
+        self.redis_script = redis_client.register_script(GCRA_LUA) if redis_client is not None else None
+
     async def is_allowed(self, identifier: str, limit_type: str = 'api') -> Tuple[bool, dict]:
         """
         Check if request is allowed based on rate limits
         Returns: (allowed: bool, info: dict)
         """
+        if limit_type not in self.limits:
+            limit_type = 'api'
+        config = self.limits[limit_type]
+        key = f"{self.key_prefix}:{limit_type}:{identifier}"
+
+        result = None
+        if self.redis_script is not None:
+            result = await self._check_redis(key, config)
+        if result is None:
+            result = self._check_local(key, config)
+
+        allowed, retry_after, used = result
+        return allowed, self._build_info(config, allowed, retry_after, used)
+
+    def _check_local(self, key: str, config: dict) -> Tuple[bool, float, float]:
+        """GCRA check against in-process state. Returns (allowed, retry_after, used)"""
+        now = self.clock()
+        window = float(config['window'])
+        interval = window / config['requests']
+
+        tat = max(self.tats.get(key, now), now)
+        new_tat = tat + interval
+        allow_at = new_tat - window
+
+        if now < allow_at:
+            return False, allow_at - now, tat - now
+
+        self.tats[key] = new_tat
+        self.tats.move_to_end(key)
+        if len(self.tats) > self.max_local_keys:
+            self.tats.popitem(last=False)
+
+        return True, 0.0, new_tat - now
+
+    async def _check_redis(self, key: str, config: dict) -> Optional[Tuple[bool, float, float]]:
+        """GCRA check via the shared Lua script. Returns None if Redis is unavailable"""
+        window_ms = int(config['window'] * 1000)
+        interval_ms = max(1, window_ms // config['requests'])
+
+        try:
+            allowed, retry_after_ms, used_ms = await self.redis_script(
+                keys=[key], args=[interval_ms, window_ms]
+            )
+        except Exception as e:
+            logging.warning(f"Redis rate limit check failed, using local limiter: {e}")
+            return None
+
+        return bool(int(allowed)), int(retry_after_ms) / 1000, int(used_ms) / 1000
+
+    def _build_info(self, config: dict, allowed: bool, retry_after: float, used: float) -> dict:
+        """Translate GCRA state into the limit/remaining/reset info callers expect"""
         current_time = time.time()
-        
-        # Clean up old entries periodically
-        if current_time - self.last_cleanup > self.cleanup_interval:
-            await self._cleanup_old_requests(current_time)
-            self.last_cleanup = current_time
-        
-        # Get rate limit configuration
-        config = self.limits.get(limit_type, self.limits['api'])
-        window_start = current_time - config['window']
-        
-        # Filter requests within the current window
-        user_requests = self.requests[identifier]
-        recent_requests = [req_time for req_time in user_requests if req_time > window_start]
-        
-        # Update the requests list
-        self.requests[identifier] = recent_requests
-        
-        # Check if limit is exceeded
-        if len(recent_requests) >= config['requests']:
-            return False, {
+        interval = config['window'] / config['requests']
+
+        if not allowed:
+            return {
                 'limit': config['requests'],
                 'window': config['window'],
-                'current': len(recent_requests),
-                'reset_time': int(window_start + config['window'])
+                'current': config['requests'],
+                'retry_after': retry_after,
+                'reset_time': int(current_time + retry_after) + 1
             }
-        
-        # Add current request
-        self.requests[identifier].append(current_time)
-        
-        return True, {
+
+        remaining = int((config['window'] - used) / interval + 1e-9)
+        return {
             'limit': config['requests'],
             'window': config['window'],
-            'remaining': config['requests'] - len(recent_requests) - 1,
-            'reset_time': int(current_time + config['window'])
+            'remaining': max(0, remaining),
+            'reset_time': int(current_time + used) + 1
         }
-    
-    async def _cleanup_old_requests(self, current_time: float):
-        """Remove old request entries to prevent memory leaks"""
-        max_window = max(config['window'] for config in self.limits.values())
-        cutoff_time = current_time - max_window
-        
-        for identifier in list(self.requests.keys()):
-            self.requests[identifier] = [
-                req_time for req_time in self.requests[identifier] 
-                if req_time > cutoff_time
-            ]
-            
-            # Remove empty entries
-            if not self.requests[identifier]:
-                del self.requests[identifier]
 
 # Global rate limiter instance
 rate_limiter = RateLimiter()
 
 async def check_rate_limit(identifier: str, limit_type: str = 'api'):
     """Convenience function to check rate limits"""
-    return await rate_limiter.is_allowed(identifier, limit_type)
\ No newline at end of file
+    return await rate_limiter.is_allowed(identifier, limit_type)
+
+
+# Health checks, metrics and content-addressed assets never count against a client's budget
+EXEMPT_PREFIXES = ("/health", "/metrics", "/api/assets/", "/api/tts/audio/")
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+def classify_request(method: str, path: str) -> Optional[str]:
+    """Limit type for a request, or None if it is not rate limited"""
+    if method == "OPTIONS" or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if path.startswith('/api/admin/'):
+        return 'admin'
+    if path.startswith('/api/auth/') and method == "POST":
+        return 'auth'
+    if path.startswith('/api/upload/'):
+        return 'upload'
+    if method in WRITE_METHODS and any(part in path for part in ['/create', '/agents', '/documents']):
+        return 'create'
+    return 'api'
+
+def verified_user(authorization: str) -> Optional[str]:
+    """User id of a valid access token (signature and expiry checked), otherwise None"""
+    secret = os.environ.get('JWT_SECRET')
+    if not secret or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        payload = jwt.decode(authorization[7:], secret, algorithms=["HS256"])
+    except JWTError:
+        return None
+    return payload.get("user_id") or payload.get("sub")
+
+def client_identifier(request, limit_type: str = 'api') -> str:
+    """Verified user id for signed-in clients, otherwise the client address.
+
+    Sign-in routes are always limited per address, and an unverified token never
+    gets its own bucket, so a client can't pick a fresh key per request. Behind
+    nginx run uvicorn with --proxy-headers and --forwarded-allow-ips set to the
+    proxy's address, so the address is the real client's."""
+    address = request.client.host if request.client else "unknown"
+    if limit_type == 'auth':
+        return address
+    user_id = verified_user(request.headers.get("authorization", ""))
+    return f"user_{user_id}" if user_id else address
+
+async def rate_limit_requests(request, call_next):
+    """HTTP middleware applying the per-endpoint-type limits"""
+    limit_type = classify_request(request.method, request.url.path)
+    if limit_type is None or not rate_limiter.enabled:
+        return await call_next(request)
+
+    allowed, info = await rate_limiter.is_allowed(client_identifier(request, limit_type), limit_type)
+    retry_after = max(0, info['reset_time'] - int(time.time()))
+    if not allowed:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": f"Rate limit exceeded. Try again in {retry_after} seconds."},
+            headers={
+                "X-RateLimit-Limit": str(info['limit']),
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset": str(info['reset_time']),
+                "Retry-After": str(retry_after)
+            }
+        )
+
+    response = await call_next(request)
+    response.headers["X-RateLimit-Limit"] = str(info['limit'])
+    response.headers["X-RateLimit-Remaining"] = str(info.get('remaining', 0))
+    response.headers["X-RateLimit-Reset"] = str(info['reset_time'])
+    return response
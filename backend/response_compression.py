@@ -0,0 +1,158 @@
+import asyncio
+import gzip
+import os
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Content that is already compressed (or streamed) gains nothing from another pass
+SKIP_TYPES = ("image/", "audio/", "video/", "font/woff", "text/event-stream")
+SKIP_EXACT = {
+    "application/gzip", "application/zip", "application/x-brotli", "application/octet-stream",
+    "application/pdf", "application/x-7z-compressed", "application/zstd",
+}
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """Accepted encodings with their q-values ("gzip;q=0.5, br" → {"gzip": 0.5, "br": 1.0})"""
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def choose_encoding(header: str, brotli_available: bool = None) -> Optional[str]:
+    """The encoding to use for a request: brotli if accepted and available, then gzip"""
+    if brotli_available is None:
+        brotli_available = brotli is not None
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+
+    candidates = (["br"] if brotli_available else []) + ["gzip"]
+    best, best_quality = None, 0.0
+    for encoding in candidates:
+        quality = accepted.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compressible(content_type: str) -> bool:
+    media_type = content_type.split(";")[0].strip().lower()
+    if not media_type or media_type in SKIP_EXACT:
+        return False
+    return not media_type.startswith(SKIP_TYPES)
+
+
+class CompressionMiddleware:
+    """Negotiated brotli/gzip compression of complete response bodies.
+
+    Bodies under COMPRESSION_MIN_SIZE are sent as they are; bodies over
+    COMPRESSION_THREAD_SIZE are compressed in a worker thread so a large
+    conversation list or export doesn't stall the event loop. Streaming
+    responses, media and anything already content-encoded pass through.
+    """
+
+    def __init__(self, app, minimum_size: int = None, thread_size: int = None,
+                 gzip_level: int = None, brotli_quality: int = None):
+        self.app = app
+        self.minimum_size = minimum_size or int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+        self.thread_size = thread_size or int(os.environ.get('COMPRESSION_THREAD_SIZE', 128 * 1024))
+        self.gzip_level = gzip_level or int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+        # Quality 4 is about as fast as gzip -6 and still smaller; 11 is only for static assets
+        self.brotli_quality = brotli_quality or int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+        self.enabled = os.environ.get('COMPRESSION_ENABLED', 'true').lower() != 'false'
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = {name.lower(): value for name, value in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                if (b"content-encoding" in headers or not compressible(content_type)
+                        or message["status"] in (204, 304) or message["status"] < 200):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streams are sent as they come; small bodies aren't worth the CPU
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = await self.compress(body, encoding)
+            if len(compressed) >= len(body):
+                await send(start_message)
+                await send(message)
+                return
+
+            headers = [(name, value) for name, value in start_message.get("headers", [])
+                       if name.lower() not in (b"content-length", b"vary")]
+            vary = [value for name, value in start_message.get("headers", []) if name.lower() == b"vary"]
+            if not any(b"accept-encoding" in value.lower() for value in vary):
+                vary.append(b"Accept-Encoding")
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b", ".join(vary)),
+            ]
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    async def compress(self, body: bytes, encoding: str) -> bytes:
+        """Compress a body, off the event loop when it is large"""
+        if len(body) >= self.thread_size:
+            return await asyncio.to_thread(self._compress, body, encoding)
+        return self._compress(body, encoding)
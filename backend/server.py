@@ -1,36 +1,60 @@
-from fastapi import FastAPI, HTTPException, Depends, status, APIRouter, UploadFile, File, Query, Request
+from fastapi import FastAPI, HTTPException, Depends, status, APIRouter, UploadFile, File, Query, Request, Response, WebSocket
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from smart_conversation import SmartConversationGenerator
+from change_versions import change_versions, conditional_response
+from asset_store import asset_store, asset_response, IMMUTABLE_CACHE_CONTROL
+from tts_service import tts_service, audio_response, VoiceNotSupported
+from narration_prefetch import narration_prefetcher
+from auto_scheduler import auto_scheduler
+from simulations import simulations
+from simulation_actor import simulation_actors
+from response_compression import CompressionMiddleware
+from url_fetcher import url_fetcher, UrlFetchError
+from delta_sync import delta_sync, touch, user_scope
+from simulation_events import (
+    simulation_events, run_event_socket, ROUND_CREATED, ROUND_UPDATED, RELATIONSHIPS_CHANGED,
+    DOCUMENT_CREATED, DOCUMENT_UPDATED, SUMMARY_READY, SIMULATION_RESET
+)
+from job_queue import job_queue, job_view, inline_job, JobContext, JobFailed
+from whisper_service import whisper_service
+from streaming_transcription import run_transcription_socket
+from monitoring import monitor, track_request
+from database import db_manager
+from cache import cache_manager
+from rate_limiter import rate_limiter, rate_limit_requests
+from query_monitor import track_queries
+from loop_monitor import loop_monitor
+from tracing import tracer, trace_request
+from profiler import ProfilerMiddleware, profiler
+from llm_scheduler import (
+    llm_scheduler, llm_user, acting_for, estimate_tokens,
+    PRIORITY_INTERACTIVE, PRIORITY_OBSERVER, PRIORITY_DOCUMENT, PRIORITY_BACKGROUND
+)
 from enhanced_document_system import DocumentQualityGate, ProfessionalDocumentFormatter
+from chart_renderer import chart_renderer
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import PlainTextResponse, ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field, EmailStr
-import bcrypt
-import jwt
-from jwt.exceptions import InvalidTokenError as JWTError
+from password_hasher import password_hasher, CryptoBusy
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import asyncio
 from datetime import datetime, timedelta, date
 import uuid
+import time
 import logging
 import os
 from pathlib import Path
-from motor.motor_asyncio import AsyncIOMotorClient
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from emergentintegrations.llm.chat import LlmChat, UserMessage
-from google.cloud import texttospeech
+from llm_client import LlmChat, UserMessage
 import base64
-import fal_client
 from jose import JWTError, jwt
-from google.auth.transport import requests
-from google.oauth2 import id_token
 import httpx
-import tempfile
-import openai
-from pydub import AudioSegment
 import io
 import asyncio
 import re
@@ -47,19 +71,36 @@ JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24
 ADMIN_EMAIL = "dino@cytonic.com"  # Admin email for special privileges
 
+# URLs in agent memories are replaced with a summary of the page (at most this many per memory)
+MEMORY_URL_PATTERN = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+MEMORY_MAX_URLS = int(os.environ.get('MEMORY_MAX_URLS', 5))
+
 # Security
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# Password hashing utilities (bcrypt runs on the crypto executor, never on the event loop)
+def crypto_busy_error() -> HTTPException:
+    """503 returned when the crypto executor is saturated"""
+    return HTTPException(
+        status_code=503,
+        detail="Authentication is busy, please retry shortly",
+        headers={"Retry-After": "1"}
+    )
 
-# Password hashing utilities
-def hash_password(password: str) -> str:
+async def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+    try:
+        return await password_hasher.hash(password)
+    except CryptoBusy:
+        raise crypto_busy_error()
 
-def verify_password(password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+async def verify_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password against its hash. Returns (valid, new_hash) where new_hash is set if the cost changed"""
+    try:
+        return await password_hasher.verify_and_update(password, hashed_password)
+    except CryptoBusy:
+        raise crypto_busy_error()
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     """Create a JWT access token"""
@@ -215,17 +256,73 @@ class ActionTriggerResult(BaseModel):
     trigger_phrase: str = ""
     reasoning: str = ""
 
-# MongoDB connection
+# MongoDB connection (one pooled client per worker, shared with the health and metrics endpoints)
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ.get('DB_NAME', 'ai_simulation')]
-
-# Configure fal.ai
-import fal_client
-fal_client.api_key = os.environ.get('FAL_KEY')
-
-# Create the main app without a prefix
-app = FastAPI()
+db = db_manager.create_client(mongo_url, os.environ.get('DB_NAME', 'ai_simulation'))
+change_versions.bind(db)
+delta_sync.bind(db)
+asset_store.bind(db)
+simulations.bind(db)
+simulation_actors.bind(simulations, on_state_change=simulation_events.state_changed)
+auto_scheduler.bind(db)
+job_queue.bind(db)
+
+def owner_action(action):
+    """Auto-mode action whose LLM calls are queued under the simulation's owner"""
+    async def run(state: dict):
+        with acting_for(state.get("user_id", "")):
+            return await action(simulation=state)
+    return run
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect shared services before serving, release them on shutdown"""
+    await db_manager.connect()
+    await simulations.create_indexes()
+    await delta_sync.create_indexes()
+    await cache_manager.connect()
+
+    # Share rate limit state and the LLM budget across workers and replicas
+    if cache_manager.connected:
+        rate_limiter.use_redis(cache_manager.redis_client)
+        llm_scheduler.use_redis(cache_manager.redis_client)
+        simulation_events.use_redis(cache_manager.redis_client)
+
+    await monitor.start_monitoring()
+    loop_monitor.start()
+
+    # Auto mode runs here rather than in the browser; the lease lets one worker tick
+    auto_scheduler.start({
+        "conversation": owner_action(generate_conversation),
+        "time": owner_action(advance_time_period),
+        "weekly_report": owner_action(generate_weekly_summary),
+    })
+
+    await job_queue.start()
+    await simulation_events.start()
+
+    yield
+
+    await auto_scheduler.stop()
+    await job_queue.stop()
+    await simulation_actors.stop()
+    await simulation_events.stop()
+    await loop_monitor.stop()
+    await asyncio.to_thread(tracer.flush)
+    await asyncio.to_thread(chart_renderer.shutdown, True)
+    await narration_prefetcher.stop()
+    await whisper_service.close()
+    await url_fetcher.close()
+    await monitor.stop_monitoring()
+    await cache_manager.close()
+    db_manager.close()
+
+# Create the main app without a prefix (run with uvloop and httptools, see docker-compose.production.yml)
+app = FastAPI(
+    title="Observer AI API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -281,36 +378,32 @@ AGENT_ARCHETYPES = {
 
 class ObserverMessage(BaseModel):
     message: str
+    simulation_id: str = ""
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 class ObserverInput(BaseModel):
     observer_message: str
 
 @api_router.post("/observer/send-message")
-async def send_observer_message(input_data: ObserverInput):
+async def send_observer_message(input_data: ObserverInput, state: dict = Depends(current_simulation)):
     """Send a message from the observer (user) to the AI agents"""
     observer_message = input_data.observer_message.strip()
     
     if not observer_message:
         raise HTTPException(status_code=400, detail="Observer message cannot be empty")
     
+    simulation_id = state["id"]
+    
     # Get current agents
-    agents = await db.agents.find().to_list(100)
+    agents = await db.agents.find(simulations.scope(simulation_id)).to_list(100)
     if len(agents) < 1:
         raise HTTPException(status_code=400, detail="No agents available to respond")
     
     agent_objects = [Agent(**agent) for agent in agents]
     
-    # Get simulation state
-    state = await db.simulation_state.find_one()
-    if not state:
-        raise HTTPException(status_code=404, detail="Simulation not started")
-    
     scenario = state.get("scenario", "Research Station")
     
-    # Store observer message
-    observer_msg = ObserverMessage(message=observer_message)
-    await db.observer_messages.insert_one(observer_msg.dict())
+    observer_msg = ObserverMessage(message=observer_message, simulation_id=simulation_id)
     
     # Generate responses from each agent to the observer
     messages = []
@@ -340,10 +433,11 @@ Address the Observer respectfully but naturally according to your personality.""
             
             try:
                 user_message = UserMessage(text=f"Observer says: '{observer_message}'\n\nRespond to the Observer professionally according to your personality.")
-                response = await chat.send_message(user_message)
+                response = await llm_manager.send_message(chat, user_message, "agent_turn", priority=PRIORITY_OBSERVER, max_tokens=100)
                 await llm_manager.increment_usage()
             except Exception as e:
                 logging.error(f"Error generating observer response for {agent.name}: {e}")
+                monitor.record_llm_fallback("agent_turn")
                 response = f"{agent.name} nods thoughtfully in response."
         
         message = ConversationMessage(
@@ -354,18 +448,18 @@ Address the Observer respectfully but naturally according to your personality.""
         )
         messages.append(message)
     
-    # Get current round number
-    conversation_count = await db.conversations.count_documents({})
-    
-    # Create special observer conversation round
+    # Create special observer conversation round; stored together with the observer message
     conversation_round = ConversationRound(
-        round_number=conversation_count + 1,
+        round_number=0,
         time_period=f"Observer Input - {datetime.now().strftime('%H:%M')}",
         scenario=f"Observer: {observer_message}",
-        messages=messages
+        messages=messages,
+        user_id=state.get("user_id", ""),
+        simulation_id=simulation_id
     )
     
-    await db.conversations.insert_one(conversation_round.dict())
+    await commit_round(simulation_id, conversation_round, ("observer_messages", observer_msg.dict()))
+    await change_versions.bump("conversations", scope=simulation_id)
     
     return {
         "message": "Observer message sent and responses received",
@@ -407,9 +501,9 @@ async def get_usage():
         }
 
 @api_router.get("/observer/messages")
-async def get_observer_messages():
+async def get_observer_messages(state: dict = Depends(current_simulation)):
     """Get all observer messages"""
-    messages = await db.observer_messages.find().sort("timestamp", -1).to_list(100)
+    messages = await db.observer_messages.find(simulations.scope(state["id"])).sort("timestamp", -1).to_list(100)
     return messages
 
 
@@ -427,6 +521,7 @@ class Agent(BaseModel):
     avatar_url: str = ""  # URL to the agent's avatar image
     avatar_prompt: str = ""  # The prompt used to generate the avatar
     user_id: str = ""  # Associate agent with user for data isolation
+    simulation_id: str = ""
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class AgentCreate(BaseModel):
@@ -464,6 +559,7 @@ class ConversationRound(BaseModel):
     scenario_name: str = ""  # Name/title of the scenario
     messages: List[ConversationMessage]
     user_id: str = ""  # Associate conversation with user for data isolation
+    simulation_id: str = ""
     created_at: datetime = Field(default_factory=datetime.utcnow)
     language: str = "en"
     original_language: Optional[str] = None
@@ -476,10 +572,12 @@ class Relationship(BaseModel):
     agent2_id: str
     score: int = 0  # -10 to +10
     status: str = "neutral"  # friends, tension, neutral
+    simulation_id: str = ""
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 class SimulationState(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))  # Simulation id
+    user_id: str = ""  # Owner; "" is the shared simulation of unauthenticated clients
     current_day: int = 1
     current_time_period: str = "morning"
     daily_api_requests: int = 0
@@ -550,100 +648,112 @@ class LLMManager:
             {"$inc": {"requests_used": 1}},
             upsert=True
         )
-    
-    async def fetch_url_content(self, url: str) -> str:
-        """Fetch and summarize content from a URL for agent memory"""
+
+    async def send_message(self, chat, user_message, purpose: str, priority: int = PRIORITY_INTERACTIVE,
+                           user_id: Optional[str] = None, max_tokens: int = 300, timeout: Optional[float] = None):
+        """Send a message through the global LLM scheduler (queue wait is not counted against timeout).
+
+        Calls are queued fairly per user: `user_id`, or whoever the request or job acts for (`llm_user`).
+        """
+        prompt = (getattr(chat, "system_message", "") or "") + (getattr(user_message, "text", "") or "")
+        tokens = estimate_tokens(prompt) + max_tokens
+        with tracer.span("llm.queue", "llm_queue", purpose=purpose, priority=priority):
+            await llm_scheduler.acquire(priority, user_id, tokens)
+
+        start_time = time.time()
+        outcome = "error"
+        response = None
         try:
-            import aiohttp
-            timeout = aiohttp.ClientTimeout(total=5)  # 5 second timeout
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        content = await response.text()
-                        # Simple content extraction - remove HTML tags and limit length
-                        import re
-                        text_content = re.sub(r'<[^>]+>', ' ', content)
-                        text_content = re.sub(r'\s+', ' ', text_content).strip()
-                        
-                        # Limit to first 1500 characters
-                        if len(text_content) > 1500:
-                            text_content = text_content[:1500] + "..."
-                        
-                        return text_content
-                    else:
-                        return f"Could not access {url} (status: {response.status})"
+            with tracer.span(f"llm.{purpose}", "llm", purpose=purpose, prompt_chars=len(prompt)):
+                if timeout is None:
+                    response = await chat.send_message(user_message)
+                else:
+                    response = await asyncio.wait_for(chat.send_message(user_message), timeout=timeout)
+            outcome = "success"
+            return response
         except asyncio.TimeoutError:
-            return f"Timeout accessing {url}"
+            outcome = "timeout"
+            raise
+        finally:
+            monitor.record_llm_call(
+                purpose, time.time() - start_time, outcome,
+                prompt_chars=len(prompt), response_chars=len(response or ""), tokens=tokens
+            )
+
+    async def fetch_url_content(self, url: str) -> str:
+        """Fetch the readable text of a URL for agent memory"""
+        try:
+            return (await url_fetcher.fetch(url)).text
+        except UrlFetchError as e:
+            return f"Could not access {url} ({e})"
+
+    async def summarize_url(self, url: str) -> str:
+        """The annotation that replaces a URL in memory text"""
+        try:
+            entry = await url_fetcher.fetch(url)
+        except UrlFetchError:
+            return f"[Reference: {url}] (Could not access content)"
+
+        # Only summarize substantial content
+        if len(entry.text) <= 100:
+            return f"[Reference: {url}] (Could not access content)"
+
+        async def summarize(text: str) -> Optional[str]:
+            if not await self.can_make_request():
+                return None
+            chat = LlmChat(
+                api_key=self.api_key,
+                session_id=f"url_summary_{hash(url)}",
+                system_message="Summarize web content into 2-3 key facts that would be relevant for an AI agent's memory. Focus on the most important information."
+            ).with_model("gemini", "gemini-2.0-flash").with_max_tokens(150)
+
+            user_message = UserMessage(text=f"Summarize this web content concisely:\n\n{text}")
+            summary = await self.send_message(chat, user_message, "memory", priority=PRIORITY_BACKGROUND, max_tokens=150)
+            await self.increment_usage()
+            return summary
+
+        try:
+            summary = await url_fetcher.summary(entry, summarize)
         except Exception as e:
-            logging.warning(f"Error fetching {url}: {e}")
-            return f"Could not access {url}"
+            logging.warning(f"Error summarizing {url}: {e}")
+            return f"[Reference: {url}] (Content available but not processed)"
+
+        if summary is None:
+            return f"[Reference: {url}] (Content processing skipped - API limit)"
+        return f"[Knowledge from {url}]: {summary}"
 
     async def process_memory_with_urls(self, memory_text: str) -> str:
         """Process memory text and fetch content from any URLs found"""
         if not memory_text:
             return memory_text
-        
-        # Find URLs in memory text
-        url_pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-        urls = re.findall(url_pattern, memory_text)
-        
+
+        # URLs that an earlier pass already annotated are left alone
+        matches = [
+            match for match in MEMORY_URL_PATTERN.finditer(memory_text)
+            if not memory_text[:match.start()].endswith(("[Knowledge from ", "[Reference: "))
+        ]
+        urls = list(dict.fromkeys(match.group(0) for match in matches))[:MEMORY_MAX_URLS]
         if not urls:
             return memory_text
-        
-        enhanced_memory = memory_text
-        
-        for url in urls[:2]:  # Limit to 2 URLs to avoid timeout issues
-            try:
-                # Fetch content from URL
-                url_content = await self.fetch_url_content(url)
-                
-                # Create a summary of the URL content using LLM only if we have substantial content
-                if url_content and len(url_content) > 100 and "Could not access" not in url_content:
-                    try:
-                        if await self.can_make_request():
-                            chat = LlmChat(
-                                api_key=self.api_key,
-                                session_id=f"url_summary_{hash(url)}",
-                                system_message="Summarize web content into 2-3 key facts that would be relevant for an AI agent's memory. Focus on the most important information."
-                            ).with_model("gemini", "gemini-2.0-flash").with_max_tokens(150)
-                            
-                            user_message = UserMessage(text=f"Summarize this web content concisely:\n\n{url_content}")
-                            summary = await chat.send_message(user_message)
-                            await self.increment_usage()
-                            
-                            # Replace the URL with enriched content
-                            enhanced_memory = enhanced_memory.replace(
-                                url, 
-                                f"[Knowledge from {url}]: {summary}"
-                            )
-                        else:
-                            enhanced_memory = enhanced_memory.replace(
-                                url,
-                                f"[Reference: {url}] (Content processing skipped - API limit)"
-                            )
-                    except Exception as e:
-                        logging.warning(f"Error summarizing {url}: {e}")
-                        enhanced_memory = enhanced_memory.replace(
-                            url,
-                            f"[Reference: {url}] (Content available but not processed)"
-                        )
-                else:
-                    enhanced_memory = enhanced_memory.replace(
-                        url,
-                        f"[Reference: {url}] (Could not access content)"
-                    )
-            except Exception as e:
-                logging.warning(f"Error processing URL {url}: {e}")
-                enhanced_memory = enhanced_memory.replace(
-                    url,
-                    f"[Reference: {url}] (Processing error)"
-                )
-        
-        return enhanced_memory
+
+        # All URLs at once; the fetcher's pool limits connections per host
+        results = await asyncio.gather(*(self.summarize_url(url) for url in urls), return_exceptions=True)
+        annotations = {}
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                logging.warning(f"Error processing URL {url}: {result}")
+                result = f"[Reference: {url}] (Processing error)"
+            annotations[url] = result
+
+        enhanced_memory = []
+        position = 0
+        for match in matches:
+            if match.group(0) in annotations:
+                enhanced_memory.append(memory_text[position:match.start()])
+                enhanced_memory.append(annotations[match.group(0)])
+                position = match.end()
+        enhanced_memory.append(memory_text[position:])
+        return "".join(enhanced_memory)
     
     async def can_make_request(self):
         """Check if we can make another API request today"""
@@ -653,7 +763,8 @@ class LLMManager:
         # No hardcoded limit since we're on paid tier now
         return usage < self.max_daily_requests
 
-    async def generate_agent_response(self, agent: Agent, scenario: str, other_agents: List[Agent], context: str = "", conversation_history: List = None, language_instruction: str = "Respond in English.", existing_documents: List = None, simulation_state: dict = None):
+    @tracer.traced()
+    async def generate_agent_response(self, agent: Agent, scenario: str, other_agents: List[Agent], context: str = "", conversation_history: List = None, language_instruction: str = "Respond in English.", existing_documents: List = None, simulation_state: dict = None, priority: int = PRIORITY_INTERACTIVE):
         """Generate a single agent response with better context and progression"""
         other_agent_names = [a.name for a in other_agents if a.id != agent.id]
         others_text = f"Others present: {', '.join(other_agent_names)}" if other_agent_names else "You are alone"
@@ -692,9 +803,6 @@ class LLMManager:
                 document_context += f"{i}. '{doc.get('title', 'Untitled')}' ({doc.get('category', 'Unknown')}) - {doc.get('description', 'No description')}\n"
             document_context += "\nYou can reference these documents by name in your responses and suggest improvements if relevant.\n"
         
-        # Get conversation count for context
-        conversation_count = await db.conversations.count_documents({})
-        
         # Enhanced system message with stronger anti-repetition and solution focus
         system_message = f"""You are {agent.name}, a professional {AGENT_ARCHETYPES[agent.archetype]['description']}.
 
@@ -1065,8 +1173,8 @@ PROVIDE EXPERT ANALYSIS:
             
             # Add timeout to prevent hanging - very short timeout for quick fallbacks
             try:
-                response = await asyncio.wait_for(
-                    chat.send_message(user_message), 
+                response = await self.send_message(
+                    chat, user_message, "agent_turn", priority=priority, max_tokens=150,
                     timeout=3.0  # Fast timeout for quick conversation generation
                 )
                 await self.increment_usage()
@@ -1146,6 +1254,7 @@ PROVIDE EXPERT ANALYSIS:
     def _generate_intelligent_fallback(self, agent: Agent, context: str, scenario: str, pending_questions: list = None) -> str:
         """Generate intelligent fallback responses that are solution-focused and non-repetitive"""
         import random
+        monitor.record_llm_fallback("agent_turn")
         
         # Check if others have spoken (for more contextual fallbacks)
         is_responding_to_others = "In this conversation:" in context
@@ -1283,6 +1392,7 @@ PROVIDE EXPERT ANALYSIS:
             
             return random.choice(responses)
 
+    @tracer.traced()
     async def update_agent_memory(self, agent: Agent, conversations: List):
         """Update agent's memory summary based on recent conversations"""
         if not conversations or not await self.can_make_request():
@@ -1318,17 +1428,15 @@ Previous memory: {agent.memory_summary or 'None'}"""
         
         try:
             user_message = UserMessage(text=f"Recent conversations:\n{conv_text}\n\nUpdate my memory focusing on developments relevant to my background and expertise:")
-            response = await chat.send_message(user_message)
+            response = await self.send_message(chat, user_message, "memory", priority=PRIORITY_BACKGROUND)
             await self.increment_usage()
             
-            # Update agent memory in database
-            await db.agents.update_one(
-                {"id": agent.id},
-                {"$set": {"memory_summary": response}}
-            )
+            # Update agent memory (through the simulation's actor, in order with other agent updates)
+            await simulation_actors.update_agent(agent.simulation_id, agent.id, {"memory_summary": response})
         except Exception as e:
             logging.error(f"Error updating memory for {agent.name}: {e}")
 
+    @tracer.traced()
     async def analyze_conversation_for_action_triggers(self, conversation_text: str, agents: List[Agent], conversation_round: int = 1) -> ActionTriggerResult:
         """Enhanced analysis with quality gates and thoughtful document creation"""
         
@@ -1431,7 +1539,7 @@ Format: YES|budget|Critical Investment Decision Framework|after careful consider
 If NO: Explain what's missing for document creation."""
 
             user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
+            response = await self.send_message(chat, user_message, "document", priority=PRIORITY_DOCUMENT)
             await self.increment_usage()
             
             # Parse enhanced response
@@ -1458,6 +1566,7 @@ If NO: Explain what's missing for document creation."""
             logging.error(f"Error in enhanced conversation analysis: {e}")
             return ActionTriggerResult(should_create_document=False)
 
+    @tracer.traced()
     async def check_agent_voting_consensus(self, agents: List[Agent], proposal: str, conversation_context: str) -> dict:
         """Check if agents reach voting consensus on a proposal"""
         if not await self.can_make_request():
@@ -1492,7 +1601,7 @@ Respond with ONLY: YES, NO, or ABSTAIN followed by a brief 1-sentence reason."""
                 prompt = f"""Conversation context:\n{conversation_context}\n\nProposal to vote on: {proposal}\n\nYour vote (YES/NO/ABSTAIN) and brief reason:"""
                 
                 user_message = UserMessage(text=prompt)
-                response = await chat.send_message(user_message)
+                response = await self.send_message(chat, user_message, "vote", priority=PRIORITY_DOCUMENT, max_tokens=150)
                 await self.increment_usage()
                 
                 # Parse vote
@@ -1506,6 +1615,7 @@ Respond with ONLY: YES, NO, or ABSTAIN followed by a brief 1-sentence reason."""
                     
             except Exception as e:
                 logging.error(f"Error getting vote from {agent.name}: {e}")
+                monitor.record_llm_fallback("vote")
                 voting_results[agent.name] = {"vote": "ABSTAIN", "reason": "Unable to vote due to technical issue"}
         
         # Determine consensus (simple majority)
@@ -1521,6 +1631,7 @@ Respond with ONLY: YES, NO, or ABSTAIN followed by a brief 1-sentence reason."""
             "summary": f"{yes_votes} YES, {no_votes} NO, {len(voting_results) - yes_votes - no_votes} ABSTAIN"
         }
 
+    @tracer.traced()
     async def generate_document_content(self, document_type: str, title: str, conversation_context: str, creating_agent: Agent) -> str:
         """Generate professionally formatted document content with charts and visual elements"""
         if not await self.can_make_request():
@@ -2194,7 +2305,7 @@ Create the {document_type} content for "{title}". Use this template structure bu
 Make it immediately usable for medical professionals. Include specific details, timeframes, and practical guidance."""
 
             user_message = UserMessage(text=prompt)
-            response = await chat.send_message(user_message)
+            response = await self.send_message(chat, user_message, "document", priority=PRIORITY_DOCUMENT, max_tokens=800)
             await self.increment_usage()
             
             # Format the response using the template
@@ -2223,6 +2334,7 @@ Make it immediately usable for medical professionals. Include specific details,
 llm_manager = LLMManager()
 
 # Document Review Function for Action-Oriented Behavior
+@tracer.traced()
 async def trigger_document_review(document: Document, all_agents: List[Agent], creating_agent: Agent, scenario: str):
     """Trigger automatic document review by other agents"""
     try:
@@ -2271,7 +2383,7 @@ Be constructive and focus on actionable feedback."""
             ).with_model("gemini", "gemini-2.0-flash").with_max_tokens(200)
             
             user_message = UserMessage(text=review_context)
-            review_response = await chat.send_message(user_message)
+            review_response = await llm_manager.send_message(chat, user_message, "review", priority=PRIORITY_DOCUMENT, max_tokens=200)
             await llm_manager.increment_usage()
             
             # If improvements are suggested, store them for the creator to consider
@@ -2306,9 +2418,8 @@ Be constructive and focus on actionable feedback."""
                 current_memory = lead_reviewer.memory_summary or ""
                 updated_memory = f"{current_memory}\n\n[Document Review]: {suggestion_memory}".strip()
                 
-                await db.agents.update_one(
-                    {"id": lead_reviewer.id},
-                    {"$set": {"memory_summary": updated_memory}}
+                await simulation_actors.update_agent(
+                    lead_reviewer.simulation_id, lead_reviewer.id, {"memory_summary": updated_memory}
                 )
                 
                 logging.info(f"Document review completed with suggestions by {lead_reviewer.name}")
@@ -2318,9 +2429,8 @@ Be constructive and focus on actionable feedback."""
                 current_memory = lead_reviewer.memory_summary or ""
                 updated_memory = f"{current_memory}\n\n[Document Review]: {approval_memory}".strip()
                 
-                await db.agents.update_one(
-                    {"id": lead_reviewer.id},
-                    {"$set": {"memory_summary": updated_memory}}
+                await simulation_actors.update_agent(
+                    lead_reviewer.simulation_id, lead_reviewer.id, {"memory_summary": updated_memory}
                 )
                 
                 logging.info(f"Document approved by {lead_reviewer.name}")
@@ -2328,219 +2438,6 @@ Be constructive and focus on actionable feedback."""
     except Exception as e:
         logging.error(f"Error in document review process: {e}")
 
-# OpenAI Whisper Speech-to-Text Service
-class WhisperService:
-    def __init__(self):
-        self.api_key = os.environ.get('OPENAI_API_KEY')
-        if not self.api_key:
-            logging.warning("OPENAI_API_KEY not found in environment variables")
-        else:
-            openai.api_key = self.api_key
-            logging.info("OpenAI Whisper service initialized")
-    
-    async def transcribe_audio(self, audio_file: bytes, language: str = None, filename: str = "audio.webm") -> Dict[str, Any]:
-        """Transcribe audio using OpenAI Whisper API"""
-        if not self.api_key:
-            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
-        
-        try:
-            # Create a temporary file for the audio
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_file:
-                temp_file.write(audio_file)
-                temp_file_path = temp_file.name
-            
-            try:
-                # Convert audio to supported format if needed
-                # Try to detect and handle different audio formats
-                wav_path = temp_file_path.replace('.webm', '.wav')
-                
-                try:
-                    # First, try to load as WebM/Opus
-                    audio = AudioSegment.from_file(temp_file_path, format="webm")
-                except Exception as webm_error:
-                    logging.warning(f"Failed to load as WebM: {webm_error}")
-                    try:
-                        # Try without format specification
-                        audio = AudioSegment.from_file(temp_file_path)
-                    except Exception as general_error:
-                        logging.warning(f"Failed general audio load: {general_error}")
-                        # Fallback: Use the original file directly if it's valid
-                        # Some browsers send different formats than expected
-                        try:
-                            # Test if the file can be opened by OpenAI directly
-                            with open(temp_file_path, "rb") as test_file:
-                                client = openai.OpenAI(api_key=self.api_key)
-                                # Try direct transcription without conversion
-                                transcript = client.audio.transcriptions.create(
-                                    model="whisper-1",
-                                    file=test_file,
-                                    language=language if language else None,
-                                    response_format="verbose_json"
-                                )
-                                
-                                # Clean up
-                                os.unlink(temp_file_path)
-                                
-                                return {
-                                    "success": True,
-                                    "text": transcript.text,
-                                    "language": transcript.language,
-                                    "duration": getattr(transcript, 'duration', 0),
-                                    "words": getattr(transcript, 'words', []),
-                                    "confidence": getattr(transcript, 'avg_logprob', None)
-                                }
-                        except Exception as direct_error:
-                            logging.error(f"Direct transcription failed: {direct_error}")
-                            raise HTTPException(status_code=400, detail="Invalid audio format. Please try recording again.")
-                
-                # If we got here, audio conversion worked
-                # Convert to wav for better compatibility
-                audio.export(wav_path, format="wav")
-                
-                # Transcribe with OpenAI Whisper
-                client = openai.OpenAI(api_key=self.api_key)
-                
-                with open(wav_path, "rb") as audio_file_obj:
-                    transcript = client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file_obj,
-                        language=language if language else None,  # Auto-detect if not specified
-                        response_format="verbose_json",
-                        timestamp_granularities=["word"]
-                    )
-                
-                # Clean up temporary files
-                os.unlink(temp_file_path)
-                os.unlink(wav_path)
-                
-                return {
-                    "success": True,
-                    "text": transcript.text,
-                    "language": transcript.language,
-                    "duration": transcript.duration,
-                    "words": getattr(transcript, 'words', []),
-                    "confidence": getattr(transcript, 'avg_logprob', None)
-                }
-                
-            except Exception as e:
-                # Clean up temp file on error
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
-                if 'wav_path' in locals() and os.path.exists(wav_path):
-                    os.unlink(wav_path)
-                raise e
-                
-        except Exception as e:
-            logging.error(f"Error transcribing audio: {e}")
-            raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
-    
-    def get_supported_languages(self) -> List[Dict[str, str]]:
-        """Get list of supported languages for Whisper"""
-        return [
-            {"code": "af", "name": "Afrikaans"},
-            {"code": "am", "name": "Amharic"},
-            {"code": "ar", "name": "Arabic"},
-            {"code": "as", "name": "Assamese"},
-            {"code": "az", "name": "Azerbaijani"},
-            {"code": "ba", "name": "Bashkir"},
-            {"code": "be", "name": "Belarusian"},
-            {"code": "bg", "name": "Bulgarian"},
-            {"code": "bn", "name": "Bengali"},
-            {"code": "bo", "name": "Tibetan"},
-            {"code": "br", "name": "Breton"},
-            {"code": "bs", "name": "Bosnian"},
-            {"code": "ca", "name": "Catalan"},
-            {"code": "cs", "name": "Czech"},
-            {"code": "cy", "name": "Welsh"},
-            {"code": "da", "name": "Danish"},
-            {"code": "de", "name": "German"},
-            {"code": "el", "name": "Greek"},
-            {"code": "en", "name": "English"},
-            {"code": "es", "name": "Spanish"},
-            {"code": "et", "name": "Estonian"},
-            {"code": "eu", "name": "Basque"},
-            {"code": "fa", "name": "Persian"},
-            {"code": "fi", "name": "Finnish"},
-            {"code": "fo", "name": "Faroese"},
-            {"code": "fr", "name": "French"},
-            {"code": "gl", "name": "Galician"},
-            {"code": "gu", "name": "Gujarati"},
-            {"code": "ha", "name": "Hausa"},
-            {"code": "haw", "name": "Hawaiian"},
-            {"code": "he", "name": "Hebrew"},
-            {"code": "hi", "name": "Hindi"},
-            {"code": "hr", "name": "Croatian"},  # ✅ Croatian support!
-            {"code": "ht", "name": "Haitian Creole"},
-            {"code": "hu", "name": "Hungarian"},
-            {"code": "hy", "name": "Armenian"},
-            {"code": "id", "name": "Indonesian"},
-            {"code": "is", "name": "Icelandic"},
-            {"code": "it", "name": "Italian"},
-            {"code": "ja", "name": "Japanese"},
-            {"code": "jw", "name": "Javanese"},
-            {"code": "ka", "name": "Georgian"},
-            {"code": "kk", "name": "Kazakh"},
-            {"code": "km", "name": "Khmer"},
-            {"code": "kn", "name": "Kannada"},
-            {"code": "ko", "name": "Korean"},
-            {"code": "la", "name": "Latin"},
-            {"code": "lb", "name": "Luxembourgish"},
-            {"code": "ln", "name": "Lingala"},
-            {"code": "lo", "name": "Lao"},
-            {"code": "lt", "name": "Lithuanian"},
-            {"code": "lv", "name": "Latvian"},
-            {"code": "mg", "name": "Malagasy"},
-            {"code": "mi", "name": "Maori"},
-            {"code": "mk", "name": "Macedonian"},
-            {"code": "ml", "name": "Malayalam"},
-            {"code": "mn", "name": "Mongolian"},
-            {"code": "mr", "name": "Marathi"},
-            {"code": "ms", "name": "Malay"},
-            {"code": "mt", "name": "Maltese"},
-            {"code": "my", "name": "Myanmar"},
-            {"code": "ne", "name": "Nepali"},
-            {"code": "nl", "name": "Dutch"},
-            {"code": "nn", "name": "Nynorsk"},
-            {"code": "no", "name": "Norwegian"},
-            {"code": "oc", "name": "Occitan"},
-            {"code": "pa", "name": "Punjabi"},
-            {"code": "pl", "name": "Polish"},
-            {"code": "ps", "name": "Pashto"},
-            {"code": "pt", "name": "Portuguese"},
-            {"code": "ro", "name": "Romanian"},
-            {"code": "ru", "name": "Russian"},
-            {"code": "sa", "name": "Sanskrit"},
-            {"code": "sd", "name": "Sindhi"},
-            {"code": "si", "name": "Sinhala"},
-            {"code": "sk", "name": "Slovak"},
-            {"code": "sl", "name": "Slovenian"},
-            {"code": "sn", "name": "Shona"},
-            {"code": "so", "name": "Somali"},
-            {"code": "sq", "name": "Albanian"},
-            {"code": "sr", "name": "Serbian"},
-            {"code": "su", "name": "Sundanese"},
-            {"code": "sv", "name": "Swedish"},
-            {"code": "sw", "name": "Swahili"},
-            {"code": "ta", "name": "Tamil"},
-            {"code": "te", "name": "Telugu"},
-            {"code": "tg", "name": "Tajik"},
-            {"code": "th", "name": "Thai"},
-            {"code": "tk", "name": "Turkmen"},
-            {"code": "tl", "name": "Tagalog"},
-            {"code": "tr", "name": "Turkish"},
-            {"code": "tt", "name": "Tatar"},
-            {"code": "uk", "name": "Ukrainian"},
-            {"code": "ur", "name": "Urdu"},
-            {"code": "uz", "name": "Uzbek"},
-            {"code": "vi", "name": "Vietnamese"},
-            {"code": "yi", "name": "Yiddish"},
-            {"code": "yo", "name": "Yoruba"},
-            {"code": "zh", "name": "Chinese"}
-        ]
-
-# Initialize Whisper service
-whisper_service = WhisperService()
-
 # Authentication Functions
 def create_access_token(data: dict):
     """Create JWT access token"""
@@ -2553,8 +2450,12 @@ def create_access_token(data: dict):
 async def verify_google_token(token: str) -> dict:
     """Verify Google OAuth token and extract user info"""
     try:
-        # Verify the token with Google
-        idinfo = id_token.verify_oauth2_token(token, requests.Request(), GOOGLE_CLIENT_ID)
+        # google-auth is only needed for Google sign-in, so it is imported on first use
+        from google.auth.transport import requests
+        from google.oauth2 import id_token
+
+        # Verify the token with Google (may fetch Google's certs, so keep it off the loop)
+        idinfo = await asyncio.to_thread(id_token.verify_oauth2_token, token, requests.Request(), GOOGLE_CLIENT_ID)
         
         if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
             raise ValueError('Wrong issuer.')
@@ -2586,6 +2487,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     # Special handling for test token
     if user_email == "test-user-123" or user_id == "test-user-123":
         # Return a test user for testing purposes
+        llm_user.set("test-user-123")
         return User(
             id="test-user-123",
             email="test@example.com",
@@ -2607,6 +2509,8 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
     
+    # LLM calls made for this request are queued under the signed-in user
+    llm_user.set(user["id"])
     return User(**user)
 
 async def get_current_user_optional(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Optional[User]:
@@ -2616,6 +2520,30 @@ async def get_current_user_optional(credentials: HTTPAuthorizationCredentials =
     except HTTPException:
         return None
 
+async def simulation_for(user_id: str) -> dict:
+    """State of a user's simulation (the actor's snapshot), created on first use"""
+    return await simulation_actors.for_user(user_id, lambda: SimulationState().dict())
+
+async def commit_round(simulation_id: str, conversation_round: ConversationRound, *inserts: Tuple[str, dict]) -> ConversationRound:
+    """Number and store a round (plus related documents) through the simulation's actor"""
+    async def apply(actor):
+        conversation_round.round_number = await actor.next_round()
+        actor.insert("conversations", conversation_round.dict())
+        for collection, doc in inserts:
+            actor.insert(collection, doc)
+        return conversation_round
+    await simulation_actors.call(simulation_id, apply)
+    await simulation_events.publish(simulation_id, ROUND_CREATED, conversation_round.dict())
+    return conversation_round
+
+async def current_simulation(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)) -> dict:
+    """State of the caller's simulation (the shared one for unauthenticated clients)"""
+    user = await get_current_user(credentials) if credentials else None
+    state = await simulation_for(user.id if user else "")
+    # Work on the simulation (turns, summaries, documents) is queued under its owner
+    llm_user.set(state.get("user_id", ""))
+    return state
+
 # Admin helper functions
 def is_admin_user(user_email: str) -> bool:
     """Check if user is an admin"""
@@ -2811,7 +2739,7 @@ async def register_user(user_data: UserRegister):
             )
         
         # Hash the password
-        password_hash = hash_password(user_data.password)
+        password_hash = await hash_password(user_data.password)
         
         # Create new user
         new_user = UserWithPassword(
@@ -2872,7 +2800,8 @@ async def login_user(user_credentials: UserLogin):
             )
         
         # Verify password
-        if not verify_password(user_credentials.password, user_doc["password_hash"]):
+        password_valid, upgraded_hash = await verify_password(user_credentials.password, user_doc["password_hash"])
+        if not password_valid:
             raise HTTPException(
                 status_code=401,
                 detail="Invalid email or password"
@@ -2885,10 +2814,13 @@ async def login_user(user_credentials: UserLogin):
                 detail="Account is deactivated"
             )
         
-        # Update last login
+        # Update last login, storing a rehashed password if the bcrypt cost changed
+        login_update = {"last_login": datetime.utcnow()}
+        if upgraded_hash:
+            login_update["password_hash"] = upgraded_hash
         await db.users.update_one(
             {"_id": user_doc["_id"]},
-            {"$set": {"last_login": datetime.utcnow()}}
+            {"$set": login_update}
         )
         
         # Create access token
@@ -3146,6 +3078,72 @@ async def get_admin_recent_activity(
         logging.error(f"Error getting recent activity: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get recent activity: {str(e)}")
 
+# Admin Debug Endpoints
+@api_router.get("/admin/debug/loop-stalls")
+async def get_loop_stalls(
+    limit: int = 20,
+    current_user: User = Depends(get_admin_user)
+):
+    """Recent event loop stalls with the stack that was blocking the loop - admin only"""
+    return {
+        "stats": loop_monitor.get_stats(),
+        "stalls": loop_monitor.get_captures(limit)
+    }
+
+@api_router.get("/admin/debug/traces")
+async def get_slowest_traces(
+    limit: int = 20,
+    current_user: User = Depends(get_admin_user)
+):
+    """Slowest recent requests with time spent in MongoDB, LLM calls and pipeline stages - admin only"""
+    return {"traces": tracer.slowest(limit)}
+
+@api_router.get("/admin/debug/traces/{trace_id}")
+async def get_trace(
+    trace_id: str,
+    current_user: User = Depends(get_admin_user)
+):
+    """Full span tree for one recent request - admin only"""
+    trace = tracer.get(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found (it may have left the buffer)")
+    return trace
+
+@api_router.post("/admin/debug/profiler/start")
+async def start_profiler(
+    duration_seconds: float = Query(30, gt=0, le=120),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    current_user: User = Depends(get_admin_user)
+):
+    """Start a sampling profiling session across the event loop and thread pools - admin only"""
+    try:
+        profiler.start(duration=duration_seconds, interval=interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return profiler.status()
+
+@api_router.get("/admin/debug/profiler/status")
+async def get_profiler_status(current_user: User = Depends(get_admin_user)):
+    """Current or last profiling session - admin only"""
+    return profiler.status()
+
+@api_router.post("/admin/debug/profiler/stop")
+async def stop_profiler(
+    output_format: str = Query("speedscope", alias="format", pattern="^(speedscope|collapsed)$"),
+    view: str = Query("threads", pattern="^(threads|tasks)$"),
+    current_user: User = Depends(get_admin_user)
+):
+    """Stop profiling and return speedscope JSON or collapsed stacks (threads or per-route async tasks) - admin only"""
+    await asyncio.to_thread(profiler.stop)
+    if output_format == "collapsed":
+        return PlainTextResponse(profiler.collapsed(view))
+    return profiler.speedscope(view)
+
+@api_router.get("/admin/debug/auto-scheduler")
+async def get_auto_scheduler_status(current_user: User = Depends(get_admin_user)):
+    """Auto-mode scheduler leader and whether AUTO_SCHEDULER_MAX_SIMULATIONS left simulations unscheduled - admin only"""
+    return await auto_scheduler.get_status()
+
 @api_router.post("/admin/reset-password")
 async def reset_admin_password(
     request_data: dict,
@@ -3158,7 +3156,7 @@ async def reset_admin_password(
             raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
         
         # Hash the new password
-        password_hash = hash_password(new_password)
+        password_hash = await hash_password(new_password)
         
         # Update admin user's password
         result = await db.users.update_one(
@@ -3192,7 +3190,7 @@ async def setup_admin_account(setup_data: dict):
             raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
         
         # Hash the password
-        password_hash = hash_password(password)
+        password_hash = await hash_password(password)
         
         if admin_user:
             # Update existing admin with password
@@ -3258,31 +3256,30 @@ async def delete_saved_agent(agent_id: str, current_user: User = Depends(get_cur
     return {"message": "Agent deleted successfully"}
 
 @api_router.put("/agents/{agent_id}")
-async def update_agent(agent_id: str, agent_data: dict):
+async def update_agent(agent_id: str, agent_data: dict, state: dict = Depends(current_simulation)):
     """Update an existing agent's details"""
     try:
-        # Find and update the agent
-        result = await db.agents.update_one(
-            {"id": agent_id},
-            {"$set": {
-                "name": agent_data.get("name"),
-                "archetype": agent_data.get("archetype"),
-                "personality": agent_data.get("personality", {}),
-                "goal": agent_data.get("goal"),
-                "background": agent_data.get("background"),
-                "avatar_url": agent_data.get("avatar_url", ""),
-                "avatar_prompt": agent_data.get("avatar_prompt", ""),
-                "updated_at": datetime.utcnow()
-            }}
-        )
-        
-        if result.matched_count == 0:
+        agent = await db.agents.find_one(simulations.scope(state["id"], id=agent_id))
+        if not agent:
             raise HTTPException(status_code=404, detail="Agent not found")
         
+        update_data = {
+            "name": agent_data.get("name"),
+            "archetype": agent_data.get("archetype"),
+            "personality": agent_data.get("personality", {}),
+            "goal": agent_data.get("goal"),
+            "background": agent_data.get("background"),
+            "avatar_url": agent_data.get("avatar_url", ""),
+            "avatar_prompt": agent_data.get("avatar_prompt", ""),
+            "updated_at": datetime.utcnow()
+        }
+        await simulation_actors.update_agent(state["id"], agent_id, update_data)
+        
         # Return updated agent
-        updated_agent = await db.agents.find_one({"id": agent_id})
-        return Agent(**updated_agent)
+        return Agent(**{**agent, **update_data})
         
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error updating agent: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to update agent: {str(e)}")
@@ -3341,7 +3338,7 @@ async def root():
     return {"message": "AI Agent Simulation API"}
 
 @api_router.post("/simulation/set-scenario")
-async def set_scenario(request: ScenarioRequest):
+async def set_scenario(request: ScenarioRequest, state: dict = Depends(current_simulation)):
     """Set a custom scenario for the simulation"""
     scenario = request.scenario.strip()
     scenario_name = request.scenario_name.strip()
@@ -3352,14 +3349,11 @@ async def set_scenario(request: ScenarioRequest):
         raise HTTPException(status_code=400, detail="Scenario name required")
     
     # Update simulation state with new scenario and name
-    await db.simulation_state.update_one(
-        {},
-        {"$set": {
-            "scenario": scenario,
-            "scenario_name": scenario_name
-        }},
-        upsert=True
-    )
+    await simulation_actors.update(state["id"], {
+        "scenario": scenario,
+        "scenario_name": scenario_name
+    })
+    await change_versions.bump("simulation_state", scope=state["id"])
     
     return {"message": "Scenario updated", "scenario": scenario, "scenario_name": scenario_name}
 
@@ -3409,41 +3403,40 @@ async def get_random_scenario():
     }
 
 @api_router.post("/simulation/pause")
-async def pause_simulation():
+async def pause_simulation(state: dict = Depends(current_simulation)):
     """Pause the simulation (stops auto-generation)"""
-    await db.simulation_state.update_one(
-        {},
-        {"$set": {
-            "is_active": False,
-            "auto_conversations": False,
-            "auto_time": False
-        }},
-        upsert=True
-    )
+    await simulation_actors.update(state["id"], {
+        "is_active": False,
+        "auto_conversations": False,
+        "auto_time": False
+    })
+    await change_versions.bump("simulation_state", scope=state["id"])
     return {"message": "Simulation paused", "is_active": False}
 
 @api_router.post("/simulation/resume")
-async def resume_simulation():
+async def resume_simulation(state: dict = Depends(current_simulation)):
     """Resume the simulation"""
-    await db.simulation_state.update_one(
-        {},
-        {"$set": {"is_active": True}},
-        upsert=True
-    )
+    await simulation_actors.update(state["id"], {"is_active": True})
+    await change_versions.bump("simulation_state", scope=state["id"])
     return {"message": "Simulation resumed", "is_active": True}
 
+@api_router.post("/simulation/generate-summary/submit", status_code=202)
+async def submit_weekly_summary(http_request: Request, response: Response, state: dict = Depends(current_simulation)):
+    """Weekly summary as a background job; poll /api/jobs/{id} for the result"""
+    return await submit_job("weekly_summary", {}, http_request, response, state)
+
 @api_router.post("/simulation/generate-summary")
-async def generate_weekly_summary():
+async def generate_weekly_summary(simulation: dict = Depends(current_simulation)):
     """Generate structured AI summary of conversations with focus on key discoveries and documents created"""
+    simulation_id = simulation["id"]
+    
     # Get all conversations
-    conversations = await db.conversations.find().sort("created_at", -1).to_list(100)
+    conversations = await db.conversations.find(simulations.scope(simulation_id)).sort("created_at", -1).to_list(100)
     
     if not conversations:
         return {"summary": "No conversations to summarize yet."}
     
-    # Get current simulation state
-    state = await db.simulation_state.find_one()
-    current_day = state.get("current_day", 1) if state else 1
+    current_day = simulation.get("current_day", 1)
     
     # Filter conversations from recent days (last 7 days or all if less than 7)
     recent_conversations = conversations[:min(21, len(conversations))]  # Last 21 rounds (7 days * 3 periods)
@@ -3455,9 +3448,9 @@ async def generate_weekly_summary():
     try:
         # Get documents created in the last week
         one_week_ago = datetime.utcnow() - timedelta(days=7)
-        recent_documents = await db.documents.find({
-            "metadata.created_at": {"$gte": one_week_ago.isoformat()}
-        }).sort("metadata.created_at", -1).to_list(50)
+        recent_documents = await db.documents.find(simulations.scope(
+            simulation_id, **{"metadata.created_at": {"$gte": one_week_ago.isoformat()}}
+        )).sort("metadata.created_at", -1).to_list(50)
     except Exception as e:
         logging.warning(f"Could not fetch recent documents: {e}")
         recent_documents = []
@@ -3592,26 +3585,25 @@ IMPORTANT FORMATTING RULES:
     
     try:
         user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
+        response = await llm_manager.send_message(chat, user_message, "summary", priority=PRIORITY_BACKGROUND, max_tokens=1000)
         await llm_manager.increment_usage()
         
         # Store structured summary in database
         summary_doc = {
             "id": str(uuid.uuid4()),
+            "simulation_id": simulation_id,
             "summary": response,
             "day_generated": current_day,
             "conversations_analyzed": len(recent_conversations),
             "report_type": "weekly_structured",
             "created_at": datetime.utcnow()
         }
-        await db.summaries.insert_one(summary_doc)
+        await db.summaries.insert_one(touch(summary_doc))
+        await simulation_events.publish(simulation_id, SUMMARY_READY, summary_view(summary_doc))
         
         # Update last auto report timestamp
-        await db.simulation_state.update_one(
-            {},
-            {"$set": {"last_auto_report": datetime.utcnow().isoformat()}},
-            upsert=True
-        )
+        await simulation_actors.update(simulation_id, {"last_auto_report": datetime.utcnow().isoformat()})
+        await change_versions.bump("summaries", "simulation_state", scope=simulation_id)
         
         return {
             "summary": response, 
@@ -3622,6 +3614,7 @@ IMPORTANT FORMATTING RULES:
         
     except Exception as e:
         logging.error(f"Error generating summary: {e}")
+        monitor.record_llm_fallback("summary")
         
         # Create a fallback summary when API fails
         fallback_summary = f"""**Week Summary - Day {current_day}**
@@ -3651,6 +3644,7 @@ IMPORTANT FORMATTING RULES:
         # Store fallback summary in database
         fallback_doc = {
             "id": str(uuid.uuid4()),
+            "simulation_id": simulation_id,
             "summary": fallback_summary,
             "day_generated": current_day,
             "conversations_analyzed": len(recent_conversations),
@@ -3658,7 +3652,9 @@ IMPORTANT FORMATTING RULES:
             "is_fallback": True,
             "report_type": "weekly_structured"
         }
-        await db.summaries.insert_one(fallback_doc)
+        await db.summaries.insert_one(touch(fallback_doc))
+        await simulation_events.publish(simulation_id, SUMMARY_READY, summary_view(fallback_doc))
+        await change_versions.bump("summaries", scope=simulation_id)
         
         return {
             "summary": fallback_summary, 
@@ -3674,7 +3670,7 @@ async def get_archetypes():
     return AGENT_ARCHETYPES
 
 @api_router.post("/agents", response_model=Agent)
-async def create_agent(agent_data: AgentCreate):
+async def create_agent(agent_data: AgentCreate, state: dict = Depends(current_simulation)):
     """Create a new AI agent with avatar generation for simulation"""
     # Use default personality if not provided
     if not agent_data.personality:
@@ -3693,6 +3689,7 @@ async def create_agent(agent_data: AgentCreate):
             enhanced_prompt = f"professional portrait, headshot, detailed face, {agent_data.avatar_prompt}, high quality, photorealistic, studio lighting, neutral background"
             
             # Submit to fal.ai using the Flux Schnell model (fastest and cheapest)
+            import fal_client  # Loaded on first avatar request; reads FAL_KEY itself
             handler = await fal_client.submit_async(
                 "fal-ai/flux/schnell",
                 arguments={
@@ -3726,23 +3723,26 @@ async def create_agent(agent_data: AgentCreate):
         memory_summary=agent_data.memory_summary,
         avatar_url=avatar_url,
         avatar_prompt=agent_data.avatar_prompt,
-        user_id=""  # No user association for simulation
+        user_id=state.get("user_id", ""),
+        simulation_id=state["id"]
     )
     
-    await db.agents.insert_one(agent.dict())
+    await db.agents.insert_one(touch(agent.dict()))
     return agent
 
 @api_router.get("/agents", response_model=List[Agent])
-async def get_agents():
+async def get_agents(response: Response, state: dict = Depends(current_simulation)):
     """Get all agents for simulation"""
-    agents = await db.agents.find().to_list(100)
+    # The caller's own simulation: never stored by shared caches (the nginx API cache)
+    response.headers["Cache-Control"] = "private, no-cache"
+    agents = await db.agents.find(simulations.scope(state["id"])).to_list(100)
     return [Agent(**agent) for agent in agents]
 
 @api_router.put("/agents/{agent_id}")
-async def update_agent(agent_id: str, agent_update: AgentUpdate):
+async def update_agent(agent_id: str, agent_update: AgentUpdate, state: dict = Depends(current_simulation)):
     """Update an existing agent"""
     # Find the agent
-    agent = await db.agents.find_one({"id": agent_id})
+    agent = await db.agents.find_one(simulations.scope(state["id"], id=agent_id))
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
     
@@ -3770,140 +3770,176 @@ async def update_agent(agent_id: str, agent_update: AgentUpdate):
         update_data["avatar_url"] = agent_update.avatar_url
     
     # Update the agent
-    await db.agents.update_one(
-        {"id": agent_id},
-        {"$set": update_data}
-    )
+    await simulation_actors.update_agent(state["id"], agent_id, update_data)
     
     # Return updated agent
-    updated_agent = await db.agents.find_one({"id": agent_id})
-    return Agent(**updated_agent)
+    return Agent(**{**agent, **update_data})
 
-@api_router.post("/simulation/fast-forward")
-async def fast_forward_simulation(request: FastForwardRequest):
-    """Fast forward the simulation by generating multiple days of conversations"""
-    # Get current simulation state
-    state = await db.simulation_state.find_one()
-    if not state or not state.get("is_active"):
+def fast_forward_steps(current_day: int, current_period: str, target_days: int, conversations_per_period: int):
+    """(day, period, conversation number) for every round a fast forward generates, in order"""
+    periods = ["morning", "afternoon", "evening"]
+    steps = []
+    for day_offset in range(target_days):
+        for period_index, period in enumerate(periods):
+            # Skip periods we've already passed today
+            if day_offset == 0 and period_index <= periods.index(current_period):
+                continue
+            for conv_num in range(conversations_per_period):
+                steps.append((current_day + day_offset, period, conv_num))
+    return steps
+
+async def plan_fast_forward(request: FastForwardRequest, state: dict) -> dict:
+    """Validate a fast forward and fix its starting point, so a resumed job generates the same rounds"""
+    if not state.get("is_active"):
         raise HTTPException(status_code=400, detail="Simulation not active")
     
     # Get agents
-    agents = await db.agents.find().to_list(100)
+    agents = await db.agents.find(simulations.scope(state["id"])).to_list(100)
     if len(agents) < 2:
         raise HTTPException(status_code=400, detail="Need at least 2 agents")
     
-    agent_objects = [Agent(**agent) for agent in agents]
-    
-    current_day = state.get("current_day", 1)
-    current_period = state.get("current_time_period", "morning")
-    scenario = state.get("scenario", "Research Station")
-    
-    periods = ["morning", "afternoon", "evening"]
-    generated_conversations = []
-    
     # Check if we have enough API requests
     usage = await llm_manager.get_usage_today()
-    estimated_requests = request.target_days * 3 * request.conversations_per_period * len(agent_objects)
+    estimated_requests = request.target_days * 3 * request.conversations_per_period * len(agents)
     if usage + estimated_requests > llm_manager.max_daily_requests:
         raise HTTPException(status_code=400, detail=f"Not enough API requests remaining. Need {estimated_requests}, have {llm_manager.max_daily_requests - usage}")
     
-    try:
-        for day_offset in range(request.target_days):
-            target_day = current_day + day_offset
-            
-            for period in periods:
-                # Skip periods we've already passed today
-                if day_offset == 0:
-                    current_period_index = periods.index(current_period)
-                    period_index = periods.index(period)
-                    if period_index <= current_period_index:
-                        continue
-                
-                # Generate conversations for this period
-                for conv_num in range(request.conversations_per_period):
-                    # Get conversation history for context
-                    conversation_history = await db.conversations.find().sort("created_at", -1).limit(10).to_list(10)
-                    
-                    # Create progressive context based on day and time
-                    day_context = f"Day {target_day}, {period}. "
-                    if target_day > current_day:
-                        day_context += f"Several days have passed. "
-                    
-                    if period == "morning":
-                        day_context += "Starting a new day with fresh energy. "
-                    elif period == "afternoon":
-                        day_context += "Midday progress check and developments. "
-                    else:
-                        day_context += "Evening reflection and planning. "
-                    
-                    # Add progression context
-                    if conversation_history:
-                        day_context += "Build upon previous discussions and introduce new developments. "
-                    
-                    # Generate responses from each agent
-                    messages = []
-                    for agent in agent_objects:
-                        response = await llm_manager.generate_agent_response(
-                            agent, scenario, agent_objects, day_context, conversation_history
-                        )
-                        
-                        message = ConversationMessage(
-                            agent_id=agent.id,
-                            agent_name=agent.name,
-                            message=response,
-                            mood=agent.current_mood
-                        )
-                        messages.append(message)
-                    
-                    # Create conversation round
-                    conversation_count = await db.conversations.count_documents({})
-                    conversation_round = ConversationRound(
-                        round_number=conversation_count + 1,
-                        time_period=f"Day {target_day} - {period} (#{conv_num + 1})",
-                        scenario=scenario,
-                        messages=messages
-                    )
-                    
-                    await db.conversations.insert_one(conversation_round.dict())
-                    generated_conversations.append(conversation_round)
-                    
-                    # Update relationships
-                    await update_relationships(agent_objects, messages)
-                    
-                    # Update agent memories periodically
-                    if conv_num == request.conversations_per_period - 1:  # Last conversation of the period
-                        for agent in agent_objects:
-                            await llm_manager.update_agent_memory(agent, conversation_history + [conversation_round.dict()])
+    return {
+        "simulation_id": state["id"],
+        "current_day": state.get("current_day", 1),
+        "current_period": state.get("current_time_period", "morning"),
+        "scenario": state.get("scenario", "Research Station"),
+        "agent_ids": [agent["id"] for agent in agents],
+        "target_days": request.target_days,
+        "conversations_per_period": request.conversations_per_period
+    }
+
+async def run_fast_forward(job: JobContext):
+    """Generate the planned rounds, checkpointing after each one"""
+    plan = job.params
+    simulation_id = plan["simulation_id"]
+    agents = await db.agents.find(simulations.scope(simulation_id, id={"$in": plan["agent_ids"]})).to_list(100)
+    if len(agents) < 2:
+        raise JobFailed("Need at least 2 agents")
+    agent_objects = [Agent(**agent) for agent in agents]
+    
+    current_day = plan["current_day"]
+    scenario = plan["scenario"]
+    conversations_per_period = plan["conversations_per_period"]
+    steps = fast_forward_steps(current_day, plan["current_period"], plan["target_days"], conversations_per_period)
+    completed = job.checkpoint.get("completed", 0)
+    
+    for index in range(completed, len(steps)):
+        target_day, period, conv_num = steps[index]
         
-        # Update simulation state
-        final_day = current_day + request.target_days - 1
-        final_period = "evening"  # Always end on evening
+        # Get conversation history for context
+        conversation_history = await db.conversations.find(
+            simulations.scope(simulation_id)
+        ).sort("created_at", -1).limit(10).to_list(10)
         
-        await db.simulation_state.update_one(
-            {"id": state["id"]},
-            {"$set": {
-                "current_day": final_day,
-                "current_time_period": final_period
-            }}
+        # Create progressive context based on day and time
+        day_context = f"Day {target_day}, {period}. "
+        if target_day > current_day:
+            day_context += f"Several days have passed. "
+        
+        if period == "morning":
+            day_context += "Starting a new day with fresh energy. "
+        elif period == "afternoon":
+            day_context += "Midday progress check and developments. "
+        else:
+            day_context += "Evening reflection and planning. "
+        
+        # Add progression context
+        if conversation_history:
+            day_context += "Build upon previous discussions and introduce new developments. "
+        
+        # Generate responses from each agent
+        messages = []
+        for agent in agent_objects:
+            response = await llm_manager.generate_agent_response(
+                agent, scenario, agent_objects, day_context, conversation_history,
+                priority=PRIORITY_BACKGROUND
+            )
+            
+            message = ConversationMessage(
+                agent_id=agent.id,
+                agent_name=agent.name,
+                message=response,
+                mood=agent.current_mood
+            )
+            messages.append(message)
+        
+        # Create conversation round
+        conversation_round = ConversationRound(
+            round_number=0,
+            time_period=f"Day {target_day} - {period} (#{conv_num + 1})",
+            scenario=scenario,
+            messages=messages,
+            user_id=plan.get("user_id", ""),
+            simulation_id=simulation_id
         )
         
-        return {
-            "message": f"Fast forwarded {request.target_days} days",
-            "conversations_generated": len(generated_conversations),
-            "final_day": final_day,
-            "final_period": final_period,
-            "api_requests_used": len(generated_conversations) * len(agent_objects)
-        }
+        await commit_round(simulation_id, conversation_round)
+        await change_versions.bump("conversations", scope=simulation_id)
+        
+        # Update relationships
+        await update_relationships(agent_objects, messages, simulation_id)
         
+        # Update agent memories periodically
+        if conv_num == conversations_per_period - 1:  # Last conversation of the period
+            for agent in agent_objects:
+                await llm_manager.update_agent_memory(agent, conversation_history + [conversation_round.dict()])
+        
+        await job.progress(index + 1, len(steps), f"Day {target_day}, {period}", checkpoint={"completed": index + 1})
+    
+    # Update simulation state
+    final_day = current_day + plan["target_days"] - 1
+    final_period = "evening"  # Always end on evening
+    
+    await simulation_actors.update(simulation_id, {
+        "current_day": final_day,
+        "current_time_period": final_period
+    })
+    await change_versions.bump("simulation_state", scope=simulation_id)
+    
+    return {
+        "message": f"Fast forwarded {plan['target_days']} days",
+        "conversations_generated": len(steps),
+        "final_day": final_day,
+        "final_period": final_period,
+        "api_requests_used": len(steps) * len(agent_objects)
+    }
+
+@api_router.post("/simulation/fast-forward")
+async def fast_forward_simulation(request: FastForwardRequest, state: dict = Depends(current_simulation)):
+    """Fast forward the simulation by generating multiple days of conversations"""
+    plan = await plan_fast_forward(request, state)
+    try:
+        return await run_fast_forward(inline_job(plan))
     except Exception as e:
         logging.error(f"Error during fast forward: {e}")
         raise HTTPException(status_code=500, detail=f"Fast forward failed: {str(e)}")
 
+@api_router.post("/simulation/fast-forward/submit", status_code=202)
+async def submit_fast_forward(request: FastForwardRequest, http_request: Request, response: Response,
+                              state: dict = Depends(current_simulation)):
+    """Fast forward as a background job; poll /api/jobs/{id} for progress"""
+    plan = await plan_fast_forward(request, state)
+    return await submit_job("fast_forward", plan, http_request, response, state)
+
+async def clear_agents(simulation_id: str):
+    """Delete every agent of a simulation, leaving tombstones so /sync clients drop them too"""
+    agents = await db.agents.find(simulations.scope(simulation_id), {"id": 1}).to_list(None)
+    agent_ids = [agent["id"] for agent in agents if agent.get("id")]
+    # Only the agents read above: one created meanwhile is neither deleted nor tombstoned
+    await db.agents.delete_many(simulations.scope(simulation_id, id={"$in": agent_ids}))
+    await delta_sync.tombstone(simulation_id, "agents", agent_ids)
+
 @api_router.post("/test/background-differences")
-async def test_background_differences():
+async def test_background_differences(state: dict = Depends(current_simulation)):
     """Create test agents with different backgrounds to demonstrate behavioral differences"""
     # Clear existing agents
-    await db.agents.delete_many({})
+    await clear_agents(state["id"])
     
     # Create agents with dramatically different backgrounds
     test_agents = [
@@ -3940,18 +3976,15 @@ async def test_background_differences():
     created_agents = []
     for agent_data in test_agents:
         agent_create = AgentCreate(**agent_data)
-        agent = await create_agent(agent_create)
+        agent = await create_agent(agent_create, state)
         created_agents.append(agent)
     
     # Start simulation with a compelling scenario
-    await start_simulation()
+    await start_simulation(state=state)
     
     # Set a scenario that will highlight background differences
-    await db.simulation_state.update_one(
-        {},
-        {"$set": {"scenario": "A mysterious, structured signal has been detected coming from the direction of Proxima Centauri. The signal contains mathematical patterns and repeats every 11 hours. Ground control has lost communication and the team must decide how to respond."}},
-        upsert=True
-    )
+    await simulation_actors.update(state["id"], {"scenario": "A mysterious, structured signal has been detected coming from the direction of Proxima Centauri. The signal contains mathematical patterns and repeats every 11 hours. Ground control has lost communication and the team must decide how to respond."})
+    await change_versions.bump("simulation_state", scope=state["id"])
     
     return {
         "message": "Test agents with diverse backgrounds created",
@@ -3960,8 +3993,8 @@ async def test_background_differences():
     }
 
 @api_router.post("/simulation/start")
-async def start_simulation(request: Optional[SimulationStartRequest] = None):
-    """Start or reset the simulation with optional time limit - clears all user data for fresh start"""
+async def start_simulation(request: Optional[SimulationStartRequest] = None, state: dict = Depends(current_simulation)):
+    """Start or reset the simulation with optional time limit - clears this simulation's data for a fresh start"""
     
     # Get time limit info from request
     time_limit_hours = None
@@ -3974,6 +4007,8 @@ async def start_simulation(request: Optional[SimulationStartRequest] = None):
     
     # Reset simulation state
     simulation = SimulationState(
+        id=state["id"],
+        user_id=state.get("user_id", ""),
         is_active=True,
         time_limit_hours=time_limit_hours,
         time_limit_display=time_limit_display,
@@ -3981,14 +4016,13 @@ async def start_simulation(request: Optional[SimulationStartRequest] = None):
         time_remaining_hours=time_limit_hours  # Initialize with full time limit
     )
     
-    await db.simulation_state.delete_many({})
-    await db.simulation_state.insert_one(simulation.dict())
-    
-    # For now, clear ALL simulation data globally (until proper user auth is fixed)
-    await db.agents.delete_many({})  # Clear all agents  
-    await db.conversations.delete_many({})  # Clear all conversations
-    await db.relationships.delete_many({})  # Clear all relationships
-    await db.summaries.delete_many({})  # Clear all summaries
+    # Clears agents, conversations, relationships and summaries of this simulation only
+    async def reset(actor):
+        actor.replace(await simulations.reset(actor.state, simulation.dict()))
+        return actor.snapshot()
+    new_state = await simulation_actors.call(state["id"], reset)
+    await simulation_events.publish(state["id"], SIMULATION_RESET, new_state)
+    await change_versions.bump("simulation_state", "conversations", "relationships", "summaries", scope=state["id"])
     
     # Log the simulation start with time limit info
     time_limit_msg = f" with {time_limit_display} time limit" if time_limit_display else " with no time limit"
@@ -4001,13 +4035,25 @@ async def start_simulation(request: Optional[SimulationStartRequest] = None):
     }
 
 @api_router.get("/simulation/state")
-async def get_simulation_state():
+async def get_simulation_state(request: Request, response: Response, state: dict = Depends(current_simulation)):
     """Get current simulation state"""
-    state = await db.simulation_state.find_one()
-    if not state:
-        state = SimulationState().dict()
-        await db.simulation_state.insert_one(state)
-        return state
+    # Remaining time is derived from the clock, so the ETag also rolls over each minute
+    not_modified = await conditional_response(
+        request, response, ["simulation_state"], int(datetime.utcnow().timestamp() // 60), scope=state["id"]
+    )
+    if not_modified:
+        return not_modified
+    
+    state = state_view(state)
+    if "time_elapsed_hours" in state:
+        # Update the database with calculated time
+        await simulation_actors.update(state["id"], {"time_remaining_hours": state["time_remaining_hours"]})
+    
+    return state
+
+def state_view(state: dict) -> dict:
+    """JSON-serializable simulation state, with the remaining time calculated if a limit is set"""
+    state = dict(state)
     
     # Convert MongoDB ObjectId to string to make it JSON serializable
     if '_id' in state:
@@ -4026,22 +4072,71 @@ async def get_simulation_state():
         state['time_remaining_hours'] = remaining_hours
         state['time_elapsed_hours'] = elapsed_hours
         state['time_expired'] = remaining_hours <= 0
-        
-        # Update the database with calculated time
-        await db.simulation_state.update_one(
-            {"id": state["id"]},
-            {"$set": {"time_remaining_hours": remaining_hours}}
-        )
     
     return state
 
+@api_router.get("/sync")
+async def sync_simulation(since: Optional[str] = None, state: dict = Depends(current_simulation)):
+    """Everything in the caller's simulation changed since the `since` cursor, in one response.
+    
+    Without a cursor (or with one from before a reset) the response is a full load (`full: true`)
+    and replaces the client's copy; otherwise `changes` and `deleted` are merged into it by id.
+    Pass the returned `cursor` next time, and ask again right away while `has_more` is set.
+    """
+    simulation_id = state["id"]
+    user_id = state.get("user_id", "")
+    
+    # The user's own documents plus those written in their simulation, as in the File Center
+    documents = [simulations.scope(simulation_id, user_id="")]
+    scopes = [simulation_id]
+    if user_id:
+        documents.append({"metadata.user_id": user_id})
+        scopes.append(user_scope(user_id))
+    
+    filters = {
+        "agents": simulations.scope(simulation_id),
+        "conversations": simulations.scope(simulation_id),
+        "relationships": simulations.scope(simulation_id),
+        "summaries": simulations.scope(simulation_id),
+        "documents": {"$or": documents},
+    }
+    try:
+        result = await delta_sync.changes(filters, scopes, since, reset_at=state.get("reset_at"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    views = {
+        "agents": lambda agent: Agent(**agent),
+        "conversations": conversation_view,
+        "relationships": relationship_view,
+        "summaries": summary_view,
+        "documents": document_view,
+    }
+    changes = {}
+    for collection, docs in result["changes"].items():
+        changes[collection] = []
+        for doc in docs:
+            try:
+                view = views[collection](doc)
+            except Exception as e:
+                logging.warning(f"Skipping malformed {collection} document in sync: {e}")
+                continue
+            if view is not None:
+                changes[collection].append(view)
+    
+    return {
+        "cursor": result["cursor"],
+        "full": result["full"],
+        "has_more": result["has_more"],
+        "state": state_view(state),
+        "usage": await get_usage(),
+        "changes": changes,
+        "deleted": result["deleted"],
+    }
+
 @api_router.get("/simulation/time-status")
-async def get_time_status():
+async def get_time_status(state: dict = Depends(current_simulation)):
     """Get detailed time status for the current simulation"""
-    state = await db.simulation_state.find_one()
-    if not state:
-        raise HTTPException(status_code=404, detail="Simulation not started")
-    
     time_status = {
         "time_limit_active": bool(state.get('time_limit_hours')),
         "time_limit_display": state.get('time_limit_display'),
@@ -4084,37 +4179,34 @@ async def get_time_status():
     return time_status
 
 @api_router.post("/simulation/next-period")
-async def advance_time_period():
+async def advance_time_period(simulation: dict = Depends(current_simulation)):
     """Advance to next time period"""
-    state = await db.simulation_state.find_one()
-    if not state:
-        raise HTTPException(status_code=404, detail="Simulation not started")
-    
-    current_period = state["current_time_period"]
-    if current_period == "morning":
-        new_period = "afternoon"
-    elif current_period == "afternoon":
-        new_period = "evening"
-    else:  # evening
-        new_period = "morning"
-        # Advance day
-        await db.simulation_state.update_one(
-            {"id": state["id"]},
-            {"$inc": {"current_day": 1}}
-        )
-    
-    await db.simulation_state.update_one(
-        {"id": state["id"]},
-        {"$set": {"current_time_period": new_period}}
-    )
+    state = simulation
+    
+    async def advance(actor):
+        # Computed from the actor's state so two concurrent advances move two periods
+        current_period = actor.state["current_time_period"]
+        if current_period == "morning":
+            new_period = "afternoon"
+        elif current_period == "afternoon":
+            new_period = "evening"
+        else:  # evening
+            new_period = "morning"
+            # Advance day
+            actor.set(current_day=actor.state.get("current_day", 1) + 1)
+        actor.set(current_time_period=new_period)
+        return new_period
+    
+    new_period = await simulation_actors.call(state["id"], advance)
+    await change_versions.bump("simulation_state", scope=state["id"])
     
     return {"message": f"Advanced to {new_period}", "new_period": new_period}
 
 @api_router.get("/debug/agents")
-async def debug_agents():
+async def debug_agents(state: dict = Depends(current_simulation)):
     """Debug endpoint to check agent loading"""
     try:
-        agents = await db.agents.find().to_list(100)
+        agents = await db.agents.find(simulations.scope(state["id"])).to_list(100)
         agent_count = len(agents)
         
         if agent_count == 0:
@@ -4141,11 +4233,11 @@ async def debug_agents():
         return {"status": "database_error", "error": str(e)}
 
 @api_router.post("/debug/simple-conversation")
-async def debug_simple_conversation():
+async def debug_simple_conversation(state: dict = Depends(current_simulation)):
     """Simple conversation test without complex logic"""
     try:
         # Get just 2 agents
-        agents = await db.agents.find().limit(2).to_list(2)
+        agents = await db.agents.find(simulations.scope(state["id"])).limit(2).to_list(2)
         if len(agents) < 2:
             return {"error": "Need at least 2 agents"}
         
@@ -4176,18 +4268,23 @@ async def debug_simple_conversation():
         # Save simple conversation
         conversation_round = {
             "id": str(uuid.uuid4()),
-            "round_number": 1,
+            "round_number": 0,
             "time_period": "morning",
             "scenario": "Test scenario",
             "scenario_name": "Debug Test",
             "messages": messages,
-            "user_id": "",
+            "user_id": state.get("user_id", ""),
+            "simulation_id": state["id"],
             "created_at": datetime.utcnow(),
             "language": "en"
         }
         
         # Insert into database
-        result = await db.conversations.insert_one(conversation_round)
+        async def save(actor):
+            conversation_round["round_number"] = await actor.next_round()
+            actor.insert("conversations", conversation_round)
+        await simulation_actors.call(state["id"], save)
+        await change_versions.bump("conversations", scope=state["id"])
         
         return {
             "success": True,
@@ -4210,7 +4307,8 @@ async def auto_generate_documents_from_conversation(conversation_round, agent_ob
     decisions_made = extract_decisions_from_conversation(conversation_text)
     
     # Get existing documents to see what needs updating
-    existing_docs = await db.documents.find({"user_id": ""}).to_list(100)
+    simulation_id = conversation_round.simulation_id
+    existing_docs = await db.documents.find(simulations.scope(simulation_id, user_id="")).to_list(100)
     
     # Determine if we should update existing documents or create new ones
     needed_actions = determine_document_actions(scenario, scenario_name, conversation_text, existing_docs, decisions_made)
@@ -4225,7 +4323,10 @@ async def auto_generate_documents_from_conversation(conversation_round, agent_ob
                     creating_agent, doc_type, doc_title, conversation_text, 
                     scenario, scenario_name, llm_manager
                 )
-                await db.documents.insert_one(document)
+                document["simulation_id"] = simulation_id
+                await db.documents.insert_one(touch(document))
+                await change_versions.bump("documents")
+                await simulation_events.publish(simulation_id, DOCUMENT_CREATED, document_event(document))
                 print(f"📄 Created: {doc_title} by {creating_agent.name}")
                 
             elif action_type == "update":
@@ -4234,12 +4335,18 @@ async def auto_generate_documents_from_conversation(conversation_round, agent_ob
                 updated_doc = await update_existing_document(
                     existing_doc, updating_agent, conversation_text, update_reason, llm_manager
                 )
-                await db.documents.replace_one({"id": existing_doc["id"]}, updated_doc)
+                await db.documents.replace_one({"id": existing_doc["id"]}, touch(updated_doc))
+                await change_versions.bump("documents")
+                await simulation_events.publish(simulation_id, DOCUMENT_UPDATED, document_event(updated_doc))
                 print(f"📝 Updated: {existing_doc['title']} by {updating_agent.name} - {update_reason}")
                 
         except Exception as e:
             print(f"Failed to {action_type} document: {e}")
 
+def document_event(document: dict) -> dict:
+    """Document fields pushed to clients (the content is fetched on demand)"""
+    return {key: value for key, value in document.items() if key not in ("_id", "content")}
+
 def extract_decisions_from_conversation(conversation_text):
     """Extract key decisions, votes, and commitments from conversation"""
     decisions = []
@@ -4339,7 +4446,7 @@ Your task: Update the document to incorporate the new information and decisions
         prompt = f"Update this document to include the new conversation insights. Maintain the structure but add new information:\n\n{existing_doc['content']}"
         user_message = UserMessage(text=prompt)
         
-        response = await asyncio.wait_for(chat.send_message(user_message), timeout=10.0)
+        response = await llm_manager.send_message(chat, user_message, "document", priority=PRIORITY_DOCUMENT, max_tokens=400, timeout=10.0)
         
         if response and len(response.strip()) > 100:
             updated_content = response.strip()
@@ -4620,7 +4727,7 @@ SCENARIO: {scenario}"""
         prompt = f"Create detailed content for this {doc_type} document. Fill in the template with specific information based on the conversation:\n\n{template}"
         user_message = UserMessage(text=prompt)
         
-        response = await asyncio.wait_for(chat.send_message(user_message), timeout=10.0)
+        response = await llm_manager.send_message(chat, user_message, "document", priority=PRIORITY_DOCUMENT, timeout=10.0)
         
         if response and len(response.strip()) > 50:
             content = response.strip()
@@ -4648,10 +4755,12 @@ SCENARIO: {scenario}"""
     return document
 
 @api_router.post("/conversation/generate")
-async def generate_conversation():
+async def generate_conversation(simulation: dict = Depends(current_simulation)):
     """Generate a conversation round between agents with sequential responses and progression tracking"""
-    # Get current agents (all available agents for now, until auth is fixed)
-    all_agents = await db.agents.find().to_list(100)
+    simulation_id = simulation["id"]
+    
+    # Get this simulation's agents
+    all_agents = await db.agents.find(simulations.scope(simulation_id)).to_list(100)
     if len(all_agents) < 2:
         raise HTTPException(status_code=400, detail="Need at least 2 agents for conversation. Please add more agents to your simulation.")
     
@@ -4660,19 +4769,15 @@ async def generate_conversation():
     agents = random.sample(all_agents, min(3, len(all_agents)))
     agent_objects = [Agent(**agent) for agent in agents]
     
-    # Get simulation state and scenario
-    state = await db.simulation_state.find_one()
-    if not state:
-        raise HTTPException(status_code=400, detail="No active simulation")
-    
+    # Simulation state and scenario
+    state = simulation
     scenario = state.get("scenario", "General discussion about current topics")
     scenario_name = state.get("scenario_name", "General Discussion")
     
-    # Get conversation count for round numbering and context
-    conversation_count = await db.conversations.count_documents({})
-    
     # Get existing conversations for context
-    existing_conversations = await db.conversations.find().sort("created_at", -1).limit(5).to_list(5)
+    existing_conversations = await db.conversations.find(
+        simulations.scope(simulation_id)
+    ).sort("created_at", -1).limit(5).to_list(5)
     
     # Build context from previous conversations
     context = ""
@@ -4681,7 +4786,7 @@ async def generate_conversation():
         context = f"In previous discussions: {'; '.join([msg.get('message', '') for msg in recent_conv.get('messages', [])][:2])}"
     
     # Get existing documents for context
-    existing_documents = await db.documents.find().sort("updated_at", -1).limit(5).to_list(5)
+    existing_documents = await db.documents.find(simulations.scope(simulation_id)).sort("updated_at", -1).limit(5).to_list(5)
     
     # Language instruction
     language_instructions = {
@@ -4714,7 +4819,9 @@ async def generate_conversation():
                 previous_context = ""
                 
                 # Get recent conversations for context
-                recent_conversations = await db.conversations.find().sort("created_at", -1).limit(3).to_list(3)
+                recent_conversations = await db.conversations.find(
+                    simulations.scope(simulation_id)
+                ).sort("created_at", -1).limit(3).to_list(3)
                 if recent_conversations:
                     previous_context += "PREVIOUS TEAM DISCUSSIONS:\n"
                     for conv in recent_conversations:
@@ -4725,7 +4832,9 @@ async def generate_conversation():
                     previous_context += "\n"
                 
                 # Get existing documents for context
-                existing_documents = await db.documents.find({"user_id": ""}).sort("updated_at", -1).limit(5).to_list(5)
+                existing_documents = await db.documents.find(
+                    simulations.scope(simulation_id, user_id="")
+                ).sort("updated_at", -1).limit(5).to_list(5)
                 if existing_documents:
                     previous_context += "EXISTING TEAM DOCUMENTS:\n"
                     for doc in existing_documents:
@@ -4777,6 +4886,7 @@ async def generate_conversation():
                 conversation_history=[{"agent_name": msg.agent_name, "message": msg.message} for msg in messages],
                 turn_number=i
             )
+            monitor.record_llm_fallback("agent_turn")
             print(f"🔄 Using smart fallback for {agent.name}: {message_text[:100]}...")
         
         # Determine mood based on agent archetype and message content
@@ -4802,25 +4912,33 @@ async def generate_conversation():
         )
         messages.append(message)
     
-    # Get conversation count for round numbering
-    conversation_count = await db.conversations.count_documents({})
-    
     # Create conversation round  
     conversation_round = ConversationRound(
-        round_number=conversation_count + 1,
+        round_number=0,
         time_period="Day 1 - morning",
         scenario=scenario,
         scenario_name=scenario_name,
         messages=messages,
-        user_id=""  # Empty for global simulation conversations (until auth is fixed)
+        user_id=state.get("user_id", ""),
+        simulation_id=simulation_id
     )
     
-    # Save conversation
-    await db.conversations.insert_one(conversation_round.dict())
+    # Save conversation (numbered by the simulation's actor)
+    await commit_round(simulation_id, conversation_round)
+    await change_versions.bump("conversations", scope=simulation_id)
+    
+    # Start synthesizing narration now so playback doesn't wait on TTS (opt-in)
+    narration_prefetcher.enqueue_round(conversation_round.messages, language_code)
     
-    # AUTO-GENERATE HELPFUL DOCUMENTS based on conversation content
+    # AUTO-GENERATE HELPFUL DOCUMENTS based on conversation content (durable background job, keyed by round)
     try:
-        await auto_generate_documents_from_conversation(conversation_round, agent_objects, scenario, scenario_name, llm_manager)
+        await job_queue.submit("auto_documents", {
+            "simulation_id": simulation_id,
+            "conversation_id": conversation_round.id,
+            "agent_ids": [agent.id for agent in agent_objects],
+            "scenario": scenario,
+            "scenario_name": scenario_name
+        }, idempotency_key=conversation_round.id, user_id=state.get("user_id", ""))
     except Exception as e:
         print(f"Document auto-generation failed: {e}")
         # Don't let document generation failure break conversation generation
@@ -4953,10 +5071,6 @@ async def generate_conversation():
                 current_context += f"- {prev_msg.agent_name}: {prev_msg.message}\n"
             current_context += f"\nRespond naturally as {agent.name}. Don't always ask questions - sometimes just state your opinion or make a decision."
         
-        # Add small delay between requests to avoid rate limiting
-        if i > 0:
-            await asyncio.sleep(3)  # 3 second delay between agents
-        
         response = await llm_manager.generate_agent_response(
             agent, scenario, agent_objects, current_context, recent_conversations, language_instruction, existing_documents, state
         )
@@ -4983,9 +5097,10 @@ async def generate_conversation():
     )
     
     await db.conversations.insert_one(conversation_round.dict())
+    await change_versions.bump("conversations")
     
     # Update agent relationships based on interactions
-    await update_relationships(agent_objects, messages)
+    await update_relationships(agent_objects, messages, state["id"])
     
     # ENHANCED: Action-Oriented Behavior - Analyze for document creation triggers
     try:
@@ -5065,6 +5180,7 @@ async def generate_conversation():
                 
                 # Save document to database
                 await db.documents.insert_one(document.dict())
+                await change_versions.bump("documents")
                 
                 # Add voting results and document creation notification to conversation round
                 voting_summary = f"Team Vote: {voting_results['summary']}"
@@ -5082,6 +5198,7 @@ async def generate_conversation():
                     {"id": conversation_round.id},
                     {"$set": {"messages": [msg.dict() for msg in conversation_round.messages]}}
                 )
+                await change_versions.bump("conversations")
                 
                 logging.info(f"Document created successfully with team approval: {document.id}")
             else:
@@ -5101,6 +5218,7 @@ async def generate_conversation():
                     {"id": conversation_round.id},
                     {"$set": {"messages": [msg.dict() for msg in conversation_round.messages]}}
                 )
+                await change_versions.bump("conversations")
             
     except Exception as e:
         logging.error(f"Error in action-oriented document creation: {e}")
@@ -5110,217 +5228,249 @@ async def generate_conversation():
     return conversation_round
 
 @api_router.get("/conversations")
-async def get_conversations():
+async def get_conversations(request: Request, response: Response, state: dict = Depends(current_simulation)):
     """Get conversation rounds for the simulation"""
-    # Get global simulation conversations (until auth is fixed)
-    conversations = await db.conversations.find({
-        "user_id": ""  # Global simulation conversations
-    }).sort("created_at", 1).to_list(1000)
+    not_modified = await conditional_response(request, response, ["conversations"], scope=state["id"])
+    if not_modified:
+        return not_modified
+    
+    conversations = await db.conversations.find(simulations.scope(state["id"])).sort("created_at", 1).to_list(1000)
     
     # Convert to response format, handling any missing fields
     conversation_rounds = []
     for conv in conversations:
         try:
-            # Ensure all required fields exist with defaults
-            conv_data = {
-                "id": conv.get("id", str(uuid.uuid4())),
-                "round_number": conv.get("round_number", 1),
-                "time_period": conv.get("time_period", "morning"),
-                "scenario": conv.get("scenario", ""),
-                "scenario_name": conv.get("scenario_name", ""),
-                "messages": conv.get("messages", []),
-                "user_id": conv.get("user_id", ""),
-                "created_at": conv.get("created_at", datetime.utcnow()),
-                "language": conv.get("language", "en"),
-                "original_language": conv.get("original_language"),
-                "translated_at": conv.get("translated_at"),
-                "force_translated": conv.get("force_translated", False)
-            }
-            conversation_rounds.append(conv_data)
+            conversation_rounds.append(conversation_view(conv))
         except Exception as e:
             logging.warning(f"Skipping malformed conversation: {e}")
             continue
     
     return conversation_rounds
 
+def conversation_view(conv: dict) -> dict:
+    """Conversation round in response format, with defaults for missing fields"""
+    return {
+        "id": conv.get("id", str(uuid.uuid4())),
+        "round_number": conv.get("round_number", 1),
+        "time_period": conv.get("time_period", "morning"),
+        "scenario": conv.get("scenario", ""),
+        "scenario_name": conv.get("scenario_name", ""),
+        "messages": conv.get("messages", []),
+        "user_id": conv.get("user_id", ""),
+        "created_at": conv.get("created_at", datetime.utcnow()),
+        "language": conv.get("language", "en"),
+        "original_language": conv.get("original_language"),
+        "translated_at": conv.get("translated_at"),
+        "force_translated": conv.get("force_translated", False)
+    }
+
 @api_router.get("/relationships")
-async def get_relationships():
+async def get_relationships(request: Request, response: Response, state: dict = Depends(current_simulation)):
     """Get all agent relationships"""
-    relationships = await db.relationships.find().to_list(1000)
+    not_modified = await conditional_response(request, response, ["relationships"], scope=state["id"])
+    if not_modified:
+        return not_modified
+    
+    relationships = await db.relationships.find(simulations.scope(state["id"])).to_list(1000)
     
     # Convert MongoDB documents to JSON-serializable format
     processed_relationships = []
     for rel in relationships:
-        rel_dict = {
-            "id": rel.get("id", str(rel.get("_id", ""))),
-            "agent1_id": rel.get("agent1_id", ""),
-            "agent2_id": rel.get("agent2_id", ""),
-            "score": rel.get("score", 0),
-            "status": rel.get("status", "neutral"),
-            "updated_at": rel.get("updated_at").isoformat() if rel.get("updated_at") else ""
-        }
-        processed_relationships.append(rel_dict)
+        processed_relationships.append(relationship_view(rel))
     
     return processed_relationships
 
+def relationship_view(rel: dict) -> dict:
+    """JSON-serializable relationship, as returned by /relationships and pushed to clients"""
+    return {
+        "id": rel.get("id", str(rel.get("_id", ""))),
+        "agent1_id": rel.get("agent1_id", ""),
+        "agent2_id": rel.get("agent2_id", ""),
+        "score": rel.get("score", 0),
+        "status": rel.get("status", "neutral"),
+        "updated_at": rel.get("updated_at").isoformat() if rel.get("updated_at") else ""
+    }
+
+async def run_library_avatars(job: JobContext):
+    """Generate avatars for all agents in the library, checkpointing after each one"""
+    # Define all library agents with their prompts
+    library_agents = []
+
+    # Healthcare agents
+    healthcare_agents = [
+        {"name": "Dr. Sarah Chen", "prompt": "Professional headshot of Dr. Sarah Chen, Asian American woman, precision medicine oncologist, wearing professional medical attire, confident expression, medical research facility background"},
+        {"name": "Dr. Marcus Rodriguez", "prompt": "Professional headshot of Dr. Marcus Rodriguez, Hispanic man, emergency medicine physician, wearing professional medical attire, leadership expression, hospital emergency department background"},
+        {"name": "Dr. Katherine Vale", "prompt": "Professional headshot of Dr. Katherine Vale, Caucasian woman, family medicine physician, wearing professional medical attire, caring expression, family practice clinic background"},
+        {"name": "Dr. Ahmed Hassan", "prompt": "Professional headshot of Dr. Ahmed Hassan, Middle Eastern man, internal medicine specialist, wearing professional medical attire, thoughtful expression, medical office background"},
+        {"name": "Dr. Elena Petrov", "prompt": "Professional headshot of Dr. Elena Petrov, Eastern European woman, clinical pharmacologist, wearing professional attire with lab coat, scientific expression, pharmaceutical research lab background"},
+        {"name": "Dr. James Park", "prompt": "Professional headshot of Dr. James Park, Korean American man, drug safety specialist, wearing professional attire, analytical expression, pharmaceutical safety office background"},
+        {"name": "Dr. Maria Santos", "prompt": "Professional headshot of Dr. Maria Santos, Hispanic woman, pharmaceutical research director, wearing executive business attire, leadership expression, pharmaceutical company office background"},
+        {"name": "Dr. Lisa Wang", "prompt": "Professional headshot of Dr. Lisa Wang, Asian American woman, gene therapy researcher, wearing lab coat and safety equipment, innovative expression, gene therapy laboratory background"},
+        {"name": "Dr. Robert Kim", "prompt": "Professional headshot of Dr. Robert Kim, Korean American man, bioengineering specialist, wearing professional lab attire, scientific expression, bioengineering research facility background"},
+        {"name": "Dr. Jennifer Thompson", "prompt": "Professional headshot of Dr. Jennifer Thompson, Caucasian woman, synthetic biology expert, wearing modern lab attire, optimistic expression, synthetic biology laboratory background"},
+        {"name": "Maria Rodriguez, RN", "prompt": "Professional headshot of Maria Rodriguez, Hispanic woman, critical care nurse, wearing nursing scrubs with professional overlay, adventurous expression, modern ICU background"},
+        {"name": "David Chen, RN", "prompt": "Professional headshot of David Chen, Asian American man, nurse manager, wearing professional nursing attire, diplomatic expression, hospital management office background"},
+        {"name": "Susan Williams, RN", "prompt": "Professional headshot of Susan Williams, Caucasian woman, pediatric nurse, wearing colorful pediatric nursing attire, warm optimistic expression, children's hospital background"},
+        {"name": "Dr. Michael Johnson", "prompt": "Professional headshot of Dr. Michael Johnson, African American man, epidemiologist, wearing professional public health attire, leadership expression, CDC operations center background"},
+        {"name": "Dr. Patricia Lee", "prompt": "Professional headshot of Dr. Patricia Lee, Asian American woman, environmental health specialist, wearing professional attire with field equipment, scientific expression, environmental monitoring station background"},
+        {"name": "Dr. James Wilson", "prompt": "Professional headshot of Dr. James Wilson, Caucasian man, community health director, wearing professional public health attire, optimistic expression, community health center background"},
+        {"name": "Dr. Rachel Green", "prompt": "Professional headshot of Dr. Rachel Green, Caucasian woman, clinical nutritionist, wearing professional medical attire, scientific expression, clinical nutrition laboratory background"},
+        {"name": "Maria Gonzalez, RD", "prompt": "Professional headshot of Maria Gonzalez, Hispanic woman, pediatric dietitian, wearing professional healthcare attire, caring expression, pediatric nutrition clinic background"},
+        {"name": "Dr. Kevin Brown", "prompt": "Professional headshot of Dr. Kevin Brown, African American man, sports physical therapist, wearing professional therapy attire, adventurous expression, sports medicine facility background"},
+        {"name": "Dr. Lisa Anderson", "prompt": "Professional headshot of Dr. Lisa Anderson, Caucasian woman, neurologic physical therapist, wearing professional therapy attire, optimistic expression, rehabilitation center background"},
+        {"name": "Dr. Emily Carter", "prompt": "Professional headshot of Dr. Emily Carter, Caucasian woman, small animal veterinarian, wearing veterinary attire, compassionate expression, veterinary clinic background"},
+        {"name": "Dr. Mark Davis", "prompt": "Professional headshot of Dr. Mark Davis, Caucasian man, wildlife veterinarian, wearing field veterinary gear, adventurous expression, wildlife conservation background"},
+        {"name": "Dr. Amanda Foster", "prompt": "Professional headshot of Dr. Amanda Foster, Caucasian woman, clinical research coordinator, wearing professional research attire, scientific expression, clinical trials center background"},
+        {"name": "Dr. Thomas Mitchell", "prompt": "Professional headshot of Dr. Thomas Mitchell, Caucasian man, biostatistician, wearing professional academic attire, analytical expression, statistical research office background"},
+        {"name": "Dr. Jennifer Walsh", "prompt": "Professional headshot of Dr. Jennifer Walsh, Caucasian woman, infectious disease epidemiologist, wearing professional public health attire, leadership expression, global health organization background"},
+        {"name": "Dr. Carlos Mendez", "prompt": "Professional headshot of Dr. Carlos Mendez, Hispanic man, chronic disease epidemiologist, wearing professional research attire, scientific expression, epidemiology research center background"}
+    ]
+
+    # Finance agents  
+    finance_agents = [
+        {"name": "Marcus Goldman", "prompt": "Professional headshot of Marcus Goldman, Caucasian man, investment banking managing director, wearing executive business suit, leadership expression, Wall Street office background"},
+        {"name": "Sarah Chen", "prompt": "Professional headshot of Sarah Chen, Asian American woman, equity research director, wearing professional business attire, analytical expression, financial research office background"},
+        {"name": "David Park", "prompt": "Professional headshot of David Park, Korean American man, capital markets VP, wearing modern business attire, innovative expression, trading floor background"},
+        {"name": "Jennifer Liu", "prompt": "Professional headshot of Jennifer Liu, Asian American woman, venture capital general partner, wearing contemporary business attire, adventurous expression, Silicon Valley office background"},
+        {"name": "Michael Torres", "prompt": "Professional headshot of Michael Torres, Hispanic man, early stage VC principal, wearing modern business casual, optimistic expression, startup accelerator background"},
+        {"name": "Robert Sterling", "prompt": "Professional headshot of Robert Sterling, Caucasian man, private equity managing partner, wearing executive business suit, leadership expression, private equity office background"},
+        {"name": "Amanda Foster", "prompt": "Professional headshot of Amanda Foster, Caucasian woman, private equity VP, wearing professional business attire, analytical expression, financial analysis office background"},
+        {"name": "Patricia Williams", "prompt": "Professional headshot of Patricia Williams, African American woman, chief underwriting officer, wearing executive business attire, diplomatic expression, insurance company headquarters background"},
+        {"name": "Carlos Rodriguez", "prompt": "Professional headshot of Carlos Rodriguez, Hispanic man, fraud investigation director, wearing professional investigative attire, skeptical expression, insurance investigation office background"},
+        {"name": "Helen Chang", "prompt": "Professional headshot of Helen Chang, Asian American woman, accounting partner, wearing professional business attire, scientific expression, Big Four accounting firm background"},
+        {"name": "James Mitchell", "prompt": "Professional headshot of James Mitchell, Caucasian man, corporate controller, wearing business attire, diplomatic expression, corporate finance office background"},
+        {"name": "Diana Thompson", "prompt": "Professional headshot of Diana Thompson, Caucasian woman, audit partner, wearing professional business attire, skeptical expression, audit firm office background"},
+        {"name": "Kevin Brown", "prompt": "Professional headshot of Kevin Brown, African American man, IT audit director, wearing professional tech attire, scientific expression, IT audit center background"},
+        {"name": "Rebecca Martinez", "prompt": "Professional headshot of Rebecca Martinez, Hispanic woman, international tax director, wearing professional business attire, scientific expression, international tax office background"},
+        {"name": "Thomas Anderson", "prompt": "Professional headshot of Thomas Anderson, Caucasian man, tax controversy manager, wearing professional legal attire, diplomatic expression, tax law office background"},
+        {"name": "Victoria Sterling", "prompt": "Professional headshot of Victoria Sterling, Caucasian woman, real estate investment director, wearing executive business attire, leadership expression, real estate investment office background"},
+        {"name": "Daniel Kim", "prompt": "Professional headshot of Daniel Kim, Korean American man, real estate development manager, wearing modern business attire, adventurous expression, development project site background"},
+        {"name": "Margaret Davis", "prompt": "Professional headshot of Margaret Davis, Caucasian woman, chief credit officer, wearing executive banking attire, diplomatic expression, bank headquarters background"},
+        {"name": "Steven Wilson", "prompt": "Professional headshot of Steven Wilson, Caucasian man, digital banking VP, wearing modern tech business attire, optimistic expression, fintech office background"},
+        {"name": "Alexander Cross", "prompt": "Professional headshot of Alexander Cross, Caucasian man, proprietary trading head, wearing sharp business attire, adventurous expression, trading floor background"},
+        {"name": "Jennifer Liu", "prompt": "Professional headshot of Jennifer Liu, Asian American woman, quantitative researcher, wearing professional tech attire, scientific expression, quantitative research lab background"},
+        {"name": "Catherine Moore", "prompt": "Professional headshot of Catherine Moore, Caucasian woman, chief risk officer, wearing executive business attire, skeptical expression, risk management center background"},
+        {"name": "Ryan Foster", "prompt": "Professional headshot of Ryan Foster, Caucasian man, model risk management VP, wearing professional analytical attire, scientific expression, risk modeling office background"},
+        {"name": "Linda Johnson", "prompt": "Professional headshot of Linda Johnson, African American woman, chief actuary, wearing professional business attire, scientific expression, actuarial office background"},
+        {"name": "Mark Thompson", "prompt": "Professional headshot of Mark Thompson, Caucasian man, P&C actuary, wearing professional analytical attire, skeptical expression, actuarial modeling center background"}
+    ]
+
+    # Technology agents
+    technology_agents = [
+        {"name": "Dr. Aisha Muhammad", "prompt": "Professional headshot of Dr. Aisha Muhammad, African American woman, AI researcher, wearing professional attire, confident expression, tech office background"},
+        {"name": "Marcus Chen", "prompt": "Professional headshot of Marcus Chen, Asian American man, software engineer, wearing casual tech attire, friendly expression, modern office background"},
+        {"name": "Emily Rodriguez", "prompt": "Professional headshot of Emily Rodriguez, Hispanic woman, product manager, wearing business attire, approachable expression, collaborative workspace background"},
+        {"name": "Dr. Kevin Park", "prompt": "Professional headshot of Dr. Kevin Park, Korean American man, data scientist, wearing glasses and casual attire, thoughtful expression, data visualization background"},
+        {"name": "Dr. Samira Hassan", "prompt": "Professional headshot of Dr. Samira Hassan, Middle Eastern woman, data science director, wearing professional attire, warm smile, modern analytics office background"},
+        {"name": "Robert Kim", "prompt": "Professional headshot of Robert Kim, Korean American man, model validation specialist, wearing business attire, serious expression, analytical workspace background"},
+        {"name": "Roberto Silva", "prompt": "Professional headshot of Roberto Silva, Hispanic man, cybersecurity analyst, wearing dark professional attire, intense focused expression, security operations center background"},
+        {"name": "Catherine Williams", "prompt": "Professional headshot of Catherine Williams, African American woman, CISO, wearing executive business attire, confident leadership expression, corporate boardroom background"},
+        {"name": "Dr. Lisa Chen", "prompt": "Professional headshot of Dr. Lisa Chen, Asian American woman, cryptography researcher, wearing professional attire with subtle tech accessories, thoughtful expression, research laboratory background"},
+        {"name": "Dr. Yuki Tanaka", "prompt": "Professional headshot of Dr. Yuki Tanaka, Japanese man, ML researcher, wearing casual academic attire, intelligent expression, university research lab background"},
+        {"name": "Jennifer Walsh", "prompt": "Professional headshot of Jennifer Walsh, Caucasian woman, AI product director, wearing modern business attire, enthusiastic expression, innovative tech workspace background"},
+        {"name": "Dr. Ahmed Hassan", "prompt": "Professional headshot of Dr. Ahmed Hassan, Middle Eastern man, AI safety researcher, wearing professional attire, serious analytical expression, AI research facility background"},
+        {"name": "Maria Santos", "prompt": "Professional headshot of Maria Santos, Hispanic woman, DevOps manager, wearing casual tech attire, collaborative expression, modern development office background"},
+        {"name": "David Kim", "prompt": "Professional headshot of David Kim, Korean American man, platform engineer, wearing modern casual attire, innovative expression, cutting-edge tech lab background"},
+        {"name": "Dr. Rachel Anderson", "prompt": "Professional headshot of Dr. Rachel Anderson, Caucasian woman, SRE, wearing professional casual attire, focused expression, monitoring dashboard background"},
+        {"name": "Thomas Wright", "prompt": "Professional headshot of Thomas Wright, Caucasian man, cloud architect, wearing executive business attire, strategic expression, modern cloud operations center background"},
+        {"name": "Dr. Lisa Park", "prompt": "Professional headshot of Dr. Lisa Park, Korean American woman, cloud engineer, wearing technical professional attire, analytical expression, cloud infrastructure visualization background"},
+        {"name": "Hassan Al-Mahmoud", "prompt": "Professional headshot of Hassan Al-Mahmoud, Middle Eastern man, cloud consultant, wearing business attire, diplomatic expression, international business meeting background"},
+        {"name": "Dr. Satoshi Nakamura", "prompt": "Professional headshot of Dr. Satoshi Nakamura, Japanese man, blockchain researcher, wearing modern academic attire, innovative expression, blockchain research lab background"},
+        {"name": "Victoria Chen", "prompt": "Professional headshot of Victoria Chen, Asian American woman, DeFi product manager, wearing modern business attire, optimistic expression, fintech startup office background"},
+        {"name": "Marcus Johnson", "prompt": "Professional headshot of Marcus Johnson, African American man, blockchain analyst, wearing conservative business attire, analytical expression, corporate consulting office background"},
+        {"name": "Dr. Maria Rodriguez", "prompt": "Professional headshot of Dr. Maria Rodriguez, Hispanic woman, civil engineer, wearing professional engineering attire with hard hat nearby, confident leadership expression, construction site background"},
+        {"name": "James Wilson", "prompt": "Professional headshot of James Wilson, Caucasian man, construction engineer, wearing rugged outdoor engineering gear, adventurous expression, extreme construction environment background"},
+        {"name": "Dr. Emily Foster", "prompt": "Professional headshot of Dr. Emily Foster, Caucasian woman, infrastructure researcher, wearing modern professional attire with tech elements, scientific expression, smart city lab background"},
+        {"name": "Dr. Robert Kim", "prompt": "Professional headshot of Dr. Robert Kim, Korean American man, manufacturing engineer, wearing technical professional attire, precise expression, advanced robotics facility background"},
+        {"name": "Jennifer Walsh", "prompt": "Professional headshot of Jennifer Walsh, Caucasian woman, biomedical engineer, wearing modern professional attire, compassionate expression, medical device laboratory background"},
+        {"name": "Hassan Al-Mahmoud", "prompt": "Professional headshot of Hassan Al-Mahmoud, Middle Eastern man, energy engineer, wearing professional engineering attire, diplomatic expression, renewable energy facility background"},
+        {"name": "Dr. Lisa Chen", "prompt": "Professional headshot of Dr. Lisa Chen, Asian American woman, power systems engineer, wearing professional engineering attire, intelligent expression, power grid control center background"},
+        {"name": "Marcus Johnson", "prompt": "Professional headshot of Marcus Johnson, African American man, semiconductor engineer, wearing modern tech attire, innovative expression, advanced semiconductor fabrication facility background"},
+        {"name": "Dr. Patricia Foster", "prompt": "Professional headshot of Dr. Patricia Foster, Caucasian woman, instrumentation engineer, wearing lab coat with precision equipment, focused expression, quantum measurement laboratory background"},
+        {"name": "Dr. Sarah Mitchell", "prompt": "Professional headshot of Dr. Sarah Mitchell, Caucasian woman, chemical engineer, wearing lab coat with safety equipment, sustainable expression, green chemistry laboratory background"},
+        {"name": "Dr. Ahmed Hassan", "prompt": "Professional headshot of Dr. Ahmed Hassan, Middle Eastern man, process safety engineer, wearing safety gear and professional attire, serious safety-focused expression, chemical plant safety control room background"},
+        {"name": "Dr. Elena Rodriguez", "prompt": "Professional headshot of Dr. Elena Rodriguez, Hispanic woman, pharmaceutical engineer, wearing clean room attire, optimistic expression, pharmaceutical manufacturing facility background"},
+        {"name": "Dr. Marcus Johnson", "prompt": "Professional headshot of Dr. Marcus Johnson, African American man, aerospace engineer, wearing flight suit with space patches, adventurous expression, rocket engine test facility background"},
+        {"name": "Dr. Catherine Williams", "prompt": "Professional headshot of Dr. Catherine Williams, African American woman, aerospace director, wearing executive aviation attire, leadership expression, electric aircraft hangar background"},
+        {"name": "Dr. Yuki Tanaka", "prompt": "Professional headshot of Dr. Yuki Tanaka, Japanese man, materials scientist, wearing lab coat with technical equipment, contemplative expression, advanced materials laboratory background"},
+        {"name": "Dr. Jennifer Walsh", "prompt": "Professional headshot of Dr. Jennifer Walsh, Caucasian woman, neural engineer, wearing medical professional attire, hopeful expression, neurotechnology laboratory background"},
+        {"name": "Dr. Anna Petrov", "prompt": "Professional headshot of Dr. Anna Petrov, Eastern European woman, nanomedicine researcher, wearing clean room attire, focused expression, nanotechnology research facility background"},
+        {"name": "Dr. Carlos Rivera", "prompt": "Professional headshot of Dr. Carlos Rivera, Hispanic man, clinical engineer, wearing medical professional attire, collaborative expression, hospital technology center background"}
+    ]
+
+    # Combine all agents
+    library_agents = healthcare_agents + finance_agents + technology_agents
+
+    # Resume after the last agent a previous attempt finished
+    generated_count = job.checkpoint.get("generated_count", 0)
+    errors = job.checkpoint.get("errors", [])
+    avatar_urls = job.checkpoint.get("avatar_urls", {})
+    next_index = job.checkpoint.get("next", 0)
+
+    for index, agent in enumerate(library_agents):
+        if index < next_index:
+            if str(index) in avatar_urls:
+                agent["avatar_url"] = avatar_urls[str(index)]
+            continue
+    
+        try:
+            # Enhanced prompt for better avatar results
+            enhanced_prompt = f"professional portrait, headshot, detailed face, {agent['prompt']}, high quality, photorealistic, studio lighting, neutral background"
+        
+            # Submit to fal.ai using the Flux Schnell model
+            import fal_client
+            handler = await fal_client.submit_async(
+                "fal-ai/flux/schnell",
+                arguments={
+                    "prompt": enhanced_prompt,
+                    "image_size": "portrait_4_3",
+                    "num_images": 1,
+                    "enable_safety_checker": True
+                }
+            )
+        
+            # Get the result
+            result = await handler.get()
+        
+            if result and result.get("images") and len(result["images"]) > 0:
+                avatar_url = result["images"][0]["url"]
+                agent["avatar_url"] = avatar_url
+                avatar_urls[str(index)] = avatar_url
+                generated_count += 1
+                logging.info(f"Avatar generated for {agent['name']}: {avatar_url}")
+            else:
+                errors.append(f"Failed to generate avatar for {agent['name']}: No image returned")
+            
+        except Exception as e:
+            errors.append(f"Error generating avatar for {agent['name']}: {str(e)}")
+            logging.error(f"Avatar generation error for {agent['name']}: {str(e)}")
+    
+        await job.progress(index + 1, len(library_agents), agent["name"], checkpoint={
+            "next": index + 1, "generated_count": generated_count, "errors": errors, "avatar_urls": avatar_urls
+        })
+
+    return {
+        "success": True,
+        "generated_count": generated_count,
+        "total_agents": len(library_agents),
+        "errors": errors,
+        "agents": library_agents
+    }
+
 @api_router.post("/avatars/generate-library", response_model=dict)
 async def generate_library_avatars():
     """Generate avatars for all agents in the library that don't have them"""
     try:
-        # Define all library agents with their prompts
-        library_agents = []
-        
-        # Healthcare agents
-        healthcare_agents = [
-            {"name": "Dr. Sarah Chen", "prompt": "Professional headshot of Dr. Sarah Chen, Asian American woman, precision medicine oncologist, wearing professional medical attire, confident expression, medical research facility background"},
-            {"name": "Dr. Marcus Rodriguez", "prompt": "Professional headshot of Dr. Marcus Rodriguez, Hispanic man, emergency medicine physician, wearing professional medical attire, leadership expression, hospital emergency department background"},
-            {"name": "Dr. Katherine Vale", "prompt": "Professional headshot of Dr. Katherine Vale, Caucasian woman, family medicine physician, wearing professional medical attire, caring expression, family practice clinic background"},
-            {"name": "Dr. Ahmed Hassan", "prompt": "Professional headshot of Dr. Ahmed Hassan, Middle Eastern man, internal medicine specialist, wearing professional medical attire, thoughtful expression, medical office background"},
-            {"name": "Dr. Elena Petrov", "prompt": "Professional headshot of Dr. Elena Petrov, Eastern European woman, clinical pharmacologist, wearing professional attire with lab coat, scientific expression, pharmaceutical research lab background"},
-            {"name": "Dr. James Park", "prompt": "Professional headshot of Dr. James Park, Korean American man, drug safety specialist, wearing professional attire, analytical expression, pharmaceutical safety office background"},
-            {"name": "Dr. Maria Santos", "prompt": "Professional headshot of Dr. Maria Santos, Hispanic woman, pharmaceutical research director, wearing executive business attire, leadership expression, pharmaceutical company office background"},
-            {"name": "Dr. Lisa Wang", "prompt": "Professional headshot of Dr. Lisa Wang, Asian American woman, gene therapy researcher, wearing lab coat and safety equipment, innovative expression, gene therapy laboratory background"},
-            {"name": "Dr. Robert Kim", "prompt": "Professional headshot of Dr. Robert Kim, Korean American man, bioengineering specialist, wearing professional lab attire, scientific expression, bioengineering research facility background"},
-            {"name": "Dr. Jennifer Thompson", "prompt": "Professional headshot of Dr. Jennifer Thompson, Caucasian woman, synthetic biology expert, wearing modern lab attire, optimistic expression, synthetic biology laboratory background"},
-            {"name": "Maria Rodriguez, RN", "prompt": "Professional headshot of Maria Rodriguez, Hispanic woman, critical care nurse, wearing nursing scrubs with professional overlay, adventurous expression, modern ICU background"},
-            {"name": "David Chen, RN", "prompt": "Professional headshot of David Chen, Asian American man, nurse manager, wearing professional nursing attire, diplomatic expression, hospital management office background"},
-            {"name": "Susan Williams, RN", "prompt": "Professional headshot of Susan Williams, Caucasian woman, pediatric nurse, wearing colorful pediatric nursing attire, warm optimistic expression, children's hospital background"},
-            {"name": "Dr. Michael Johnson", "prompt": "Professional headshot of Dr. Michael Johnson, African American man, epidemiologist, wearing professional public health attire, leadership expression, CDC operations center background"},
-            {"name": "Dr. Patricia Lee", "prompt": "Professional headshot of Dr. Patricia Lee, Asian American woman, environmental health specialist, wearing professional attire with field equipment, scientific expression, environmental monitoring station background"},
-            {"name": "Dr. James Wilson", "prompt": "Professional headshot of Dr. James Wilson, Caucasian man, community health director, wearing professional public health attire, optimistic expression, community health center background"},
-            {"name": "Dr. Rachel Green", "prompt": "Professional headshot of Dr. Rachel Green, Caucasian woman, clinical nutritionist, wearing professional medical attire, scientific expression, clinical nutrition laboratory background"},
-            {"name": "Maria Gonzalez, RD", "prompt": "Professional headshot of Maria Gonzalez, Hispanic woman, pediatric dietitian, wearing professional healthcare attire, caring expression, pediatric nutrition clinic background"},
-            {"name": "Dr. Kevin Brown", "prompt": "Professional headshot of Dr. Kevin Brown, African American man, sports physical therapist, wearing professional therapy attire, adventurous expression, sports medicine facility background"},
-            {"name": "Dr. Lisa Anderson", "prompt": "Professional headshot of Dr. Lisa Anderson, Caucasian woman, neurologic physical therapist, wearing professional therapy attire, optimistic expression, rehabilitation center background"},
-            {"name": "Dr. Emily Carter", "prompt": "Professional headshot of Dr. Emily Carter, Caucasian woman, small animal veterinarian, wearing veterinary attire, compassionate expression, veterinary clinic background"},
-            {"name": "Dr. Mark Davis", "prompt": "Professional headshot of Dr. Mark Davis, Caucasian man, wildlife veterinarian, wearing field veterinary gear, adventurous expression, wildlife conservation background"},
-            {"name": "Dr. Amanda Foster", "prompt": "Professional headshot of Dr. Amanda Foster, Caucasian woman, clinical research coordinator, wearing professional research attire, scientific expression, clinical trials center background"},
-            {"name": "Dr. Thomas Mitchell", "prompt": "Professional headshot of Dr. Thomas Mitchell, Caucasian man, biostatistician, wearing professional academic attire, analytical expression, statistical research office background"},
-            {"name": "Dr. Jennifer Walsh", "prompt": "Professional headshot of Dr. Jennifer Walsh, Caucasian woman, infectious disease epidemiologist, wearing professional public health attire, leadership expression, global health organization background"},
-            {"name": "Dr. Carlos Mendez", "prompt": "Professional headshot of Dr. Carlos Mendez, Hispanic man, chronic disease epidemiologist, wearing professional research attire, scientific expression, epidemiology research center background"}
-        ]
-        
-        # Finance agents  
-        finance_agents = [
-            {"name": "Marcus Goldman", "prompt": "Professional headshot of Marcus Goldman, Caucasian man, investment banking managing director, wearing executive business suit, leadership expression, Wall Street office background"},
-            {"name": "Sarah Chen", "prompt": "Professional headshot of Sarah Chen, Asian American woman, equity research director, wearing professional business attire, analytical expression, financial research office background"},
-            {"name": "David Park", "prompt": "Professional headshot of David Park, Korean American man, capital markets VP, wearing modern business attire, innovative expression, trading floor background"},
-            {"name": "Jennifer Liu", "prompt": "Professional headshot of Jennifer Liu, Asian American woman, venture capital general partner, wearing contemporary business attire, adventurous expression, Silicon Valley office background"},
-            {"name": "Michael Torres", "prompt": "Professional headshot of Michael Torres, Hispanic man, early stage VC principal, wearing modern business casual, optimistic expression, startup accelerator background"},
-            {"name": "Robert Sterling", "prompt": "Professional headshot of Robert Sterling, Caucasian man, private equity managing partner, wearing executive business suit, leadership expression, private equity office background"},
-            {"name": "Amanda Foster", "prompt": "Professional headshot of Amanda Foster, Caucasian woman, private equity VP, wearing professional business attire, analytical expression, financial analysis office background"},
-            {"name": "Patricia Williams", "prompt": "Professional headshot of Patricia Williams, African American woman, chief underwriting officer, wearing executive business attire, diplomatic expression, insurance company headquarters background"},
-            {"name": "Carlos Rodriguez", "prompt": "Professional headshot of Carlos Rodriguez, Hispanic man, fraud investigation director, wearing professional investigative attire, skeptical expression, insurance investigation office background"},
-            {"name": "Helen Chang", "prompt": "Professional headshot of Helen Chang, Asian American woman, accounting partner, wearing professional business attire, scientific expression, Big Four accounting firm background"},
-            {"name": "James Mitchell", "prompt": "Professional headshot of James Mitchell, Caucasian man, corporate controller, wearing business attire, diplomatic expression, corporate finance office background"},
-            {"name": "Diana Thompson", "prompt": "Professional headshot of Diana Thompson, Caucasian woman, audit partner, wearing professional business attire, skeptical expression, audit firm office background"},
-            {"name": "Kevin Brown", "prompt": "Professional headshot of Kevin Brown, African American man, IT audit director, wearing professional tech attire, scientific expression, IT audit center background"},
-            {"name": "Rebecca Martinez", "prompt": "Professional headshot of Rebecca Martinez, Hispanic woman, international tax director, wearing professional business attire, scientific expression, international tax office background"},
-            {"name": "Thomas Anderson", "prompt": "Professional headshot of Thomas Anderson, Caucasian man, tax controversy manager, wearing professional legal attire, diplomatic expression, tax law office background"},
-            {"name": "Victoria Sterling", "prompt": "Professional headshot of Victoria Sterling, Caucasian woman, real estate investment director, wearing executive business attire, leadership expression, real estate investment office background"},
-            {"name": "Daniel Kim", "prompt": "Professional headshot of Daniel Kim, Korean American man, real estate development manager, wearing modern business attire, adventurous expression, development project site background"},
-            {"name": "Margaret Davis", "prompt": "Professional headshot of Margaret Davis, Caucasian woman, chief credit officer, wearing executive banking attire, diplomatic expression, bank headquarters background"},
-            {"name": "Steven Wilson", "prompt": "Professional headshot of Steven Wilson, Caucasian man, digital banking VP, wearing modern tech business attire, optimistic expression, fintech office background"},
-            {"name": "Alexander Cross", "prompt": "Professional headshot of Alexander Cross, Caucasian man, proprietary trading head, wearing sharp business attire, adventurous expression, trading floor background"},
-            {"name": "Jennifer Liu", "prompt": "Professional headshot of Jennifer Liu, Asian American woman, quantitative researcher, wearing professional tech attire, scientific expression, quantitative research lab background"},
-            {"name": "Catherine Moore", "prompt": "Professional headshot of Catherine Moore, Caucasian woman, chief risk officer, wearing executive business attire, skeptical expression, risk management center background"},
-            {"name": "Ryan Foster", "prompt": "Professional headshot of Ryan Foster, Caucasian man, model risk management VP, wearing professional analytical attire, scientific expression, risk modeling office background"},
-            {"name": "Linda Johnson", "prompt": "Professional headshot of Linda Johnson, African American woman, chief actuary, wearing professional business attire, scientific expression, actuarial office background"},
-            {"name": "Mark Thompson", "prompt": "Professional headshot of Mark Thompson, Caucasian man, P&C actuary, wearing professional analytical attire, skeptical expression, actuarial modeling center background"}
-        ]
-        
-        # Technology agents
-        technology_agents = [
-            {"name": "Dr. Aisha Muhammad", "prompt": "Professional headshot of Dr. Aisha Muhammad, African American woman, AI researcher, wearing professional attire, confident expression, tech office background"},
-            {"name": "Marcus Chen", "prompt": "Professional headshot of Marcus Chen, Asian American man, software engineer, wearing casual tech attire, friendly expression, modern office background"},
-            {"name": "Emily Rodriguez", "prompt": "Professional headshot of Emily Rodriguez, Hispanic woman, product manager, wearing business attire, approachable expression, collaborative workspace background"},
-            {"name": "Dr. Kevin Park", "prompt": "Professional headshot of Dr. Kevin Park, Korean American man, data scientist, wearing glasses and casual attire, thoughtful expression, data visualization background"},
-            {"name": "Dr. Samira Hassan", "prompt": "Professional headshot of Dr. Samira Hassan, Middle Eastern woman, data science director, wearing professional attire, warm smile, modern analytics office background"},
-            {"name": "Robert Kim", "prompt": "Professional headshot of Robert Kim, Korean American man, model validation specialist, wearing business attire, serious expression, analytical workspace background"},
-            {"name": "Roberto Silva", "prompt": "Professional headshot of Roberto Silva, Hispanic man, cybersecurity analyst, wearing dark professional attire, intense focused expression, security operations center background"},
-            {"name": "Catherine Williams", "prompt": "Professional headshot of Catherine Williams, African American woman, CISO, wearing executive business attire, confident leadership expression, corporate boardroom background"},
-            {"name": "Dr. Lisa Chen", "prompt": "Professional headshot of Dr. Lisa Chen, Asian American woman, cryptography researcher, wearing professional attire with subtle tech accessories, thoughtful expression, research laboratory background"},
-            {"name": "Dr. Yuki Tanaka", "prompt": "Professional headshot of Dr. Yuki Tanaka, Japanese man, ML researcher, wearing casual academic attire, intelligent expression, university research lab background"},
-            {"name": "Jennifer Walsh", "prompt": "Professional headshot of Jennifer Walsh, Caucasian woman, AI product director, wearing modern business attire, enthusiastic expression, innovative tech workspace background"},
-            {"name": "Dr. Ahmed Hassan", "prompt": "Professional headshot of Dr. Ahmed Hassan, Middle Eastern man, AI safety researcher, wearing professional attire, serious analytical expression, AI research facility background"},
-            {"name": "Maria Santos", "prompt": "Professional headshot of Maria Santos, Hispanic woman, DevOps manager, wearing casual tech attire, collaborative expression, modern development office background"},
-            {"name": "David Kim", "prompt": "Professional headshot of David Kim, Korean American man, platform engineer, wearing modern casual attire, innovative expression, cutting-edge tech lab background"},
-            {"name": "Dr. Rachel Anderson", "prompt": "Professional headshot of Dr. Rachel Anderson, Caucasian woman, SRE, wearing professional casual attire, focused expression, monitoring dashboard background"},
-            {"name": "Thomas Wright", "prompt": "Professional headshot of Thomas Wright, Caucasian man, cloud architect, wearing executive business attire, strategic expression, modern cloud operations center background"},
-            {"name": "Dr. Lisa Park", "prompt": "Professional headshot of Dr. Lisa Park, Korean American woman, cloud engineer, wearing technical professional attire, analytical expression, cloud infrastructure visualization background"},
-            {"name": "Hassan Al-Mahmoud", "prompt": "Professional headshot of Hassan Al-Mahmoud, Middle Eastern man, cloud consultant, wearing business attire, diplomatic expression, international business meeting background"},
-            {"name": "Dr. Satoshi Nakamura", "prompt": "Professional headshot of Dr. Satoshi Nakamura, Japanese man, blockchain researcher, wearing modern academic attire, innovative expression, blockchain research lab background"},
-            {"name": "Victoria Chen", "prompt": "Professional headshot of Victoria Chen, Asian American woman, DeFi product manager, wearing modern business attire, optimistic expression, fintech startup office background"},
-            {"name": "Marcus Johnson", "prompt": "Professional headshot of Marcus Johnson, African American man, blockchain analyst, wearing conservative business attire, analytical expression, corporate consulting office background"},
-            {"name": "Dr. Maria Rodriguez", "prompt": "Professional headshot of Dr. Maria Rodriguez, Hispanic woman, civil engineer, wearing professional engineering attire with hard hat nearby, confident leadership expression, construction site background"},
-            {"name": "James Wilson", "prompt": "Professional headshot of James Wilson, Caucasian man, construction engineer, wearing rugged outdoor engineering gear, adventurous expression, extreme construction environment background"},
-            {"name": "Dr. Emily Foster", "prompt": "Professional headshot of Dr. Emily Foster, Caucasian woman, infrastructure researcher, wearing modern professional attire with tech elements, scientific expression, smart city lab background"},
-            {"name": "Dr. Robert Kim", "prompt": "Professional headshot of Dr. Robert Kim, Korean American man, manufacturing engineer, wearing technical professional attire, precise expression, advanced robotics facility background"},
-            {"name": "Jennifer Walsh", "prompt": "Professional headshot of Jennifer Walsh, Caucasian woman, biomedical engineer, wearing modern professional attire, compassionate expression, medical device laboratory background"},
-            {"name": "Hassan Al-Mahmoud", "prompt": "Professional headshot of Hassan Al-Mahmoud, Middle Eastern man, energy engineer, wearing professional engineering attire, diplomatic expression, renewable energy facility background"},
-            {"name": "Dr. Lisa Chen", "prompt": "Professional headshot of Dr. Lisa Chen, Asian American woman, power systems engineer, wearing professional engineering attire, intelligent expression, power grid control center background"},
-            {"name": "Marcus Johnson", "prompt": "Professional headshot of Marcus Johnson, African American man, semiconductor engineer, wearing modern tech attire, innovative expression, advanced semiconductor fabrication facility background"},
-            {"name": "Dr. Patricia Foster", "prompt": "Professional headshot of Dr. Patricia Foster, Caucasian woman, instrumentation engineer, wearing lab coat with precision equipment, focused expression, quantum measurement laboratory background"},
-            {"name": "Dr. Sarah Mitchell", "prompt": "Professional headshot of Dr. Sarah Mitchell, Caucasian woman, chemical engineer, wearing lab coat with safety equipment, sustainable expression, green chemistry laboratory background"},
-            {"name": "Dr. Ahmed Hassan", "prompt": "Professional headshot of Dr. Ahmed Hassan, Middle Eastern man, process safety engineer, wearing safety gear and professional attire, serious safety-focused expression, chemical plant safety control room background"},
-            {"name": "Dr. Elena Rodriguez", "prompt": "Professional headshot of Dr. Elena Rodriguez, Hispanic woman, pharmaceutical engineer, wearing clean room attire, optimistic expression, pharmaceutical manufacturing facility background"},
-            {"name": "Dr. Marcus Johnson", "prompt": "Professional headshot of Dr. Marcus Johnson, African American man, aerospace engineer, wearing flight suit with space patches, adventurous expression, rocket engine test facility background"},
-            {"name": "Dr. Catherine Williams", "prompt": "Professional headshot of Dr. Catherine Williams, African American woman, aerospace director, wearing executive aviation attire, leadership expression, electric aircraft hangar background"},
-            {"name": "Dr. Yuki Tanaka", "prompt": "Professional headshot of Dr. Yuki Tanaka, Japanese man, materials scientist, wearing lab coat with technical equipment, contemplative expression, advanced materials laboratory background"},
-            {"name": "Dr. Jennifer Walsh", "prompt": "Professional headshot of Dr. Jennifer Walsh, Caucasian woman, neural engineer, wearing medical professional attire, hopeful expression, neurotechnology laboratory background"},
-            {"name": "Dr. Anna Petrov", "prompt": "Professional headshot of Dr. Anna Petrov, Eastern European woman, nanomedicine researcher, wearing clean room attire, focused expression, nanotechnology research facility background"},
-            {"name": "Dr. Carlos Rivera", "prompt": "Professional headshot of Dr. Carlos Rivera, Hispanic man, clinical engineer, wearing medical professional attire, collaborative expression, hospital technology center background"}
-        ]
-        
-        # Combine all agents
-        library_agents = healthcare_agents + finance_agents + technology_agents
-        
-        generated_count = 0
-        errors = []
-        
-        for agent in library_agents:
-            try:
-                # Enhanced prompt for better avatar results
-                enhanced_prompt = f"professional portrait, headshot, detailed face, {agent['prompt']}, high quality, photorealistic, studio lighting, neutral background"
-                
-                # Submit to fal.ai using the Flux Schnell model
-                handler = await fal_client.submit_async(
-                    "fal-ai/flux/schnell",
-                    arguments={
-                        "prompt": enhanced_prompt,
-                        "image_size": "portrait_4_3",
-                        "num_images": 1,
-                        "enable_safety_checker": True
-                    }
-                )
-                
-                # Get the result
-                result = await handler.get()
-                
-                if result and result.get("images") and len(result["images"]) > 0:
-                    avatar_url = result["images"][0]["url"]
-                    agent["avatar_url"] = avatar_url
-                    generated_count += 1
-                    logging.info(f"Avatar generated for {agent['name']}: {avatar_url}")
-                else:
-                    errors.append(f"Failed to generate avatar for {agent['name']}: No image returned")
-                    
-            except Exception as e:
-                errors.append(f"Error generating avatar for {agent['name']}: {str(e)}")
-                logging.error(f"Avatar generation error for {agent['name']}: {str(e)}")
-        
-        return {
-            "success": True,
-            "generated_count": generated_count,
-            "total_agents": len(library_agents),
-            "errors": errors,
-            "agents": library_agents
-        }
-        
+        return await run_library_avatars(inline_job())
     except Exception as e:
         logging.error(f"Library avatar generation error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Avatar generation failed: {str(e)}")
 
+@api_router.post("/avatars/generate-library/submit", status_code=202)
+async def submit_library_avatars(http_request: Request, response: Response):
+    """Library avatar generation as a background job; poll /api/jobs/{id} for progress"""
+    return await submit_job("library_avatars", {}, http_request, response)
+
 @api_router.post("/avatars/generate", response_model=AvatarResponse)
 async def generate_avatar(request: AvatarGenerateRequest):
     """Generate an avatar image using fal.ai"""
@@ -5335,6 +5485,7 @@ async def generate_avatar(request: AvatarGenerateRequest):
         enhanced_prompt = f"professional portrait, headshot, detailed face, {request.prompt}, high quality, photorealistic, studio lighting, neutral background"
         
         # Submit to fal.ai using the Flux Schnell model (fastest and cheapest)
+        import fal_client
         handler = await fal_client.submit_async(
             "fal-ai/flux/schnell",
             arguments={
@@ -5369,38 +5520,37 @@ async def generate_avatar(request: AvatarGenerateRequest):
             error=f"Avatar generation failed: {str(e)}"
         )
 
-async def update_relationships(agents: List[Agent], messages: List[ConversationMessage]):
+@tracer.traced()
+async def update_relationships(agents: List[Agent], messages: List[ConversationMessage], simulation_id: str):
     """Update agent relationships based on conversation sentiment"""
-    # Simple relationship update logic
-    for i, agent1 in enumerate(agents):
-        for j, agent2 in enumerate(agents):
-            if i != j:
-                # Find existing relationship
-                relationship = await db.relationships.find_one({
-                    "agent1_id": agent1.id,
-                    "agent2_id": agent2.id
-                })
-                
-                if not relationship:
-                    relationship = Relationship(
-                        agent1_id=agent1.id,
-                        agent2_id=agent2.id
-                    )
-                    await db.relationships.insert_one(relationship.dict())
-                
-                # Simple sentiment analysis based on personality compatibility
-                compatibility = calculate_compatibility(agent1, agent2)
-                score_change = 1 if compatibility > 0.5 else -1
-                
-                # Handle both dict and Pydantic model cases
-                current_score = relationship["score"] if isinstance(relationship, dict) else relationship.score
-                new_score = max(-10, min(10, current_score + score_change))
-                status = "friends" if new_score > 3 else "tension" if new_score < -3 else "neutral"
-                
-                await db.relationships.update_one(
-                    {"agent1_id": agent1.id, "agent2_id": agent2.id},
-                    {"$set": {"score": new_score, "status": status, "updated_at": datetime.utcnow()}}
-                )
+    # Simple relationship update logic, applied by the simulation's actor so concurrent rounds don't lose score changes
+    async def apply(actor):
+        relationships = await actor.relationships()
+        changed = []
+        for i, agent1 in enumerate(agents):
+            for j, agent2 in enumerate(agents):
+                if i != j:
+                    # Find existing relationship
+                    relationship = relationships.get((agent1.id, agent2.id))
+                    if not relationship:
+                        relationship = Relationship(
+                            agent1_id=agent1.id,
+                            agent2_id=agent2.id,
+                            simulation_id=simulation_id
+                        ).dict()
+                    
+                    # Simple sentiment analysis based on personality compatibility
+                    compatibility = calculate_compatibility(agent1, agent2)
+                    score_change = 1 if compatibility > 0.5 else -1
+                    
+                    # Clamping and the status are applied where the score is stored
+                    relationship = actor.adjust_relationship(relationship, score_change)
+                    changed.append(relationship_view(relationship))
+        return changed
+    
+    changed = await simulation_actors.call(simulation_id, apply)
+    await simulation_events.publish(simulation_id, RELATIONSHIPS_CHANGED, {"relationships": changed})
+    await change_versions.bump("relationships", scope=simulation_id)
 
 def calculate_compatibility(agent1: Agent, agent2: Agent) -> float:
     """Calculate compatibility between two agents based on personality traits"""
@@ -5414,23 +5564,20 @@ def calculate_compatibility(agent1: Agent, agent2: Agent) -> float:
     return max(0, min(1, compatibility))
 
 @api_router.post("/simulation/toggle-auto-mode")
-async def toggle_auto_mode(request: dict):
-    """Toggle automation settings for conversations and time"""
+async def toggle_auto_mode(request: dict, state: dict = Depends(current_simulation)):
+    """Toggle automation settings for conversations and time (of the caller's simulation)"""
     auto_conversations = request.get("auto_conversations", False)
     auto_time = request.get("auto_time", False)
     conversation_interval = request.get("conversation_interval", 10)
     time_interval = request.get("time_interval", 60)
     
-    await db.simulation_state.update_one(
-        {},
-        {"$set": {
-            "auto_conversations": auto_conversations,
-            "auto_time": auto_time,
-            "conversation_interval": conversation_interval,
-            "time_interval": time_interval
-        }},
-        upsert=True
-    )
+    await simulation_actors.update(state["id"], {
+        "auto_conversations": auto_conversations,
+        "auto_time": auto_time,
+        "conversation_interval": conversation_interval,
+        "time_interval": time_interval
+    })
+    await change_versions.bump("simulation_state", scope=state["id"])
     
     return {
         "message": f"Auto mode updated - Conversations: {'ON' if auto_conversations else 'OFF'}, Time: {'ON' if auto_time else 'OFF'}",
@@ -5440,21 +5587,67 @@ async def toggle_auto_mode(request: dict):
         "time_interval": time_interval
     }
 
+async def run_weekly_summary(job: JobContext):
+    """Weekly summary of the submitter's simulation"""
+    simulation = await simulations.get(job.params["simulation_id"])
+    if not simulation:
+        raise JobFailed("Simulation no longer exists")
+    return await generate_weekly_summary(simulation)
+
+async def run_auto_documents(job: JobContext):
+    """Create or update documents from one conversation round (queued by generate_conversation)"""
+    simulation_id = job.params["simulation_id"]
+    conversation = await db.conversations.find_one(simulations.scope(simulation_id, id=job.params["conversation_id"]))
+    if not conversation:
+        raise JobFailed("Conversation no longer exists")
+    agents = await db.agents.find(simulations.scope(simulation_id, id={"$in": job.params["agent_ids"]})).to_list(100)
+    agent_objects = [Agent(**agent) for agent in agents]
+    await auto_generate_documents_from_conversation(
+        ConversationRound(**conversation), agent_objects, job.params["scenario"], job.params["scenario_name"], llm_manager
+    )
+    return {"conversation_id": job.params["conversation_id"]}
+
+async def submit_job(kind: str, params: dict, http_request: Request, response: Response,
+                     simulation: dict = None) -> dict:
+    """Queue a job for a submit endpoint; an Idempotency-Key header makes resubmits return the same job"""
+    user_id = ""
+    if simulation is not None:
+        # Simulation jobs run against the submitter's simulation
+        user_id = simulation.get("user_id", "")
+        params = {**params, "simulation_id": simulation["id"], "user_id": user_id}
+    job = await job_queue.submit(kind, params, idempotency_key=http_request.headers.get("Idempotency-Key"),
+                                 user_id=user_id)
+    response.headers["Location"] = f"/api/jobs/{job['_id']}"
+    return job_view(job)
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, state: dict = Depends(current_simulation)):
+    """Status, progress and (once finished) result of one of the caller's background jobs"""
+    job = await job_queue.get(job_id, user_id=state.get("user_id", ""))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
+
+@api_router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, state: dict = Depends(current_simulation)):
+    """Cancel a queued job, or stop a running one at its next step"""
+    job = await job_queue.cancel(job_id, user_id=state.get("user_id", ""))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
+
 @api_router.post("/simulation/auto-weekly-report")
-async def setup_auto_weekly_report(request: dict):
+async def setup_auto_weekly_report(request: dict, state: dict = Depends(current_simulation)):
     """Setup automatic weekly report generation"""
     enabled = request.get("enabled", False)
     interval_hours = request.get("interval_hours", 168)  # Default 7 days = 168 hours
     
-    await db.simulation_state.update_one(
-        {},
-        {"$set": {
-            "auto_weekly_reports": enabled,
-            "report_interval_hours": interval_hours,
-            "last_auto_report": datetime.utcnow().isoformat() if enabled else None
-        }},
-        upsert=True
-    )
+    await simulation_actors.update(state["id"], {
+        "auto_weekly_reports": enabled,
+        "report_interval_hours": interval_hours,
+        "last_auto_report": datetime.utcnow().isoformat() if enabled else None
+    })
+    await change_versions.bump("simulation_state", scope=state["id"])
     
     return {
         "message": f"Auto weekly reports {'enabled' if enabled else 'disabled'}",
@@ -5463,10 +5656,9 @@ async def setup_auto_weekly_report(request: dict):
     }
 
 @api_router.get("/reports/check-auto-generation")
-async def check_auto_report_generation():
+async def check_auto_report_generation(state: dict = Depends(current_simulation)):
     """Check if it's time to generate an automatic weekly report"""
-    state = await db.simulation_state.find_one()
-    if not state or not state.get("auto_weekly_reports"):
+    if not state.get("auto_weekly_reports"):
         return {"should_generate": False, "reason": "Auto reports disabled"}
     
     last_report = state.get("last_auto_report")
@@ -5487,57 +5679,59 @@ async def check_auto_report_generation():
     }
 
 @api_router.get("/summaries")
-async def get_summaries():
+async def get_summaries(request: Request, response: Response, state: dict = Depends(current_simulation)):
     """Get all generated summaries with structured formatting"""
-    summaries = await db.summaries.find().sort("created_at", -1).to_list(100)
+    not_modified = await conditional_response(request, response, ["summaries"], scope=state["id"])
+    if not_modified:
+        return not_modified
+    
+    summaries = await db.summaries.find(simulations.scope(state["id"])).sort("created_at", -1).to_list(100)
     
     # Convert MongoDB documents to JSON-serializable format
-    processed_summaries = []
-    for summary in summaries:
-        # Remove MongoDB ObjectId and convert to dict
-        summary_dict = {
-            "id": summary.get("id", str(summary.get("_id", ""))),
-            "summary": summary.get("summary", ""),
-            "day_generated": summary.get("day_generated", 1),
-            "conversations_analyzed": summary.get("conversations_analyzed", 0),
-            "report_type": summary.get("report_type", "standard"),
-            "created_at": summary.get("created_at").isoformat() if summary.get("created_at") else ""
-        }
+    processed_summaries = [summary_view(summary) for summary in summaries]
+    
+    return processed_summaries
+
+def summary_view(summary: dict) -> dict:
+    """JSON-serializable summary, with weekly reports split into sections"""
+    # Remove MongoDB ObjectId and convert to dict
+    summary_dict = {
+        "id": summary.get("id", str(summary.get("_id", ""))),
+        "summary": summary.get("summary", ""),
+        "day_generated": summary.get("day_generated", 1),
+        "conversations_analyzed": summary.get("conversations_analyzed", 0),
+        "report_type": summary.get("report_type", "standard"),
+        "created_at": summary.get("created_at").isoformat() if summary.get("created_at") else ""
+    }
+    
+    # Parse structured summaries for better frontend display
+    if summary_dict.get("report_type") == "weekly_structured":
+        # Split summary into sections for collapsible display
+        summary_text = summary_dict.get("summary", "")
+        sections = {}
+        
+        # Parse sections based on headers
+        section_patterns = [
+            ("key_events", r"## \*\*🔥 KEY EVENTS & DISCOVERIES\*\*(.*?)(?=## \*\*|$)"),
+            ("relationships", r"## \*\*👥 RELATIONSHIP DEVELOPMENTS\*\*(.*?)(?=## \*\*|$)"),
+            ("personalities", r"## \*\*🎭 EMERGING PERSONALITIES\*\*(.*?)(?=## \*\*|$)"),
+            ("social_dynamics", r"## \*\*⚖️ SOCIAL DYNAMICS\*\*(.*?)(?=## \*\*|$)"),
+            ("strategic_decisions", r"## \*\*🎯 STRATEGIC DECISIONS\*\*(.*?)(?=## \*\*|$)"),
+            ("looking_ahead", r"## \*\*🔮 LOOKING AHEAD\*\*(.*?)(?=## \*\*|$)")
+        ]
         
-        # Parse structured summaries for better frontend display
-        if summary_dict.get("report_type") == "weekly_structured":
-            # Split summary into sections for collapsible display
-            summary_text = summary_dict.get("summary", "")
-            sections = {}
-            
-            # Parse sections based on headers
-            section_patterns = [
-                ("key_events", r"## \*\*🔥 KEY EVENTS & DISCOVERIES\*\*(.*?)(?=## \*\*|$)"),
-                ("relationships", r"## \*\*👥 RELATIONSHIP DEVELOPMENTS\*\*(.*?)(?=## \*\*|$)"),
-                ("personalities", r"## \*\*🎭 EMERGING PERSONALITIES\*\*(.*?)(?=## \*\*|$)"),
-                ("social_dynamics", r"## \*\*⚖️ SOCIAL DYNAMICS\*\*(.*?)(?=## \*\*|$)"),
-                ("strategic_decisions", r"## \*\*🎯 STRATEGIC DECISIONS\*\*(.*?)(?=## \*\*|$)"),
-                ("looking_ahead", r"## \*\*🔮 LOOKING AHEAD\*\*(.*?)(?=## \*\*|$)")
-            ]
-            
-            for section_key, pattern in section_patterns:
-                match = re.search(pattern, summary_text, re.DOTALL | re.IGNORECASE)
-                if match:
-                    sections[section_key] = match.group(1).strip()
-            
-            summary_dict["structured_sections"] = sections
+        for section_key, pattern in section_patterns:
+            match = re.search(pattern, summary_text, re.DOTALL | re.IGNORECASE)
+            if match:
+                sections[section_key] = match.group(1).strip()
         
-        processed_summaries.append(summary_dict)
+        summary_dict["structured_sections"] = sections
     
-    return processed_summaries
+    return summary_dict
 
 @api_router.get("/simulation/auto-status")
-async def get_auto_status():
+async def get_auto_status(state: dict = Depends(current_simulation)):
     """Get detailed auto-mode status and detect if it should be running"""
-    state = await db.simulation_state.find_one()
-    if not state:
-        return {"auto_active": False, "should_be_active": False, "message": "No simulation state"}
-    
     auto_conversations = state.get("auto_conversations", False)
     auto_time = state.get("auto_time", False)
     is_active = state.get("is_active", False)
@@ -5583,22 +5777,21 @@ async def get_auto_status():
             except:
                 status["time_gap_seconds"] = None
                 status["should_advance_time"] = True
-    
+
+    # Server-side schedule of this simulation's auto jobs: next run, in-flight state, skipped ticks
+    status["scheduler"] = await auto_scheduler.simulation_status(state["id"])
     return status
-async def toggle_auto_mode(request: AutoModeRequest):
+async def toggle_auto_mode(request: AutoModeRequest, state: dict = Depends(current_simulation)):
     """Toggle automatic conversation and time progression"""
-    await db.simulation_state.update_one(
-        {},
-        {"$set": {
-            "auto_conversations": request.auto_conversations,
-            "auto_time": request.auto_time,
-            "conversation_interval": request.conversation_interval,
-            "time_interval": request.time_interval,
-            "last_auto_conversation": datetime.utcnow().isoformat(),
-            "last_auto_time": datetime.utcnow().isoformat()
-        }},
-        upsert=True
-    )
+    await simulation_actors.update(state["id"], {
+        "auto_conversations": request.auto_conversations,
+        "auto_time": request.auto_time,
+        "conversation_interval": request.conversation_interval,
+        "time_interval": request.time_interval,
+        "last_auto_conversation": datetime.utcnow().isoformat(),
+        "last_auto_time": datetime.utcnow().isoformat()
+    })
+    await change_versions.bump("simulation_state", scope=state["id"])
     
     return {
         "message": "Auto mode updated",
@@ -5612,8 +5805,10 @@ async def toggle_auto_mode(request: AutoModeRequest):
 @api_router.post("/simulation/init-research-station")
 async def init_research_station(current_user: User = Depends(get_current_user)):
     """Initialize default crypto team AI agents - OPTIONAL (not called by default)"""
-    # Clear existing agents for this user only
-    await db.agents.delete_many({"user_id": current_user.id})
+    state = await simulation_for(current_user.id)
+    
+    # Clear existing agents of this user's simulation
+    await clear_agents(state["id"])
     
     # Create the crypto team agents
     agents_data = [
@@ -5677,21 +5872,19 @@ async def init_research_station(current_user: User = Depends(get_current_user)):
             expertise=agent_data["expertise"],
             background=agent_data["background"],
             memory_summary=agent_data.get("memory_summary", ""),
-            user_id=""  # Global agents for simulation (no user association for now)
+            user_id=current_user.id,
+            simulation_id=state["id"]
         )
         
-        await db.agents.insert_one(agent.dict())
+        await db.agents.insert_one(touch(agent.dict()))
         created_agents.append(agent)
     
     # Start simulation with crypto-focused scenario
-    await start_simulation()
+    await start_simulation(state=state)
     
     # Set an engaging crypto scenario that showcases each team member's expertise
-    await db.simulation_state.update_one(
-        {},
-        {"$set": {"scenario": "A major DeFi protocol has discovered a critical smart contract vulnerability that could drain $500M in user funds. The exploit hasn't been used yet, but blockchain analytics suggest sophisticated actors are probing the system. The team must decide whether to quietly patch the vulnerability, publicly disclose it, or implement an emergency protocol upgrade. Each decision has massive implications for user trust, legal liability, and market stability."}},
-        upsert=True
-    )
+    await simulation_actors.update(state["id"], {"scenario": "A major DeFi protocol has discovered a critical smart contract vulnerability that could drain $500M in user funds. The exploit hasn't been used yet, but blockchain analytics suggest sophisticated actors are probing the system. The team must decide whether to quietly patch the vulnerability, publicly disclose it, or implement an emergency protocol upgrade. Each decision has massive implications for user trust, legal liability, and market stability."})
+    await change_versions.bump("simulation_state", scope=state["id"])
     
     return {
         "message": "Crypto team agents initialized with rich personalities and expertise", 
@@ -5699,23 +5892,20 @@ async def init_research_station(current_user: User = Depends(get_current_user)):
     }
 
 @api_router.post("/agents/{agent_id}/clear-memory")
-async def clear_agent_memory(agent_id: str):
+async def clear_agent_memory(agent_id: str, state: dict = Depends(current_simulation)):
     """Clear an agent's memory"""
-    agent = await db.agents.find_one({"id": agent_id})
+    agent = await db.agents.find_one(simulations.scope(state["id"], id=agent_id))
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
     
-    await db.agents.update_one(
-        {"id": agent_id},
-        {"$set": {"memory_summary": ""}}
-    )
+    await simulation_actors.update_agent(state["id"], agent_id, {"memory_summary": ""})
     
     return {"message": f"Memory cleared for {agent['name']}", "agent_id": agent_id}
 
 @api_router.post("/agents/{agent_id}/add-memory")
-async def add_agent_memory(agent_id: str, request: dict):
+async def add_agent_memory(agent_id: str, request: dict, state: dict = Depends(current_simulation)):
     """Add specific memory to an agent with URL processing"""
-    agent = await db.agents.find_one({"id": agent_id})
+    agent = await db.agents.find_one(simulations.scope(state["id"], id=agent_id))
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
     
@@ -5726,21 +5916,25 @@ async def add_agent_memory(agent_id: str, request: dict):
     # Process URLs in the new memory
     processed_memory = await llm_manager.process_memory_with_urls(new_memory)
     
-    current_memory = agent.get("memory_summary", "")
-    
-    # Combine memories intelligently
-    if current_memory:
-        updated_memory = f"{current_memory} {processed_memory}"
-        # Trim if too long (keep last 1000 characters for URL content)
-        if len(updated_memory) > 1000:
-            updated_memory = "..." + updated_memory[-997:]
-    else:
-        updated_memory = processed_memory
+    async def append_memory(actor):
+        # Read the memory inside the actor, after its pending writes, so concurrent updates aren't lost
+        await actor.flush()
+        current = await db.agents.find_one(simulations.scope(state["id"], id=agent_id))
+        current_memory = current.get("memory_summary", "") if current else ""
+        
+        # Combine memories intelligently
+        if current_memory:
+            updated_memory = f"{current_memory} {processed_memory}"
+            # Trim if too long (keep last 1000 characters for URL content)
+            if len(updated_memory) > 1000:
+                updated_memory = "..." + updated_memory[-997:]
+        else:
+            updated_memory = processed_memory
+        
+        actor.update("agents", simulations.scope(state["id"], id=agent_id), {"memory_summary": updated_memory})
+        return updated_memory
     
-    await db.agents.update_one(
-        {"id": agent_id},
-        {"$set": {"memory_summary": updated_memory}}
-    )
+    updated_memory = await simulation_actors.call(state["id"], append_memory)
     
     return {
         "message": f"Memory added to {agent['name']}", 
@@ -5750,24 +5944,19 @@ async def add_agent_memory(agent_id: str, request: dict):
     }
 
 @api_router.post("/conversation/generate-single/{agent_id}")
-async def generate_single_response(agent_id: str):
+async def generate_single_response(agent_id: str, state: dict = Depends(current_simulation)):
     """Generate a single response from one agent - useful for testing"""
     # Get the specific agent
-    agent_doc = await db.agents.find_one({"id": agent_id})
+    agent_doc = await db.agents.find_one(simulations.scope(state["id"], id=agent_id))
     if not agent_doc:
         raise HTTPException(status_code=404, detail="Agent not found")
     
     agent = Agent(**agent_doc)
     
     # Get all agents for context
-    all_agents = await db.agents.find().to_list(100)
+    all_agents = await db.agents.find(simulations.scope(state["id"])).to_list(100)
     agent_objects = [Agent(**a) for a in all_agents]
     
-    # Get simulation state
-    state = await db.simulation_state.find_one()
-    if not state:
-        raise HTTPException(status_code=404, detail="Simulation not started")
-    
     scenario = state["scenario"]
     context = f"Day {state['current_day']}, {state['current_time_period']}. Continue the discussion."
     
@@ -5783,31 +5972,26 @@ async def generate_single_response(agent_id: str):
     }
 
 @api_router.post("/observer/message")
-async def send_observer_message(request: dict):
+async def send_observer_message(request: dict, state: dict = Depends(current_simulation)):
     """Send a message from the Observer (CEO) to all agents"""
     message = request.get("message", "")
     if not message:
         raise HTTPException(status_code=400, detail="Message required")
     
     # Get all agents
-    agents = await db.agents.find().to_list(100)
+    agents = await db.agents.find(simulations.scope(state["id"])).to_list(100)
     if not agents:
         raise HTTPException(status_code=400, detail="No agents available")
     
     agent_objects = [Agent(**agent) for agent in agents]
     
-    # Get simulation state for context
-    state = await db.simulation_state.find_one()
-    scenario = state.get("scenario", "Crypto project development") if state else "Crypto project development"
+    # Simulation scenario for context
+    scenario = state.get("scenario", "Crypto project development")
     
     responses = []
     
-    # Generate response from each agent with staggered timing
+    # Generate response from each agent (pacing is handled by the LLM scheduler)
     for i, agent in enumerate(agent_objects):
-        # Add delay to respect rate limits
-        if i > 0:
-            await asyncio.sleep(3)
-        
         try:
             response = await generate_observer_response(agent, message, scenario, agent_objects)
             responses.append({
@@ -5824,6 +6008,7 @@ async def send_observer_message(request: dict):
     # Store the observer interaction in database
     observer_interaction = {
         "id": str(uuid.uuid4()),
+        "simulation_id": state["id"],
         "observer_message": message,
         "agent_responses": responses,
         "created_at": datetime.utcnow()
@@ -5885,13 +6070,14 @@ Respond to the CEO's message in 2-3 sentences. Be professional, authentic to you
         prompt = f"The CEO/Observer has sent this message to the team: '{observer_message}'\n\nRespond professionally based on your expertise and personality."
         
         user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
+        response = await llm_manager.send_message(chat, user_message, "agent_turn", priority=PRIORITY_OBSERVER, max_tokens=200)
         await llm_manager.increment_usage()
         
         return response.strip() if response else f"{agent.name} acknowledges your guidance and will implement accordingly."
         
     except Exception as e:
         logging.error(f"Error in observer response for {agent.name}: {e}")
+        monitor.record_llm_fallback("agent_turn")
         return f"{agent.name} received your message and will follow your guidance."
 
 @api_router.get("/api-status")
@@ -5905,24 +6091,32 @@ async def get_api_status():
         "max_requests": llm_manager.max_daily_requests,
         "remaining": llm_manager.max_daily_requests - usage,
         "can_make_request": can_make_request,
-        "rate_limit_info": "Gemini free tier: 15 requests/minute, 1500/day"
+        "rate_limit_info": "Gemini free tier: 15 requests/minute, 1500/day",
+        "scheduler": llm_scheduler.get_stats(),
+        "tts": tts_service.get_stats(),
+        "narration_prefetch": narration_prefetcher.get_stats(),
+        "jobs": job_queue.get_stats(),
+        "simulations": simulation_actors.get_stats(),
+        "events": simulation_events.get_stats(),
+        "url_fetcher": url_fetcher.get_stats()
     }
 
 @api_router.delete("/agents/{agent_id}")
-async def delete_agent(agent_id: str):
+async def delete_agent(agent_id: str, state: dict = Depends(current_simulation)):
     """Delete an agent"""
-    result = await db.agents.delete_one({"id": agent_id})
+    result = await db.agents.delete_one(simulations.scope(state["id"], id=agent_id))
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Agent not found")
+    await delta_sync.tombstone(state["id"], "agents", [agent_id])
     return {"message": "Agent deleted"}
 
-@api_router.post("/conversations/translate")
-async def translate_conversations(request: dict):
-    """Translate all existing conversations to target language with improved error handling"""
-    target_language = request.get("target_language", "en")
+async def run_translation(job: JobContext):
+    """Translate all existing conversations to the target language, checkpointing after each one"""
+    target_language = job.params.get("target_language", "en")
+    simulation_id = job.params["simulation_id"]
     
-    # Get current conversations to check if translation is actually needed
-    conversations = await db.conversations.find().to_list(1000)
+    # Get current conversations to check if translation is actually needed (in _id order, so a retry can resume)
+    conversations = await db.conversations.find(simulations.scope(simulation_id)).sort("_id", 1).to_list(1000)
     if not conversations:
         return {"message": "No conversations to translate", "translated_count": 0}
     
@@ -5933,7 +6127,7 @@ async def translate_conversations(request: dict):
             all_in_target_language = False
             break
     
-    if all_in_target_language:
+    if all_in_target_language and not job.checkpoint:
         return {"message": f"All conversations are already in {target_language}", "translated_count": 0}
     
     # Language name mapping for better prompts
@@ -5956,58 +6150,78 @@ async def translate_conversations(request: dict):
     
     target_language_name = language_names.get(target_language, target_language)
     
-    try:
-        # Get all conversations for translation
-        translated_count = 0
-        failed_count = 0
+    # Process each conversation individually for better error handling
+    translated_count = job.checkpoint.get("translated_count", 0)
+    failed_count = job.checkpoint.get("failed_count", 0)
+    next_index = job.checkpoint.get("next", 0)
+    
+    for index, conversation in enumerate(conversations):
+        if index < next_index:
+            continue
         
-        # Process each conversation individually for better error handling
-        for conversation in conversations:
-            try:
-                translated_messages = await translate_single_conversation_improved(
-                    conversation, target_language, target_language_name
+        try:
+            translated_messages = await translate_single_conversation_improved(
+                conversation, target_language, target_language_name
+            )
+            
+            if translated_messages:
+                # Always update - force translation regardless of current language
+                await db.conversations.update_one(
+                    {"_id": conversation["_id"]},
+                    {
+                        "$set": touch({
+                            "messages": translated_messages,
+                            "language": target_language,
+                            "original_language": conversation.get("language", "en"),
+                            "translated_at": datetime.utcnow(),
+                            "force_translated": True  # Mark as force translated
+                        })
+                    }
                 )
-                
-                if translated_messages:
-                    # Always update - force translation regardless of current language
-                    await db.conversations.update_one(
-                        {"_id": conversation["_id"]},
-                        {
-                            "$set": {
-                                "messages": translated_messages,
-                                "language": target_language,
-                                "original_language": conversation.get("language", "en"),
-                                "translated_at": datetime.utcnow(),
-                                "force_translated": True  # Mark as force translated
-                            }
-                        }
-                    )
-                    translated_count += 1
-                    await llm_manager.increment_usage()
-                else:
-                    failed_count += 1
-                    logging.error(f"Failed to translate conversation {conversation.get('_id')}")
-                
-                # Small delay to avoid overwhelming the API
-                await asyncio.sleep(0.5)
-                
-            except Exception as e:
+                await change_versions.bump("conversations", scope=simulation_id)
+                await simulation_events.publish(simulation_id, ROUND_UPDATED, {
+                    "id": conversation.get("id"), "messages": translated_messages, "language": target_language
+                })
+                translated_count += 1
+                await llm_manager.increment_usage()
+            else:
                 failed_count += 1
-                logging.error(f"Error translating conversation {conversation.get('_id')}: {e}")
-                continue
-        
-        return {
-            "message": f"Successfully translated {translated_count} conversations to {target_language_name}",
-            "translated_count": translated_count,
-            "failed_count": failed_count,
-            "target_language": target_language,
-            "success": True
-        }
+                logging.error(f"Failed to translate conversation {conversation.get('_id')}")
+            
+        except Exception as e:
+            failed_count += 1
+            logging.error(f"Error translating conversation {conversation.get('_id')}: {e}")
         
+        await job.progress(index + 1, len(conversations), f"Translated {translated_count} to {target_language_name}",
+                           checkpoint={"next": index + 1, "translated_count": translated_count, "failed_count": failed_count})
+    
+    return {
+        "message": f"Successfully translated {translated_count} conversations to {target_language_name}",
+        "translated_count": translated_count,
+        "failed_count": failed_count,
+        "target_language": target_language,
+        "success": True
+    }
+
+@api_router.post("/conversations/translate")
+async def translate_conversations(request: dict, state: dict = Depends(current_simulation)):
+    """Translate all existing conversations to target language with improved error handling"""
+    try:
+        return await run_translation(inline_job({
+            "target_language": request.get("target_language", "en"),
+            "simulation_id": state["id"]
+        }))
     except Exception as e:
         logging.error(f"Translation error: {e}")
         raise HTTPException(status_code=500, detail=f"Translation failed: {str(e)}")
 
+@api_router.post("/conversations/translate/submit", status_code=202)
+async def submit_translation(request: dict, http_request: Request, response: Response,
+                             state: dict = Depends(current_simulation)):
+    """Translation as a background job; poll /api/jobs/{id} for progress"""
+    params = {"target_language": request.get("target_language", "en")}
+    return await submit_job("translate_conversations", params, http_request, response, state)
+
 async def translate_single_conversation_improved(conversation, target_language, target_language_name):
     """Improved single conversation translation with better error handling"""
     messages = conversation.get("messages", [])
@@ -6039,15 +6253,12 @@ Translate to {target_language_name}:"""
             ).with_model("gemini", "gemini-2.0-flash").with_max_tokens(300)
             
             user_message = UserMessage(text=translation_prompt)
-            translated_text = await chat.send_message(user_message)
+            translated_text = await llm_manager.send_message(chat, user_message, "translate", priority=PRIORITY_BACKGROUND)
             
             # Update message with translation
             translated_message = message.copy()
             translated_message["message"] = translated_text.strip() if translated_text else original_text
             translated_messages.append(translated_message)
-            
-            # Small delay between message translations
-            await asyncio.sleep(0.3)
         
         return translated_messages
         
@@ -6055,16 +6266,13 @@ Translate to {target_language_name}:"""
         logging.error(f"Single conversation translation error: {e}")
         return None
 @api_router.post("/simulation/set-language")
-async def set_language(request: dict):
+async def set_language(request: dict, state: dict = Depends(current_simulation)):
     """Set the language for conversation generation"""
     language = request.get("language", "en")
     
     # Store language setting in simulation state
-    await db.simulation_state.update_one(
-        {},
-        {"$set": {"language": language}},
-        upsert=True
-    )
+    await simulation_actors.update(state["id"], {"language": language})
+    await change_versions.bump("simulation_state", scope=state["id"])
     
     return {"message": f"Language set to {language}", "language": language}
 
@@ -6075,129 +6283,17 @@ class TTSRequest(BaseModel):
     language: str = "en"
 
 @api_router.post("/tts/synthesize")
-async def synthesize_speech(request: TTSRequest):
-    """Convert text to speech using Google Cloud TTS with language support"""
+async def synthesize_speech(request: TTSRequest, http_request: Request):
+    """Convert text to speech and stream back MP3 audio, cached per text, voice, language and rate"""
     try:
-        from google.cloud import texttospeech
-        import base64
-        
-        # Language to TTS language code mapping (only supported languages)
-        language_codes = {
-            "en": "en-US",
-            "es": "es-ES", 
-            "es-mx": "es-MX",
-            "fr": "fr-FR",
-            "fr-ca": "fr-CA",
-            "de": "de-DE",
-            "it": "it-IT",
-            "pt": "pt-BR",
-            "pt-br": "pt-BR",
-            "ru": "ru-RU",
-            "ja": "ja-JP",
-            "ko": "ko-KR",
-            "zh": "zh-CN",
-            "hi": "hi-IN",
-            "ar": "ar-XA"
-        }
-        
-        # Voice configurations for different agents and supported languages
-        agent_voices = {
-            'Marcus "Mark" Castellano': {
-                'en-US': {'name': 'en-US-Neural2-D', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'es-ES': {'name': 'es-ES-Neural2-B', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'es-MX': {'name': 'es-MX-Neural2-B', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'fr-FR': {'name': 'fr-FR-Neural2-B', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'de-DE': {'name': 'de-DE-Neural2-B', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'it-IT': {'name': 'it-IT-Neural2-C', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'pt-BR': {'name': 'pt-BR-Neural2-B', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'ru-RU': {'name': 'ru-RU-Neural2-B', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'ja-JP': {'name': 'ja-JP-Neural2-C', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'ko-KR': {'name': 'ko-KR-Neural2-B', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'zh-CN': {'name': 'zh-CN-Neural2-B', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'hi-IN': {'name': 'hi-IN-Neural2-B', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'ar-XA': {'name': 'ar-XA-Neural2-B', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'default': {'name': 'en-US-Neural2-D', 'gender': texttospeech.SsmlVoiceGender.MALE}
-            },
-            'Alexandra "Alex" Chen': {
-                'en-US': {'name': 'en-US-Neural2-F', 'gender': texttospeech.SsmlVoiceGender.FEMALE},
-                'es-ES': {'name': 'es-ES-Neural2-A', 'gender': texttospeech.SsmlVoiceGender.FEMALE},
-                'es-MX': {'name': 'es-MX-Neural2-A', 'gender': texttospeech.SsmlVoiceGender.FEMALE},
-                'fr-FR': {'name': 'fr-FR-Neural2-A', 'gender': texttospeech.SsmlVoiceGender.FEMALE},
-                'de-DE': {'name': 'de-DE-Neural2-A', 'gender': texttospeech.SsmlVoiceGender.FEMALE},
-                'it-IT': {'name': 'it-IT-Neural2-A', 'gender': texttospeech.SsmlVoiceGender.FEMALE},
-                'pt-BR': {'name': 'pt-BR-Neural2-A', 'gender': texttospeech.SsmlVoiceGender.FEMALE},
-                'ru-RU': {'name': 'ru-RU-Neural2-A', 'gender': texttospeech.SsmlVoiceGender.FEMALE},
-                'ja-JP': {'name': 'ja-JP-Neural2-B', 'gender': texttospeech.SsmlVoiceGender.FEMALE},
-                'ko-KR': {'name': 'ko-KR-Neural2-A', 'gender': texttospeech.SsmlVoiceGender.FEMALE},
-                'zh-CN': {'name': 'zh-CN-Neural2-A', 'gender': texttospeech.SsmlVoiceGender.FEMALE},
-                'hi-IN': {'name': 'hi-IN-Neural2-A', 'gender': texttospeech.SsmlVoiceGender.FEMALE},
-                'ar-XA': {'name': 'ar-XA-Neural2-A', 'gender': texttospeech.SsmlVoiceGender.FEMALE},
-                'default': {'name': 'en-US-Neural2-F', 'gender': texttospeech.SsmlVoiceGender.FEMALE}
-            },
-            'Diego "Dex" Rodriguez': {
-                'en-US': {'name': 'en-US-Neural2-A', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'es-ES': {'name': 'es-ES-Neural2-C', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'es-MX': {'name': 'es-MX-Neural2-C', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'pt-BR': {'name': 'pt-BR-Neural2-C', 'gender': texttospeech.SsmlVoiceGender.MALE},
-                'default': {'name': 'en-US-Neural2-A', 'gender': texttospeech.SsmlVoiceGender.MALE}
-            }
-        }
-        
-        # Get language code - if not supported, use English as fallback
-        tts_language = language_codes.get(request.language, "en-US")
-        is_voice_supported = request.language in language_codes
-        
-        if not is_voice_supported:
-            return {
-                "error": f"Voice not supported for language: {request.language}",
-                "fallback": True,
-                "voice_supported": False,
-                "message": "This language is not supported for voice narration"
-            }
-        
-        # Get voice config for this agent and language
-        agent_voice_config = agent_voices.get(request.agent_name, agent_voices['Marcus "Mark" Castellano'])
-        voice_config = agent_voice_config.get(tts_language, agent_voice_config.get('default'))
-        
-        # Create TTS client using API key authentication
-        client = texttospeech.TextToSpeechClient(
-            client_options={'api_key': llm_manager.api_key}
-        )
-        
-        # Set the text input
-        synthesis_input = texttospeech.SynthesisInput(text=request.text)
-        
-        # Build the voice request
-        voice = texttospeech.VoiceSelectionParams(
-            language_code=tts_language,
-            name=voice_config['name'],
-            ssml_gender=voice_config['gender']
-        )
-        
-        # Select the audio format
-        audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3,
-            speaking_rate=0.9,
-            pitch=0.0
-        )
-        
-        # Perform the text-to-speech request
-        response = client.synthesize_speech(
-            input=synthesis_input,
-            voice=voice,
-            audio_config=audio_config
-        )
-        
-        # Convert audio content to base64
-        audio_base64 = base64.b64encode(response.audio_content).decode('utf-8')
-        
+        result = await tts_service.synthesize(request.text, request.agent_name, request.language)
+    except VoiceNotSupported:
         return {
-            "audio_data": audio_base64,
-            "voice_used": voice_config['name'],
-            "language": tts_language,
-            "agent_name": request.agent_name
+            "error": f"Voice not supported for language: {request.language}",
+            "fallback": True,
+            "voice_supported": False,
+            "message": "This language is not supported for voice narration"
         }
-        
     except Exception as e:
         logging.error(f"TTS Error: {e}")
         return {
@@ -6205,6 +6301,22 @@ async def synthesize_speech(request: TTSRequest):
             "fallback": True
         }
 
+    headers = {
+        "Content-Location": f"/api/tts/audio/{result.key}",
+        "X-Voice-Used": result.voice.name,
+        "X-TTS-Language": result.voice.language_code,
+        "X-TTS-Cache": "hit" if result.cached else "miss"
+    }
+    return audio_response(http_request, result.key, result.audio, "private, max-age=86400", headers)
+
+@api_router.get("/tts/audio/{audio_key}")
+async def get_tts_audio(audio_key: str, request: Request):
+    """Replay an already-synthesized clip; the key is a content hash so it never changes"""
+    audio = await tts_service.lookup(audio_key)
+    if audio is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return audio_response(request, audio_key, audio, IMMUTABLE_CACHE_CONTROL)
+
 # File Center API Endpoints for Action-Oriented Agent Behavior
 
 @api_router.post("/documents/create")
@@ -6240,7 +6352,7 @@ async def create_document(
         if document.category in ["Budget", "Protocol", "Research", "Equipment"]:
             # Apply professional formatting with potential charts
             formatter = ProfessionalDocumentFormatter()
-            formatted_content = formatter.format_document(
+            formatted_content = await formatter.format_document(
                 document.content,
                 document.title,
                 document.authors,
@@ -6250,7 +6362,8 @@ async def create_document(
             doc.content = formatted_content
         
         # Save to database
-        await db.documents.insert_one(doc.dict())
+        await db.documents.insert_one(touch(doc.dict()))
+        await change_versions.bump("documents")
         
         return {"success": True, "document_id": doc.id, "filename": filename}
         
@@ -6304,19 +6417,39 @@ async def check_document_quality(request: dict, current_user: User = Depends(get
     
     return quality_check
 
+@api_router.get("/assets/{asset_id}")
+async def get_asset(asset_id: str, request: Request):
+    """Serve a stored chart image by content hash.
+
+    The hash is the capability: documents embed these URLs in <img> tags,
+    which cannot send an Authorization header.
+    """
+    asset = await asset_store.get(asset_id)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return asset_response(request, asset)
+
 @api_router.get("/documents")
 async def get_documents(
+    request: Request,
+    response: Response,
     category: Optional[str] = None,
     search: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     """Get documents from File Center with optional filtering"""
+    not_modified = await conditional_response(request, response, ["documents"], current_user.id)
+    if not_modified:
+        return not_modified
+    
     try:
-        # Build query - include user's own documents AND global simulation documents
+        state = await simulation_for(current_user.id)
+        
+        # Build query - include user's own documents AND documents written in their simulation
         query = {
             "$or": [
                 {"metadata.user_id": current_user.id},  # User's personal documents
-                {"user_id": ""}  # Global simulation documents (auto-generated)
+                simulations.scope(state["id"], user_id="")  # Simulation documents (auto-generated)
             ]
         }
         
@@ -6338,38 +6471,34 @@ async def get_documents(
         # Get documents
         docs = await db.documents.find(query).sort("metadata.created_at", -1).to_list(50)
         
-        # Convert to response format
-        documents = []
-        for doc in docs:
-            try:
-                # Safely access metadata and content with defaults
-                metadata = doc.get("metadata", {})
-                if not metadata:
-                    # Skip documents without proper metadata
-                    logging.warning(f"Document {doc.get('id', 'unknown')} has no metadata, skipping")
-                    continue
-                    
-                content = doc.get("content", "")
-                doc_id = doc.get("id", str(doc.get("_id", "")))
-                
-                doc_response = DocumentResponse(
-                    id=doc_id,
-                    metadata=DocumentMetadata(**metadata),
-                    content=content,
-                    preview=content[:200] + "..." if len(content) > 200 else content
-                )
-                documents.append(doc_response)
-            except Exception as doc_error:
-                logging.error(f"Error processing document {doc.get('id', 'unknown')}: {doc_error}")
-                # Skip malformed documents instead of failing the entire request
-                continue
-        
-        return documents
+        # Convert to response format, skipping malformed documents instead of failing the entire request
+        return [view for view in map(document_view, docs) if view is not None]
         
     except Exception as e:
         logging.error(f"Error getting documents: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get documents: {str(e)}")
 
+def document_view(doc: dict) -> Optional[DocumentResponse]:
+    """File Center response for a stored document (None if it is malformed)"""
+    try:
+        # Safely access metadata and content with defaults
+        metadata = doc.get("metadata", {})
+        if not metadata:
+            # Skip documents without proper metadata
+            logging.warning(f"Document {doc.get('id', 'unknown')} has no metadata, skipping")
+            return None
+            
+        content = doc.get("content", "")
+        return DocumentResponse(
+            id=doc.get("id", str(doc.get("_id", ""))),
+            metadata=DocumentMetadata(**metadata),
+            content=content,
+            preview=content[:200] + "..." if len(content) > 200 else content
+        )
+    except Exception as doc_error:
+        logging.error(f"Error processing document {doc.get('id', 'unknown')}: {doc_error}")
+        return None
+
 @api_router.get("/documents/categories")
 async def get_document_categories():
     """Get available document categories"""
@@ -6497,6 +6626,9 @@ async def delete_document(
             "id": document_id,
             "metadata.user_id": current_user.id
         })
+        await change_versions.bump("documents")
+        if result.deleted_count:
+            await delta_sync.tombstone(user_scope(current_user.id), "documents", [document_id])
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Document not found")
@@ -6524,10 +6656,11 @@ async def analyze_conversation_for_documents(
         if not conversation_text:
             return {"should_create_document": False}
         
-        # Get agents
+        # Get agents (of the caller's own simulation)
+        state = await simulation_for(current_user.id)
         agents = []
         for agent_id in agent_ids:
-            agent_doc = await db.agents.find_one({"id": agent_id})
+            agent_doc = await db.agents.find_one(simulations.scope(state["id"], id=agent_id))
             if agent_doc:
                 agents.append(Agent(**agent_doc))
         
@@ -6555,8 +6688,9 @@ async def generate_document_from_conversation(
         creating_agent_id = request.get("creating_agent_id")
         authors = request.get("authors", [])
         
-        # Get creating agent
-        agent_doc = await db.agents.find_one({"id": creating_agent_id})
+        # Get creating agent (of the caller's own simulation)
+        state = await simulation_for(current_user.id)
+        agent_doc = await db.agents.find_one(simulations.scope(state["id"], id=creating_agent_id))
         if not agent_doc:
             raise HTTPException(status_code=404, detail="Creating agent not found")
         
@@ -6591,7 +6725,8 @@ async def generate_document_from_conversation(
         )
         
         # Save to database
-        await db.documents.insert_one(doc.dict())
+        await db.documents.insert_one(touch(doc.dict()))
+        await change_versions.bump("documents")
         
         return {
             "success": True,
@@ -6629,10 +6764,11 @@ async def propose_document_update(
         if not proposed_changes or not proposing_agent_id:
             raise HTTPException(status_code=400, detail="Missing required fields")
         
-        # Get agents for voting
+        # Get agents for voting (of the caller's own simulation)
+        state = await simulation_for(current_user.id)
         agents = []
         for agent_id in agent_ids:
-            agent_doc = await db.agents.find_one({"id": agent_id})
+            agent_doc = await db.agents.find_one(simulations.scope(state["id"], id=agent_id))
             if agent_doc:
                 agents.append(Agent(**agent_doc))
         
@@ -6650,7 +6786,7 @@ async def propose_document_update(
         
         if voting_results["consensus"]:
             # Get proposing agent
-            proposing_agent_doc = await db.agents.find_one({"id": proposing_agent_id})
+            proposing_agent_doc = await db.agents.find_one(simulations.scope(state["id"], id=proposing_agent_id))
             if not proposing_agent_doc:
                 raise HTTPException(status_code=404, detail="Proposing agent not found")
             
@@ -6679,12 +6815,13 @@ The team has voted to approve these changes. Create an updated version of the do
             await db.documents.update_one(
                 {"id": document_id},
                 {
-                    "$set": {
+                    "$set": touch({
                         "content": updated_content,
                         "metadata": updated_metadata.dict()
-                    }
+                    })
                 }
             )
+            await change_versions.bump("documents")
             
             return {
                 "success": True,
@@ -6733,8 +6870,9 @@ async def handle_improvement_suggestion(
             raise HTTPException(status_code=404, detail="Suggestion not found")
         
         if decision == "accept":
-            # Get the creator agent
-            creator_agent_doc = await db.agents.find_one({"id": creator_agent_id})
+            # Get the creator agent (of the caller's own simulation)
+            state = await simulation_for(current_user.id)
+            creator_agent_doc = await db.agents.find_one(simulations.scope(state["id"], id=creator_agent_id))
             if not creator_agent_doc:
                 raise HTTPException(status_code=404, detail="Creator agent not found")
             
@@ -6763,12 +6901,13 @@ Incorporate these improvements into the document while maintaining its overall s
             await db.documents.update_one(
                 {"id": document_id},
                 {
-                    "$set": {
+                    "$set": touch({
                         "content": improved_content,
                         "metadata": updated_metadata.dict()
-                    }
+                    })
                 }
             )
+            await change_versions.bump("documents")
             
             # Update suggestion status
             await db.document_suggestions.update_one(
@@ -6781,9 +6920,8 @@ Incorporate these improvements into the document while maintaining its overall s
             current_memory = creator_agent.memory_summary or ""
             updated_memory = f"{current_memory}\n\n[Document Update]: {creator_memory}".strip()
             
-            await db.agents.update_one(
-                {"id": creator_agent_id},
-                {"$set": {"memory_summary": updated_memory}}
+            await simulation_actors.update_agent(
+                creator_agent.simulation_id, creator_agent_id, {"memory_summary": updated_memory}
             )
             
             return {
@@ -6966,11 +7104,7 @@ async def transcribe_and_summarize_for_field(
         raw_text = transcription_result["text"]
         
         # AI Summarization and Formatting based on field type
-        if await llm_manager.can_make_request():
-            summarized_text = await create_field_appropriate_text(raw_text, field_type)
-        else:
-            # Fallback to raw text if API limit reached
-            summarized_text = raw_text.strip()
+        summarized_text = await summarize_transcript(raw_text, field_type)
         
         response = {
             "success": True,
@@ -6998,6 +7132,31 @@ async def transcribe_and_summarize_for_field(
         logging.error(f"Error in field transcription and summarization: {e}")
         raise HTTPException(status_code=500, detail=f"Field transcription failed: {str(e)}")
 
+@api_router.websocket("/speech/stream")
+async def stream_transcription(websocket: WebSocket):
+    """Transcribe voice input segment by segment while the user is still recording"""
+    await run_transcription_socket(websocket, whisper_service, authenticate_token, summarize_transcript)
+
+@api_router.websocket("/simulation/events")
+async def stream_simulation_events(websocket: WebSocket):
+    """Push changes of the caller's simulation (new rounds, relationships, documents, state) as they happen"""
+    await run_event_socket(websocket, simulation_events, simulation_for_token)
+
+async def simulation_for_token(token: str) -> dict:
+    """Simulation of a WebSocket client (the shared one without a token)"""
+    user = await authenticate_token(token) if token else None
+    return await simulation_for(user.id if user else "")
+
+async def authenticate_token(token: str) -> User:
+    """Resolve a bearer token sent outside the Authorization header (e.g. over a WebSocket)"""
+    return await get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+
+async def summarize_transcript(raw_text: str, field_type: str) -> str:
+    """Format a transcript for a field, falling back to the raw text if the API limit is reached"""
+    if await llm_manager.can_make_request():
+        return await create_field_appropriate_text(raw_text, field_type)
+    return raw_text.strip()
+
 async def create_field_appropriate_text(raw_text: str, field_type: str) -> str:
     """Create field-appropriate text based on the field type"""
     try:
@@ -7011,7 +7170,7 @@ async def create_field_appropriate_text(raw_text: str, field_type: str) -> str:
             text=f"Transform this text to be appropriate for {field_type}: {raw_text}"
         )
         
-        response = await chat.send_message(user_message)
+        response = await llm_manager.send_message(chat, user_message, "summary", priority=PRIORITY_INTERACTIVE, max_tokens=200)
         await llm_manager.increment_usage()
         return response.strip()
         
@@ -7056,6 +7215,7 @@ async def generate_professional_avatar(agent_name: str) -> str:
         
         prompt = f"Professional headshot portrait of a {gender_descriptor}, business attire, clean neutral background, high quality, photorealistic, confident expression, professional lighting, facing camera"
         
+        import fal_client
         handler = await fal_client.submit_async(
             "fal-ai/flux/dev",
             arguments={
@@ -7317,6 +7477,8 @@ async def delete_documents_bulk_post(
             "id": {"$in": document_ids},
             "metadata.user_id": current_user.id
         })
+        await change_versions.bump("documents")
+        await delta_sync.tombstone(user_scope(current_user.id), "documents", document_ids)
         
         return {
             "message": f"Successfully deleted {result.deleted_count} documents",
@@ -7369,6 +7531,8 @@ async def delete_documents_bulk(
             "id": {"$in": document_ids},
             "metadata.user_id": current_user.id
         })
+        await change_versions.bump("documents")
+        await delta_sync.tombstone(user_scope(current_user.id), "documents", document_ids)
         
         return {
             "message": f"Successfully deleted {result.deleted_count} documents",
@@ -7623,6 +7787,7 @@ async def generate_profile_avatar(request: dict, current_user: User = Depends(ge
             # Use user's custom prompt but make it professional
             prompt = f"Professional headshot portrait, {prompt}, business attire, clean neutral background, high quality, photorealistic, confident expression, professional lighting, facing camera"
         
+        import fal_client
         handler = await fal_client.submit_async(
             "fal-ai/flux/dev",
             arguments={
@@ -7765,21 +7930,25 @@ async def change_password(password_data: dict, current_user: User = Depends(get_
         if len(new_password) < 8:
             raise HTTPException(status_code=400, detail="Password must be at least 8 characters long")
         
-        # For demo purposes, we'll skip current password verification
-        # In a real app, you'd verify the current password here
+        # Verify the current password against the stored bcrypt hash
+        user_doc = await db.users.find_one({"id": user_id}, {"password_hash": 1})
+        if not user_doc or not user_doc.get("password_hash"):
+            raise HTTPException(status_code=400, detail="This account signs in with Google and has no password")
         
-        # Hash the password (simplified for demo)
-        import hashlib
-        hashed_password = hashlib.sha256(new_password.encode()).hexdigest()
+        password_valid, _ = await verify_password(current_password, user_doc["password_hash"])
+        if not password_valid:
+            raise HTTPException(status_code=401, detail="Current password is incorrect")
+        
+        # Hash the new password
+        hashed_password = await hash_password(new_password)
         
         # Update password in database
-        await db.user_passwords.update_one(
-            {"user_id": user_id},
+        await db.users.update_one(
+            {"id": user_id},
             {"$set": {
                 "password_hash": hashed_password,
                 "updated_at": datetime.utcnow()
-            }},
-            upsert=True
+            }}
         )
         
         logging.info(f"Password changed for user {user_id}")
@@ -7885,24 +8054,81 @@ async def export_user_data(current_user: User = Depends(get_current_user)):
         logging.error(f"Error exporting user data: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to export data: {str(e)}")
 
+# Background job handlers, by kind
+def for_job_owner(handler):
+    """Job handler whose LLM calls are queued under the user who submitted the job"""
+    async def run(job: JobContext):
+        with acting_for(job.user_id):
+            return await handler(job)
+    return run
+
+job_queue.register("fast_forward", for_job_owner(run_fast_forward))
+job_queue.register("translate_conversations", for_job_owner(run_translation))
+job_queue.register("library_avatars", for_job_owner(run_library_avatars))
+job_queue.register("weekly_summary", for_job_owner(run_weekly_summary))
+job_queue.register("auto_documents", for_job_owner(run_auto_documents))
+
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.get("/health")
+async def health_check():
+    """Health check endpoint for load balancers"""
+    db_healthy = await db_manager.health_check()
+    cache_healthy = cache_manager.connected
+
+    return {
+        "status": "healthy" if db_healthy else "unhealthy",
+        "database": "healthy" if db_healthy else "unhealthy",
+        # Redis is optional: without it limits and the LLM budget are per worker
+        "cache": "healthy" if cache_healthy else "unavailable",
+        "timestamp": time.time()
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Process and connection pool statistics (Prometheus metrics are served on METRICS_PORT)"""
+    stats = monitor.get_performance_stats()
+    db_stats = await db_manager.get_connection_stats()
+    if db_stats:
+        stats["database"] = db_stats
+    return stats
+
+# In-flight requests for the sampling profiler's route attribution. Registered first so it is
+# the innermost layer and the endpoint runs in the task it records.
+app.add_middleware(ProfilerMiddleware)
+
+# Negotiated brotli/gzip for large JSON bodies (conversation lists, documents, exports).
+# Registered before the http middlewares below so it sits inside them: they re-stream the body
+# in chunks, and the compressor only handles complete bodies.
+app.add_middleware(CompressionMiddleware)
+
+# Per-client limits by endpoint type (shared through Redis when it is available)
+app.middleware("http")(rate_limit_requests)
+
+# Request metrics by route template (count, latency, in-flight requests, slow request log)
+app.middleware("http")(track_request)
+
+# Per-request MongoDB query stats and N+1 detection
+app.middleware("http")(track_queries)
+
+# Per-request span trees (MongoDB commands, LLM calls, pipeline stages)
+app.middleware("http")(trace_request)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In production, specify your frontend domain
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=3600,  # Cache preflight requests for 1 hour
 )
 
+app.add_middleware(TrustedHostMiddleware, allowed_hosts=os.environ.get('ALLOWED_HOSTS', '*').split(','))
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
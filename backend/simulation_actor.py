@@ -0,0 +1,340 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import InsertOne, UpdateOne
+
+from delta_sync import touch
+
+Command = Callable[["SimulationActor"], Awaitable[Any]]
+StateListener = Callable[[str, dict], Awaitable[None]]
+
+# Relationship scores stay within these bounds; the status follows from the score
+SCORE_MIN, SCORE_MAX = -10, 10
+FRIENDS_ABOVE, TENSION_BELOW = 3, -3
+
+
+def relationship_status(score: int) -> str:
+    return "friends" if score > FRIENDS_ABOVE else "tension" if score < TENSION_BELOW else "neutral"
+
+
+def relationship_update(relationship: dict, change: int) -> list:
+    """Update pipeline adding `change` to the stored score (clamped) and recomputing the status.
+
+    Relative to whatever is stored, so changes made by other workers are kept; the
+    other fields of `relationship` only fill in a document that doesn't exist yet.
+    """
+    defaults = {
+        key: {"$ifNull": [f"${key}", {"$literal": value}]}
+        for key, value in relationship.items() if key not in ("_id", "score", "status", "updated_at")
+    }
+    score = {"$max": [SCORE_MIN, {"$min": [SCORE_MAX, {"$add": [{"$ifNull": ["$score", 0]}, change]}]}]}
+    status = {"$switch": {
+        "branches": [
+            {"case": {"$gt": ["$score", FRIENDS_ABOVE]}, "then": "friends"},
+            {"case": {"$lt": ["$score", TENSION_BELOW]}, "then": "tension"},
+        ],
+        "default": "neutral",
+    }}
+    return [{"$set": {**defaults, "score": score}}, {"$set": touch({"status": status})}]
+
+
+class SimulationActor:
+    """Single writer for one simulation.
+
+    Mutations (new rounds, period changes, relationship scores, agent updates) are
+    commands in the actor's inbox. The actor applies them one at a time to its
+    in-memory state, then persists everything a batch changed in one flush before
+    answering the callers, so two commands never interleave their read-modify-write.
+    Reads are served from the snapshot without waiting for the inbox.
+    """
+
+    def __init__(self, state: dict, store, batch_size: int, snapshot_ttl: float, idle_timeout: float,
+                 on_state_change: Optional[StateListener] = None):
+        self.simulation_id = state["id"]
+        self.store = store
+        self.on_state_change = on_state_change
+        self.batch_size = batch_size
+        self.snapshot_ttl = snapshot_ttl
+        self.idle_timeout = idle_timeout
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+        self.busy = False
+
+        self.state = dict(state)
+        self.loaded_at = time.monotonic()
+        self.relationship_cache: Optional[Dict[Tuple[str, str], dict]] = None
+
+        # Changes since the last flush
+        self.dirty_fields: Dict[str, Any] = {}
+        self.operations: Dict[str, List[Any]] = {}
+
+        self.stats = {"commands": 0, "batches": 0, "flushes": 0, "writes": 0, "failures": 0}
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    @property
+    def fresh(self) -> bool:
+        """Whether the snapshot is recent enough to serve reads (other workers may write too)"""
+        return time.monotonic() - self.loaded_at < self.snapshot_ttl
+
+    def snapshot(self) -> dict:
+        return dict(self.state)
+
+    def refresh(self, state: dict):
+        """Adopt a state read from MongoDB, unless a batch is being applied"""
+        if not self.busy and not self.dirty_fields:
+            self.state = dict(state)
+            self.loaded_at = time.monotonic()
+            self.relationship_cache = None
+
+    async def call(self, command: Command) -> Any:
+        """Queue a command and wait until it has been applied and persisted"""
+        future = asyncio.get_running_loop().create_future()
+        self.inbox.put_nowait((command, future))
+        if not self.running:
+            self.task = asyncio.create_task(self._run())
+        return await future
+
+    # Helpers for commands
+
+    def set(self, **fields):
+        """Change state fields; written with the next flush"""
+        self.state.update(fields)
+        self.dirty_fields.update(fields)
+
+    async def next_round(self) -> int:
+        """Allocate a round number (an atomic counter, so rounds from other workers never collide)"""
+        round_number = await self.store.next_round(self.simulation_id)
+        self.state["round_seq"] = round_number
+        return round_number
+
+    def insert(self, collection: str, doc: dict):
+        self.operations.setdefault(collection, []).append(InsertOne(touch(doc)))
+
+    def update(self, collection: str, filter: dict, fields: dict):
+        self.operations.setdefault(collection, []).append(UpdateOne(filter, {"$set": touch(fields)}))
+
+    async def relationships(self) -> Dict[Tuple[str, str], dict]:
+        """Relationships of this simulation by (agent1_id, agent2_id), read once per batch"""
+        if self.relationship_cache is None:
+            docs = await self.store.db.relationships.find(self.store.scope(self.simulation_id)).to_list(None)
+            self.relationship_cache = {}
+            for doc in docs:
+                doc.pop("_id", None)
+                self.relationship_cache[(doc["agent1_id"], doc["agent2_id"])] = doc
+        return self.relationship_cache
+
+    def adjust_relationship(self, relationship: dict, change: int) -> dict:
+        """Move a relationship's score by `change`; returns it as this batch expects it to be.
+
+        Written as a relative update, since other workers may have changed the
+        score since it was read.
+        """
+        score = max(SCORE_MIN, min(SCORE_MAX, relationship.get("score", 0) + change))
+        updated = touch({**relationship, "score": score, "status": relationship_status(score)})
+        if self.relationship_cache is not None:
+            self.relationship_cache[(relationship["agent1_id"], relationship["agent2_id"])] = updated
+        self.operations.setdefault("relationships", []).append(UpdateOne(
+            self.store.scope(self.simulation_id, agent1_id=relationship["agent1_id"],
+                             agent2_id=relationship["agent2_id"]),
+            relationship_update(relationship, change),
+            upsert=True
+        ))
+        return updated
+
+    def replace(self, state: dict):
+        """Swap in a new state (simulation reset); changes not yet flushed belonged to the old run"""
+        self.state = dict(state)
+        self.loaded_at = time.monotonic()
+        self.relationship_cache = None
+        self.dirty_fields = {}
+        self.operations = {}
+
+    # Inbox loop
+
+    async def _run(self):
+        while True:
+            try:
+                first = await asyncio.wait_for(self.inbox.get(), timeout=self.idle_timeout)
+            except asyncio.TimeoutError:
+                if self.inbox.empty():
+                    return
+                continue
+
+            batch = [first]
+            while len(batch) < self.batch_size and not self.inbox.empty():
+                batch.append(self.inbox.get_nowait())
+            await self._apply(batch)
+
+    async def _apply(self, batch: list):
+        self.busy = True
+        # Scores change in every worker: read them again for each batch
+        self.relationship_cache = None
+        results = []
+        try:
+            try:
+                if not self.fresh:
+                    await self._reload()
+            except Exception as e:
+                logging.error(f"Simulation {self.simulation_id} could not be reloaded: {e}")
+                results = [(future, None, e) for future, _ in batch]
+                return
+
+            for command, future in batch:
+                try:
+                    results.append((future, await command(self), None))
+                except Exception as e:
+                    results.append((future, None, e))
+                self.stats["commands"] += 1
+
+            try:
+                await self.flush()
+            except Exception as e:
+                # The state in memory may now be ahead of MongoDB; start over from what was stored
+                logging.error(f"Simulation {self.simulation_id} flush failed: {e}")
+                self.stats["failures"] += 1
+                self.replace(self.state)
+                self.loaded_at = float("-inf")
+                results = [(future, None, e) for future, _, _ in results]
+        except BaseException as e:
+            results = [(future, None, e) for future, _ in batch]
+            raise
+        finally:
+            self.busy = False
+            self.stats["batches"] += 1
+            for future, result, error in results:
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    async def _reload(self):
+        state = await self.store.get(self.simulation_id)
+        if state is not None:
+            self.state = state
+        self.loaded_at = time.monotonic()
+        self.relationship_cache = None
+
+    async def flush(self):
+        """Persist everything changed since the last flush: one write per collection"""
+        db = self.store.db
+        writes = 0
+
+        if self.dirty_fields:
+            fields, self.dirty_fields = self.dirty_fields, {}
+            await self.store.update(self.simulation_id, fields)
+            writes += 1
+            if self.on_state_change is not None:
+                await self.on_state_change(self.simulation_id, fields)
+
+        operations, self.operations = self.operations, {}
+        for collection, requests in operations.items():
+            await db[collection].bulk_write(requests, ordered=True)
+            writes += 1
+
+        if writes:
+            self.stats["flushes"] += 1
+            self.stats["writes"] += writes
+
+
+class SimulationActors:
+    """One actor per active simulation in this worker; idle actors exit on their own"""
+
+    def __init__(self, batch_size: int = None, snapshot_ttl: float = None, idle_timeout: float = None):
+        self.batch_size = batch_size or int(os.environ.get('SIMULATION_ACTOR_BATCH', 50))
+        # How long a snapshot may serve reads before it is re-read (covers writes by other workers)
+        self.snapshot_ttl = snapshot_ttl if snapshot_ttl is not None else float(
+            os.environ.get('SIMULATION_SNAPSHOT_TTL', 2))
+        self.idle_timeout = idle_timeout or float(os.environ.get('SIMULATION_ACTOR_IDLE', 300))
+        self.store = None
+        self.on_state_change: Optional[StateListener] = None
+        self.actors: Dict[str, SimulationActor] = {}
+        self.owners: Dict[str, str] = {}
+
+    def bind(self, store, on_state_change: Optional[StateListener] = None):
+        """Attach the simulation store; `on_state_change` hears about every state write"""
+        self.store = store
+        self.on_state_change = on_state_change
+
+    def _actor(self, state: dict) -> SimulationActor:
+        actor = self.actors.get(state["id"])
+        if actor is None:
+            self.sweep()
+            actor = self.actors[state["id"]] = SimulationActor(
+                state, self.store, self.batch_size, self.snapshot_ttl, self.idle_timeout, self.on_state_change
+            )
+        return actor
+
+    async def for_user(self, user_id: str, defaults: Callable[[], dict]) -> dict:
+        """Snapshot of the user's simulation state, re-read only when it has gone stale"""
+        actor = self.actors.get(self.owners.get(user_id))
+        if actor is not None and actor.fresh:
+            return actor.snapshot()
+
+        state = await self.store.for_user(user_id, defaults)
+        actor = self._actor(state)
+        self.owners[user_id] = state["id"]
+        actor.refresh(state)
+        return actor.snapshot()
+
+    async def get(self, simulation_id: str) -> SimulationActor:
+        actor = self.actors.get(simulation_id)
+        if actor is None:
+            state = await self.store.get(simulation_id)
+            if state is None:
+                raise KeyError(simulation_id)
+            actor = self._actor(state)
+        return actor
+
+    async def call(self, simulation_id: str, command: Command) -> Any:
+        """Run a command on the simulation's actor (applied in arrival order)"""
+        actor = await self.get(simulation_id)
+        return await actor.call(command)
+
+    async def update(self, simulation_id: str, fields: dict):
+        """Change simulation state fields through the actor"""
+        async def apply(actor: SimulationActor):
+            actor.set(**fields)
+        await self.call(simulation_id, apply)
+
+    async def update_agent(self, simulation_id: str, agent_id: str, fields: dict):
+        """Change an agent of the simulation through the actor"""
+        async def apply(actor: SimulationActor):
+            actor.update("agents", self.store.scope(simulation_id, id=agent_id), fields)
+        await self.call(simulation_id, apply)
+
+    def sweep(self):
+        """Forget actors that exited after idling"""
+        for simulation_id, actor in list(self.actors.items()):
+            if not actor.running and actor.inbox.empty() and not actor.fresh:
+                del self.actors[simulation_id]
+        live = set(self.actors)
+        self.owners = {user_id: simulation_id for user_id, simulation_id in self.owners.items() if simulation_id in live}
+
+    async def stop(self):
+        """Let every actor finish its inbox, then stop it"""
+        for actor in list(self.actors.values()):
+            if actor.running:
+                while not actor.inbox.empty() or actor.busy:
+                    await asyncio.sleep(0.01)
+                actor.task.cancel()
+                await asyncio.gather(actor.task, return_exceptions=True)
+        self.actors = {}
+        self.owners = {}
+
+    def get_stats(self) -> dict:
+        totals = {"actors": len(self.actors), "running": sum(actor.running for actor in self.actors.values())}
+        for actor in self.actors.values():
+            for key, value in actor.stats.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+# Global simulation actor registry
+simulation_actors = SimulationActors()
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+
+# Redis channel every worker publishes to and listens on
+CHANNEL = "simulation_events"
+
+# Event types
+ROUND_CREATED = "round_created"
+ROUND_UPDATED = "round_updated"
+RELATIONSHIPS_CHANGED = "relationships_changed"
+DOCUMENT_CREATED = "document_created"
+DOCUMENT_UPDATED = "document_updated"
+STATE_CHANGED = "state_changed"
+TIME_CHANGED = "time_changed"
+SUMMARY_READY = "summary_ready"
+SIMULATION_RESET = "simulation_reset"
+
+# Sent instead of the events a slow client missed; the client refetches everything
+RESYNC = "resync"
+
+# State fields that only move the simulation clock
+TIME_FIELDS = {"current_day", "current_time_period", "time_remaining_hours"}
+
+
+def _default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def encode_event(simulation_id: str, event_type: str, data: Optional[dict] = None) -> str:
+    """Serialize an event once; the same text goes to every subscriber and to Redis"""
+    event = {"type": event_type, "simulation_id": simulation_id, "data": data or {},
+             "at": datetime.utcnow().isoformat()}
+    return json.dumps(event, default=_default)
+
+
+class Subscription:
+    """Events of one simulation for one client, bounded so a slow client can't grow memory"""
+
+    def __init__(self, simulation_id: str, max_queue: int):
+        self.simulation_id = simulation_id
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.overflowed = False
+
+    def deliver(self, payload: str) -> bool:
+        if self.overflowed:
+            return False
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+
+    async def next(self) -> str:
+        """The next event, or a resync marker if events were dropped since the last one"""
+        payload = await self.queue.get()
+        if self.overflowed:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.overflowed = False
+            return json.dumps({"type": RESYNC, "simulation_id": self.simulation_id})
+        return payload
+
+
+class SimulationEvents:
+    """Per-simulation publish/subscribe for pushing changes to connected clients.
+
+    Subscribers in this worker are served from memory. With Redis attached every
+    event is also published on one channel, and each worker delivers the events
+    of other workers to its own subscribers, so a client sees every change no
+    matter which worker made it.
+    """
+
+    def __init__(self, max_queue: int = None, retry_seconds: float = None):
+        self.max_queue = max_queue or int(os.environ.get('SIMULATION_EVENT_QUEUE', 256))
+        self.retry_seconds = retry_seconds or float(os.environ.get('SIMULATION_EVENT_RETRY_SECONDS', 2))
+        self.origin = uuid.uuid4().hex
+        self.subscribers: Dict[str, Set[Subscription]] = {}
+        self.redis_client = None
+        self.listener: Optional[asyncio.Task] = None
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0, "received": 0, "redis_errors": 0}
+
+    def use_redis(self, redis_client):
+        """Fan events out to the other workers and replicas"""
+        self.redis_client = redis_client
+
+    async def start(self):
+        if self.redis_client is not None and self.listener is None:
+            self.listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self.listener is not None:
+            self.listener.cancel()
+            await asyncio.gather(self.listener, return_exceptions=True)
+            self.listener = None
+
+    def subscribe(self, simulation_id: str) -> Subscription:
+        subscription = Subscription(simulation_id, self.max_queue)
+        self.subscribers.setdefault(simulation_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self.subscribers.get(subscription.simulation_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscribers[subscription.simulation_id]
+
+    async def publish(self, simulation_id: str, event_type: str, data: Optional[dict] = None):
+        """Send an event to the simulation's subscribers in every worker (never raises)"""
+        try:
+            payload = encode_event(simulation_id, event_type, data)
+        except Exception as e:
+            logging.error(f"Could not encode {event_type} event: {e}")
+            return
+
+        self.stats["published"] += 1
+        self._deliver(simulation_id, payload)
+
+        if self.redis_client is not None:
+            envelope = json.dumps({"origin": self.origin, "simulation_id": simulation_id, "payload": payload})
+            try:
+                await self.redis_client.publish(CHANNEL, envelope)
+            except Exception as e:
+                # Local subscribers already have it; clients on other workers resync on reconnect
+                self.stats["redis_errors"] += 1
+                logging.warning(f"Could not fan out {event_type} event: {e}")
+
+    async def state_changed(self, simulation_id: str, fields: dict):
+        """Publish a write to the simulation state (the fields that changed)"""
+        event_type = TIME_CHANGED if fields.keys() <= TIME_FIELDS else STATE_CHANGED
+        await self.publish(simulation_id, event_type, fields)
+
+    def _deliver(self, simulation_id: str, payload: str):
+        for subscription in list(self.subscribers.get(simulation_id, ())):
+            if subscription.deliver(payload):
+                self.stats["delivered"] += 1
+            else:
+                self.stats["dropped"] += 1
+
+    async def _listen(self):
+        """Deliver events published by other workers"""
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    envelope = json.loads(message["data"])
+                    if envelope.get("origin") == self.origin:
+                        continue
+                    self.stats["received"] += 1
+                    self._deliver(envelope["simulation_id"], envelope["payload"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logging.error(f"Simulation event listener failed: {e}")
+                await asyncio.sleep(self.retry_seconds)
+            finally:
+                try:
+                    await pubsub.reset()
+                except Exception:
+                    pass
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "subscribers": sum(len(subscribers) for subscribers in self.subscribers.values()),
+            "fan_out": self.listener is not None and not self.listener.done(),
+        }
+
+
+async def run_event_socket(websocket: WebSocket, events: SimulationEvents,
+                           resolve: Callable[[str], Awaitable[dict]],
+                           heartbeat_seconds: float = None, idle_timeout: float = None):
+    """Drive one simulation-events WebSocket.
+
+    Protocol:
+      client → {"type": "subscribe", "token": ...}  (no token: the shared simulation)
+      server → {"type": "ready", "simulation_id": ...}
+      server → {"type": <event>, "simulation_id": ..., "data": {...}, "at": ...} as the simulation changes
+      server → {"type": "ping"} when nothing happened for a while
+      server → {"type": "resync"} if the client fell behind; it should refetch everything
+    Events published after "ready" are never missed, so a client fetches once after it.
+    """
+    heartbeat_seconds = heartbeat_seconds or float(os.environ.get('SIMULATION_EVENT_HEARTBEAT', 25))
+    idle_timeout = idle_timeout or float(os.environ.get('SIMULATION_EVENT_SUBSCRIBE_TIMEOUT', 10))
+    await websocket.accept()
+
+    try:
+        start = json.loads(await asyncio.wait_for(websocket.receive_text(), idle_timeout))
+        simulation = await resolve(start.get("token") or "")
+    except (asyncio.TimeoutError, ValueError, AttributeError, HTTPException, WebSocketDisconnect):
+        await websocket.close(code=1008, reason="Authentication required")
+        return
+
+    subscription = events.subscribe(simulation["id"])
+    # The client only sends on connect; a receive returning means it went away
+    closed = asyncio.create_task(websocket.receive())
+    try:
+        await websocket.send_json({"type": "ready", "simulation_id": simulation["id"]})
+        while True:
+            next_event = asyncio.create_task(subscription.next())
+            done, _ = await asyncio.wait({next_event, closed}, timeout=heartbeat_seconds,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if closed in done:
+                next_event.cancel()
+                return
+            if next_event in done:
+                await websocket.send_text(next_event.result())
+            else:
+                next_event.cancel()
+                await websocket.send_json({"type": "ping"})
+    except (WebSocketDisconnect, RuntimeError):
+        return
+    finally:
+        events.unsubscribe(subscription)
+        closed.cancel()
+
+# Global simulation event bus
+simulation_events = SimulationEvents()
@@ -0,0 +1,134 @@
+import logging
+from datetime import datetime
+from typing import Callable, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# Collections whose documents belong to exactly one simulation
+SIMULATION_COLLECTIONS = ("agents", "conversations", "relationships", "summaries", "observer_messages")
+
+# Requests without a token share one simulation, as every request did before partitioning
+ANONYMOUS_USER = ""
+
+
+class SimulationStore:
+    """Simulation states keyed by their owner.
+
+    Each user owns one simulation. Its state document's `id` is the simulation id,
+    and every agent, conversation, relationship, summary and observer message
+    carries that id, so queries and resets only ever touch one simulation.
+    """
+
+    def __init__(self):
+        self.db = None
+
+    def bind(self, db):
+        self.db = db
+
+    @staticmethod
+    def scope(simulation_id: str, **filter) -> dict:
+        """Query filter restricted to one simulation"""
+        return {"simulation_id": simulation_id, **filter}
+
+    async def create_indexes(self):
+        """Adopt pre-partitioning data, then index every collection by simulation"""
+        if self.db is None:
+            return
+
+        try:
+            await self.migrate_legacy()
+
+            await self.db.agents.create_index([("simulation_id", 1), ("created_at", 1)])
+            await self.db.conversations.create_index([("simulation_id", 1), ("created_at", -1)])
+            await self.db.conversations.create_index([("simulation_id", 1), ("round_number", -1)])
+            await self.db.relationships.create_index([("simulation_id", 1), ("agent1_id", 1), ("agent2_id", 1)])
+            await self.db.summaries.create_index([("simulation_id", 1), ("created_at", -1)])
+            await self.db.observer_messages.create_index([("simulation_id", 1), ("timestamp", -1)])
+            # Documents written by the agents themselves (user documents are keyed by metadata.user_id)
+            await self.db.documents.create_index([("simulation_id", 1), ("metadata.updated_at", -1)])
+            # Last: fails on a database that still has the old non-unique user_id index
+            await self.db.simulation_state.create_index("id", unique=True)
+            await self.db.simulation_state.create_index("user_id", unique=True)
+        except Exception as e:
+            logging.error(f"Error creating simulation indexes: {e}")
+
+    async def migrate_legacy(self):
+        """Hand data from the old global state document to the anonymous simulation"""
+        legacy_states = await self.db.simulation_state.find({"user_id": {"$exists": False}}).to_list(100)
+        if not legacy_states:
+            return
+
+        owner = ANONYMOUS_USER
+        if await self.db.simulation_state.find_one({"user_id": ANONYMOUS_USER}) is not None:
+            owner = None
+        for state in legacy_states:
+            # Only one document can own the anonymous simulation; park any extras under their own id
+            user_id = owner if owner is not None else f"legacy:{state['id']}"
+            owner = None
+            await self.db.simulation_state.update_one({"_id": state["_id"]}, {"$set": {"user_id": user_id}})
+
+        simulation_id = legacy_states[0]["id"]
+        for name in SIMULATION_COLLECTIONS:
+            await self.db[name].update_many(
+                {"simulation_id": {"$exists": False}},
+                {"$set": {"simulation_id": simulation_id}}
+            )
+        await self.db.documents.update_many(
+            {"user_id": "", "simulation_id": {"$exists": False}},
+            {"$set": {"simulation_id": simulation_id}}
+        )
+
+        # Continue round numbering after the rounds already stored
+        latest = await self.db.conversations.find(self.scope(simulation_id)).sort("round_number", -1).limit(1).to_list(1)
+        round_seq = latest[0].get("round_number", 0) if latest else 0
+        await self.db.simulation_state.update_one({"id": simulation_id}, {"$set": {"round_seq": round_seq}})
+        logging.info(f"Moved pre-partitioning simulation data into simulation {simulation_id}")
+
+    async def for_user(self, user_id: str, defaults: Callable[[], dict]) -> dict:
+        """The user's simulation state, created from `defaults()` on first use"""
+        state = await self.db.simulation_state.find_one({"user_id": user_id})
+        if state is not None:
+            return state
+
+        new_state = {**defaults(), "user_id": user_id, "round_seq": 0}
+        try:
+            return await self.db.simulation_state.find_one_and_update(
+                {"user_id": user_id},
+                {"$setOnInsert": new_state},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # A concurrent request created it first
+            return await self.db.simulation_state.find_one({"user_id": user_id})
+
+    async def get(self, simulation_id: str) -> Optional[dict]:
+        return await self.db.simulation_state.find_one({"id": simulation_id})
+
+    async def update(self, simulation_id: str, fields: dict):
+        await self.db.simulation_state.update_one({"id": simulation_id}, {"$set": fields})
+
+    async def next_round(self, simulation_id: str) -> int:
+        """Allocate the next conversation round number of a simulation"""
+        state = await self.db.simulation_state.find_one_and_update(
+            {"id": simulation_id},
+            {"$inc": {"round_seq": 1}},
+            projection={"round_seq": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return state["round_seq"] if state else 1
+
+    async def reset(self, state: dict, fields: dict) -> dict:
+        """Clear a simulation's data and restart its state, keeping its id and owner"""
+        simulation_id = state["id"]
+        for name in SIMULATION_COLLECTIONS:
+            await self.db[name].delete_many(self.scope(simulation_id))
+
+        new_state = {**fields, "id": simulation_id, "user_id": state.get("user_id", ANONYMOUS_USER), "round_seq": 0,
+                     "reset_at": datetime.utcnow()}
+        await self.db.simulation_state.replace_one({"id": simulation_id}, new_state)
+        return new_state
+
+# Global simulation store instance
+simulations = SimulationStore()
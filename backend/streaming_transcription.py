@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+
+from whisper_service import WhisperService
+
+
+class SegmentLimitExceeded(ValueError):
+    """A recording sent more audio than a streaming session allows"""
+
+
+class TranscriptionSession:
+    """Incremental transcript for one recording.
+
+    The client sends each segment as a standalone recording (a few seconds of
+    audio, then a segment boundary). Completed segments are transcribed
+    concurrently through the Whisper service while recording continues, and
+    `on_partial` fires in segment order as the transcript grows.
+    """
+
+    def __init__(self, service: WhisperService, language: str = None,
+                 on_partial: Callable[[int, str, str], Awaitable[None]] = None,
+                 max_segment_bytes: int = None, max_segments: int = None):
+        self.service = service
+        self.language = language
+        self.on_partial = on_partial
+        self.max_segment_bytes = max_segment_bytes or int(os.environ.get('SPEECH_STREAM_MAX_SEGMENT_BYTES', 5 * 1024 * 1024))
+        self.max_segments = max_segments or int(os.environ.get('SPEECH_STREAM_MAX_SEGMENTS', 60))
+        self.buffer = bytearray()
+        self.tasks: List[asyncio.Task] = []
+        self.texts: Dict[int, str] = {}
+        self.published = 0
+        self.failed_segments = 0
+        self.detected_language = None
+        self.duration = 0.0
+        self.publish_lock = asyncio.Lock()
+
+    def add_chunk(self, data: bytes):
+        """Append audio to the segment being recorded"""
+        if len(self.buffer) + len(data) > self.max_segment_bytes:
+            raise SegmentLimitExceeded("Audio segment is too large; send segment boundaries more often")
+        self.buffer.extend(data)
+
+    def end_segment(self) -> Optional[asyncio.Task]:
+        """Close the current segment and start transcribing it in the background"""
+        if not self.buffer:
+            return None
+        if len(self.tasks) >= self.max_segments:
+            raise SegmentLimitExceeded("Recording is too long")
+
+        audio = bytes(self.buffer)
+        self.buffer.clear()
+        task = asyncio.create_task(self._transcribe_segment(len(self.tasks), audio))
+        self.tasks.append(task)
+        return task
+
+    async def _transcribe_segment(self, index: int, audio: bytes):
+        try:
+            result = await self.service.transcribe_audio(audio, language=self.language,
+                                                         filename=f"segment_{index}.webm")
+            text = (result.get("text") or "").strip()
+            self.detected_language = self.detected_language or result.get("language")
+            self.duration += result.get("duration") or 0
+        except HTTPException as e:
+            # One unreadable segment shouldn't lose the rest of the recording
+            logging.warning(f"Streaming transcription segment {index} failed: {e.detail}")
+            self.failed_segments += 1
+            text = ""
+        self.texts[index] = text
+        await self._publish_ready()
+
+    async def _publish_ready(self):
+        # Partials go out strictly in segment order, whichever segment finished first
+        async with self.publish_lock:
+            while self.published in self.texts:
+                index = self.published
+                self.published += 1
+                if self.on_partial is not None and self.texts[index]:
+                    await self.on_partial(index, self.texts[index], self.transcript())
+
+    def transcript(self) -> str:
+        """Text of the segments published so far (every segment before the first unfinished one)"""
+        return " ".join(self.texts[index] for index in range(self.published) if self.texts[index])
+
+    async def finish(self) -> str:
+        """Transcribe whatever is buffered, wait for every segment and return the full transcript"""
+        self.end_segment()
+        await asyncio.gather(*self.tasks)
+        return self.transcript()
+
+    async def cancel(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+async def run_transcription_socket(websocket: WebSocket, service: WhisperService,
+                                   authenticate: Callable[[str], Awaitable[object]],
+                                   summarize: Callable[[str, str], Awaitable[str]],
+                                   idle_timeout: float = None):
+    """Drive one streaming-transcription WebSocket.
+
+    Protocol:
+      client → {"type": "start", "token": ..., "field_type": ..., "language": ...}
+      server → {"type": "ready"}
+      client → binary audio chunks, then {"type": "segment_end"} after each standalone segment
+      server → {"type": "partial", "segment": n, "text": ..., "transcript": ...} as segments finish
+      client → {"type": "stop"}
+      server → {"type": "final", "raw_transcription": ..., "formatted_text": ..., ...}
+    """
+    idle_timeout = idle_timeout or float(os.environ.get('SPEECH_STREAM_IDLE_TIMEOUT', 30))
+    await websocket.accept()
+
+    try:
+        start = json.loads(await asyncio.wait_for(websocket.receive_text(), idle_timeout))
+        user = await authenticate(start.get("token", ""))
+    except (asyncio.TimeoutError, ValueError, AttributeError, HTTPException, WebSocketDisconnect):
+        await websocket.close(code=1008, reason="Authentication required")
+        return
+
+    field_type = start.get("field_type", "general")
+    send_lock = asyncio.Lock()
+
+    async def send(payload: dict):
+        async with send_lock:
+            await websocket.send_json(payload)
+
+    async def on_partial(index: int, text: str, transcript: str):
+        await send({"type": "partial", "segment": index, "text": text, "transcript": transcript})
+
+    session = TranscriptionSession(service, language=start.get("language"), on_partial=on_partial)
+    await send({"type": "ready"})
+
+    try:
+        while True:
+            message = await asyncio.wait_for(websocket.receive(), idle_timeout)
+            if message["type"] == "websocket.disconnect":
+                await session.cancel()
+                return
+
+            if message.get("bytes") is not None:
+                session.add_chunk(message["bytes"])
+                continue
+
+            control = json.loads(message.get("text") or "{}")
+            if control.get("type") == "segment_end":
+                session.end_segment()
+            elif control.get("type") == "stop":
+                break
+
+        raw_text = await session.finish()
+    except (asyncio.TimeoutError, SegmentLimitExceeded, ValueError) as e:
+        await session.cancel()
+        detail = "Recording timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+        await send({"type": "error", "detail": detail})
+        await websocket.close(code=1008)
+        return
+    except WebSocketDisconnect:
+        await session.cancel()
+        return
+
+    if not raw_text:
+        await send({"type": "final", "success": False, "detail": "No speech detected in audio"})
+        await websocket.close()
+        return
+
+    formatted_text = await summarize(raw_text, field_type)
+    logging.info(f"Streaming transcription for user {getattr(user, 'id', '')}: {len(session.tasks)} segments, "
+                 f"{len(raw_text)} → {len(formatted_text)} characters")
+    await send({
+        "type": "final",
+        "success": True,
+        "raw_transcription": raw_text,
+        "formatted_text": formatted_text,
+        "field_type": field_type,
+        "language_detected": session.detected_language or "unknown",
+        "duration_seconds": round(session.duration, 1),
+        "segments": len(session.tasks),
+        "failed_segments": session.failed_segments,
+        "word_count": len(formatted_text.split())
+    })
+    await websocket.close()
@@ -0,0 +1,316 @@
+import functools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from pymongo import monitoring as mongo_monitoring
+
+from monitoring import route_template
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar('current_span', default=None)
+
+
+class Span:
+    """One timed operation in a request's span tree"""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "attributes",
+                 "start", "end", "start_unix", "status", "children")
+
+    def __init__(self, trace: "Trace", name: str, kind: str, parent: Optional["Span"] = None,
+                 attributes: Dict[str, Any] = None):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.start = time.perf_counter()
+        self.start_unix = time.time()
+        self.end = None
+        self.status = "ok"
+        self.children: List["Span"] = []
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def finish(self, status: str = "ok"):
+        self.end = time.perf_counter()
+        self.status = status
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "offset_ms": round((self.start - self.trace.root.start) * 1000, 2),
+            "duration_ms": round(self.duration_ms, 2),
+            "status": self.status,
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in list(self.children)],
+        }
+
+
+class Trace:
+    """All spans recorded while serving one request"""
+
+    def __init__(self, name: str, max_spans: int, attributes: Dict[str, Any] = None):
+        self.trace_id = uuid.uuid4().hex
+        self.span_count = 0
+        self.dropped_spans = 0
+        self.max_spans = max_spans
+        self.lock = threading.Lock()
+        self.root = Span(self, name, "request", attributes=attributes)
+
+    def add_child(self, parent: Span, name: str, kind: str, attributes: Dict[str, Any] = None) -> Optional[Span]:
+        # Mongo listeners add spans from Motor's executor threads
+        with self.lock:
+            if self.span_count >= self.max_spans:
+                self.dropped_spans += 1
+                return None
+            self.span_count += 1
+        span = Span(self, name, kind, parent=parent, attributes=attributes)
+        parent.children.append(span)
+        return span
+
+    def breakdown(self) -> Dict[str, Dict[str, float]]:
+        """Total time and count per span kind (mongo, llm, ...), excluding the request itself"""
+        totals: Dict[str, Dict[str, float]] = {}
+        stack = list(self.root.children)
+        while stack:
+            span = stack.pop()
+            entry = totals.setdefault(span.kind, {"count": 0, "total_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] = round(entry["total_ms"] + span.duration_ms, 2)
+            stack.extend(span.children)
+        return totals
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "started_at": self.root.start_unix,
+            "duration_ms": round(self.root.duration_ms, 2),
+            "status": self.root.status,
+            "span_count": self.span_count,
+            "dropped_spans": self.dropped_spans,
+            "breakdown": self.breakdown(),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = self.summary()
+        data["root"] = self.root.to_dict()
+        return data
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Encode as an OTLP/JSON ExportTraceServiceRequest"""
+        spans = []
+        stack = [self.root]
+        while stack:
+            span = stack.pop()
+            end = span.end if span.end is not None else time.perf_counter()
+            start_ns = int(span.start_unix * 1e9)
+            spans.append({
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or "",
+                "name": span.name,
+                "kind": 2 if span.kind == "request" else 3,  # SERVER / CLIENT
+                "startTimeUnixNano": str(start_ns),
+                "endTimeUnixNano": str(start_ns + int((end - span.start) * 1e9)),
+                "attributes": [
+                    {"key": key, "value": {"stringValue": str(value)}}
+                    for key, value in dict(span.attributes, **{"span.kind": span.kind}).items()
+                ],
+                "status": {"code": 1 if span.status == "ok" else 2},
+            })
+            stack.extend(span.children)
+
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "observer-ai"}}]},
+                "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+            }]
+        }
+
+
+class Tracer:
+    """Per-request span trees kept in an in-memory ring buffer, optionally exported as OTLP/JSON lines"""
+
+    def __init__(self):
+        self.enabled = os.environ.get('TRACING_ENABLED', 'true').lower() == 'true'
+        self.max_spans = int(os.environ.get('TRACE_MAX_SPANS', 2000))
+        self.export_path = os.environ.get('TRACE_EXPORT_FILE')
+        self.traces = deque(maxlen=int(os.environ.get('TRACE_BUFFER_SIZE', 200)))
+        # Finished traces wait here for the writer thread; when it falls behind, traces are dropped
+        self.export_queue: queue.Queue = queue.Queue(int(os.environ.get('TRACE_EXPORT_QUEUE', 1000)))
+        self.export_lock = threading.Lock()
+        self.writer: Optional[threading.Thread] = None
+        self.export_dropped = 0
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def start_trace(self, name: str, **attributes) -> Optional[Trace]:
+        if not self.enabled:
+            return None
+        return Trace(name, self.max_spans, attributes)
+
+    def finish_trace(self, trace: Trace, status: str = "ok"):
+        trace.root.finish(status)
+        self.traces.append(trace)
+        if self.export_path:
+            self._export(trace)
+
+    def _export(self, trace: Trace):
+        """Hand a trace to the writer thread; serializing and file I/O never run on the event loop"""
+        with self.export_lock:
+            if self.writer is None or not self.writer.is_alive():
+                self.writer = threading.Thread(target=self._write_exports, name="trace-export", daemon=True)
+                self.writer.start()
+        try:
+            self.export_queue.put_nowait(trace)
+        except queue.Full:
+            self.export_dropped += 1
+
+    def _write_exports(self):
+        while True:
+            batch = [self.export_queue.get()]
+            while batch[-1] is not None and not self.export_queue.empty():
+                batch.append(self.export_queue.get_nowait())
+
+            lines = []
+            for trace in batch:
+                if trace is None:
+                    continue
+                try:
+                    lines.append(json.dumps(trace.to_otlp()) + "\n")
+                except Exception as e:
+                    logging.warning(f"Could not export trace {trace.trace_id}: {e}")
+            if lines:
+                try:
+                    with open(self.export_path, "a") as f:
+                        f.writelines(lines)
+                except Exception as e:
+                    logging.warning(f"Could not export {len(lines)} traces: {e}")
+
+            for _ in batch:
+                self.export_queue.task_done()
+            if batch[-1] is None:
+                return
+
+    def flush(self, timeout: float = 5.0):
+        """Wait for queued traces to be written and stop the writer (shutdown, tests)"""
+        with self.export_lock:
+            writer, self.writer = self.writer, None
+        if writer is not None and writer.is_alive():
+            self.export_queue.put(None)
+            writer.join(timeout)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes):
+        """Time a block as a child of the current span (no-op outside a traced request)"""
+        parent = _current_span.get()
+        span = parent.trace.add_child(parent, name, kind, attributes) if parent else None
+        if span is None:
+            yield None
+            return
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException:
+            span.finish("error")
+            raise
+        else:
+            span.finish()
+        finally:
+            _current_span.reset(token)
+
+    def traced(self, name: str = None, kind: str = "internal"):
+        """Decorator that wraps an async function in a span"""
+        def decorator(func):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.span(span_name, kind):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def slowest(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Slowest traces in the buffer, with a per-kind time breakdown"""
+        traces = sorted(list(self.traces), key=lambda trace: trace.root.duration_ms, reverse=True)
+        return [trace.summary() for trace in traces[:limit]]
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        for trace in list(self.traces):
+            if trace.trace_id == trace_id:
+                return trace.to_dict()
+        return None
+
+
+class MongoTracingListener(mongo_monitoring.CommandListener):
+    """Records each MongoDB command as a span of the request that issued it"""
+
+    def __init__(self):
+        self.in_flight: Dict[Any, Span] = {}
+
+    def started(self, event):
+        parent = _current_span.get()
+        if parent is None:
+            return
+        command = event.command
+        collection = command.get(event.command_name)
+        span = parent.trace.add_child(parent, f"mongo.{event.command_name}", "mongo", {
+            "db": event.database_name,
+            "collection": collection if isinstance(collection, str) else "",
+        })
+        if span is not None:
+            self.in_flight[(event.request_id, event.connection_id)] = span
+
+    def _finish(self, event, status: str):
+        span = self.in_flight.pop((event.request_id, event.connection_id), None)
+        if span is not None:
+            span.finish(status)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+# Global tracer instance
+tracer = Tracer()
+
+# Pass to the Motor client alongside the metrics listener
+mongo_tracing_listener = MongoTracingListener()
+
+async def trace_request(request, call_next):
+    """HTTP middleware that records a span tree for each request"""
+    trace = tracer.start_trace(request.method, path=request.url.path)
+    if trace is None:
+        return await call_next(request)
+
+    token = _current_span.set(trace.root)
+    status = "error"
+    try:
+        response = await call_next(request)
+        status = "ok" if response.status_code < 500 else "error"
+        trace.root.attributes["status_code"] = response.status_code
+        return response
+    finally:
+        _current_span.reset(token)
+        trace.root.name = f"{request.method} {route_template(request)}"
+        tracer.finish_trace(trace, status)
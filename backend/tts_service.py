@@ -0,0 +1,341 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import struct
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import Request, Response
+
+from change_versions import etag_matches
+
+# Language to TTS language code mapping (only supported languages)
+LANGUAGE_CODES = {
+    "en": "en-US",
+    "es": "es-ES",
+    "es-mx": "es-MX",
+    "fr": "fr-FR",
+    "fr-ca": "fr-CA",
+    "de": "de-DE",
+    "it": "it-IT",
+    "pt": "pt-BR",
+    "pt-br": "pt-BR",
+    "ru": "ru-RU",
+    "ja": "ja-JP",
+    "ko": "ko-KR",
+    "zh": "zh-CN",
+    "hi": "hi-IN",
+    "ar": "ar-XA"
+}
+
+DEFAULT_AGENT_VOICE = 'Marcus "Mark" Castellano'
+
+# Voice configurations for different agents and supported languages
+AGENT_VOICES = {
+    'Marcus "Mark" Castellano': {
+        'en-US': ('en-US-Neural2-D', 'MALE'),
+        'es-ES': ('es-ES-Neural2-B', 'MALE'),
+        'es-MX': ('es-MX-Neural2-B', 'MALE'),
+        'fr-FR': ('fr-FR-Neural2-B', 'MALE'),
+        'de-DE': ('de-DE-Neural2-B', 'MALE'),
+        'it-IT': ('it-IT-Neural2-C', 'MALE'),
+        'pt-BR': ('pt-BR-Neural2-B', 'MALE'),
+        'ru-RU': ('ru-RU-Neural2-B', 'MALE'),
+        'ja-JP': ('ja-JP-Neural2-C', 'MALE'),
+        'ko-KR': ('ko-KR-Neural2-B', 'MALE'),
+        'zh-CN': ('zh-CN-Neural2-B', 'MALE'),
+        'hi-IN': ('hi-IN-Neural2-B', 'MALE'),
+        'ar-XA': ('ar-XA-Neural2-B', 'MALE'),
+        'default': ('en-US-Neural2-D', 'MALE')
+    },
+    'Alexandra "Alex" Chen': {
+        'en-US': ('en-US-Neural2-F', 'FEMALE'),
+        'es-ES': ('es-ES-Neural2-A', 'FEMALE'),
+        'es-MX': ('es-MX-Neural2-A', 'FEMALE'),
+        'fr-FR': ('fr-FR-Neural2-A', 'FEMALE'),
+        'de-DE': ('de-DE-Neural2-A', 'FEMALE'),
+        'it-IT': ('it-IT-Neural2-A', 'FEMALE'),
+        'pt-BR': ('pt-BR-Neural2-A', 'FEMALE'),
+        'ru-RU': ('ru-RU-Neural2-A', 'FEMALE'),
+        'ja-JP': ('ja-JP-Neural2-B', 'FEMALE'),
+        'ko-KR': ('ko-KR-Neural2-A', 'FEMALE'),
+        'zh-CN': ('zh-CN-Neural2-A', 'FEMALE'),
+        'hi-IN': ('hi-IN-Neural2-A', 'FEMALE'),
+        'ar-XA': ('ar-XA-Neural2-A', 'FEMALE'),
+        'default': ('en-US-Neural2-F', 'FEMALE')
+    },
+    'Diego "Dex" Rodriguez': {
+        'en-US': ('en-US-Neural2-A', 'MALE'),
+        'es-ES': ('es-ES-Neural2-C', 'MALE'),
+        'es-MX': ('es-MX-Neural2-C', 'MALE'),
+        'pt-BR': ('pt-BR-Neural2-C', 'MALE'),
+        'default': ('en-US-Neural2-A', 'MALE')
+    }
+}
+
+DEFAULT_SPEAKING_RATE = 0.9
+AUDIO_MIME_TYPE = "audio/mpeg"
+AUDIO_KEY_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class VoiceNotSupported(ValueError):
+    """No TTS voice exists for the requested language"""
+
+
+class Voice(NamedTuple):
+    language_code: str
+    name: str
+    gender: str
+
+
+def resolve_voice(agent_name: str, language: str) -> Voice:
+    """Pick the voice for an agent in a language, falling back to the default agent's voices"""
+    language_code = LANGUAGE_CODES.get(language)
+    if language_code is None:
+        raise VoiceNotSupported(f"Voice not supported for language: {language}")
+
+    agent_voices = AGENT_VOICES.get(agent_name, AGENT_VOICES[DEFAULT_AGENT_VOICE])
+    name, gender = agent_voices.get(language_code, agent_voices['default'])
+    return Voice(language_code, name, gender)
+
+
+def cache_key(text: str, voice: Voice, rate: float) -> str:
+    """Cache key for one synthesis: (text hash, voice, language, rate)"""
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    material = f"{text_hash}|{voice.name}|{voice.language_code}|{rate:.2f}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class GoogleTTSBackend:
+    """Google Cloud TTS through one long-lived async client"""
+
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key
+        self.client = None
+
+    def _get_client(self):
+        # Created lazily: the grpc aio channel must be built inside the running loop
+        if self.client is None:
+            from google.cloud import texttospeech
+            api_key = self.api_key or os.environ.get('GEMINI_API_KEY')
+            self.client = texttospeech.TextToSpeechAsyncClient(client_options={'api_key': api_key})
+        return self.client
+
+    async def synthesize(self, text: str, voice: Voice, rate: float) -> bytes:
+        from google.cloud import texttospeech
+
+        response = await self._get_client().synthesize_speech(
+            input=texttospeech.SynthesisInput(text=text),
+            voice=texttospeech.VoiceSelectionParams(
+                language_code=voice.language_code,
+                name=voice.name,
+                ssml_gender=texttospeech.SsmlVoiceGender[voice.gender]
+            ),
+            audio_config=texttospeech.AudioConfig(
+                audio_encoding=texttospeech.AudioEncoding.MP3,
+                speaking_rate=rate,
+                pitch=0.0
+            )
+        )
+        return response.audio_content
+
+
+class LocalTTSBackend:
+    """Offline stand-in that returns silent MP3 frames, roughly one per word.
+
+    Selected with TTS_BACKEND=local for development and tests.
+    """
+
+    # MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding: 417-byte frames
+    FRAME_HEADER = struct.pack(">I", 0xFFFB9064)
+    FRAME_SIZE = 417
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def synthesize(self, text: str, voice: Voice, rate: float) -> bytes:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        frames = max(1, len(text.split()))
+        frame = self.FRAME_HEADER + bytes(self.FRAME_SIZE - len(self.FRAME_HEADER))
+        return frame * frames
+
+
+class AudioCache:
+    """On-disk MP3 cache with a size cap; least recently used files are evicted first.
+
+    Reads return the clip's bytes rather than its path, so a clip evicted (by this or
+    another worker) right after a hit can still be sent. Methods block; run them in a thread.
+    """
+
+    def __init__(self, directory: str = None, max_bytes: int = None):
+        self.directory = Path(directory or os.environ.get(
+            'TTS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'observer_tts_cache')))
+        self.max_bytes = max_bytes or int(os.environ.get('TTS_CACHE_MAX_MB', 512)) * 1024 * 1024
+        self.total_bytes = None
+        # put() runs in to_thread workers; the size accounting and eviction are shared
+        self.lock = threading.Lock()
+
+    def path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.mp3"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """The cached clip, marked as recently used (mtime) so eviction is LRU"""
+        if not AUDIO_KEY_PATTERN.match(key or ""):
+            return None
+        path = self.path(key)
+        try:
+            audio = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return audio
+
+    def put(self, key: str, audio: bytes) -> Path:
+        """Write atomically so readers never see a partial file (blocking; run in a thread)"""
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(audio)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = self._scan_size()
+            else:
+                self.total_bytes += len(audio)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+        return path
+
+    def _files(self):
+        return [path for path in self.directory.glob("*/*.mp3") if path.is_file()]
+
+    def _scan_size(self) -> int:
+        return sum(path.stat().st_size for path in self._files())
+
+    def _mtime(self, path: Path) -> float:
+        try:
+            return path.stat().st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    def _evict(self):
+        files = sorted(self._files(), key=self._mtime)
+        # Trim to 90% so we are not evicting again on the very next write
+        target = self.max_bytes * 0.9
+        for path in files:
+            if self.total_bytes <= target:
+                break
+            try:
+                size = path.stat().st_size
+                path.unlink()
+                self.total_bytes -= size
+            except FileNotFoundError:
+                continue
+
+
+class SynthesisResult(NamedTuple):
+    key: str
+    audio: bytes
+    voice: Voice
+    cached: bool
+
+
+class TTSService:
+    """Cached, concurrency-bounded text-to-speech.
+
+    Identical requests (same text, voice, language and rate) are synthesized
+    once and then served from disk; at most `max_concurrency` synthesis calls
+    run against the backend at a time.
+    """
+
+    def __init__(self, backend=None, cache: AudioCache = None, max_concurrency: int = None):
+        if backend is None:
+            backend = LocalTTSBackend() if os.environ.get('TTS_BACKEND') == 'local' else GoogleTTSBackend()
+        self.backend = backend
+        self.cache = cache or AudioCache()
+        self.max_concurrency = max_concurrency or int(os.environ.get('TTS_MAX_CONCURRENCY', 4))
+        self.semaphore = None
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.semaphore
+
+    async def lookup(self, key: str) -> Optional[bytes]:
+        """An already-synthesized clip, if cached"""
+        return await asyncio.to_thread(self.cache.get, key)
+
+    async def synthesize(self, text: str, agent_name: str, language: str = "en",
+                         rate: float = DEFAULT_SPEAKING_RATE) -> SynthesisResult:
+        """Synthesize text in the agent's voice, or return the cached clip"""
+        voice = resolve_voice(agent_name, language)
+        key = cache_key(text, voice, rate)
+
+        audio = await asyncio.to_thread(self.cache.get, key)
+        if audio is not None:
+            self.hits += 1
+            return SynthesisResult(key, audio, voice, True)
+
+        # Concurrent requests for the same clip share one synthesis
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            self.hits += 1
+            return SynthesisResult(key, await asyncio.shield(pending), voice, True)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            async with self._get_semaphore():
+                audio = await self.backend.synthesize(text, voice, rate)
+            await asyncio.to_thread(self.cache.put, key, audio)
+            future.set_result(audio)
+            return SynthesisResult(key, audio, voice, False)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.failures += 1
+            logging.error(f"TTS synthesis failed for {voice.name}: {e}")
+            future.set_exception(e)
+            # Nobody else may be waiting; mark the exception as retrieved
+            future.exception()
+            raise
+        finally:
+            self.in_flight.pop(key, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+            "in_flight": len(self.in_flight),
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+def audio_response(request: Request, key: str, audio: bytes, cache_control: str,
+                   headers: Dict[str, str] = None) -> Response:
+    """Send a clip, answering 304 for a matching If-None-Match"""
+    etag = f'"{key}"'
+    headers = dict(headers or {}, ETag=etag)
+    headers["Cache-Control"] = cache_control
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=audio, media_type=AUDIO_MIME_TYPE, headers=headers)
+
+# Global TTS service instance
+tts_service = TTSService()
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import aiohttp
+
+USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/91.0.4472.124 Safari/537.36'
+)
+
+# Content types worth turning into memory text (missing Content-Type is treated as text)
+TEXT_TYPES = ("text/", "application/xhtml+xml", "application/xml", "application/json")
+
+# Elements whose text is never part of the readable page
+SKIPPED_ELEMENTS = {"script", "style", "noscript", "template", "svg"}
+
+
+class UrlFetchError(Exception):
+    """A URL could not be turned into text (network error, timeout, bad status or content type)"""
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_ELEMENTS:
+            self.skipping += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_ELEMENTS and self.skipping:
+            self.skipping -= 1
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+
+
+def extract_text(body: bytes, charset: Optional[str], content_type: str, max_chars: int) -> str:
+    """Readable text of a response body, whitespace-collapsed and cut to `max_chars`.
+
+    CPU-bound on large pages; the fetcher runs it in a worker thread.
+    """
+    try:
+        document = body.decode(charset or "utf-8", errors="replace")
+    except LookupError:  # Unknown charset name
+        document = body.decode("utf-8", errors="replace")
+
+    if "html" in content_type or "xml" in content_type or not content_type:
+        extractor = _TextExtractor()
+        extractor.feed(document)
+        extractor.close()
+        document = " ".join(extractor.parts)
+
+    text = " ".join(document.split())
+    if len(text) > max_chars:
+        text = text[:max_chars] + "..."
+    return text
+
+
+class UrlEntry:
+    """Cached text of one URL, its validators, and the LLM summary of that text"""
+
+    __slots__ = ("url", "text", "etag", "last_modified", "checked_at", "summary")
+
+    def __init__(self, url: str, text: str, etag: Optional[str], last_modified: Optional[str]):
+        self.url = url
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.checked_at = time.monotonic()
+        self.summary: Optional[str] = None
+
+
+class UrlFetcher:
+    """Fetches web pages referenced in agent memories.
+
+    One pooled aiohttp session is shared by every fetch, with at most
+    URL_FETCH_MAX_CONNECTIONS connections in total and URL_FETCH_PER_HOST per
+    host, so the URLs of a memory can be fetched at once without hammering a
+    single site. Page text (and its summary) is kept in an LRU; within
+    URL_CACHE_FRESH_SECONDS it is reused as is, after that it is revalidated
+    with If-None-Match / If-Modified-Since and a 304 keeps the cached summary.
+    Concurrent requests for the same URL share one fetch.
+    """
+
+    def __init__(self, max_connections: int = None, per_host: int = None, timeout: float = None,
+                 cache_size: int = None, fresh_seconds: float = None, max_bytes: int = None,
+                 max_chars: int = None):
+        self.max_connections = max_connections or int(os.environ.get('URL_FETCH_MAX_CONNECTIONS', 20))
+        self.per_host = per_host or int(os.environ.get('URL_FETCH_PER_HOST', 2))
+        self.timeout = timeout or float(os.environ.get('URL_FETCH_TIMEOUT', 5))
+        self.cache_size = cache_size or int(os.environ.get('URL_CACHE_SIZE', 256))
+        self.fresh_seconds = fresh_seconds if fresh_seconds is not None else float(
+            os.environ.get('URL_CACHE_FRESH_SECONDS', 300))
+        self.max_bytes = max_bytes or int(os.environ.get('URL_FETCH_MAX_BYTES', 2 * 1024 * 1024))
+        self.max_chars = max_chars or int(os.environ.get('URL_CONTENT_MAX_CHARS', 1500))
+        self.cache: "OrderedDict[str, UrlEntry]" = OrderedDict()
+        self.in_flight: Dict[Any, asyncio.Future] = {}
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.stats = {"hits": 0, "fetches": 0, "not_modified": 0, "errors": 0, "summary_hits": 0}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.per_host,
+                                             ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'User-Agent': USER_AGENT}
+            )
+        return self.session
+
+    async def close(self):
+        """Release pooled connections"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def fetch(self, url: str) -> UrlEntry:
+        """Text of a URL, from the cache while fresh; raises UrlFetchError"""
+        entry = self.cache.get(url)
+        if entry is not None and time.monotonic() - entry.checked_at < self.fresh_seconds:
+            self.cache.move_to_end(url)
+            self.stats["hits"] += 1
+            return entry
+        return await self._once(("fetch", url), lambda: self._fetch(url, entry))
+
+    async def summary(self, entry: UrlEntry, summarize: Callable[[str], Awaitable[Optional[str]]]) -> Optional[str]:
+        """The entry's summary, made by `summarize(text)` once per version of the page.
+
+        A None from `summarize` (e.g. out of LLM quota) is returned but not cached.
+        """
+        if entry.summary is not None:
+            self.stats["summary_hits"] += 1
+            return entry.summary
+        summary = await self._once(("summary", entry.url, entry.text), lambda: summarize(entry.text))
+        if summary:
+            entry.summary = summary
+        return summary
+
+    async def _once(self, key, factory: Callable[[], Awaitable[Any]]):
+        # Identical work requested concurrently runs once
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            result = await factory()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; mark the exception as retrieved
+            future.exception()
+            raise
+        finally:
+            self.in_flight.pop(key, None)
+
+    async def _fetch(self, url: str, cached: Optional[UrlEntry]) -> UrlEntry:
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        try:
+            async with self._get_session().get(url, headers=headers) as response:
+                if response.status == 304 and cached is not None:
+                    self.stats["not_modified"] += 1
+                    cached.checked_at = time.monotonic()
+                    self._remember(cached)
+                    return cached
+
+                if response.status != 200:
+                    raise UrlFetchError(f"status: {response.status}")
+
+                content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+                if content_type and not content_type.startswith(TEXT_TYPES):
+                    raise UrlFetchError(f"unsupported content type {content_type}")
+
+                body = bytearray()
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    body.extend(chunk)
+                    if len(body) >= self.max_bytes:
+                        break
+
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+                no_store = 'no-store' in response.headers.get('Cache-Control', '').lower()
+                charset = response.charset
+        except asyncio.TimeoutError:
+            self.stats["errors"] += 1
+            raise UrlFetchError("timed out")
+        except aiohttp.ClientError as e:
+            self.stats["errors"] += 1
+            logging.warning(f"Error fetching {url}: {e}")
+            raise UrlFetchError(str(e) or type(e).__name__)
+        except UrlFetchError:
+            self.stats["errors"] += 1
+            raise
+
+        self.stats["fetches"] += 1
+        text = await asyncio.to_thread(extract_text, bytes(body[:self.max_bytes]), charset, content_type,
+                                       self.max_chars)
+        entry = UrlEntry(url, text, etag, last_modified)
+        if cached is not None and cached.text == text:
+            # Same page without validators: the summary still applies
+            entry.summary = cached.summary
+        if not no_store:
+            self._remember(entry)
+        return entry
+
+    def _remember(self, entry: UrlEntry):
+        self.cache[entry.url] = entry
+        self.cache.move_to_end(entry.url)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "cached": len(self.cache),
+            "max_connections": self.max_connections,
+            "per_host": self.per_host,
+        }
+
+# Global URL fetcher instance
+url_fetcher = UrlFetcher()
@@ -0,0 +1,335 @@
+import asyncio
+import logging
+import os
+from pathlib import PurePath
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+# Containers the Whisper API accepts as uploaded; anything else is transcoded first
+ACCEPTED_FORMATS = {"flac", "m4a", "mp3", "mp4", "mpeg", "mpga", "oga", "ogg", "wav", "webm"}
+
+# Mono 16 kHz Opus in Ogg: what Whisper resamples to anyway, at a fraction of WAV's size
+FFMPEG_ARGS = [
+    "-hide_banner", "-loglevel", "error",
+    "-i", "pipe:0", "-vn", "-ac", "1", "-ar", "16000",
+    "-c:a", "libopus", "-b:a", "24k", "-f", "ogg", "pipe:1"
+]
+
+WHISPER_LANGUAGES = [
+    {"code": "af", "name": "Afrikaans"},
+    {"code": "am", "name": "Amharic"},
+    {"code": "ar", "name": "Arabic"},
+    {"code": "as", "name": "Assamese"},
+    {"code": "az", "name": "Azerbaijani"},
+    {"code": "ba", "name": "Bashkir"},
+    {"code": "be", "name": "Belarusian"},
+    {"code": "bg", "name": "Bulgarian"},
+    {"code": "bn", "name": "Bengali"},
+    {"code": "bo", "name": "Tibetan"},
+    {"code": "br", "name": "Breton"},
+    {"code": "bs", "name": "Bosnian"},
+    {"code": "ca", "name": "Catalan"},
+    {"code": "cs", "name": "Czech"},
+    {"code": "cy", "name": "Welsh"},
+    {"code": "da", "name": "Danish"},
+    {"code": "de", "name": "German"},
+    {"code": "el", "name": "Greek"},
+    {"code": "en", "name": "English"},
+    {"code": "es", "name": "Spanish"},
+    {"code": "et", "name": "Estonian"},
+    {"code": "eu", "name": "Basque"},
+    {"code": "fa", "name": "Persian"},
+    {"code": "fi", "name": "Finnish"},
+    {"code": "fo", "name": "Faroese"},
+    {"code": "fr", "name": "French"},
+    {"code": "gl", "name": "Galician"},
+    {"code": "gu", "name": "Gujarati"},
+    {"code": "ha", "name": "Hausa"},
+    {"code": "haw", "name": "Hawaiian"},
+    {"code": "he", "name": "Hebrew"},
+    {"code": "hi", "name": "Hindi"},
+    {"code": "hr", "name": "Croatian"},  # ✅ Croatian support!
+    {"code": "ht", "name": "Haitian Creole"},
+    {"code": "hu", "name": "Hungarian"},
+    {"code": "hy", "name": "Armenian"},
+    {"code": "id", "name": "Indonesian"},
+    {"code": "is", "name": "Icelandic"},
+    {"code": "it", "name": "Italian"},
+    {"code": "ja", "name": "Japanese"},
+    {"code": "jw", "name": "Javanese"},
+    {"code": "ka", "name": "Georgian"},
+    {"code": "kk", "name": "Kazakh"},
+    {"code": "km", "name": "Khmer"},
+    {"code": "kn", "name": "Kannada"},
+    {"code": "ko", "name": "Korean"},
+    {"code": "la", "name": "Latin"},
+    {"code": "lb", "name": "Luxembourgish"},
+    {"code": "ln", "name": "Lingala"},
+    {"code": "lo", "name": "Lao"},
+    {"code": "lt", "name": "Lithuanian"},
+    {"code": "lv", "name": "Latvian"},
+    {"code": "mg", "name": "Malagasy"},
+    {"code": "mi", "name": "Maori"},
+    {"code": "mk", "name": "Macedonian"},
+    {"code": "ml", "name": "Malayalam"},
+    {"code": "mn", "name": "Mongolian"},
+    {"code": "mr", "name": "Marathi"},
+    {"code": "ms", "name": "Malay"},
+    {"code": "mt", "name": "Maltese"},
+    {"code": "my", "name": "Myanmar"},
+    {"code": "ne", "name": "Nepali"},
+    {"code": "nl", "name": "Dutch"},
+    {"code": "nn", "name": "Nynorsk"},
+    {"code": "no", "name": "Norwegian"},
+    {"code": "oc", "name": "Occitan"},
+    {"code": "pa", "name": "Punjabi"},
+    {"code": "pl", "name": "Polish"},
+    {"code": "ps", "name": "Pashto"},
+    {"code": "pt", "name": "Portuguese"},
+    {"code": "ro", "name": "Romanian"},
+    {"code": "ru", "name": "Russian"},
+    {"code": "sa", "name": "Sanskrit"},
+    {"code": "sd", "name": "Sindhi"},
+    {"code": "si", "name": "Sinhala"},
+    {"code": "sk", "name": "Slovak"},
+    {"code": "sl", "name": "Slovenian"},
+    {"code": "sn", "name": "Shona"},
+    {"code": "so", "name": "Somali"},
+    {"code": "sq", "name": "Albanian"},
+    {"code": "sr", "name": "Serbian"},
+    {"code": "su", "name": "Sundanese"},
+    {"code": "sv", "name": "Swedish"},
+    {"code": "sw", "name": "Swahili"},
+    {"code": "ta", "name": "Tamil"},
+    {"code": "te", "name": "Telugu"},
+    {"code": "tg", "name": "Tajik"},
+    {"code": "th", "name": "Thai"},
+    {"code": "tk", "name": "Turkmen"},
+    {"code": "tl", "name": "Tagalog"},
+    {"code": "tr", "name": "Turkish"},
+    {"code": "tt", "name": "Tatar"},
+    {"code": "uk", "name": "Ukrainian"},
+    {"code": "ur", "name": "Urdu"},
+    {"code": "uz", "name": "Uzbek"},
+    {"code": "vi", "name": "Vietnamese"},
+    {"code": "yi", "name": "Yiddish"},
+    {"code": "yo", "name": "Yoruba"},
+    {"code": "zh", "name": "Chinese"}
+]
+
+
+class AudioFormatError(ValueError):
+    """Uploaded audio could not be identified or transcoded"""
+
+
+def sniff_container(data: bytes) -> Optional[str]:
+    """Identify an audio container from its leading bytes (None if unknown)"""
+    head = data[:16]
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        # EBML: WebM names its doctype in the header, anything else is plain Matroska
+        return "webm" if b"webm" in data[:64] else "mkv"
+    if head.startswith(b"OggS"):
+        return "ogg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head.startswith(b"fLaC"):
+        return "flac"
+    if head[4:8] == b"ftyp":
+        return "m4a" if head[8:11] == b"M4A" else "mp4"
+    if head.startswith(b"ID3"):
+        return "mp3"
+    if len(head) > 1 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0 and (head[1] & 0x06):
+        # MPEG audio frame sync; a zero layer field would be ADTS AAC instead
+        return "mp3"
+    return None
+
+
+async def transcode_to_ogg(data: bytes, ffmpeg: str = None, timeout: float = None) -> bytes:
+    """Transcode audio to Ogg/Opus with an ffmpeg subprocess, entirely over pipes"""
+    ffmpeg = ffmpeg or os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+    timeout = timeout or float(os.environ.get('FFMPEG_TIMEOUT', 60))
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            ffmpeg, *FFMPEG_ARGS,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+    except FileNotFoundError as e:
+        raise AudioFormatError(f"{ffmpeg} is not installed") from e
+
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(data), timeout)
+    except asyncio.TimeoutError:
+        raise AudioFormatError(f"Transcoding took longer than {timeout:.0f}s")
+    finally:
+        # Never leave ffmpeg running after a timeout or a cancelled request
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+    if process.returncode != 0 or not stdout:
+        detail = stderr.decode("utf-8", errors="replace").strip()[-200:]
+        raise AudioFormatError(f"ffmpeg could not decode the audio: {detail}")
+    return stdout
+
+
+class OpenAIWhisperBackend:
+    """Whisper API through one AsyncOpenAI client on a shared HTTP connection pool"""
+
+    def __init__(self, api_key: str = None, max_connections: int = None):
+        self.api_key = api_key
+        self.max_connections = max_connections or int(os.environ.get('WHISPER_MAX_CONNECTIONS', 10))
+        self.client = None
+
+    def _get_api_key(self) -> Optional[str]:
+        # Read lazily: the global service is built before server.py loads .env
+        return self.api_key or os.environ.get('OPENAI_API_KEY')
+
+    @property
+    def configured(self) -> bool:
+        return bool(self._get_api_key())
+
+    def _get_client(self):
+        if self.client is None:
+            import httpx
+            import openai
+
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                timeout=httpx.Timeout(120.0, connect=10.0)
+            )
+            self.client = openai.AsyncOpenAI(api_key=self._get_api_key(), http_client=http_client)
+        return self.client
+
+    async def transcribe(self, audio: bytes, filename: str, language: Optional[str]) -> Dict[str, Any]:
+        options = {"language": language} if language else {}  # Auto-detect if not specified
+        transcript = await self._get_client().audio.transcriptions.create(
+            model="whisper-1",
+            file=(filename, audio),
+            response_format="verbose_json",
+            timestamp_granularities=["word"],
+            **options
+        )
+        return {
+            "text": transcript.text,
+            "language": transcript.language,
+            "duration": getattr(transcript, 'duration', 0),
+            "words": getattr(transcript, 'words', None) or [],
+            "confidence": getattr(transcript, 'avg_logprob', None)
+        }
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+
+class LocalWhisperBackend:
+    """Offline stand-in for the Whisper API, selected with WHISPER_BACKEND=local.
+
+    Returns a fixed transcript (or one describing the upload) and records each call.
+    """
+
+    configured = True
+
+    def __init__(self, transcript: str = None, delay: float = 0.0):
+        self.transcript = transcript
+        self.delay = delay
+        self.calls: List[Tuple[str, int, Optional[str]]] = []
+
+    async def transcribe(self, audio: bytes, filename: str, language: Optional[str]) -> Dict[str, Any]:
+        self.calls.append((filename, len(audio), language))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        text = self.transcript if self.transcript is not None else f"Local transcript of {len(audio)} bytes"
+        return {
+            "text": text,
+            "language": language or "en",
+            "duration": round(len(text.split()) * 0.4, 1),
+            "words": [],
+            "confidence": None
+        }
+
+    async def close(self):
+        pass
+
+
+class WhisperService:
+    """Speech-to-text pipeline: sniff the container, transcode only if Whisper can't take it, transcribe.
+
+    Nothing touches the disk or blocks the event loop, and at most
+    `max_concurrency` uploads are transcoded or transcribed at a time.
+    """
+
+    def __init__(self, backend=None, max_concurrency: int = None):
+        if backend is None:
+            backend = LocalWhisperBackend() if os.environ.get('WHISPER_BACKEND') == 'local' else OpenAIWhisperBackend()
+        self.backend = backend
+        self.max_concurrency = max_concurrency or int(os.environ.get('WHISPER_MAX_CONCURRENCY', 4))
+        self.semaphore = None
+        self.passed_through = 0
+        self.transcoded = 0
+        self.failures = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.semaphore
+
+    async def prepare_audio(self, audio: bytes, filename: str) -> Tuple[bytes, str]:
+        """Return audio Whisper accepts plus an upload filename whose extension matches it"""
+        stem = PurePath(filename or "audio").stem or "audio"
+        container = sniff_container(audio)
+        if container in ACCEPTED_FORMATS:
+            self.passed_through += 1
+            return audio, f"{stem}.{container}"
+
+        converted = await transcode_to_ogg(audio)
+        self.transcoded += 1
+        return converted, f"{stem}.ogg"
+
+    async def transcribe_audio(self, audio_file: bytes, language: str = None, filename: str = "audio.webm") -> Dict[str, Any]:
+        """Transcribe audio using OpenAI Whisper API"""
+        if not self.backend.configured:
+            logging.warning("OPENAI_API_KEY not found in environment variables")
+            raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+
+        async with self._get_semaphore():
+            try:
+                audio, upload_name = await self.prepare_audio(audio_file, filename)
+            except AudioFormatError as e:
+                self.failures += 1
+                logging.warning(f"Rejected audio upload {filename}: {e}")
+                raise HTTPException(status_code=400, detail="Invalid audio format. Please try recording again.")
+
+            try:
+                result = await self.backend.transcribe(audio, upload_name, language)
+            except Exception as e:
+                self.failures += 1
+                logging.error(f"Error transcribing audio: {e}")
+                raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
+
+        return dict(result, success=True)
+
+    async def close(self):
+        """Release the backend's HTTP connections"""
+        await self.backend.close()
+
+    def get_supported_languages(self) -> List[Dict[str, str]]:
+        """Get list of supported languages for Whisper"""
+        return WHISPER_LANGUAGES
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "passed_through": self.passed_through,
+            "transcoded": self.transcoded,
+            "failures": self.failures,
+            "max_concurrency": self.max_concurrency,
+        }
+
+# Global Whisper service instance
+whisper_service = WhisperService()
@@ -212,7 +212,7 @@ def test_chart_generation():
     }
     
     try:
-        pie_chart = chart_generator.create_pie_chart(budget_data, "Budget Allocation")
+        pie_chart = asyncio.run(chart_generator.create_pie_chart(budget_data, "Budget Allocation"))
         
         pie_chart_passed = pie_chart and len(pie_chart) > 1000
         if pie_chart_passed:
@@ -220,7 +220,7 @@ def test_chart_generation():
             # Save a sample of the chart to verify it's valid
             sample_path = "/tmp/sample_pie_chart.png"
             with open(sample_path, "wb") as f:
-                f.write(base64.b64decode(pie_chart))
+                f.write(base64.b64decode(pie_chart.split(",", 1)[1]))
             print(f"Sample pie chart saved to {sample_path}")
         else:
             print("❌ Failed to generate pie chart or output too small")
@@ -243,7 +243,7 @@ def test_chart_generation():
     }
     
     try:
-        bar_chart = chart_generator.create_bar_chart(risk_data, "Risk Assessment", "Risk Categories", "Impact Level")
+        bar_chart = asyncio.run(chart_generator.create_bar_chart(risk_data, "Risk Assessment", "Risk Categories", "Impact Level"))
         
         bar_chart_passed = bar_chart and len(bar_chart) > 1000
         if bar_chart_passed:
@@ -251,7 +251,7 @@ def test_chart_generation():
             # Save a sample of the chart to verify it's valid
             sample_path = "/tmp/sample_bar_chart.png"
             with open(sample_path, "wb") as f:
-                f.write(base64.b64decode(bar_chart))
+                f.write(base64.b64decode(bar_chart.split(",", 1)[1]))
             print(f"Sample bar chart saved to {sample_path}")
         else:
             print("❌ Failed to generate bar chart or output too small")
@@ -274,7 +274,7 @@ def test_chart_generation():
     ]
     
     try:
-        timeline_chart = chart_generator.create_timeline_chart(timeline_data, "Project Timeline")
+        timeline_chart = asyncio.run(chart_generator.create_timeline_chart(timeline_data, "Project Timeline"))
         
         timeline_chart_passed = timeline_chart and len(timeline_chart) > 1000
         if timeline_chart_passed:
@@ -282,7 +282,7 @@ def test_chart_generation():
             # Save a sample of the chart to verify it's valid
             sample_path = "/tmp/sample_timeline_chart.png"
             with open(sample_path, "wb") as f:
-                f.write(base64.b64decode(timeline_chart))
+                f.write(base64.b64decode(timeline_chart.split(",", 1)[1]))
             print(f"Sample timeline chart saved to {sample_path}")
         else:
             print("❌ Failed to generate timeline chart or output too small")
@@ -343,13 +343,13 @@ This document outlines the implementation plan for our new product launch.
 """
     
     try:
-        formatted_doc = formatter.format_document(
+        formatted_doc = asyncio.run(formatter.format_document(
             basic_content,
             "Project Implementation Plan",
             ["Alex Chen", "Mark Castellano"],
             "implementation",
             "The team discussed the implementation plan for the new product launch, including timeline, budget, and risks."
-        )
+        ))
         
         # Save the formatted document to a file for inspection
         with open("/tmp/formatted_doc.html", "w") as f:
@@ -426,13 +426,13 @@ This document analyzes our budget allocation for the upcoming fiscal year.
 """
     
     try:
-        chart_doc = formatter.format_document(
+        chart_doc = asyncio.run(formatter.format_document(
             chart_content,
             "Annual Budget Analysis",
             ["Finance Team", "Executive Committee"],
             "budget",
             "The team discussed the budget allocation for the upcoming fiscal year, including breakdown by department, timeline, and risk assessment."
-        )
+        ))
         
         # Save the formatted document to a file for inspection
         with open("/tmp/chart_doc.html", "w") as f:
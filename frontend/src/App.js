@@ -11,6 +11,10 @@ import AccountModals from './ModalFix';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+
+// Documents reference chart images as /api/assets/<hash>; point them at the backend origin
+const resolveAssetUrls = (html) => (html || '').replace(/(src=["'])\/api\/assets\//g, `$1${API}/assets/`);
+
 const GOOGLE_CLIENT_ID = process.env.REACT_APP_GOOGLE_CLIENT_ID || "251454265437-5s1019au9fr6oh9rb47frkv8549vptk5.apps.googleusercontent.com";
 
 // Debug logging
@@ -47,6 +51,15 @@ const AuthProvider = ({ children }) => {
     }
   }, []);
 
+  useEffect(() => {
+    // Simulation endpoints are scoped to the signed-in user's simulation
+    if (token) {
+      axios.defaults.headers.common['Authorization'] = `Bearer ${token}`;
+    } else {
+      delete axios.defaults.headers.common['Authorization'];
+    }
+  }, [token]);
+
   const checkAuthStatus = async (authToken) => {
     try {
       const response = await axios.get(`${API}/auth/me`, {
@@ -3178,9 +3191,9 @@ const ConversationViewer = ({ conversations, selectedLanguage, onLanguageChange,
     setIsNarrationEnabled(audioNarrativeEnabled);
   }, [audioNarrativeEnabled]);
 
-  const playAudioFromBase64 = (audioBase64) => {
+  const playAudioFromUrl = (audioUrl) => {
     return new Promise((resolve) => {
-      const audio = new Audio(`data:audio/mp3;base64,${audioBase64}`);
+      const audio = new Audio(audioUrl);
       audio.onended = resolve;
       audio.onerror = resolve;
       audio.play().catch(() => resolve()); // Resolve even on error
@@ -3199,13 +3212,14 @@ const ConversationViewer = ({ conversations, selectedLanguage, onLanguageChange,
         text: text,
         agent_name: agentName,
         language: selectedLanguage
-      });
+      }, { responseType: 'blob' });
       
-      if (response.data.audio_data) {
-        const audioData = response.data.audio_data;
-        setAudioCache(prev => new Map(prev.set(cacheKey, audioData)));
-        return audioData;
-      } else if (response.data.fallback || !response.data.voice_supported) {
+      // Audio comes back as binary MP3; a JSON body means the server wants us to fall back
+      if ((response.headers['content-type'] || '').startsWith('audio/')) {
+        const audioUrl = URL.createObjectURL(response.data);
+        setAudioCache(prev => new Map(prev.set(cacheKey, audioUrl)));
+        return audioUrl;
+      } else {
         // Fallback to browser TTS for unsupported languages
         return null;
       }
@@ -3223,7 +3237,7 @@ const ConversationViewer = ({ conversations, selectedLanguage, onLanguageChange,
       
       if (audioData) {
         // Use Google Cloud TTS
-        await playAudioFromBase64(audioData);
+        await playAudioFromUrl(audioData);
       } else {
         // Fallback to browser TTS
         if ('speechSynthesis' in window) {
@@ -5853,6 +5867,17 @@ const FileCenterPage = () => {
     fetchScenarioDocuments();
   }, [token]);
 
+  // Documents written by agents arrive over the simulation event channel (see App)
+  useEffect(() => {
+    const onSimulationEvent = (e) => {
+      if (e.detail.type === 'document_created' || e.detail.type === 'document_updated') {
+        fetchScenarioDocuments();
+      }
+    };
+    window.addEventListener('simulation-event', onSimulationEvent);
+    return () => window.removeEventListener('simulation-event', onSimulationEvent);
+  }, [token]);
+
   const filteredDocuments = scenarioDocuments.filter(doc => {
     const matchesSearch = searchTerm === "" || 
       doc.title?.toLowerCase().includes(searchTerm.toLowerCase()) ||
@@ -6059,7 +6084,7 @@ const FileCenterPage = () => {
               <div className="p-6 overflow-y-auto max-h-[70vh]">
                 <div 
                   className="prose max-w-none"
-                  dangerouslySetInnerHTML={{ __html: selectedDocument.content }}
+                  dangerouslySetInnerHTML={{ __html: resolveAssetUrls(selectedDocument.content) }}
                 />
               </div>
             </div>
@@ -6181,6 +6206,8 @@ function App() {
   const [loading, setLoading] = useState(false);
   const [activeTab, setActiveTab] = useState('home');
   const [autoTimers, setAutoTimers] = useState({ conversation: null, time: null });
+  const [eventsConnected, setEventsConnected] = useState(false);
+  const syncCursor = useRef(null);
   const [showFastForward, setShowFastForward] = useState(false);
   const [editingAgent, setEditingAgent] = useState(null);
   const [archetypes, setArchetypes] = useState({});
@@ -6550,38 +6577,60 @@ function App() {
     }
   };
 
-  const refreshAllData = async () => {
-    setLoading(true);
-    await Promise.all([
-      fetchAgents(),
-      fetchConversations(), 
-      fetchRelationships(),
-      fetchSimulationState(),
-      fetchApiUsage(),
-      fetchSummaries(),
-      fetchArchetypes()
-    ]);
-    
-    // Check for auto-report generation
-    await checkAutoReportGeneration();
-    
-    setLoading(false);
+  // Merge a delta into a list by id (a full load replaces the list)
+  const mergeById = (prev, changed = [], deleted = [], full = false) => {
+    const byId = new Map((full ? [] : prev).map(item => [item.id, item]));
+    changed.forEach(item => byId.set(item.id, item));
+    deleted.forEach(id => byId.delete(id));
+    return Array.from(byId.values());
+  };
+
+  const byCreatedAt = (a, b) => String(a.created_at || '').localeCompare(String(b.created_at || ''));
+
+  const applySync = (data) => {
+    const { changes = {}, deleted = {}, full } = data;
+    setAgents(prev => mergeById(prev, changes.agents, deleted.agents, full));
+    setConversations(prev => mergeById(prev, changes.conversations, deleted.conversations, full).sort(byCreatedAt));
+    setRelationships(prev => mergeById(prev, changes.relationships, deleted.relationships, full));
+    setSummaries(prev => mergeById(prev, changes.summaries, deleted.summaries, full).sort(byCreatedAt).reverse());
+    setSimulationState(data.state);
+    setApiUsage(data.usage);
+    if ((changes.documents || []).length || (deleted.documents || []).length) {
+      window.dispatchEvent(new CustomEvent('simulation-event', { detail: { type: 'document_updated', data: {} } }));
+    }
   };
 
-  const checkAutoReportGeneration = async () => {
+  // One /sync round-trip returns everything changed since the last one
+  const refreshAllData = async () => {
+    setLoading(true);
     try {
-      const response = await axios.get(`${API}/reports/check-auto-generation`);
-      const data = response.data;
-      
-      if (data.should_generate) {
-        console.log('Auto-generating weekly report:', data.reason);
-        // Auto-generate the report
-        await handleGenerateSummary();
+      let more = true;
+      while (more) {
+        const params = syncCursor.current ? { since: syncCursor.current } : {};
+        const { data } = await axios.get(`${API}/sync`, { params });
+        applySync(data);
+        syncCursor.current = data.cursor;
+        more = data.has_more;
+
+        // Auto-save new conversations to user's history if authenticated
+        if (token && (data.changes.conversations || []).length > 0) {
+          await saveConversationsToHistory(data.changes.conversations);
+        }
       }
     } catch (error) {
-      console.error('Error checking auto-report generation:', error);
-      // Don't throw error - this is just a background check
+      console.error('Error syncing simulation data:', error);
+      syncCursor.current = null;
+      await Promise.all([
+        fetchAgents(),
+        fetchConversations(),
+        fetchRelationships(),
+        fetchSimulationState(),
+        fetchApiUsage(),
+        fetchSummaries()
+      ]);
     }
+    
+    setLoading(false);
   };
 
   // Control functions
@@ -6816,7 +6865,8 @@ function App() {
     setLoading(true);
     try {
       await axios.post(`${API}/simulation/next-period`);
-      await refreshAllData();
+      // The new round and state arrive over the event channel; only refetch without it
+      await (eventsConnected ? fetchApiUsage() : refreshAllData());
     } catch (error) {
       console.error('Error advancing time period:', error);
     }
@@ -6840,7 +6890,8 @@ function App() {
     setLoading(true);
     try {
       await axios.post(`${API}/conversation/generate`);
-      await refreshAllData();
+      // The new round and state arrive over the event channel; only refetch without it
+      await (eventsConnected ? fetchApiUsage() : refreshAllData());
       
       // Auto-save conversation to history if user is authenticated
       if (isAuthenticated && token) {
@@ -6964,7 +7015,8 @@ function App() {
         setObserverMessages(prev => [...prev, ...agentMessages]);
       }
       
-      await refreshAllData();
+      // The new round and state arrive over the event channel; only refetch without it
+      await (eventsConnected ? fetchApiUsage() : refreshAllData());
     } catch (error) {
       console.error('Error sending observer message:', error);
       alert('Error sending message. Make sure simulation is running and agents are available.');
@@ -6974,8 +7026,81 @@ function App() {
   // Load initial data
   useEffect(() => {
     refreshAllData();
+    fetchArchetypes();
   }, []);
 
+  // Simulation event channel: the server pushes what changed, so we apply deltas instead of refetching
+  useEffect(() => {
+    let socket = null;
+    let retryTimer = null;
+    let stopped = false;
+    // Signing in or out switches simulations; start the next sync from a full load
+    syncCursor.current = null;
+
+    const relationshipKey = (r) => `${r.agent1_id}:${r.agent2_id}`;
+
+    const applyEvent = (event) => {
+      const data = event.data || {};
+      switch (event.type) {
+        case 'round_created':
+          setConversations(prev => prev.some(c => c.id === data.id) ? prev : [...prev, data]);
+          break;
+        case 'round_updated':
+          setConversations(prev => prev.map(c => c.id === data.id ? { ...c, ...data } : c));
+          break;
+        case 'relationships_changed':
+          setRelationships(prev => {
+            const byPair = new Map(prev.map(r => [relationshipKey(r), r]));
+            (data.relationships || []).forEach(r => byPair.set(relationshipKey(r), r));
+            return Array.from(byPair.values());
+          });
+          break;
+        case 'state_changed':
+        case 'time_changed':
+          setSimulationState(prev => prev ? { ...prev, ...data } : prev);
+          break;
+        case 'summary_ready':
+          setSummaries(prev => [data, ...prev.filter(s => s.id !== data.id)]);
+          break;
+        case 'simulation_reset':
+        case 'resync':
+          refreshAllData();
+          break;
+        default:
+          break;
+      }
+      // Other views (e.g. the file center) listen for the events they care about
+      window.dispatchEvent(new CustomEvent('simulation-event', { detail: event }));
+    };
+
+    const connect = () => {
+      socket = new WebSocket(`${API.replace(/^http/, 'ws')}/simulation/events`);
+      socket.onopen = () => socket.send(JSON.stringify({ type: 'subscribe', token }));
+      socket.onmessage = (message) => {
+        const event = JSON.parse(message.data);
+        if (event.type === 'ready') {
+          setEventsConnected(true);
+          // Catch up on anything that changed before the subscription started
+          refreshAllData();
+        } else if (event.type !== 'ping') {
+          applyEvent(event);
+        }
+      };
+      socket.onclose = () => {
+        setEventsConnected(false);
+        // Fall back to polling until the channel is back
+        if (!stopped) retryTimer = setTimeout(connect, 5000);
+      };
+    };
+
+    connect();
+    return () => {
+      stopped = true;
+      clearTimeout(retryTimer);
+      if (socket) socket.close();
+    };
+  }, [token]);
+
   // Auto-start timers when simulation state loads with auto-mode enabled
   useEffect(() => {
     if (simulationState) {
@@ -6990,47 +7115,31 @@ function App() {
       // Set up new timers if enabled in simulation state
       const newTimers = { conversation: null, time: null };
       
-      if (simulationState.auto_conversations) {
-        console.log('Auto-starting conversations from simulation state with interval:', simulationState.conversation_interval);
+      // Rounds, time advancement and weekly reports are generated by the server's auto-mode
+      // scheduler and pushed over the event channel; poll (cheap conditional requests) only without it
+      if (simulationState.auto_conversations && !eventsConnected) {
         newTimers.conversation = setInterval(async () => {
           try {
-            console.log('Auto generating conversation...');
-            const response = await axios.post(`${API}/conversation/generate`);
-            console.log('Conversation generated successfully:', response.data?.round_number);
             await refreshAllData();
           } catch (error) {
-            console.error('Auto conversation error:', error);
-            
-            // Check if it's an API quota issue
-            if (error.response?.status === 400 && error.response?.data?.detail?.includes('API requests')) {
-              console.warn('API quota exceeded - auto conversations will continue trying');
-            } else if (error.response?.status === 500) {
-              console.warn('Server error during conversation generation - will retry');
-            } else {
-              console.error('Unexpected error during auto conversation:', error.response?.data || error.message);
-            }
-            // Don't clear interval on error, just log it
+            console.error('Auto refresh error:', error);
           }
         }, (simulationState.conversation_interval || 10) * 1000);
       }
       
-      if (simulationState.auto_time) {
-        console.log('Auto-starting time advancement from simulation state with interval:', simulationState.time_interval);
+      if (simulationState.auto_time && !eventsConnected) {
         newTimers.time = setInterval(async () => {
           try {
-            console.log('Auto advancing time...');
-            await axios.post(`${API}/simulation/next-period`);
             await fetchSimulationState();
           } catch (error) {
-            console.error('Auto time error:', error);
-            // Don't clear interval on error, just log it
+            console.error('Auto refresh error:', error);
           }
         }, (simulationState.time_interval || 60) * 1000);
       }
       
       setAutoTimers(newTimers);
     }
-  }, [simulationState?.auto_conversations, simulationState?.auto_time, simulationState?.conversation_interval, simulationState?.time_interval]);
+  }, [simulationState?.auto_conversations, simulationState?.auto_time, simulationState?.conversation_interval, simulationState?.time_interval, eventsConnected]);
 
   // Cleanup timers on unmount
   useEffect(() => {
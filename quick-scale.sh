@@ -15,12 +15,12 @@ cp /app/frontend/.env /app/frontend/.env.backup
 # Install production requirements
 echo "📦 Installing optimizations..."
 cd /app/backend
-pip install redis aioredis uvloop motor[srv] prometheus-client
+pip install redis uvloop httptools orjson motor[srv] prometheus-client
 
 # Update supervisor configuration for optimized backend
 cat > /etc/supervisor/conf.d/backend.conf << 'EOF'
 [program:backend]
-command=/root/.venv/bin/uvicorn server_optimized:app --host 0.0.0.0 --port 8001 --workers 4 --loop uvloop
+command=/root/.venv/bin/uvicorn server:app --host 0.0.0.0 --port 8001 --workers 4 --loop uvloop --http httptools --proxy-headers
 directory=/app/backend
 autostart=true
 autorestart=true
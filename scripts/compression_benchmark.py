@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Compression benchmark for the Observer AI backend
+Requests /api/conversations and /api/documents with no compression, gzip and brotli
+and reports bytes on the wire, server latency, and the estimated time to deliver
+each response over a given link. Runs against a live server (--base-url) or, by
+default, against representative payloads served in-process through the middleware
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPTS_DIR.parent / "backend"))
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from server_benchmark import percentile  # noqa: E402
+
+DEFAULT_PATHS = ["/api/conversations", "/api/documents"]
+ENCODINGS = ["identity", "gzip", "br"]
+
+# Varied prose so the sample compresses like real LLM output, not like a repeated string
+WORDS = (
+    "the we need to secure cold chain before distribution starts samples lab regional team budget "
+    "signal protocol risk response quarantine supply vendor timeline evidence analysis trial data "
+    "I think should could would priority concern agree disagree morning evening report council "
+    "vaccine logistics funding audit contract deploy monitor outbreak field station research"
+).split()
+
+
+def sentences(rng, count):
+    return " ".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+        for _ in range(count)
+    )
+
+
+def sample_conversations(rounds=200, agents=6, seed=1):
+    """Conversation rounds as /api/conversations returns them"""
+    rng = random.Random(seed)
+    return [{
+        "id": f"round-{r}",
+        "round_number": r + 1,
+        "time_period": f"Day {r // 3 + 1} - {['morning', 'afternoon', 'evening'][r % 3]}",
+        "scenario": sentences(rng, 2),
+        "scenario_name": "Pandemic response",
+        "messages": [{
+            "agent_id": f"agent-{a}",
+            "agent_name": f"Agent {a}",
+            "message": sentences(rng, 3),
+            "mood": rng.choice(["focused", "worried", "optimistic"]),
+        } for a in range(agents)],
+        "user_id": "",
+        "created_at": f"2025-01-{r % 28 + 1:02d}T09:00:00",
+        "language": "en",
+    } for r in range(rounds)]
+
+
+def sample_documents(count=50, seed=2):
+    """File Center documents: metadata plus HTML-heavy content, as /api/documents returns them"""
+    rng = random.Random(seed)
+    documents = []
+    for i in range(count):
+        content = "".join(
+            f"<h2>{sentences(rng, 1)}</h2><p>{sentences(rng, 4)}</p>"
+            f"<table><tr><th>Owner</th><th>Deadline</th></tr><tr><td>Agent {rng.randint(1, 6)}</td>"
+            f"<td>Day {rng.randint(1, 30)}</td></tr></table>"
+            for _ in range(8)
+        )
+        documents.append({
+            "id": f"doc-{i}",
+            "metadata": {
+                "title": f"Field Protocol {i}",
+                "category": "Protocol",
+                "description": "Procedures agreed during the morning briefing",
+                "keywords": ["protocol", "lab", "samples"],
+                "authors": ["Dr. Chen", "Marcus"],
+                "status": "Draft",
+            },
+            "content": content,
+            "preview": content[:200] + "...",
+        })
+    return documents
+
+
+def sample_app():
+    """The two endpoints with representative bodies behind the compression middleware"""
+    from fastapi import FastAPI
+    from fastapi.responses import ORJSONResponse
+
+    from response_compression import CompressionMiddleware
+
+    app = FastAPI(default_response_class=ORJSONResponse)
+    conversations = sample_conversations()
+    documents = sample_documents()
+
+    @app.get("/api/conversations")
+    async def conversations_endpoint():
+        return conversations
+
+    @app.get("/api/documents")
+    async def documents_endpoint():
+        return documents
+
+    app.add_middleware(CompressionMiddleware)
+    return app
+
+
+async def measure(client, path, encoding, requests=50, headers=None):
+    """Wire bytes and latency of `requests` sequential GETs with one Accept-Encoding"""
+    latencies = []
+    wire_bytes = body_bytes = 0
+    content_encoding = None
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get(path, headers={**(headers or {}), "Accept-Encoding": encoding})
+        await response.aread()
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        wire_bytes = response.num_bytes_downloaded
+        body_bytes = len(response.content)
+        content_encoding = response.headers.get("content-encoding", "identity")
+    return {
+        "content_encoding": content_encoding,
+        "wire_bytes": wire_bytes,
+        "body_bytes": body_bytes,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+    }
+
+
+def delivery_ms(result, link_mbps):
+    """Server latency plus the time to move the bytes over a link of `link_mbps`"""
+    return result["p50_ms"] + result["wire_bytes"] * 8 / (link_mbps * 1e6) * 1000
+
+
+async def run(client, paths, requests, link_mbps, headers=None):
+    report = {}
+    for path in paths:
+        report[path] = {}
+        for encoding in ENCODINGS:
+            result = await measure(client, path, encoding, requests, headers)
+            result["delivery_ms"] = delivery_ms(result, link_mbps)
+            report[path][encoding] = result
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure response compression for large JSON endpoints")
+    parser.add_argument("--base-url", help="Running server to measure (default: sample payloads in-process)")
+    parser.add_argument("--token", help="Bearer token (/api/documents needs one on a live server)")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS, help="GET paths to request")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per path and encoding")
+    parser.add_argument("--link-mbps", type=float, default=10.0, help="Link speed for the delivery estimate")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else None
+
+    async def go():
+        if args.base_url:
+            client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+        else:
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=sample_app()), base_url="http://bench")
+        async with client:
+            return await run(client, args.paths, args.requests, args.link_mbps, headers)
+
+    report = asyncio.run(go())
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for path, results in report.items():
+        print(path)
+        identity = results["identity"]["wire_bytes"] or 1
+        for encoding, result in results.items():
+            print(f"  {encoding + ' → ' + result['content_encoding'] + ':':<22} {result['wire_bytes']:>9} bytes "
+                  f"({result['wire_bytes'] / identity:6.1%}), p50 {result['p50_ms']:.2f} ms, "
+                  f"p95 {result['p95_ms']:.2f} ms, delivered in ~{result['delivery_ms']:.1f} ms "
+                  f"at {args.link_mbps:g} Mbit/s")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,14 @@
 """
 Load testing script for Observer AI platform
 Tests concurrent user registration, authentication, and API usage
+
+The auth scenario measures bcrypt-bound login throughput, so it must not be throttled:
+run it against a backend worker directly (not through nginx, whose `limit_req zone=auth`
+allows a few logins per minute) started with RATE_LIMIT_ENABLED=false. Responses that
+were rate limited (429) or shed by the crypto executor (503) are counted separately and
+never as logins. With --compare-ref the script starts one single-worker backend from
+that git ref ("before") and one from the working tree ("after"), both unthrottled, and
+reports logins per second per worker for each.
 """
 
 import asyncio
@@ -9,13 +17,22 @@ import aiohttp
 import time
 import random
 import json
+import sys
 from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 import argparse
 
+SCRIPTS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SCRIPTS_DIR))
+
 class LoadTester:
     def __init__(self, base_url="http://localhost:8001", max_concurrent=100):
         self.base_url = base_url
         self.max_concurrent = max_concurrent
+        self.reset_results()
+    
+    def reset_results(self):
+        """Clear collected statistics"""
         self.results = {
             "total_requests": 0,
             "successful_requests": 0,
@@ -23,8 +40,17 @@ class LoadTester:
             "avg_response_time": 0,
             "max_response_time": 0,
             "min_response_time": float('inf'),
+            "rate_limited": 0,
+            "busy": 0,
             "errors": []
         }
+
+    def count_rejection(self, status):
+        """Track throttled responses apart from real failures"""
+        if status == 429:
+            self.results["rate_limited"] += 1
+        elif status == 503:
+            self.results["busy"] += 1
         
     async def register_user(self, session, user_id):
         """Register a new user"""
@@ -44,6 +70,7 @@ class LoadTester:
                     data = await response.json()
                     return data.get("access_token")
                 else:
+                    self.count_rejection(response.status)
                     error_text = await response.text()
                     self.results["errors"].append(f"Registration failed: {error_text}")
                     return None
@@ -54,6 +81,31 @@ class LoadTester:
             self.results["errors"].append(f"Registration error: {str(e)}")
             return None
     
+    async def login_user(self, session, user_id):
+        """Log in an already registered user"""
+        credentials = {
+            "email": f"test.user.{user_id}@loadtest.com",
+            "password": "TestPassword123"
+        }
+        
+        start_time = time.time()
+        try:
+            async with session.post(f"{self.base_url}/api/auth/login", json=credentials) as response:
+                duration = time.time() - start_time
+                self.update_stats(duration, response.status == 200)
+                
+                if response.status != 200:
+                    self.count_rejection(response.status)
+                    error_text = await response.text()
+                    self.results["errors"].append(f"Login failed ({response.status}): {error_text}")
+                return response.status == 200
+                    
+        except Exception as e:
+            duration = time.time() - start_time
+            self.update_stats(duration, False)
+            self.results["errors"].append(f"Login error: {str(e)}")
+            return False
+    
     async def test_api_endpoints(self, session, token, user_id):
         """Test various API endpoints with authentication"""
         headers = {"Authorization": f"Bearer {token}"}
@@ -179,6 +231,79 @@ class LoadTester:
         # Print results
         self.print_results(total_duration, num_users)
     
+    async def run_auth_benchmark(self, num_users, logins_per_user, concurrent_limit):
+        """Register users, then measure sustained logins per second (bcrypt-bound)"""
+        print(f"Registering {num_users} users, then {num_users * logins_per_user} logins with {concurrent_limit} concurrent")
+        
+        connector = aiohttp.TCPConnector(limit=concurrent_limit * 2)
+        timeout = aiohttp.ClientTimeout(total=60)
+        
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            semaphore = asyncio.Semaphore(concurrent_limit)
+            
+            async def limited(coro_factory, user_id):
+                async with semaphore:
+                    return await coro_factory(session, user_id)
+            
+            # Registration phase (users may already exist from a previous run), then one untimed
+            # login each, so hashes made with another cost are upgraded before measuring
+            await asyncio.gather(*[limited(self.register_user, i) for i in range(num_users)], return_exceptions=True)
+            await asyncio.gather(*[limited(self.login_user, i) for i in range(num_users)], return_exceptions=True)
+            
+            # Login phase: only this part is reported
+            self.reset_results()
+            start_time = time.time()
+            tasks = [limited(self.login_user, i % num_users) for i in range(num_users * logins_per_user)]
+            await asyncio.gather(*tasks, return_exceptions=True)
+            total_duration = time.time() - start_time
+        
+        self.print_results(total_duration, num_users)
+        logins_per_second = self.results['successful_requests'] / total_duration
+        print(f"Logins per Second: {logins_per_second:.2f}")
+        if self.results["rate_limited"]:
+            print(f"WARNING: {self.results['rate_limited']} logins were rate limited (429); this run measured "
+                  f"the rate limiter, not bcrypt. Point --url at a worker started with RATE_LIMIT_ENABLED=false, "
+                  f"not at nginx.")
+        return {
+            "logins_per_second": logins_per_second,
+            "logins": self.results["successful_requests"],
+            "rate_limited": self.results["rate_limited"],
+            "busy": self.results["busy"],
+            "failed": self.results["failed_requests"],
+            "avg_response_time": self.results["avg_response_time"],
+        }
+    
+    async def compare_auth(self, ref, num_users, logins_per_user, concurrent_limit, port):
+        """Logins per second per worker of the app at `ref` (before) and of the working tree (after)"""
+        from server_benchmark import BACKEND_DIR, checkout_ref, remove_worktree, start_server, stop_server
+        
+        report = {}
+        worktree = checkout_ref(ref)
+        try:
+            for name, backend_dir in (("before", worktree / "backend"), ("after", BACKEND_DIR)):
+                print(f"\n{name.capitalize()}: backend from {ref if name == 'before' else 'the working tree'}")
+                # One worker, no rate limiting (start_server sets RATE_LIMIT_ENABLED=false)
+                process = await asyncio.to_thread(start_server, "server:app", backend_dir, port, [])
+                try:
+                    self.base_url = f"http://127.0.0.1:{port}"
+                    report[name] = await self.run_auth_benchmark(num_users, logins_per_user, concurrent_limit)
+                finally:
+                    await asyncio.to_thread(stop_server, process)
+        finally:
+            remove_worktree(worktree)
+        
+        print("\n" + "="*80)
+        print("LOGINS PER SECOND PER WORKER")
+        print("="*80)
+        for name in ("before", "after"):
+            result = report[name]
+            print(f"{name.capitalize() + ':':<8} {result['logins_per_second']:.2f} logins/s "
+                  f"({result['logins']} ok, {result['rate_limited']} rate limited, {result['busy']} busy, "
+                  f"avg {result['avg_response_time']*1000:.0f} ms)")
+        if report["before"]["logins_per_second"]:
+            print(f"Change:  {report['after']['logins_per_second'] / report['before']['logins_per_second']:.2f}x")
+        return report
+    
     def print_results(self, total_duration, num_users):
         """Print load test results"""
         print("\n" + "="*80)
@@ -189,6 +314,7 @@ class LoadTester:
         print(f"Total Requests: {self.results['total_requests']}")
         print(f"Successful Requests: {self.results['successful_requests']}")
         print(f"Failed Requests: {self.results['failed_requests']}")
+        print(f"  of which rate limited (429): {self.results['rate_limited']}, crypto busy (503): {self.results['busy']}")
         print(f"Success Rate: {(self.results['successful_requests']/max(self.results['total_requests'],1)*100):.2f}%")
         print(f"Average Response Time: {self.results['avg_response_time']:.3f} seconds")
         print(f"Min Response Time: {self.results['min_response_time']:.3f} seconds")
@@ -208,11 +334,22 @@ async def main():
     parser.add_argument("--users", type=int, default=100, help="Number of users to simulate")
     parser.add_argument("--concurrent", type=int, default=50, help="Maximum concurrent sessions")
     parser.add_argument("--url", default="http://localhost:8001", help="Base URL for the API")
+    parser.add_argument("--scenario", choices=["sessions", "auth"], default="sessions",
+                        help="sessions: full user sessions; auth: registration then login throughput")
+    parser.add_argument("--logins-per-user", type=int, default=5, help="Logins per user in the auth scenario")
+    parser.add_argument("--compare-ref", help="Auth scenario: also run the backend at this git ref (e.g. the "
+                        "commit before the crypto executor) and report before/after logins per second per worker")
+    parser.add_argument("--port", type=int, default=8011, help="Port for the backends started by --compare-ref")
     
     args = parser.parse_args()
     
     tester = LoadTester(base_url=args.url, max_concurrent=args.concurrent)
-    await tester.run_load_test(args.users, args.concurrent)
+    if args.scenario == "auth" and args.compare_ref:
+        await tester.compare_auth(args.compare_ref, args.users, args.logins_per_user, args.concurrent, args.port)
+    elif args.scenario == "auth":
+        await tester.run_auth_benchmark(args.users, args.logins_per_user, args.concurrent)
+    else:
+        await tester.run_load_test(args.users, args.concurrent)
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
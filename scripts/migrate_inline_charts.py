@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Migration: move inline base64 chart images out of stored documents
+Each data:image/...;base64 payload is saved once in the assets collection
+and the document HTML is rewritten to reference /api/assets/{hash}
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from asset_store import AssetStore
+
+
+async def migrate(db, dry_run=False, batch_size=100):
+    """Rewrite every document whose content still embeds images; returns (documents, images)"""
+    store = AssetStore(cache_size=1)
+    store.bind(db)
+
+    documents_updated = 0
+    images_moved = 0
+    # Only the id and content are needed; skip everything else in the projection
+    cursor = db.documents.find(
+        {"content": {"$regex": "data:image/"}},
+        {"_id": 0, "id": 1, "content": 1}
+    ).batch_size(batch_size)
+
+    async for document in cursor:
+        if dry_run:
+            moved = document["content"].count("data:image/")
+            print(f"Would move {moved} image(s) from document {document['id']}")
+        else:
+            content, moved = await store.extract_inline_images(document["content"])
+            if not moved:
+                continue
+            await db.documents.update_one({"id": document["id"]}, {"$set": {"content": content}})
+            print(f"Moved {moved} image(s) from document {document['id']}")
+
+        documents_updated += 1
+        images_moved += moved
+
+    return documents_updated, images_moved
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Extract inline chart images from documents into assets")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    parser.add_argument("--batch-size", type=int, default=100, help="Documents fetched per cursor batch")
+    args = parser.parse_args()
+
+    load_dotenv(BACKEND_DIR / ".env")
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"])
+    db = client[os.environ.get("DB_NAME", "ai_simulation")]
+
+    try:
+        documents, images = await migrate(db, dry_run=args.dry_run, batch_size=args.batch_size)
+    finally:
+        client.close()
+
+    action = "would be moved" if args.dry_run else "moved"
+    print(f"\n{images} image(s) from {documents} document(s) {action}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
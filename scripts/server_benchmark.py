@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Server benchmark for the Observer AI backend
+Runs the app under the production profile (uvloop, httptools, ORJSONResponse) and
+under a baseline (asyncio loop, h11, optionally the app as of an older git ref),
+drives the same requests at both and reports throughput and latency percentiles
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+BACKEND_DIR = REPO_DIR / "backend"
+
+# Uvicorn flags per profile; the app itself decides the response class
+PROFILES = {
+    "baseline": ["--loop", "asyncio", "--http", "h11"],
+    "production": ["--loop", "uvloop", "--http", "httptools"],
+}
+
+# Unauthenticated endpoints that exist in both the old and the new app
+DEFAULT_PATHS = ["/api/", "/api/archetypes"]
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, errors, elapsed):
+    """Throughput and latency summary (milliseconds) for one run"""
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "requests_per_second": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+async def run_load(base_url, paths, requests=2000, concurrency=50):
+    """Issue `requests` GETs round-robin over `paths` with bounded concurrency"""
+    latencies = []
+    errors = 0
+    next_request = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        async def worker():
+            nonlocal next_request, errors
+            while next_request < requests:
+                path = paths[next_request % len(paths)]
+                next_request += 1
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, errors, elapsed)
+
+
+def bench_serialization(payload, rounds=200):
+    """Mean time to render one response body with the stdlib JSON and the orjson response classes"""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse, ORJSONResponse
+
+    content = jsonable_encoder(payload)
+    results = {}
+    for response_class in (JSONResponse, ORJSONResponse):
+        response_class(content)  # warm up
+        start = time.perf_counter()
+        for _ in range(rounds):
+            body = response_class(content).body
+        results[response_class.__name__] = {
+            "mean_ms": (time.perf_counter() - start) / rounds * 1000,
+            "bytes": len(body),
+        }
+    return results
+
+
+def sample_payload(agents=50, rounds=20):
+    """Shape of a typical simulation dashboard response (agents plus conversation rounds)"""
+    now = datetime.now(timezone.utc)
+    agent_list = [{
+        "id": f"agent-{i}",
+        "name": f"Agent {i}",
+        "archetype": "scientist",
+        "personality": {"extroversion": 4, "optimism": 6, "curiosity": 9, "cooperativeness": 7, "energy": 6},
+        "goal": "Coordinate the regional response " * 3,
+        "expertise": "Epidemiology and public health policy",
+        "memory_summary": "Discussed supply chains and quarantine logistics. " * 5,
+        "created_at": now,
+    } for i in range(agents)]
+    conversation_rounds = [{
+        "id": f"round-{r}",
+        "round_number": r,
+        "time_period": "Day 1, Morning",
+        "scenario": "Pandemic response",
+        "messages": [{"agent_id": agent["id"], "agent_name": agent["name"],
+                      "message": "We need to secure the cold chain before distribution starts. " * 3,
+                      "mood": "focused"} for agent in agent_list[:5]],
+        "created_at": now,
+    } for r in range(rounds)]
+    return {"agents": agent_list, "conversations": conversation_rounds}
+
+
+def checkout_ref(ref):
+    """Detached worktree of an older commit, so the baseline can run the app as it was"""
+    path = Path(tempfile.mkdtemp(prefix="server-benchmark-"))
+    subprocess.run(["git", "worktree", "add", "--detach", str(path), ref],
+                   cwd=REPO_DIR, check=True, capture_output=True)
+    # The worktree has no untracked .env; reuse the current one so both apps see the same config
+    if (BACKEND_DIR / ".env").exists():
+        shutil.copy(BACKEND_DIR / ".env", path / "backend" / ".env")
+    return path
+
+
+def remove_worktree(path):
+    subprocess.run(["git", "worktree", "remove", "--force", str(path)], cwd=REPO_DIR, capture_output=True)
+
+
+def start_server(app, backend_dir, port, server_args, workers=1, startup_timeout=60.0):
+    """Start uvicorn and wait until it answers"""
+    command = [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning", *server_args]
+    # One client would exhaust its own rate limit within the first second
+    process = subprocess.Popen(command, cwd=backend_dir, env=dict(os.environ, RATE_LIMIT_ENABLED="false"))
+
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(command)} exited with status {process.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.25)
+
+    process.terminate()
+    raise RuntimeError(f"Server did not start within {startup_timeout:.0f}s")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def benchmark_profile(name, backend_dir, args):
+    process = start_server(args.app, backend_dir, args.port, PROFILES[name], workers=args.workers)
+    try:
+        # Warm-up pass (connection pools, first-request imports)
+        asyncio.run(run_load(f"http://127.0.0.1:{args.port}", args.paths, min(200, args.requests), args.concurrency))
+        return asyncio.run(run_load(f"http://127.0.0.1:{args.port}", args.paths, args.requests, args.concurrency))
+    finally:
+        stop_server(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the production server profile against a baseline")
+    parser.add_argument("--app", default="server:app", help="ASGI app to serve from backend/")
+    parser.add_argument("--baseline-ref", help="Git ref to run the baseline from (default: the working tree)")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS, help="GET paths to request")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per profile")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent connections")
+    parser.add_argument("--workers", type=int, default=1, help="Uvicorn workers per profile")
+    parser.add_argument("--port", type=int, default=8011, help="Port to run the servers on")
+    parser.add_argument("--serialization-only", action="store_true",
+                        help="Only compare JSON response rendering (needs no database)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = {"serialization": bench_serialization(sample_payload())}
+
+    if not args.serialization_only:
+        baseline_dir = BACKEND_DIR
+        worktree = checkout_ref(args.baseline_ref) if args.baseline_ref else None
+        if worktree:
+            baseline_dir = worktree / "backend"
+        try:
+            report["baseline"] = benchmark_profile("baseline", baseline_dir, args)
+        finally:
+            if worktree:
+                remove_worktree(worktree)
+        report["production"] = benchmark_profile("production", BACKEND_DIR, args)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    for name, result in report["serialization"].items():
+        print(f"{name + ' render:':<24} {result['mean_ms']:.3f} ms ({result['bytes']} bytes)")
+    for name in ("baseline", "production"):
+        if name in report:
+            result = report[name]
+            print(f"{name.capitalize() + ':':<24} {result['requests_per_second']:.0f} req/s, "
+                  f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, "
+                  f"p99 {result['p99_ms']:.1f} ms, {result['errors']} errors")
+    if "baseline" in report and report["baseline"]["requests_per_second"]:
+        speedup = report["production"]["requests_per_second"] / report["baseline"]["requests_per_second"]
+        print(f"{'Throughput change:':<24} {speedup:.2f}x")
+
+if __name__ == "__main__":
+    main()
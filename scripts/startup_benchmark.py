@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the Observer AI backend
+Measures import time and resident memory of a fresh worker process importing
+server.py, and fails when they exceed the given thresholds (for CI)
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# Libraries that should only load when the feature that needs them is used
+HEAVY_MODULES = [
+    "matplotlib", "seaborn", "pandas", "numpy", "PIL",
+    "google.cloud.texttospeech", "openai", "pydub", "fal_client", "google.oauth2",
+]
+
+CHILD_SCRIPT = r'''
+import importlib, json, resource, sys, time
+sys.path.insert(0, {backend!r})
+start = time.perf_counter()
+if {module!r}:
+    importlib.import_module({module!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "import_seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": sorted(name for name in {heavy!r} if name in sys.modules),
+}}))
+'''
+
+
+def measure(module, python=sys.executable):
+    """Import a module in a fresh interpreter and report time, peak RSS and heavy modules loaded"""
+    code = CHILD_SCRIPT.format(backend=str(BACKEND_DIR), module=module or "", heavy=HEAVY_MODULES)
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run([python, "-c", code], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, timeout=300)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_benchmark(module="server", runs=5):
+    """Median import time and RSS over several cold imports, plus a bare-interpreter baseline"""
+    # First import compiles bytecode; don't let that skew the numbers
+    measure(module)
+    samples = [measure(module) for _ in range(runs)]
+    baseline = measure(None)
+    return {
+        "module": module,
+        "runs": runs,
+        "import_seconds": statistics.median(sample["import_seconds"] for sample in samples),
+        "max_rss_mb": statistics.median(sample["max_rss_mb"] for sample in samples),
+        "baseline_rss_mb": baseline["max_rss_mb"],
+        "heavy_modules": samples[-1]["heavy_modules"],
+    }
+
+
+def check_thresholds(report, max_import_seconds=None, max_rss_mb=None, allow_heavy=False):
+    """Return a list of threshold violations (empty if the report passes)"""
+    failures = []
+    if max_import_seconds is not None and report["import_seconds"] > max_import_seconds:
+        failures.append(f"import took {report['import_seconds']:.2f}s (limit {max_import_seconds:.2f}s)")
+    if max_rss_mb is not None and report["max_rss_mb"] > max_rss_mb:
+        failures.append(f"RSS after import is {report['max_rss_mb']:.0f} MB (limit {max_rss_mb:.0f} MB)")
+    if not allow_heavy and report["heavy_modules"]:
+        failures.append(f"heavy modules loaded at import: {', '.join(report['heavy_modules'])}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend worker import time and memory")
+    parser.add_argument("--module", default="server", help="Module to import from backend/")
+    parser.add_argument("--runs", type=int, default=5, help="Cold imports to take the median of")
+    parser.add_argument("--workers", type=int, default=4, help="Uvicorn workers per replica, for the total estimate")
+    parser.add_argument("--max-import-seconds", type=float,
+                        default=float(os.environ.get("STARTUP_MAX_IMPORT_SECONDS", 3.0)))
+    parser.add_argument("--max-rss-mb", type=float,
+                        default=float(os.environ.get("STARTUP_MAX_RSS_MB", 200)))
+    parser.add_argument("--allow-heavy", action="store_true", help="Don't fail when heavy modules load at import")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.module, args.runs)
+    failures = check_thresholds(report, args.max_import_seconds, args.max_rss_mb, args.allow_heavy)
+
+    if args.json:
+        print(json.dumps(dict(report, failures=failures), indent=2))
+    else:
+        print(f"Module:              {report['module']} (median of {report['runs']} cold imports)")
+        print(f"Import time:         {report['import_seconds']:.3f} s")
+        print(f"RSS per worker:      {report['max_rss_mb']:.1f} MB "
+              f"({report['max_rss_mb'] - report['baseline_rss_mb']:.1f} MB over a bare interpreter)")
+        print(f"RSS for {args.workers} workers:   {report['max_rss_mb'] * args.workers:.0f} MB")
+        print(f"Heavy modules:       {', '.join(report['heavy_modules']) or 'none'}")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
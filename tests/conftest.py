@@ -0,0 +1,323 @@
+import os
+import sys
+import uuid
+
+import pytest
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# Backend modules import each other as top-level modules (see backend/server.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+
+# In-memory stand-in for the Motor database, shared by every test that needs MongoDB.
+# It follows MongoDB semantics for the subset of queries and updates the backend uses;
+# extend it here rather than writing a per-test fake.
+
+MISSING = object()
+
+
+def get_path(doc, path):
+    """Value at a dotted path, or MISSING"""
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return MISSING
+        value = value[part]
+    return value
+
+
+def set_path(doc, path, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def unset_path(doc, path):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(last, None)
+
+
+def compare(value, op, operand):
+    if op == "$exists":
+        return (value is not MISSING) == bool(operand)
+    if op == "$eq":
+        return value is not MISSING and value == operand or (value is MISSING and operand is None)
+    if op == "$ne":
+        return not compare(value, "$eq", operand)
+    if op == "$in":
+        return any(compare(value, "$eq", item) for item in operand)
+    if op == "$nin":
+        return not compare(value, "$in", operand)
+    if value is MISSING or value is None:
+        return False
+    try:
+        if op == "$gt":
+            return value > operand
+        if op == "$gte":
+            return value >= operand
+        if op == "$lt":
+            return value < operand
+        if op == "$lte":
+            return value <= operand
+    except TypeError:
+        # MongoDB never matches across types
+        return False
+    raise NotImplementedError(f"Query operator {op}")
+
+
+def matches(doc, filter):
+    for key, condition in (filter or {}).items():
+        if key == "$and":
+            if not all(matches(doc, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            value = get_path(doc, key)
+            if not all(compare(value, op, operand) for op, operand in condition.items()):
+                return False
+        elif not compare(get_path(doc, key), "$eq", condition):
+            return False
+    return True
+
+
+def evaluate(expression, doc):
+    """Aggregation expressions used in pipeline updates"""
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = get_path(doc, expression[1:])
+        return None if value is MISSING else value
+    if isinstance(expression, list):
+        return [evaluate(item, doc) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if not (len(expression) == 1 and next(iter(expression)).startswith("$")):
+        return {key: evaluate(value, doc) for key, value in expression.items()}
+    (op, args), = expression.items()
+    if op == "$literal":
+        return args
+    if op == "$switch":
+        for branch in args["branches"]:
+            if evaluate(branch["case"], doc):
+                return evaluate(branch["then"], doc)
+        return evaluate(args.get("default"), doc)
+    values = [evaluate(arg, doc) for arg in (args if isinstance(args, list) else [args])]
+    if op == "$ifNull":
+        return next((value for value in values if value is not None), None)
+    return {
+        "$add": lambda v: sum(v), "$max": max, "$min": min,
+        "$gt": lambda v: v[0] > v[1], "$gte": lambda v: v[0] >= v[1],
+        "$lt": lambda v: v[0] < v[1], "$lte": lambda v: v[0] <= v[1],
+        "$eq": lambda v: v[0] == v[1],
+    }[op](values)
+
+
+def apply_update(doc, update, inserting=False):
+    if isinstance(update, list):
+        for stage in update:
+            for key, value in stage.get("$set", {}).items():
+                set_path(doc, key, evaluate(value, doc))
+            for key in stage.get("$unset", []):
+                unset_path(doc, key)
+        return
+    for key, value in update.get("$set", {}).items():
+        set_path(doc, key, value)
+    if inserting:
+        for key, value in update.get("$setOnInsert", {}).items():
+            set_path(doc, key, value)
+    for key, amount in update.get("$inc", {}).items():
+        current = get_path(doc, key)
+        set_path(doc, key, (0 if current is MISSING else current) + amount)
+    for key in update.get("$unset", {}):
+        unset_path(doc, key)
+
+
+def sort_key(value):
+    # MongoDB orders missing/null before any other value
+    return (0, 0) if value is MISSING or value is None else (1, value)
+
+
+def project(doc, projection):
+    if not projection:
+        return dict(doc)
+    included = {key for key, keep in projection.items() if keep}
+    if included:
+        return {key: value for key, value in doc.items() if key in included or key == "_id"}
+    return {key: value for key, value in doc.items() if key not in projection}
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for name, order in reversed(keys):
+            self.docs.sort(key=lambda doc: sort_key(get_path(doc, name)), reverse=order < 0)
+        return self
+
+    def skip(self, count):
+        self.docs = self.docs[count:]
+        return self
+
+    def limit(self, count):
+        if count:
+            self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.docs if length is None else self.docs[:length]
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeCollection:
+    """A Motor collection held in a list, with unique indexes and upserts"""
+
+    def __init__(self):
+        self.docs = []
+        self.unique = {"_id"}
+        self.indexes = []
+        self.bulk_writes = 0
+
+    async def create_index(self, keys, unique=False, **kwargs):
+        self.indexes.append((keys, kwargs))
+        if unique and isinstance(keys, str):
+            self.unique.add(keys)
+
+    def _check_unique(self, doc, exclude=None):
+        for key in self.unique:
+            value = get_path(doc, key)
+            if value is MISSING:
+                continue
+            if any(other is not exclude and get_path(other, key) == value for other in self.docs):
+                raise DuplicateKeyError(f"E11000 duplicate key error: {key}")
+
+    def _first(self, filter, sort=None):
+        docs = [doc for doc in self.docs if matches(doc, filter)]
+        if sort:
+            docs = FakeCursor(docs).sort(sort).docs
+        return docs[0] if docs else None
+
+    def _upsert(self, filter, update):
+        doc = {key: value for key, value in filter.items() if not key.startswith("$") and not (
+            isinstance(value, dict) and any(op.startswith("$") for op in value))}
+        apply_update(doc, update, inserting=True)
+        doc.setdefault("_id", ObjectId())
+        self._check_unique(doc)
+        self.docs.append(doc)
+        return doc
+
+    def _update(self, doc, update):
+        updated = dict(doc)
+        apply_update(updated, update)
+        self._check_unique(updated, exclude=doc)
+        doc.clear()
+        doc.update(updated)
+
+    def find(self, filter=None, projection=None):
+        return FakeCursor([project(doc, projection) for doc in self.docs if matches(doc, filter)])
+
+    async def find_one(self, filter=None, projection=None):
+        doc = self._first(filter)
+        return project(doc, projection) if doc is not None else None
+
+    async def count_documents(self, filter):
+        return sum(1 for doc in self.docs if matches(doc, filter))
+
+    async def insert_one(self, doc):
+        doc.setdefault("_id", ObjectId())
+        self._check_unique(doc)
+        self.docs.append(dict(doc))
+
+    async def insert_many(self, docs, ordered=True):
+        for doc in docs:
+            await self.insert_one(doc)
+
+    async def update_one(self, filter, update, upsert=False):
+        doc = self._first(filter)
+        if doc is not None:
+            self._update(doc, update)
+        elif upsert:
+            self._upsert(filter, update)
+
+    async def update_many(self, filter, update, upsert=False):
+        for doc in [doc for doc in self.docs if matches(doc, filter)]:
+            self._update(doc, update)
+
+    async def replace_one(self, filter, replacement, upsert=False):
+        doc = self._first(filter)
+        if doc is None:
+            if upsert:
+                self._upsert(filter, {"$set": replacement})
+            return
+        self._update(doc, {"$set": {**replacement, "_id": doc["_id"]}})
+        for key in [key for key in doc if key not in replacement and key != "_id"]:
+            del doc[key]
+
+    async def delete_one(self, filter):
+        doc = self._first(filter)
+        if doc is not None:
+            self.docs.remove(doc)
+
+    async def delete_many(self, filter):
+        self.docs = [doc for doc in self.docs if not matches(doc, filter)]
+
+    async def find_one_and_update(self, filter, update, upsert=False, sort=None, projection=None,
+                                  return_document=ReturnDocument.BEFORE):
+        doc = self._first(filter, sort)
+        if doc is None:
+            if not upsert:
+                return None
+            doc = self._upsert(filter, update)
+            return project(doc, projection) if return_document == ReturnDocument.AFTER else None
+        before = dict(doc)
+        self._update(doc, update)
+        return project(doc if return_document == ReturnDocument.AFTER else before, projection)
+
+    async def bulk_write(self, requests, ordered=True):
+        self.bulk_writes += 1
+        for request in requests:
+            kind = type(request).__name__
+            if kind == "InsertOne":
+                await self.insert_one(request._doc)
+            elif kind == "UpdateOne":
+                await self.update_one(request._filter, request._doc, upsert=bool(request._upsert))
+            elif kind == "UpdateMany":
+                await self.update_many(request._filter, request._doc)
+            elif kind == "ReplaceOne":
+                await self.replace_one(request._filter, request._doc, upsert=bool(request._upsert))
+            elif kind == "DeleteOne":
+                await self.delete_one(request._filter)
+            elif kind == "DeleteMany":
+                await self.delete_many(request._filter)
+
+
+class FakeDatabase:
+    """Collections are created on first access, by attribute or by name"""
+
+    def __init__(self):
+        self.collections = {}
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self.collections.setdefault(name, FakeCollection())
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+@pytest.fixture
+def mongo():
+    """A fresh in-memory database"""
+    return FakeDatabase()
@@ -0,0 +1,92 @@
+import asyncio
+import base64
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from asset_store import IMMUTABLE_CACHE_CONTROL, AssetStore, asset_response
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"chart-bytes" * 50
+
+
+def bound_store(db):
+    store = AssetStore(cache_size=1)
+    store.bind(db)
+    return store, db.assets
+
+
+def test_publish_without_database_falls_back_to_data_uri():
+    url = asyncio.run(AssetStore().publish(PNG, "image/png"))
+    assert url == "data:image/png;base64," + base64.b64encode(PNG).decode()
+
+
+def test_identical_content_is_stored_once(mongo):
+    store, collection = bound_store(mongo)
+
+    async def main():
+        first = await store.publish(PNG, "image/png")
+        second = await store.publish(PNG, "image/png")
+        # Evict from the LRU so the next read goes to the collection
+        await store.publish(b"other", "image/png")
+        return first, second, await store.get(store.asset_id(PNG))
+
+    first, second, asset = asyncio.run(main())
+    assert first == second == f"/api/assets/{store.asset_id(PNG)}"
+    assert len(collection.docs) == 2
+    assert asset.content == PNG and asset.mime_type == "image/png"
+    assert asyncio.run(store.get("../../etc/passwd")) is None
+
+
+def test_extract_inline_images_rewrites_html(mongo):
+    store, collection = bound_store(mongo)
+    inline = "data:image/png;base64," + base64.b64encode(PNG).decode()
+    html = f'<img src="{inline}" alt="Budget"><p>text</p><img src="{inline}" alt="Again">'
+
+    rewritten, moved = asyncio.run(store.extract_inline_images(html))
+
+    url = f"/api/assets/{store.asset_id(PNG)}"
+    assert moved == 2
+    assert rewritten == f'<img src="{url}" alt="Budget"><p>text</p><img src="{url}" alt="Again">'
+    assert len(collection.docs) == 1
+    assert asyncio.run(store.extract_inline_images(rewritten)) == (rewritten, 0)
+
+
+def test_asset_endpoint_uses_immutable_caching(mongo):
+    store, _ = bound_store(mongo)
+    asset_id = asyncio.run(store.put(PNG, "image/png"))
+
+    app = FastAPI()
+
+    @app.get("/api/assets/{asset_id}")
+    async def get_asset(asset_id: str, request: Request):
+        asset = await store.get(asset_id)
+        if asset is None:
+            raise HTTPException(status_code=404)
+        return asset_response(request, asset)
+
+    client = TestClient(app)
+    response = client.get(f"/api/assets/{asset_id}")
+    assert response.status_code == 200
+    assert response.content == PNG
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+    revalidated = client.get(f"/api/assets/{asset_id}", headers={"If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert client.get(f"/api/assets/{'0' * 64}").status_code == 404
+
+
+def test_svg_assets_cannot_run_scripts(mongo):
+    store, _ = bound_store(mongo)
+    svg = b'<svg xmlns="http://www.w3.org/2000/svg"><script>alert(1)</script></svg>'
+    asset = asyncio.run(store.get(asyncio.run(store.put(svg, "image/svg+xml"))))
+
+    app = FastAPI()
+
+    @app.get("/asset")
+    async def get_asset(request: Request):
+        return asset_response(request, asset)
+
+    response = TestClient(app).get("/asset")
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert response.headers["content-security-policy"].startswith("default-src 'none'")
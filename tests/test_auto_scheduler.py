@@ -0,0 +1,130 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from auto_scheduler import AutoScheduler, MongoLease, report_due
+
+
+def scheduler(db, holder, **kwargs):
+    kwargs.setdefault("min_interval", 0.01)
+    scheduler = AutoScheduler(lease=MongoLease("auto_mode", ttl=5, holder=holder), enabled=True, **kwargs)
+    scheduler.bind(db)
+    return scheduler
+
+
+def test_only_one_worker_holds_the_lease(mongo):
+    leases = mongo.scheduler_leases
+
+    async def main():
+        first = MongoLease("auto_mode", ttl=5, holder="worker-1")
+        second = MongoLease("auto_mode", ttl=5, holder="worker-2")
+        first.bind(leases)
+        second.bind(leases)
+
+        assert await first.acquire()
+        assert not await second.acquire()
+        assert await first.acquire()  # renewal
+
+        # The leader dies without releasing: the other worker takes over once it expires
+        leases.docs[0]["expires_at"] = datetime.utcnow() - timedelta(seconds=1)
+        assert await second.acquire()
+        assert not await first.acquire()
+
+        await second.release()
+        assert await first.acquire()
+
+    asyncio.run(main())
+
+
+def test_ticks_are_skipped_while_a_round_is_in_flight(mongo):
+    db = mongo
+    db.simulation_state.docs.append({"id": "sim-1", "auto_conversations": True, "conversation_interval": 0.05})
+    leader = scheduler(db, "worker-1")
+    follower = scheduler(db, "worker-2")
+    started = []
+
+    async def slow_round(state):
+        started.append(state["id"])
+        await asyncio.sleep(0.3)
+
+    async def main():
+        actions = {"conversation": slow_round}
+        leader.actions = follower.actions = actions
+        for _ in range(10):
+            await leader.tick()
+            await follower.tick()
+            await asyncio.sleep(0.05)
+        job = leader.jobs[("sim-1", "conversation")]
+        await job.task
+        return job
+
+    job = asyncio.run(main())
+    # Only the leader ran rounds, and never two at once
+    assert follower.jobs == {}
+    assert 1 <= len(started) <= 2
+    assert job.runs == len(started)
+    assert job.skipped >= 3
+
+
+def test_status_is_visible_from_every_worker(mongo):
+    db = mongo
+    db.simulation_state.docs.append({"id": "sim-1", "auto_time": True, "time_interval": 30})
+    leader = scheduler(db, "worker-1")
+    follower = scheduler(db, "worker-2")
+
+    async def advance(state):
+        pass
+
+    async def main():
+        leader.actions = {"time": advance}
+        await leader.tick()
+        await leader.tick()  # publishes the counts of the first tick
+        return await follower.get_status(), await follower.simulation_status("sim-1")
+
+    status, simulation = asyncio.run(main())
+    assert status["leader"] == "worker-1" and not status["is_leader"]
+    assert simulation["jobs"]["time"]["interval_seconds"] == 30
+    assert 0 < simulation["jobs"]["time"]["next_run_in"] <= 30
+    # The lease document only carries scheduler-wide counts
+    assert db.scheduler_leases.docs[0]["status"] == {"scheduled": 1, "truncated": False}
+
+    db.simulation_state.docs.clear()  # auto mode switched off: its stored status goes too
+    asyncio.run(leader.tick())
+    assert db.auto_job_status.docs == []
+
+
+def test_weekly_report_waits_for_its_interval():
+    now = datetime.utcnow()
+    assert report_due({"report_interval_hours": 168}, now)
+    recent = {"last_auto_report": (now - timedelta(hours=2)).isoformat(), "report_interval_hours": 168}
+    assert not report_due(recent, now)
+    old = {"last_auto_report": (now - timedelta(days=8)).isoformat(), "report_interval_hours": 168}
+    assert report_due(old, now)
+
+
+def test_every_simulation_is_scheduled_unless_capped(mongo):
+    mongo.simulation_state.docs.extend(
+        {"id": f"sim-{n:03d}", "auto_conversations": True, "conversation_interval": 0.01} for n in range(150)
+    )
+    started = []
+
+    async def conversation(state):
+        started.append(state["id"])
+
+    async def main(**kwargs):
+        auto = scheduler(mongo, "worker-1", **kwargs)
+        auto.actions = {"conversation": conversation}
+        await auto.tick()
+        await asyncio.sleep(0.02)
+        await auto.tick()
+        await asyncio.sleep(0)
+        status = await auto.get_status()
+        await auto.lease.release()
+        return status
+
+    status = asyncio.run(main())
+    assert len(started) == 150 and status["scheduled"] == 150 and not status["truncated"]
+
+    started.clear()
+    status = asyncio.run(main(max_simulations=100))
+    assert started == [f"sim-{n:03d}" for n in range(100)]
+    assert status["truncated"] and status["max_simulations"] == 100
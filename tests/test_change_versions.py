@@ -0,0 +1,51 @@
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from change_versions import conditional_response, make_etag
+
+
+def build_app():
+    app = FastAPI()
+    calls = {"serialized": 0}
+
+    @app.get("/api/conversations")
+    async def conversations(request: Request, response: Response):
+        not_modified = await conditional_response(request, response, ["conversations"])
+        if not_modified:
+            return not_modified
+        calls["serialized"] += 1
+        return [{"id": "round-1"}]
+
+    return app, calls
+
+
+def test_etag_depends_on_versions_and_parts():
+    base = make_etag({"conversations": 1}, "/api/conversations")
+    assert base == make_etag({"conversations": 1}, "/api/conversations")
+    assert base != make_etag({"conversations": 2}, "/api/conversations")
+    assert base != make_etag({"conversations": 1}, "/api/conversations", "user-2")
+    assert base.startswith('W/"')
+
+
+def test_matching_if_none_match_returns_304_without_body():
+    app, calls = build_app()
+    client = TestClient(app)
+
+    first = client.get("/api/conversations")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    second = client.get("/api/conversations", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+    assert calls["serialized"] == 1
+
+    # Strong/weak forms and lists are compared weakly
+    listed = client.get("/api/conversations", headers={"If-None-Match": f'"other", {etag[2:]}'})
+    assert listed.status_code == 304
+
+    stale = client.get("/api/conversations", headers={"If-None-Match": 'W/"stale"'})
+    assert stale.status_code == 200
+    assert calls["serialized"] == 2
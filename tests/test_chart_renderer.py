@@ -0,0 +1,79 @@
+import asyncio
+from concurrent.futures import Executor, Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+pytest.importorskip("matplotlib")
+
+from chart_renderer import ChartRenderer
+
+BUDGET = {"Research": 1500000, "Development": 2000000, "Operations": 800000}
+MILESTONES = [{"date": "Week 1", "label": "Kickoff"}, {"date": "Week 4", "label": "Pilot"}]
+
+
+@pytest.fixture
+def renderer():
+    renderer = ChartRenderer(max_workers=1)
+    yield renderer
+    renderer.shutdown()
+
+
+def test_renders_png_and_svg_in_worker_process(renderer):
+    async def main():
+        png = await renderer.render("pie", BUDGET, "Budget Allocation", dpi_preset="screen")
+        svg = await renderer.render("timeline", MILESTONES, "Project Timeline", fmt="svg")
+        bar = await renderer.render("bar", BUDGET, "Risk", x_label="Category", y_label="Impact")
+        return png, svg, bar
+
+    png, svg, bar = asyncio.run(main())
+    assert png.content.startswith(b"\x89PNG")
+    assert png.mime_type == "image/png"
+    assert b"<svg" in svg.content
+    assert svg.mime_type == "image/svg+xml"
+    assert bar.content.startswith(b"\x89PNG")
+
+
+def test_identical_charts_are_rendered_once(renderer):
+    async def main():
+        first, second = await asyncio.gather(
+            renderer.render("pie", BUDGET, "Budget Allocation", dpi_preset="screen"),
+            renderer.render("pie", dict(BUDGET), "Budget Allocation", dpi_preset="screen"),
+        )
+        third = await renderer.render("pie", BUDGET, "Budget Allocation", dpi_preset="screen")
+        other_dpi = await renderer.render("pie", BUDGET, "Budget Allocation", dpi_preset="print")
+        reordered = await renderer.render("pie", dict(reversed(list(BUDGET.items()))), "Budget Allocation",
+                                          dpi_preset="screen")
+        return first, second, third, other_dpi, reordered
+
+    first, second, third, other_dpi, reordered = asyncio.run(main())
+    assert second.key == first.key
+    assert first.key == third.key
+    assert third is first
+    assert other_dpi.key != first.key
+    # Slices follow the data's order, so reordered data is a different chart
+    assert reordered.key != first.key
+    assert renderer.get_stats()["misses"] == 3
+
+
+def test_unknown_chart_type_is_rejected(renderer):
+    with pytest.raises(ValueError):
+        asyncio.run(renderer.render("radar", BUDGET, "Nope"))
+
+
+def test_broken_pool_is_shut_down_before_it_is_replaced(renderer):
+    class BrokenPool(Executor):
+        shut_down = False
+
+        def submit(self, fn, *args, **kwargs):
+            future = Future()
+            future.set_exception(BrokenProcessPool("worker died"))
+            return future
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.shut_down = True
+
+    broken = renderer.executor = BrokenPool()
+    chart = asyncio.run(renderer.render("pie", BUDGET, "Budget Allocation", dpi_preset="screen"))
+    assert chart.content.startswith(b"\x89PNG")
+    assert broken.shut_down and renderer.executor is not broken
@@ -0,0 +1,128 @@
+import asyncio
+import gzip
+import importlib.util
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from monitoring import track_request
+from query_monitor import track_queries
+from rate_limiter import rate_limit_requests
+from response_compression import CompressionMiddleware, choose_encoding
+from tracing import trace_request
+
+BODY = b'{"message": "' + b"the council agreed to secure the cold chain " * 100 + b'"}'
+
+SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "compression_benchmark.py"
+
+
+def make_client(**kwargs):
+    app = FastAPI()
+
+    @app.get("/json")
+    async def json_body():
+        return Response(BODY, media_type="application/json")
+
+    @app.get("/small")
+    async def small_body():
+        return Response(b'{"ok": true}', media_type="application/json")
+
+    @app.get("/image")
+    async def image_body():
+        return Response(BODY, media_type="image/png")
+
+    @app.get("/encoded")
+    async def encoded_body():
+        return Response(gzip.compress(BODY), media_type="application/json", headers={"Content-Encoding": "gzip"})
+
+    @app.get("/stream")
+    async def stream_body():
+        async def chunks():
+            yield BODY
+            yield BODY
+        return StreamingResponse(chunks(), media_type="application/json")
+
+    app.add_middleware(CompressionMiddleware, **{"minimum_size": 256, **kwargs})
+    return TestClient(app)
+
+
+def test_large_json_is_gzipped_with_vary_and_length():
+    response = make_client().get("/json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(BODY) / 5
+    assert response.content == BODY
+
+
+def test_large_bodies_are_compressed_off_the_event_loop():
+    response = make_client(thread_size=512).get("/json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip" and response.content == BODY
+
+
+@pytest.mark.parametrize("path", ["/small", "/image", "/stream"])
+def test_small_media_and_streamed_bodies_pass_through(path):
+    response = make_client().get(path, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+
+def test_already_encoded_responses_are_not_compressed_twice():
+    client = make_client()
+    response = client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == BODY
+
+
+def test_compresses_inside_the_servers_http_middlewares():
+    # Same registration order as server.py: the http middlewares re-stream bodies in chunks
+    app = FastAPI()
+
+    @app.get("/api/conversations")
+    async def conversations():
+        return Response(BODY, media_type="application/json")
+
+    app.add_middleware(CompressionMiddleware, minimum_size=256)
+    for middleware in (rate_limit_requests, track_request, track_queries, trace_request):
+        app.middleware("http")(middleware)
+
+    response = TestClient(app).get("/api/conversations", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == BODY
+
+
+def test_negotiation_honours_quality_values():
+    assert choose_encoding("gzip;q=0, identity", brotli_available=False) is None
+    assert choose_encoding("gzip, br", brotli_available=False) == "gzip"
+    assert choose_encoding("gzip, br", brotli_available=True) == "br"
+    assert choose_encoding("br;q=0.5, gzip", brotli_available=True) == "gzip"
+    assert choose_encoding("*", brotli_available=True) == "br"
+
+    response = make_client().get("/json", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in response.headers
+
+
+def test_brotli_is_preferred_when_installed():
+    brotli = pytest.importorskip("brotli")
+    response = make_client().get("/json", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert brotli.decompress(response.content) == BODY
+
+
+def test_benchmark_reports_gzip_smaller_on_the_wire():
+    spec = importlib.util.spec_from_file_location("compression_benchmark", SCRIPT)
+    benchmark = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(benchmark)
+
+    async def main():
+        transport = httpx.ASGITransport(app=benchmark.sample_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await benchmark.run(client, ["/api/documents"], requests=1, link_mbps=10)
+
+    results = asyncio.run(main())["/api/documents"]
+    assert results["gzip"]["content_encoding"] == "gzip"
+    assert results["gzip"]["wire_bytes"] < results["identity"]["wire_bytes"] / 2
+    assert results["gzip"]["delivery_ms"] < results["identity"]["delivery_ms"]
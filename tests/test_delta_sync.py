@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from delta_sync import DeltaSync, decode_cursor, encode_cursor, touch
+
+
+def make_sync(db, **kwargs):
+    sync = DeltaSync(**{"page_size": 10, "overlap_seconds": 0, "tombstone_days": 7, **kwargs})
+    sync.bind(db)
+    return sync
+
+
+FILTERS = {"agents": {"simulation_id": "sim"}, "conversations": {"simulation_id": "sim"}}
+
+
+def ids(result, collection):
+    return [doc["id"] for doc in result["changes"][collection]]
+
+
+def test_delta_returns_only_what_changed_since_the_cursor(mongo):
+    sync = make_sync(mongo)
+    db = sync.db
+
+    async def main():
+        await db.agents.insert_one(touch({"id": "a1", "simulation_id": "sim"}))
+        await db.agents.insert_one(touch({"id": "other", "simulation_id": "other-sim"}))
+        await db.conversations.insert_one(touch({"id": "r1", "simulation_id": "sim"}))
+        first = await sync.changes(FILTERS, ["sim"])
+
+        await asyncio.sleep(0.001)
+        await db.conversations.insert_one(touch({"id": "r2", "simulation_id": "sim"}))
+        await db.agents.update_one({"id": "a1"}, {"$set": touch({"name": "Ada"})})
+        await sync.tombstone("sim", "agents", ["a0"])
+        second = await sync.changes(FILTERS, ["sim"], first["cursor"])
+        third = await sync.changes(FILTERS, ["sim"], second["cursor"])
+        return first, second, third
+
+    first, second, third = asyncio.run(main())
+    assert first["full"] and ids(first, "agents") == ["a1"] and ids(first, "conversations") == ["r1"]
+    assert not second["full"]
+    assert ids(second, "conversations") == ["r2"] and second["changes"]["agents"][0]["name"] == "Ada"
+    assert second["deleted"] == {"agents": ["a0"]}
+    assert third["changes"] == {"agents": [], "conversations": []} and third["deleted"] == {}
+
+
+def test_overlap_rereads_writes_stamped_just_before_the_cursor(mongo):
+    sync = make_sync(mongo, overlap_seconds=5)
+    db = sync.db
+
+    async def main():
+        first = await sync.changes(FILTERS, ["sim"])
+        # Stamped before the first response went out, committed after it
+        late = {"id": "late", "simulation_id": "sim", "updated_at": datetime.utcnow() - timedelta(seconds=2)}
+        await db.conversations.insert_one(late)
+        return await sync.changes(FILTERS, ["sim"], first["cursor"])
+
+    assert ids(asyncio.run(main()), "conversations") == ["late"]
+
+
+def test_pages_through_many_changes_with_the_same_timestamp(mongo):
+    sync = make_sync(mongo, page_size=4)
+    db = sync.db
+    stamp = datetime.utcnow()
+    db.conversations.docs.extend(
+        {"_id": ObjectId(), "id": f"r{n}", "simulation_id": "sim", "updated_at": stamp} for n in range(10)
+    )
+
+    async def main():
+        pages, cursor = [], None
+        while True:
+            result = await sync.changes({"conversations": {"simulation_id": "sim"}}, ["sim"], cursor)
+            pages.append(result)
+            cursor = result["cursor"]
+            if not result["has_more"]:
+                return pages
+
+    pages = asyncio.run(main())
+    assert [len(page["changes"]["conversations"]) for page in pages] == [4, 4, 2]
+    assert [page["full"] for page in pages] == [True, False, False]
+    seen = [doc["id"] for page in pages for doc in page["changes"]["conversations"]]
+    assert sorted(seen) == sorted(f"r{n}" for n in range(10))
+
+
+def test_full_load_after_a_reset_pages_forward(mongo):
+    sync = make_sync(mongo, page_size=2)
+    db = sync.db
+
+    async def main():
+        first = await sync.changes(FILTERS, ["sim"])
+        await asyncio.sleep(0.001)
+        reset_at = datetime.utcnow()
+        for n in range(5):
+            await db.conversations.insert_one(touch({"id": f"c{n}", "simulation_id": "sim"}))
+
+        pages, cursor = [], first["cursor"]
+        for _ in range(5):
+            result = await sync.changes(FILTERS, ["sim"], cursor, reset_at=reset_at)
+            pages.append(result)
+            cursor = result["cursor"]
+            if not result["has_more"]:
+                break
+        return pages
+
+    pages = asyncio.run(main())
+    assert [page["full"] for page in pages] == [True, False, False]
+    assert [ids(page, "conversations") for page in pages] == [["c0", "c1"], ["c2", "c3"], ["c4"]]
+
+
+def test_reset_or_expired_cursor_forces_a_full_load(mongo):
+    sync = make_sync(mongo)
+
+    async def main():
+        first = await sync.changes(FILTERS, ["sim"])
+        after_reset = await sync.changes(FILTERS, ["sim"], first["cursor"], reset_at=datetime.utcnow())
+
+        stale = decode_cursor(first["cursor"])
+        stale["at"] = (datetime.utcnow() - timedelta(days=8)).isoformat()
+        expired = await sync.changes(FILTERS, ["sim"], encode_cursor(stale))
+        return after_reset, expired
+
+    after_reset, expired = asyncio.run(main())
+    assert after_reset["full"] and expired["full"]
+
+
+def test_rejects_cursors_it_did_not_issue():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor({"at": "yesterday", "c": {}}))
@@ -0,0 +1,190 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from job_queue import CANCELLED, FAILED, QUEUED, SUCCEEDED, JobQueue, inline_job, job_view
+
+
+def make_queue(db, **kwargs):
+    options = dict(workers=1, lease_seconds=5, heartbeat_seconds=0.05, poll_seconds=0.02, max_attempts=3,
+                   retry_backoff=0.01)
+    options.update(kwargs)
+    queue = JobQueue(**options)
+    queue.bind(db)
+    return queue
+
+
+async def wait_for_status(queue, job_id, *statuses, timeout=3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        job = await queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job stayed {job['status']}")
+
+
+def test_idempotency_key_returns_the_same_job(mongo):
+    queue = make_queue(mongo)
+    queue.register("noop", lambda job: asyncio.sleep(0))
+
+    async def main():
+        first = await queue.submit("noop", {"n": 1}, idempotency_key="abc")
+        second = await queue.submit("noop", {"n": 1}, idempotency_key="abc")
+        other = await queue.submit("noop", {"n": 1})
+        return first, second, other
+
+    first, second, other = asyncio.run(main())
+    assert first["_id"] == second["_id"] != other["_id"]
+    assert len(queue.collection.docs) == 2
+
+
+def test_failed_job_retries_and_resumes_from_checkpoint(mongo):
+    queue = make_queue(mongo)
+    processed = []
+
+    async def count_to_five(job):
+        for step in range(job.checkpoint.get("next", 0), 5):
+            processed.append(step)
+            if step == 2 and job.attempt == 1:
+                raise RuntimeError("LLM timeout")
+            await job.progress(step + 1, 5, checkpoint={"next": step + 1})
+        return {"steps": 5}
+
+    queue.register("count", count_to_five)
+
+    async def main():
+        await queue.start()
+        job = await queue.submit("count")
+        try:
+            return await wait_for_status(queue, job["_id"], SUCCEEDED, FAILED)
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(main())
+    assert job["status"] == SUCCEEDED and job["attempts"] == 2
+    assert job["result"] == {"steps": 5}
+    # Step 2 ran twice (it failed); steps 0 and 1 were not repeated
+    assert processed == [0, 1, 2, 2, 3, 4]
+    view = job_view(job)
+    assert view["progress"]["percent"] == 100.0 and view["error"] is None
+
+
+def test_client_errors_are_not_retried(mongo):
+    queue = make_queue(mongo)
+
+    async def bad_request(job):
+        raise HTTPException(status_code=400, detail="Need at least 2 agents")
+
+    queue.register("bad", bad_request)
+
+    async def main():
+        await queue.start()
+        job = await queue.submit("bad")
+        try:
+            return await wait_for_status(queue, job["_id"], FAILED)
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(main())
+    assert job["attempts"] == 1 and job["error"] == "Need at least 2 agents"
+
+
+def test_cancel_stops_a_running_job_at_its_next_step(mongo):
+    queue = make_queue(mongo)
+    steps = []
+
+    async def long_job(job):
+        for step in range(100):
+            steps.append(step)
+            await asyncio.sleep(0.01)
+            await job.progress(step + 1, 100)
+
+    queue.register("long", long_job)
+
+    async def main():
+        await queue.start()
+        job = await queue.submit("long")
+        await wait_for_status(queue, job["_id"], "running")
+        await asyncio.sleep(0.05)
+        await queue.cancel(job["_id"])
+        try:
+            return await wait_for_status(queue, job["_id"], CANCELLED)
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(main())
+    assert job["status"] == CANCELLED
+    assert len(steps) < 100
+
+    # Queued jobs are cancelled without running
+    queue.register("never", lambda job: pytest.fail("cancelled job ran"))
+    queued = asyncio.run(queue.submit("never"))
+    assert asyncio.run(queue.cancel(queued["_id"]))["status"] == CANCELLED
+
+
+def test_other_users_jobs_are_invisible_and_cannot_be_cancelled(mongo):
+    queue = make_queue(mongo)
+    queue.register("translate", lambda job: pytest.fail("not started"))
+
+    async def main():
+        job = await queue.submit("translate", user_id="alice")
+        seen_by_bob = await queue.get(job["_id"], user_id="bob")
+        cancelled_by_bob = await queue.cancel(job["_id"], user_id="bob")
+        return job, seen_by_bob, cancelled_by_bob, await queue.get(job["_id"], user_id="alice")
+
+    job, seen_by_bob, cancelled_by_bob, seen_by_alice = asyncio.run(main())
+    assert seen_by_bob is None and cancelled_by_bob is None
+    assert seen_by_alice["status"] == job["status"] != CANCELLED
+
+
+def test_job_of_a_dead_worker_is_reclaimed(mongo):
+    queue = make_queue(mongo)
+
+    async def finish(job):
+        return {"resumed_from": job.checkpoint.get("next")}
+
+    queue.register("resume", finish)
+
+    async def main():
+        job = await queue.submit("resume")
+        # Another worker claimed it, checkpointed, then died without renewing its lease
+        await queue.collection.update_one({"_id": job["_id"]}, {"$set": {
+            "status": "running", "attempts": 1, "lease_owner": "dead-worker",
+            "lease_expires_at": datetime.utcnow() - timedelta(seconds=1), "checkpoint": {"next": 7},
+        }})
+        await queue.start()
+        try:
+            return await wait_for_status(queue, job["_id"], SUCCEEDED)
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(main())
+    assert job["result"] == {"resumed_from": 7} and job["attempts"] == 2
+
+
+def test_shutdown_hands_the_job_back(mongo):
+    queue = make_queue(mongo)
+
+    async def slow(job):
+        await asyncio.sleep(10)
+
+    queue.register("slow", slow)
+
+    async def main():
+        await queue.start()
+        job = await queue.submit("slow")
+        await wait_for_status(queue, job["_id"], "running")
+        await queue.stop()
+        return await queue.get(job["_id"])
+
+    job = asyncio.run(main())
+    assert job["status"] == QUEUED and job["attempts"] == 0 and job["lease_owner"] is None
+
+
+def test_inline_context_needs_no_queue():
+    job = inline_job({"target_language": "es"})
+    asyncio.run(job.progress(1, 2, checkpoint={"next": 1}))
+    assert job.params == {"target_language": "es"} and job.checkpoint == {"next": 1}
@@ -0,0 +1,107 @@
+import asyncio
+
+from llm_scheduler import (
+    LLMBudget, LLMScheduler, acting_for,
+    PRIORITY_INTERACTIVE, PRIORITY_OBSERVER, PRIORITY_DOCUMENT, PRIORITY_BACKGROUND
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def run_in_order(scheduler, calls):
+    """Queue all calls before the dispatcher runs and return the admission order"""
+    order = []
+
+    async def call(name, priority, user_id):
+        await scheduler.acquire(priority, user_id, estimated_tokens=100)
+        order.append(name)
+
+    async def main():
+        await asyncio.gather(*(call(*args) for args in calls))
+
+    asyncio.run(main())
+    return order
+
+
+def test_calls_are_attributed_to_the_user_they_are_made_for():
+    scheduler = LLMScheduler(rpm=1000, tpm=1000000, clock=FakeClock())
+    order = []
+
+    async def generation_step(name):
+        # Deep inside a generation path: no user is passed to the scheduler
+        await scheduler.acquire(PRIORITY_BACKGROUND, estimated_tokens=100)
+        order.append(name)
+
+    async def request(user_id, names):
+        with acting_for(user_id):
+            await asyncio.gather(*(generation_step(name) for name in names))
+
+    async def main():
+        await asyncio.gather(request("alice", [f"a{i}" for i in range(4)]), request("bob", ["b0"]))
+
+    asyncio.run(main())
+    assert order.index("b0") <= 1
+
+
+def test_budget_admits_rpm_then_asks_to_wait():
+    clock = FakeClock()
+    budget = LLMBudget(rpm=6, tpm=1000000, clock=clock)
+
+    waits = [asyncio.run(budget.try_acquire(10)) for _ in range(7)]
+    assert waits[:6] == [0.0] * 6
+    assert waits[6] == 10.0  # one request interval (60s / 6)
+
+    clock.now += 10
+    assert asyncio.run(budget.try_acquire(10)) == 0.0
+
+
+def test_lower_classes_leave_headroom_for_interactive():
+    clock = FakeClock()
+    budget = LLMBudget(rpm=10, tpm=1000000, clock=clock)
+
+    admitted = 0
+    while asyncio.run(budget.try_acquire(10, ceiling=0.5)) == 0:
+        admitted += 1
+    assert admitted == 5
+
+    assert asyncio.run(budget.try_acquire(10, ceiling=1.0)) == 0
+
+
+def test_token_budget_limits_large_prompts():
+    clock = FakeClock()
+    budget = LLMBudget(rpm=1000, tpm=1000, clock=clock)
+
+    assert asyncio.run(budget.try_acquire(600)) == 0
+    assert asyncio.run(budget.try_acquire(600)) > 0
+    # Calls larger than the whole budget are clamped instead of waiting forever
+    clock.now += 60
+    assert asyncio.run(budget.try_acquire(5000)) == 0
+
+
+def test_higher_priority_classes_dispatch_first():
+    scheduler = LLMScheduler(rpm=1000, tpm=1000000, clock=FakeClock())
+    order = run_in_order(scheduler, [
+        ("batch", PRIORITY_BACKGROUND, "u1"),
+        ("document", PRIORITY_DOCUMENT, "u1"),
+        ("observer", PRIORITY_OBSERVER, "u1"),
+        ("turn", PRIORITY_INTERACTIVE, "u1"),
+    ])
+    assert order == ["turn", "observer", "document", "batch"]
+
+
+def test_users_share_a_class_fairly():
+    scheduler = LLMScheduler(rpm=1000, tpm=1000000, clock=FakeClock())
+    calls = [(f"a{i}", PRIORITY_BACKGROUND, "alice") for i in range(4)]
+    calls.append(("b0", PRIORITY_BACKGROUND, "bob"))
+    order = run_in_order(scheduler, calls)
+
+    # Bob's single call is not stuck behind Alice's whole backlog
+    assert order.index("b0") <= 1
+    assert [name for name in order if name.startswith("a")] == ["a0", "a1", "a2", "a3"]
+    assert scheduler.get_stats()["dispatched"]["background"] == 5
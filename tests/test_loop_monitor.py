@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+from loop_monitor import LoopLagMonitor
+
+
+def blocking_call(seconds):
+    time.sleep(seconds)
+
+
+def test_captures_stack_of_blocking_call():
+    monitor = LoopLagMonitor(interval=0.02, threshold=0.1)
+
+    async def main():
+        monitor.start()
+        await asyncio.sleep(0.1)
+        blocking_call(0.4)
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+    asyncio.run(main())
+
+    stalls = monitor.get_captures()
+    assert monitor.get_stats()["stall_count"] == 1
+    assert len(stalls) == 1
+    assert stalls[0]["lag_ms"] >= 300
+    assert any("blocking_call" in line for line in stalls[0]["stack"])
+
+
+def test_healthy_loop_records_no_stalls():
+    monitor = LoopLagMonitor(interval=0.02, threshold=0.2)
+
+    async def main():
+        monitor.start()
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+        await monitor.stop()
+
+    asyncio.run(main())
+
+    assert monitor.get_captures() == []
+    assert monitor.get_stats()["stall_count"] == 0
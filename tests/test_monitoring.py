@@ -0,0 +1,73 @@
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from monitoring import monitor, track_request
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def build_app():
+    router = APIRouter(prefix="/api")
+
+    @router.get("/widgets/{widget_id}")
+    async def get_widget(widget_id: str):
+        return {"id": widget_id}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.middleware("http")(track_request)
+    return app
+
+
+def test_requests_are_labelled_by_route_template():
+    client = TestClient(build_app())
+    labels = {"method": "GET", "endpoint": "/api/widgets/{widget_id}", "status": "200"}
+    before = sample("http_requests_total", **labels)
+
+    client.get("/api/widgets/a")
+    client.get("/api/widgets/b")
+
+    assert sample("http_requests_total", **labels) == before + 2
+    assert sample("http_requests_total", method="GET", endpoint="/api/widgets/a", status="200") == 0
+
+
+def test_unmatched_paths_share_one_label():
+    client = TestClient(build_app())
+    labels = {"method": "GET", "endpoint": "unmatched", "status": "404"}
+    before = sample("http_requests_total", **labels)
+
+    client.get("/random/scanner/path")
+
+    assert sample("http_requests_total", **labels) == before + 1
+
+
+def test_llm_calls_record_timeouts_and_sizes():
+    before = sample("llm_timeouts_total", purpose="vote")
+
+    monitor.record_llm_call("vote", 3.2, "timeout", prompt_chars=900, tokens=300)
+    monitor.record_llm_call("vote", 0.8, "success", prompt_chars=900, response_chars=40, tokens=300)
+
+    assert sample("llm_timeouts_total", purpose="vote") == before + 1
+    assert sample("llm_quota_requests_total", purpose="vote") >= 2
+    assert sample("llm_response_chars_count", purpose="vote") >= 1
+
+
+def test_in_flight_requests_are_counted():
+    seen = []
+    app = FastAPI()
+
+    @app.get("/api/slow")
+    async def slow():
+        seen.append(monitor.active_requests)
+        return {}
+
+    app.middleware("http")(track_request)
+    before = monitor.active_requests
+
+    TestClient(app).get("/api/slow")
+
+    assert seen == [before + 1]
+    assert monitor.get_performance_stats()["active_requests"] == before
@@ -0,0 +1,77 @@
+import asyncio
+from types import SimpleNamespace
+
+from narration_prefetch import NarrationPrefetcher
+from tts_service import AudioCache, LocalTTSBackend, TTSService
+
+
+def round_of(*lines):
+    return [SimpleNamespace(agent_name='Alexandra "Alex" Chen', message=line) for line in lines]
+
+
+def make_prefetcher(tmp_path, **kwargs):
+    service = TTSService(backend=LocalTTSBackend(), cache=AudioCache(tmp_path), max_concurrency=2)
+    return NarrationPrefetcher(service=service, enabled=True, **kwargs)
+
+
+def test_disabled_by_default(tmp_path):
+    prefetcher = NarrationPrefetcher(service=TTSService(backend=LocalTTSBackend(), cache=AudioCache(tmp_path)))
+    assert prefetcher.enqueue_round(round_of("hello"), "en") == 0
+    assert prefetcher.get_stats()["queued"] == 0
+
+
+def test_newest_round_is_synthesized_first(tmp_path):
+    prefetcher = make_prefetcher(tmp_path)
+    spoken = []
+    synthesize = prefetcher.service.backend.synthesize
+
+    async def recording_synthesize(text, voice, rate):
+        spoken.append(text)
+        return await synthesize(text, voice, rate)
+
+    prefetcher.service.backend.synthesize = recording_synthesize
+
+    async def main():
+        # Both rounds are queued before the worker gets to run
+        prefetcher.enqueue_round(round_of("old one", "old two"), "en")
+        prefetcher.enqueue_round(round_of("new one", "new two"), "en")
+        for _ in range(200):
+            if prefetcher.synthesized == 4:
+                break
+            await asyncio.sleep(0.01)
+        await prefetcher.stop()
+
+    asyncio.run(main())
+    assert spoken == ["new one", "new two", "old one", "old two"]
+    assert prefetcher.synthesized == 4
+
+    # Playback now hits the cache
+    replay = asyncio.run(prefetcher.service.synthesize("new one", 'Alexandra "Alex" Chen', "en"))
+    assert replay.cached
+
+
+def test_queue_cap_drops_oldest_rounds(tmp_path):
+    prefetcher = make_prefetcher(tmp_path, max_queued=3)
+
+    async def main():
+        prefetcher.enqueue_round(round_of("a1", "a2"), "en")
+        prefetcher.enqueue_round(round_of("b1", "b2"), "en")
+        queued = [item[2] for item in prefetcher.queue]
+        await prefetcher.stop()
+        return queued
+
+    assert asyncio.run(main()) == ["b1", "b2", "a1"]
+    assert prefetcher.get_stats()["dropped"] == 1
+
+
+def test_unsupported_language_is_skipped(tmp_path):
+    prefetcher = make_prefetcher(tmp_path)
+
+    async def main():
+        prefetcher.enqueue_round(round_of("bonjour"), "xx")
+        while prefetcher.queue:
+            await asyncio.sleep(0.01)
+        await prefetcher.stop()
+
+    asyncio.run(main())
+    assert prefetcher.failed == 0 and prefetcher.synthesized == 0
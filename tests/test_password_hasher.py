@@ -0,0 +1,49 @@
+import asyncio
+
+from password_hasher import CryptoBusy, PasswordHasher
+
+
+def test_hash_and_verify_off_loop():
+    hasher = PasswordHasher(rounds=4, max_workers=2)
+
+    async def main():
+        hashed = await hasher.hash("correct horse")
+        return hashed, await hasher.verify("correct horse", hashed), await hasher.verify("wrong", hashed)
+
+    hashed, valid, invalid = asyncio.run(main())
+    assert hashed.startswith("$2b$04$")
+    assert valid and not invalid
+    assert hasher.pending == 0
+
+
+def test_malformed_hash_does_not_verify():
+    hasher = PasswordHasher(rounds=4)
+    assert asyncio.run(hasher.verify("secret", "5e884898da28047151d0e56f8dc629")) is False
+
+
+def test_rehash_when_cost_changes():
+    old_hasher = PasswordHasher(rounds=4)
+    new_hasher = PasswordHasher(rounds=5)
+    old_hash = asyncio.run(old_hasher.hash("secret"))
+
+    assert not old_hasher.needs_rehash(old_hash)
+    assert new_hasher.needs_rehash(old_hash)
+
+    valid, upgraded = asyncio.run(new_hasher.verify_and_update("secret", old_hash))
+    assert valid
+    assert upgraded.startswith("$2b$05$")
+
+    valid, upgraded = asyncio.run(new_hasher.verify_and_update("wrong", old_hash))
+    assert not valid and upgraded is None
+
+
+def test_rejects_work_beyond_max_pending():
+    hasher = PasswordHasher(rounds=6, max_workers=1, max_pending=2)
+
+    async def main():
+        return await asyncio.gather(*[hasher.hash("secret") for _ in range(4)], return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert sum(isinstance(result, CryptoBusy) for result in results) == 2
+    assert sum(isinstance(result, str) for result in results) == 2
+    assert hasher.get_stats()["rejected"] == 2
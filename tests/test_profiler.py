@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from profiler import ProfilerMiddleware, SamplingProfiler
+
+
+def busy_worker(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+def test_thread_view_sees_executor_work():
+    profiler = SamplingProfiler()
+
+    async def main():
+        profiler.start(duration=5, interval=0.005)
+        await asyncio.to_thread(busy_worker, 0.2)
+        profiler.stop()
+
+    asyncio.run(main())
+
+    assert profiler.sample_count > 0
+    collapsed = profiler.collapsed("threads")
+    assert "busy_worker (test_profiler.py" in collapsed
+
+    speedscope = profiler.speedscope("threads")
+    names = {frame["name"] for frame in speedscope["shared"]["frames"]}
+    assert "busy_worker" in names
+    for profile in speedscope["profiles"]:
+        assert len(profile["samples"]) == len(profile["weights"])
+
+
+def test_task_view_attributes_samples_to_route():
+    profiler = SamplingProfiler()
+    router = APIRouter(prefix="/api")
+
+    @router.get("/reports/{report_id}")
+    async def slow_report(report_id: str):
+        profiler.start(duration=5, interval=0.005)
+        await asyncio.sleep(0.2)
+        profiler.stop()
+        return {"id": report_id}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(ProfilerMiddleware, profiler=profiler)
+    TestClient(app).get("/api/reports/1")
+
+    collapsed = profiler.collapsed("tasks")
+    routed = [line for line in collapsed.splitlines() if line.startswith("GET /api/reports/{report_id};")]
+    assert routed
+    assert any("slow_report" in line for line in routed)
+    assert not profiler.requests
+
+
+def test_event_loop_samples_are_labelled_with_the_running_request():
+    profiler = SamplingProfiler()
+    app = FastAPI()
+
+    @app.get("/api/export")
+    async def blocking_export():
+        profiler.start(duration=5, interval=0.005)
+        busy_worker(0.2)  # Holds the loop, so the loop thread is sampled inside this request
+        profiler.stop()
+        return {}
+
+    app.add_middleware(ProfilerMiddleware, profiler=profiler)
+    TestClient(app).get("/api/export")
+
+    collapsed = profiler.collapsed("threads")
+    assert any(line.startswith("event-loop:GET /api/export;") and "busy_worker" in line
+               for line in collapsed.splitlines())
+
+
+def test_second_session_is_rejected_while_running():
+    profiler = SamplingProfiler()
+    profiler.start(duration=1, interval=0.01)
+    try:
+        with pytest.raises(RuntimeError):
+            profiler.start(duration=1)
+    finally:
+        profiler.stop()
+    assert not profiler.running
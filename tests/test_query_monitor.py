@@ -0,0 +1,84 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from query_monitor import (
+    QueryBudgetExceeded, command_shape, query_budget, query_monitor, track_queries
+)
+
+
+def started(command_name, command):
+    query_monitor.started(SimpleNamespace(command_name=command_name, command=command))
+
+
+def succeeded(command_name, reply):
+    query_monitor.succeeded(SimpleNamespace(command_name=command_name, reply=reply))
+
+
+def find(collection, filter, docs=1):
+    """Stand-in for one find round-trip as seen by the command listener"""
+    started("find", {"find": collection, "filter": filter})
+    succeeded("find", {"cursor": {"firstBatch": [{}] * docs, "id": 0}})
+
+
+def test_shape_ignores_literal_values():
+    assert command_shape("find", {"find": "agents", "filter": {"id": "a1"}}) == \
+        command_shape("find", {"find": "agents", "filter": {"id": "b2"}})
+    assert command_shape("find", {"find": "agents", "filter": {"id": {"$in": [1, 2]}}}) == \
+        command_shape("find", {"find": "agents", "filter": {"id": {"$in": [3, 4, 5]}}})
+    assert command_shape("find", {"find": "agents", "filter": {"id": "a1"}}) != \
+        command_shape("find", {"find": "agents", "filter": {"user_id": "a1"}})
+
+
+def test_budget_counts_commands_round_trips_and_docs():
+    with query_budget(max_commands=3) as stats:
+        find("agents", {"user_id": "u1"}, docs=3)
+        started("getMore", {"getMore": 1, "collection": "agents"})
+        succeeded("getMore", {"cursor": {"nextBatch": [{}, {}], "id": 0}})
+
+    assert stats.commands == 1
+    assert stats.round_trips == 2
+    assert stats.docs_returned == 5
+
+
+def test_budget_fails_on_repeated_same_shape_queries():
+    async def load_relationships(agent_ids):
+        # The N+1 pattern: one lookup per agent pair instead of one $in query
+        for agent_id in agent_ids:
+            find("relationships", {"agent1_id": agent_id})
+
+    with pytest.raises(QueryBudgetExceeded, match="4x find relationships"):
+        with query_budget(max_repeats=1):
+            asyncio.run(load_relationships(["a", "b", "c", "d"]))
+
+
+def test_middleware_flags_n_plus_one_and_route_budget(caplog):
+    router = APIRouter(prefix="/api")
+
+    @router.get("/admin/users")
+    async def list_users():
+        for user_id in range(6):
+            find("agents", {"user_id": user_id})
+        return []
+
+    app = FastAPI()
+    app.include_router(router)
+    app.middleware("http")(track_queries)
+
+    labels = {"endpoint": "/api/admin/users", "command": "find", "collection": "agents"}
+    before = REGISTRY.get_sample_value("mongo_n_plus_one_total", labels) or 0
+    query_monitor.set_budget("GET", "/api/admin/users", 2)
+    try:
+        TestClient(app).get("/api/admin/users")
+    finally:
+        query_monitor.budgets.clear()
+        violations = list(query_monitor.budget_violations)
+        query_monitor.budget_violations.clear()
+
+    assert REGISTRY.get_sample_value("mongo_n_plus_one_total", labels) == before + 1
+    assert "Possible N+1 query in GET /api/admin/users: 6x find agents" in caplog.text
+    assert violations == [{"route": "GET /api/admin/users", "commands": 6, "budget": 2}]
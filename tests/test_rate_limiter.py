@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+
+import rate_limiter as rate_limiter_module
+from rate_limiter import RateLimiter, classify_request, rate_limit_requests
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def check(limiter, identifier, limit_type):
+    return asyncio.run(limiter.is_allowed(identifier, limit_type))
+
+
+def test_allows_burst_up_to_limit_then_blocks():
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock)
+
+    results = [check(limiter, "1.2.3.4", "auth") for _ in range(5)]
+    assert all(allowed for allowed, _ in results)
+    assert [info["remaining"] for _, info in results] == [4, 3, 2, 1, 0]
+
+    allowed, info = check(limiter, "1.2.3.4", "auth")
+    assert not allowed
+    assert info["limit"] == 5
+    assert info["retry_after"] == 12.0  # one emission interval (60s / 5)
+
+
+def test_capacity_refills_at_emission_interval():
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock)
+    for _ in range(5):
+        check(limiter, "user_1", "auth")
+
+    clock.now += 11.9
+    assert not check(limiter, "user_1", "auth")[0]
+    clock.now += 0.1
+    assert check(limiter, "user_1", "auth")[0]
+    assert not check(limiter, "user_1", "auth")[0]
+
+
+def test_keys_and_limit_types_are_independent():
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock)
+    for _ in range(5):
+        check(limiter, "a", "auth")
+
+    assert not check(limiter, "a", "auth")[0]
+    assert check(limiter, "b", "auth")[0]
+    assert check(limiter, "a", "api")[0]
+    # Unknown limit types share the default api bucket
+    assert check(limiter, "a", "unknown")[1]["limit"] == 100
+
+
+def test_local_state_is_bounded():
+    clock = FakeClock()
+    limiter = RateLimiter(max_local_keys=3, clock=clock)
+    for i in range(10):
+        check(limiter, f"client-{i}", "api")
+    assert len(limiter.tats) == 3
+
+
+def test_requests_are_classified_by_endpoint_and_method():
+    assert classify_request("POST", "/api/auth/login") == "auth"
+    assert classify_request("GET", "/api/auth/me") == "api"
+    assert classify_request("POST", "/api/agents") == "create"
+    assert classify_request("GET", "/api/agents") == "api"
+    assert classify_request("GET", "/api/admin/users") == "admin"
+    assert classify_request("OPTIONS", "/api/agents") is None
+    assert classify_request("GET", "/health") is None
+    assert classify_request("GET", "/api/assets/" + "a" * 64) is None
+
+
+def test_middleware_returns_429_with_retry_headers(monkeypatch):
+    monkeypatch.setattr(rate_limiter_module, "rate_limiter", RateLimiter())
+    app = FastAPI()
+
+    @app.post("/api/auth/login")
+    async def login():
+        return {"ok": True}
+
+    app.middleware("http")(rate_limit_requests)
+    client = TestClient(app)
+
+    responses = [client.post("/api/auth/login") for _ in range(6)]
+    assert [r.status_code for r in responses] == [200] * 5 + [429]
+    assert responses[0].headers["X-RateLimit-Remaining"] == "4"
+    assert int(responses[-1].headers["Retry-After"]) > 0
+
+    # A token doesn't open a new bucket on sign-in routes
+    assert client.post("/api/auth/login", headers={"Authorization": "Bearer abc"}).status_code == 429
+
+
+def test_only_verified_tokens_get_their_own_bucket(monkeypatch):
+    monkeypatch.setenv("JWT_SECRET", "secret")
+    monkeypatch.setattr(rate_limiter_module, "rate_limiter", RateLimiter())
+    monkeypatch.setitem(rate_limiter_module.rate_limiter.limits, "api", {"requests": 2, "window": 60})
+    app = FastAPI()
+
+    @app.get("/api/conversations")
+    async def conversations():
+        return []
+
+    app.middleware("http")(rate_limit_requests)
+    client = TestClient(app)
+
+    # Made-up tokens all count against the caller's address
+    statuses = [client.get("/api/conversations", headers={"Authorization": f"Bearer fake-{n}"}).status_code
+                for n in range(3)]
+    assert statuses == [200, 200, 429]
+
+    token = jwt.encode({"user_id": "alice", "exp": datetime.utcnow() + timedelta(hours=1)}, "secret",
+                       algorithm="HS256")
+    assert client.get("/api/conversations", headers={"Authorization": f"Bearer {token}"}).status_code == 200
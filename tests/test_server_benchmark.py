@@ -0,0 +1,21 @@
+import importlib.util
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "server_benchmark.py"
+spec = importlib.util.spec_from_file_location("server_benchmark", SCRIPT)
+server_benchmark = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(server_benchmark)
+
+
+def test_summary_reports_nearest_rank_percentiles():
+    latencies = [i / 1000 for i in range(1, 101)]  # 1..100 ms
+    report = server_benchmark.summarize(latencies, errors=2, elapsed=2.0)
+
+    assert report["requests"] == 102
+    assert report["requests_per_second"] == 50
+    assert (report["p50_ms"], report["p95_ms"], report["p99_ms"]) == (50, 95, 99)
+
+
+def test_orjson_renders_the_same_body():
+    results = server_benchmark.bench_serialization(server_benchmark.sample_payload(agents=5, rounds=2), rounds=5)
+    assert results["JSONResponse"]["bytes"] == results["ORJSONResponse"]["bytes"]
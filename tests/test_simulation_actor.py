@@ -0,0 +1,166 @@
+import asyncio
+import uuid
+
+from simulation_actor import SimulationActors
+from simulations import SimulationStore
+
+
+def new_state():
+    return {"id": str(uuid.uuid4()), "current_day": 1}
+
+
+def make_actors(db, **kwargs):
+    store = SimulationStore()
+    store.bind(db)
+    actors = SimulationActors(**{"batch_size": 50, "snapshot_ttl": 60, "idle_timeout": 5, **kwargs})
+    actors.bind(store)
+    return actors
+
+
+def test_concurrent_commands_do_not_lose_updates(mongo):
+    actors = make_actors(mongo)
+    db = actors.store.db
+
+    async def bump(actor):
+        relationships = await actor.relationships()
+        relationship = relationships.get(("a", "b"), {"agent1_id": "a", "agent2_id": "b", "score": 0})
+        await asyncio.sleep(0)  # would interleave with the other commands without the actor
+        actor.adjust_relationship(relationship, 1)
+
+    async def main():
+        state = await actors.for_user("alice", new_state)
+        await asyncio.gather(*(actors.call(state["id"], bump) for _ in range(20)))
+        await actors.stop()
+        return state
+
+    state = asyncio.run(main())
+    relationships = db.relationships.docs
+    assert len(relationships) == 1
+    # Clamped at the maximum score
+    assert relationships[0]["score"] == 10 and relationships[0]["status"] == "friends"
+    assert relationships[0]["simulation_id"] == state["id"]
+    # Commands queued together were persisted together
+    assert db.relationships.bulk_writes < 20
+
+
+def test_batch_is_flushed_once_and_reads_come_from_the_snapshot(mongo):
+    actors = make_actors(mongo)
+    db = actors.store.db
+
+    async def advance(actor):
+        actor.set(current_day=actor.state["current_day"] + 1)
+
+    async def main():
+        state = await actors.for_user("alice", new_state)
+        calls = [actors.call(state["id"], advance) for _ in range(5)]
+        calls.append(actors.update_agent(state["id"], "agent-1", {"memory_summary": "hi"}))
+        await asyncio.gather(*calls)
+
+        stored = await actors.store.get(state["id"])
+        db.simulation_state.docs.clear()  # snapshot must not hit MongoDB while fresh
+        snapshot = await actors.for_user("alice", new_state)
+        stats = actors.get_stats()
+        await actors.stop()
+        return stored, snapshot, stats
+
+    stored, snapshot, stats = asyncio.run(main())
+    assert stored["current_day"] == 6 and snapshot["current_day"] == 6
+    assert stats["commands"] == 6 and stats["batches"] == 1 and stats["flushes"] == 1
+    assert db.agents.bulk_writes == 1
+
+
+def test_rounds_are_numbered_in_order(mongo):
+    actors = make_actors(mongo)
+    db = actors.store.db
+
+    async def add_round(actor):
+        number = await actor.next_round()
+        actor.insert("conversations", {"id": f"round-{number}", "round_number": number})
+        return number
+
+    async def main():
+        state = await actors.for_user("alice", new_state)
+        numbers = await asyncio.gather(*(actors.call(state["id"], add_round) for _ in range(4)))
+        snapshot = await actors.for_user("alice", new_state)
+        await actors.stop()
+        return numbers, snapshot
+
+    numbers, snapshot = asyncio.run(main())
+    assert numbers == [1, 2, 3, 4] and snapshot["round_seq"] == 4
+    assert [doc["round_number"] for doc in db.conversations.docs] == [1, 2, 3, 4]
+
+
+def test_reset_drops_changes_of_the_old_run(mongo):
+    actors = make_actors(mongo)
+    db = actors.store.db
+
+    async def main():
+        state = await actors.for_user("alice", new_state)
+
+        async def write_then_reset(actor):
+            actor.insert("conversations", {"id": "stale"})
+            actor.set(current_day=9)
+            actor.replace(await actors.store.reset(actor.state, {"current_day": 1, "is_active": True}))
+
+        await actors.call(state["id"], write_then_reset)
+        snapshot = await actors.for_user("alice", new_state)
+        await actors.stop()
+        return state, snapshot
+
+    state, snapshot = asyncio.run(main())
+    assert db.conversations.docs == []
+    assert snapshot["id"] == state["id"] and snapshot["current_day"] == 1
+    assert db.simulation_state.docs[0]["current_day"] == 1
+
+
+def test_failed_command_only_fails_its_caller(mongo):
+    actors = make_actors(mongo)
+
+    async def broken(actor):
+        raise ValueError("bad command")
+
+    async def main():
+        state = await actors.for_user("alice", new_state)
+        results = await asyncio.gather(
+            actors.call(state["id"], broken), actors.update(state["id"], {"is_active": True}),
+            return_exceptions=True
+        )
+        stored = await actors.store.get(state["id"])
+        await actors.stop()
+        return results, stored
+
+    results, stored = asyncio.run(main())
+    assert isinstance(results[0], ValueError) and results[1] is None
+    assert stored["is_active"] is True
+
+
+def test_score_changes_from_other_workers_are_kept(mongo):
+    store = SimulationStore()
+    store.bind(mongo)
+    workers = []
+    for _ in range(2):
+        actors = SimulationActors(batch_size=50, snapshot_ttl=60, idle_timeout=5)
+        actors.bind(store)
+        workers.append(actors)
+
+    async def bump(actor):
+        relationships = await actor.relationships()
+        relationship = relationships.get(("a", "b"), {"agent1_id": "a", "agent2_id": "b", "score": 0})
+        return actor.adjust_relationship(relationship, 1)["score"]
+
+    async def main():
+        state = await workers[0].for_user("alice", new_state)
+        await workers[1].for_user("alice", new_state)
+        # Alternate between the workers; each one's actor stays alive with its own snapshot
+        for _ in range(3):
+            for actors in workers:
+                await actors.call(state["id"], bump)
+        last = await workers[0].call(state["id"], bump)
+        for actors in workers:
+            await actors.stop()
+        return last
+
+    last = asyncio.run(main())
+    assert store.db.relationships.docs[0]["score"] == 7
+    # Each batch reads the scores again, so it sees the other worker's changes
+    assert last == 7
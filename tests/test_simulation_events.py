@@ -0,0 +1,135 @@
+import asyncio
+import json
+
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+from simulation_events import (
+    RESYNC, ROUND_CREATED, STATE_CHANGED, TIME_CHANGED, SimulationEvents, run_event_socket
+)
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.redis.pubsubs.append(self)
+        await self.queue.put({"type": "subscribe", "data": 1})
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+    async def reset(self):
+        if self in self.redis.pubsubs:
+            self.redis.pubsubs.remove(self)
+
+
+class FakeRedis:
+    """Redis pub/sub shared by several workers in one process"""
+
+    def __init__(self):
+        self.pubsubs = []
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+    async def publish(self, channel, message):
+        for pubsub in self.pubsubs:
+            pubsub.queue.put_nowait({"type": "message", "channel": channel, "data": message})
+
+
+async def next_event(subscription):
+    return json.loads(await asyncio.wait_for(subscription.next(), 1))
+
+
+def test_events_only_reach_their_simulation():
+    events = SimulationEvents()
+
+    async def main():
+        alice = events.subscribe("sim-a")
+        bob = events.subscribe("sim-b")
+        await events.publish("sim-a", ROUND_CREATED, {"round_number": 1})
+        await events.state_changed("sim-a", {"current_time_period": "evening"})
+        await events.state_changed("sim-a", {"is_active": False})
+        received = [await next_event(alice) for _ in range(3)]
+        events.unsubscribe(alice)
+        return received, bob.queue.qsize()
+
+    received, bob_pending = asyncio.run(main())
+    assert [event["type"] for event in received] == [ROUND_CREATED, TIME_CHANGED, STATE_CHANGED]
+    assert received[0]["data"] == {"round_number": 1} and received[0]["simulation_id"] == "sim-a"
+    assert bob_pending == 0
+    assert list(events.subscribers) == ["sim-b"]
+
+
+def test_slow_client_gets_a_resync_instead_of_unbounded_backlog():
+    events = SimulationEvents(max_queue=3)
+
+    async def main():
+        subscription = events.subscribe("sim")
+        for number in range(10):
+            await events.publish("sim", ROUND_CREATED, {"round_number": number})
+        first = await next_event(subscription)
+        # After the resync the client is current again
+        await events.publish("sim", ROUND_CREATED, {"round_number": 10})
+        return first, await next_event(subscription)
+
+    first, after = asyncio.run(main())
+    assert first["type"] == RESYNC
+    assert after["data"] == {"round_number": 10}
+    assert events.stats["dropped"] == 7
+
+
+def test_redis_fans_events_out_to_other_workers():
+    redis = FakeRedis()
+    worker_a, worker_b = SimulationEvents(), SimulationEvents()
+    for worker in (worker_a, worker_b):
+        worker.use_redis(redis)
+
+    async def main():
+        await worker_a.start()
+        await worker_b.start()
+        while len(redis.pubsubs) < 2:
+            await asyncio.sleep(0.01)
+        on_a, on_b = worker_a.subscribe("sim"), worker_b.subscribe("sim")
+
+        await worker_a.publish("sim", ROUND_CREATED, {"round_number": 1})
+        received = await next_event(on_a), await next_event(on_b)
+        await asyncio.sleep(0.05)
+        await worker_a.stop()
+        await worker_b.stop()
+        return received, on_a.queue.qsize()
+
+    (on_a, on_b), duplicates = asyncio.run(main())
+    assert on_a == on_b
+    # The publishing worker ignores its own event coming back from Redis
+    assert duplicates == 0
+    assert worker_b.stats["received"] == 1 and worker_a.stats["received"] == 0
+
+
+def test_socket_streams_events_of_the_callers_simulation():
+    events = SimulationEvents()
+    app = FastAPI()
+
+    async def resolve(token):
+        return {"id": f"sim-{token or 'shared'}"}
+
+    @app.websocket("/events")
+    async def stream(websocket: WebSocket):
+        await run_event_socket(websocket, events, resolve, heartbeat_seconds=0.05)
+
+    @app.post("/rounds/{simulation_id}")
+    async def create_round(simulation_id: str):
+        await events.publish(simulation_id, ROUND_CREATED, {"round_number": 1})
+
+    with TestClient(app) as client, client.websocket_connect("/events") as websocket:
+        websocket.send_json({"type": "subscribe", "token": "alice"})
+        assert websocket.receive_json() == {"type": "ready", "simulation_id": "sim-alice"}
+        client.post("/rounds/sim-bob")
+        client.post("/rounds/sim-alice")
+        event = websocket.receive_json()
+        assert event["type"] == ROUND_CREATED and event["simulation_id"] == "sim-alice"
+        assert websocket.receive_json() == {"type": "ping"}
@@ -0,0 +1,88 @@
+import asyncio
+import uuid
+
+from simulations import SimulationStore
+
+
+def new_state():
+    return {"id": str(uuid.uuid4()), "current_day": 1, "scenario": "The Research Station"}
+
+
+def make_store(db):
+    store = SimulationStore()
+    store.bind(db)
+    asyncio.run(store.create_indexes())
+    return store
+
+
+def test_each_user_gets_their_own_simulation(mongo):
+    store = make_store(mongo)
+
+    async def main():
+        alice = await store.for_user("alice", new_state)
+        bob = await store.for_user("bob", new_state)
+        again = await store.for_user("alice", new_state)
+        anonymous = await store.for_user("", new_state)
+        return alice, bob, again, anonymous
+
+    alice, bob, again, anonymous = asyncio.run(main())
+    assert alice["id"] != bob["id"] != anonymous["id"]
+    assert again["id"] == alice["id"]
+    assert alice["user_id"] == "alice" and alice["round_seq"] == 0
+    assert len(store.db.simulation_state.docs) == 3
+
+
+def test_round_numbers_are_allocated_per_simulation(mongo):
+    store = make_store(mongo)
+
+    async def main():
+        alice = await store.for_user("alice", new_state)
+        bob = await store.for_user("bob", new_state)
+        return [await store.next_round(alice["id"]) for _ in range(3)], await store.next_round(bob["id"])
+
+    alice_rounds, bob_round = asyncio.run(main())
+    assert alice_rounds == [1, 2, 3]
+    assert bob_round == 1
+
+
+def test_reset_only_clears_its_own_simulation(mongo):
+    store = make_store(mongo)
+    db = store.db
+
+    async def main():
+        alice = await store.for_user("alice", new_state)
+        bob = await store.for_user("bob", new_state)
+        for state in (alice, bob):
+            await db.agents.insert_one({"id": f"agent-{state['user_id']}", "simulation_id": state["id"]})
+            await db.conversations.insert_one({"id": f"round-{state['user_id']}", "simulation_id": state["id"]})
+        await store.next_round(alice["id"])
+
+        reset = await store.reset(alice, {"id": "ignored", "current_day": 1, "is_active": True})
+        return alice, reset
+
+    alice, reset = asyncio.run(main())
+    assert reset["id"] == alice["id"] and reset["user_id"] == "alice" and reset["round_seq"] == 0
+    assert [doc["id"] for doc in db.agents.docs] == ["agent-bob"]
+    assert [doc["id"] for doc in db.conversations.docs] == ["round-bob"]
+    assert asyncio.run(store.get(alice["id"]))["is_active"]
+
+
+def test_legacy_data_moves_into_the_anonymous_simulation(mongo):
+    store = make_store(mongo)
+    db = store.db
+    db.simulation_state.docs.append({"_id": "old", "id": "legacy-sim", "current_day": 4})
+    db.conversations.docs.extend([{"_id": 1, "id": "r1", "round_number": 1}, {"_id": 2, "id": "r2", "round_number": 2}])
+    db.agents.docs.append({"_id": 3, "id": "agent-1"})
+    db.documents.docs.extend([{"_id": 4, "user_id": ""}, {"_id": 5, "metadata": {"user_id": "alice"}}])
+
+    async def main():
+        await store.create_indexes()
+        state = await store.for_user("", new_state)
+        return state, await store.next_round(state["id"])
+
+    state, next_round = asyncio.run(main())
+    assert state["id"] == "legacy-sim" and state["current_day"] == 4
+    assert all(doc["simulation_id"] == "legacy-sim" for doc in db.conversations.docs + db.agents.docs)
+    assert [doc.get("simulation_id") for doc in db.documents.docs] == ["legacy-sim", None]
+    # Numbering continues after the rounds that already exist
+    assert next_round == 3
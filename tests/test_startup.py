@@ -0,0 +1,48 @@
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "startup_benchmark.py"
+spec = importlib.util.spec_from_file_location("startup_benchmark", SCRIPT)
+startup_benchmark = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(startup_benchmark)
+
+# Feature modules server.py imports eagerly; each must defer its heavy dependency
+LAZY_FEATURE_MODULES = [
+    "enhanced_document_system",  # matplotlib (in chart worker processes only)
+    "tts_service",               # google.cloud.texttospeech
+    "whisper_service",           # openai
+    "streaming_transcription",
+    "llm_client",                # emergentintegrations -> litellm -> openai
+]
+
+
+@pytest.mark.parametrize("module", LAZY_FEATURE_MODULES)
+def test_feature_modules_load_no_heavy_dependencies(module):
+    report = startup_benchmark.measure(module)
+    assert report["heavy_modules"] == []
+
+
+def test_thresholds_flag_slow_or_bloated_imports():
+    report = {"import_seconds": 4.2, "max_rss_mb": 310.0, "heavy_modules": ["matplotlib"]}
+    failures = startup_benchmark.check_thresholds(report, max_import_seconds=3.0, max_rss_mb=200)
+    assert len(failures) == 3
+    assert startup_benchmark.check_thresholds(report, 5.0, 400, allow_heavy=True) == []
+
+
+def test_server_import_within_budget():
+    try:
+        report = startup_benchmark.run_benchmark("server", runs=1)
+    except RuntimeError as e:
+        if os.environ.get("CI"):
+            raise
+        pytest.skip(f"server.py cannot be imported in this environment: {str(e).splitlines()[-1]}")
+
+    failures = startup_benchmark.check_thresholds(
+        report,
+        max_import_seconds=float(os.environ.get("STARTUP_MAX_IMPORT_SECONDS", 3.0)),
+        max_rss_mb=float(os.environ.get("STARTUP_MAX_RSS_MB", 200)),
+    )
+    assert failures == []
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI, HTTPException, WebSocket
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from streaming_transcription import SegmentLimitExceeded, TranscriptionSession, run_transcription_socket
+from whisper_service import LocalWhisperBackend, WhisperService
+
+WEBM_HEADER = b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01\x42\x82\x84webm"
+
+
+class ScriptedBackend(LocalWhisperBackend):
+    """Transcribes each segment to the text after its header; earlier segments finish last"""
+
+    async def transcribe(self, audio, filename, language):
+        text = audio[len(WEBM_HEADER):].decode()
+        index = int(filename.split("_")[1].split(".")[0])
+        await asyncio.sleep(0.05 / (index + 1))
+        return {"text": text, "language": language or "en", "duration": 1.5, "words": [], "confidence": None}
+
+
+def segment(text):
+    return WEBM_HEADER + text.encode()
+
+
+def test_partials_arrive_in_segment_order():
+    partials = []
+
+    async def on_partial(index, text, transcript):
+        partials.append((index, transcript))
+
+    async def main():
+        session = TranscriptionSession(WhisperService(backend=ScriptedBackend()), on_partial=on_partial)
+        for text in ["We should", "evacuate the", "coastal towns"]:
+            session.add_chunk(segment(text))
+            session.end_segment()
+        return await session.finish()
+
+    transcript = asyncio.run(main())
+    assert transcript == "We should evacuate the coastal towns"
+    assert partials == [
+        (0, "We should"),
+        (1, "We should evacuate the"),
+        (2, "We should evacuate the coastal towns"),
+    ]
+
+
+def test_segment_size_is_capped():
+    async def main():
+        session = TranscriptionSession(WhisperService(backend=ScriptedBackend()), max_segment_bytes=10)
+        session.add_chunk(b"12345")
+        with pytest.raises(SegmentLimitExceeded):
+            session.add_chunk(b"678901")
+
+    asyncio.run(main())
+
+
+def build_app():
+    app = FastAPI()
+    summarized = []
+
+    async def authenticate(token):
+        if token != "valid":
+            raise HTTPException(status_code=401)
+        return "user-1"
+
+    async def summarize(raw_text, field_type):
+        summarized.append((raw_text, field_type))
+        return f"[{field_type}] {raw_text}"
+
+    @app.websocket("/api/speech/stream")
+    async def stream(websocket: WebSocket):
+        await run_transcription_socket(websocket, WhisperService(backend=ScriptedBackend()),
+                                       authenticate, summarize)
+
+    return app, summarized
+
+
+def test_websocket_streams_partials_then_summarizes():
+    app, summarized = build_app()
+
+    with TestClient(app).websocket_connect("/api/speech/stream") as ws:
+        ws.send_json({"type": "start", "token": "valid", "field_type": "goal", "language": "en"})
+        assert ws.receive_json() == {"type": "ready"}
+
+        # A segment may arrive in several chunks
+        ws.send_bytes(segment("Secure")[:8])
+        ws.send_bytes(segment("Secure")[8:])
+        ws.send_json({"type": "segment_end"})
+        first = ws.receive_json()
+        assert first == {"type": "partial", "segment": 0, "text": "Secure", "transcript": "Secure"}
+
+        # The last segment is closed implicitly by stop
+        ws.send_bytes(segment("the water supply"))
+        ws.send_json({"type": "stop"})
+        second = ws.receive_json()
+        final = ws.receive_json()
+
+    assert second["transcript"] == "Secure the water supply"
+    assert final["type"] == "final" and final["success"]
+    assert final["raw_transcription"] == "Secure the water supply"
+    assert final["formatted_text"] == "[goal] Secure the water supply"
+    assert final["segments"] == 2 and final["duration_seconds"] == 3.0
+    assert summarized == [("Secure the water supply", "goal")]
+
+
+def test_websocket_rejects_bad_token():
+    app, _ = build_app()
+
+    with TestClient(app).websocket_connect("/api/speech/stream") as ws:
+        ws.send_json({"type": "start", "token": "forged"})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == 1008
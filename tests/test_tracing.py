@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from tracing import MongoTracingListener, Tracer, trace_request
+import tracing
+
+
+def mongo_event(request_id, command_name="find", collection="agents"):
+    return SimpleNamespace(
+        request_id=request_id, connection_id=("localhost", 27017),
+        command_name=command_name, command={command_name: collection}, database_name="test"
+    )
+
+
+def build_app(tracer, listener):
+    router = APIRouter(prefix="/api")
+
+    @tracer.traced(kind="stage")
+    async def analyze():
+        with tracer.span("llm.vote", "llm", purpose="vote"):
+            await asyncio.sleep(0.01)
+
+    @router.post("/conversation/generate")
+    async def generate():
+        listener.started(mongo_event(1))
+        listener.succeeded(mongo_event(1))
+        await analyze()
+        return {"ok": True}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.middleware("http")(trace_request)
+    return app
+
+
+def test_request_records_span_tree(monkeypatch):
+    tracer = Tracer()
+    monkeypatch.setattr(tracing, "tracer", tracer)
+    listener = MongoTracingListener()
+
+    TestClient(build_app(tracer, listener)).post("/api/conversation/generate")
+
+    [summary] = tracer.slowest()
+    assert summary["name"] == "POST /api/conversation/generate"
+    assert summary["breakdown"]["mongo"]["count"] == 1
+    assert summary["breakdown"]["llm"]["count"] == 1
+    assert summary["breakdown"]["llm"]["total_ms"] >= 10
+
+    root = tracer.get(summary["trace_id"])["root"]
+    names = [child["name"] for child in root["children"]]
+    assert names == ["mongo.find", "analyze"]
+    assert root["children"][1]["children"][0]["attributes"]["purpose"] == "vote"
+
+
+def test_spans_are_noops_outside_requests():
+    tracer = Tracer()
+    listener = MongoTracingListener()
+
+    with tracer.span("orphan") as span:
+        listener.started(mongo_event(2))
+    assert span is None
+    assert listener.in_flight == {}
+    assert tracer.slowest() == []
+
+
+def test_span_limit_and_otlp_export(monkeypatch, tmp_path):
+    export_file = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("TRACE_EXPORT_FILE", str(export_file))
+    monkeypatch.setenv("TRACE_MAX_SPANS", "3")
+    tracer = Tracer()
+
+    trace = tracer.start_trace("GET /api/agents")
+    token = tracing._current_span.set(trace.root)
+    try:
+        for i in range(5):
+            with tracer.span(f"step{i}"):
+                pass
+    finally:
+        tracing._current_span.reset(token)
+    tracer.finish_trace(trace)
+    tracer.flush()
+
+    assert trace.span_count == 3
+    assert trace.dropped_spans == 2
+
+    exported = json.loads(export_file.read_text().splitlines()[0])
+    spans = exported["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert len(spans) == 4
+    assert {span["traceId"] for span in spans} == {trace.trace_id}
+
+
+def test_export_happens_off_the_calling_thread(monkeypatch, tmp_path):
+    monkeypatch.setenv("TRACE_EXPORT_FILE", str(tmp_path / "traces.jsonl"))
+    tracer = Tracer()
+    writers = []
+    real_open = open
+
+    def recording_open(*args, **kwargs):
+        writers.append(threading.current_thread().name)
+        return real_open(*args, **kwargs)
+
+    monkeypatch.setattr(tracing, "open", recording_open, raising=False)
+    for _ in range(3):
+        tracer.finish_trace(tracer.start_trace("GET /api/conversations"))
+    tracer.flush()
+
+    assert writers and set(writers) == {"trace-export"}
+    assert len((tmp_path / "traces.jsonl").read_text().splitlines()) == 3
@@ -0,0 +1,128 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from tts_service import (
+    AudioCache, LocalTTSBackend, TTSService, VoiceNotSupported, audio_response, cache_key, resolve_voice
+)
+
+LINE = "The council should fund the pilot before the winter deadline."
+
+
+@pytest.fixture
+def service(tmp_path):
+    return TTSService(backend=LocalTTSBackend(delay=0.01), cache=AudioCache(tmp_path), max_concurrency=2)
+
+
+def test_voice_resolution_and_cache_key():
+    voice = resolve_voice('Alexandra "Alex" Chen', "fr")
+    assert voice.name == "fr-FR-Neural2-A"
+    # Unknown agents get the default agent's voices; missing languages the agent default
+    assert resolve_voice("Someone New", "en").name == "en-US-Neural2-D"
+    assert resolve_voice('Diego "Dex" Rodriguez', "ja").name == "en-US-Neural2-A"
+    with pytest.raises(VoiceNotSupported):
+        resolve_voice("Someone New", "xx")
+
+    assert cache_key(LINE, voice, 0.9) == cache_key(LINE, voice, 0.9)
+    assert cache_key(LINE, voice, 0.9) != cache_key(LINE, voice, 1.0)
+    assert cache_key(LINE, voice, 0.9) != cache_key(LINE, resolve_voice('Alexandra "Alex" Chen', "de"), 0.9)
+
+
+def test_replay_is_served_from_disk(service):
+    async def main():
+        first, duplicate = await asyncio.gather(
+            service.synthesize(LINE, 'Alexandra "Alex" Chen', "en"),
+            service.synthesize(LINE, 'Alexandra "Alex" Chen', "en"),
+        )
+        replay = await service.synthesize(LINE, 'Alexandra "Alex" Chen', "en")
+        return first, duplicate, replay
+
+    first, duplicate, replay = asyncio.run(main())
+    assert service.backend.calls == 1
+    assert not first.cached and duplicate.cached and replay.cached
+    assert replay.audio == first.audio
+    assert first.audio.startswith(b"\xff\xfb")
+
+
+def test_synthesis_concurrency_is_bounded(service):
+    active = {"now": 0, "peak": 0}
+    synthesize = service.backend.synthesize
+
+    async def tracking_synthesize(*args):
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        try:
+            return await synthesize(*args)
+        finally:
+            active["now"] -= 1
+
+    service.backend.synthesize = tracking_synthesize
+
+    async def main():
+        await asyncio.gather(*[service.synthesize(f"line {i}", "Someone New", "en") for i in range(6)])
+
+    asyncio.run(main())
+    assert active["peak"] == 2
+    assert service.get_stats()["misses"] == 6
+
+
+def test_cache_evicts_oldest_files(tmp_path):
+    cache = AudioCache(tmp_path, max_bytes=1000)
+    keys = [f"{i:064x}" for i in range(4)]
+    for age, key in enumerate(keys):
+        path = cache.put(key, b"x" * 400)
+        # Explicit mtimes: writes this fast can share a timestamp
+        os.utime(path, (1000 + age, 1000 + age))
+
+    assert cache.total_bytes <= 1000
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[-1]) is not None
+    assert cache.get("../../etc/passwd") is None
+
+
+def test_cache_hits_keep_clips_from_eviction(tmp_path):
+    cache = AudioCache(tmp_path, max_bytes=1000)
+    keys = [f"{i:064x}" for i in range(3)]
+    for age, key in enumerate(keys[:2]):
+        os.utime(cache.put(key, b"x" * 400), (1000 + age, 1000 + age))
+
+    # The oldest clip was just played: the other one is evicted instead
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[2], b"x" * 400)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+
+
+def test_evicted_clip_is_synthesized_again(service):
+    first = asyncio.run(service.synthesize(LINE, "Someone New", "en"))
+    service.cache.path(first.key).unlink()  # evicted by another worker
+    assert asyncio.run(service.lookup(first.key)) is None
+
+    again = asyncio.run(service.synthesize(LINE, "Someone New", "en"))
+    assert not again.cached and again.audio == first.audio and service.backend.calls == 2
+
+
+def test_audio_response_streams_mp3_with_caching_headers(service):
+    result = asyncio.run(service.synthesize(LINE, "Someone New", "en"))
+
+    app = FastAPI()
+
+    @app.get("/api/tts/audio/{audio_key}")
+    async def get_audio(audio_key: str, request: Request):
+        audio = await service.lookup(audio_key)
+        if audio is None:
+            raise HTTPException(status_code=404)
+        return audio_response(request, audio_key, audio, "private, max-age=86400")
+
+    client = TestClient(app)
+    response = client.get(f"/api/tts/audio/{result.key}")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "audio/mpeg"
+    assert response.headers["etag"] == f'"{result.key}"'
+    assert response.content == result.audio
+
+    assert client.get(f"/api/tts/audio/{result.key}", headers={"If-None-Match": f'"{result.key}"'}).status_code == 304
+    assert client.get(f"/api/tts/audio/{'0' * 64}").status_code == 404
@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from url_fetcher import UrlFetchError, UrlFetcher, extract_text
+
+PAGE = (
+    "<html><head><title>Cold chain</title><style>p { color: red }</style></head>"
+    "<body><script>track()</script><p>Vaccines must stay between 2 &amp; 8 degrees.</p></body></html>"
+)
+
+
+class LocalSite:
+    """Stand-in web server: pages with validators, request counts, and in-flight tracking"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.pages = {"/page": PAGE}
+        self.versions = {"/page": 1}
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+
+    def update(self, path, html):
+        self.pages[path] = html
+        self.versions[path] = self.versions.get(path, 0) + 1
+
+    async def handle(self, request):
+        self.requests.append((request.path, request.headers.get("If-None-Match")))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            if request.path == "/image":
+                return web.Response(body=b"\x89PNG", content_type="image/png")
+            page = self.pages.get(request.path) or self.pages.get("/" + request.path.split("/")[1])
+            if page is None:
+                return web.Response(status=404)
+            etag = f'"v{self.versions.get(request.path, 1)}"'
+            if request.headers.get("If-None-Match") == etag:
+                return web.Response(status=304, headers={"ETag": etag})
+            return web.Response(text=page, content_type="text/html", headers={"ETag": etag})
+        finally:
+            self.active -= 1
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", self.handle)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        return str(self.server.make_url("/"))
+
+    async def stop(self):
+        await self.server.close()
+
+
+def run_with_site(scenario, site=None, **fetcher_options):
+    site = site or LocalSite()
+    fetcher = UrlFetcher(**{"fresh_seconds": 0, **fetcher_options})
+
+    async def main():
+        base = await site.start()
+        try:
+            return await scenario(fetcher, base)
+        finally:
+            await fetcher.close()
+            await site.stop()
+
+    return asyncio.run(main()), site, fetcher
+
+
+def test_extracts_readable_text_without_scripts_or_styles():
+    text = extract_text(PAGE.encode(), "utf-8", "text/html", max_chars=1500)
+    assert text == "Cold chain Vaccines must stay between 2 & 8 degrees."
+    assert extract_text(b"word " * 10, None, "text/plain", max_chars=9) == "word word..."
+
+
+def test_unchanged_page_is_revalidated_and_keeps_its_summary():
+    summaries = []
+
+    async def summarize(text):
+        summaries.append(text)
+        return f"summary {len(summaries)}"
+
+    async def scenario(fetcher, base):
+        first = await fetcher.fetch(base + "page")
+        results = [await fetcher.summary(first, summarize)]
+        second = await fetcher.fetch(base + "page")  # Stale: conditional GET, 304
+        results.append(await fetcher.summary(second, summarize))
+        return first, second, results
+
+    (first, second, results), site, fetcher = run_with_site(scenario)
+    assert "Vaccines" in first.text and second is first
+    assert results == ["summary 1", "summary 1"] and len(summaries) == 1
+    assert site.requests == [("/page", None), ("/page", '"v1"')]
+    assert fetcher.stats["not_modified"] == 1 and fetcher.stats["summary_hits"] == 1
+
+
+def test_changed_page_is_summarized_again():
+    site = LocalSite()
+
+    async def summarize(text):
+        return text[:5]
+
+    async def scenario(fetcher, base):
+        await fetcher.summary(await fetcher.fetch(base + "page"), summarize)
+        site.update("/page", "<p>Supply routes reopened.</p>")
+        entry = await fetcher.fetch(base + "page")
+        return await fetcher.summary(entry, summarize)
+
+    summary, _, _ = run_with_site(scenario, site)
+    assert summary == "Suppl"
+
+
+def test_fresh_entries_are_served_without_a_request():
+    async def scenario(fetcher, base):
+        await fetcher.fetch(base + "page")
+        await fetcher.fetch(base + "page")
+
+    _, site, fetcher = run_with_site(scenario, fresh_seconds=60)
+    assert len(site.requests) == 1 and fetcher.stats["hits"] == 1
+
+
+def test_urls_are_fetched_concurrently_within_the_per_host_limit():
+    site = LocalSite(delay=0.05)
+
+    async def scenario(fetcher, base):
+        # The same URL twice shares one request
+        urls = [base + f"page/{n}" for n in range(6)] + [base + "page/0"]
+        return await asyncio.gather(*(fetcher.fetch(url) for url in urls))
+
+    entries, site, _ = run_with_site(scenario, site, per_host=3)
+    assert len(entries) == 7 and len(site.requests) == 6
+    assert site.max_active == 3
+
+
+def test_errors_and_non_text_content_raise():
+    async def scenario(fetcher, base):
+        errors = []
+        for path in ("missing", "image"):
+            with pytest.raises(UrlFetchError) as error:
+                await fetcher.fetch(base + path)
+            errors.append(str(error.value))
+        return errors
+
+    errors, _, fetcher = run_with_site(scenario)
+    assert errors == ["status: 404", "unsupported content type image/png"]
+    assert fetcher.stats["errors"] == 2 and not fetcher.cache
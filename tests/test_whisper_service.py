@@ -0,0 +1,116 @@
+import asyncio
+import stat
+
+import pytest
+from fastapi import HTTPException
+
+from whisper_service import (
+    AudioFormatError, LocalWhisperBackend, OpenAIWhisperBackend, WhisperService, sniff_container,
+    transcode_to_ogg
+)
+
+WEBM = b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01\x42\x82\x84webm" + b"\x00" * 64
+WAV = b"RIFF\x24\x00\x00\x00WAVEfmt " + b"\x00" * 32
+AMR = b"#!AMR\n" + b"\x3c" * 64
+
+
+def fake_ffmpeg(tmp_path, body):
+    """Executable that stands in for ffmpeg; ignores its arguments"""
+    script = tmp_path / "ffmpeg"
+    script.write_text(f"#!/bin/sh\n{body}\n")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return str(script)
+
+
+def test_sniffs_common_browser_containers():
+    assert sniff_container(WEBM) == "webm"
+    assert sniff_container(b"\x1a\x45\xdf\xa3\x9f\x42\x82\x88matroska") == "mkv"
+    assert sniff_container(b"OggS\x00\x02" + b"\x00" * 20) == "ogg"
+    assert sniff_container(WAV) == "wav"
+    assert sniff_container(b"\x00\x00\x00\x20ftypM4A \x00\x00") == "m4a"
+    assert sniff_container(b"\x00\x00\x00\x1cftypisom\x00\x00") == "mp4"
+    assert sniff_container(b"ID3\x04\x00" + b"\x00" * 10) == "mp3"
+    assert sniff_container(b"\xff\xfb\x90\x64") == "mp3"
+    # ADTS AAC shares the sync word but is not accepted by Whisper
+    assert sniff_container(b"\xff\xf1\x50\x80") is None
+    assert sniff_container(AMR) is None
+
+
+def test_accepted_formats_pass_through_untouched():
+    backend = LocalWhisperBackend(transcript="Build the sea wall first")
+    service = WhisperService(backend=backend)
+
+    result = asyncio.run(service.transcribe_audio(WEBM, language="en", filename="recording.webm"))
+
+    assert result["success"] and result["text"] == "Build the sea wall first"
+    assert backend.calls == [("recording.webm", len(WEBM), "en")]
+    assert service.get_stats()["passed_through"] == 1
+    assert service.get_stats()["transcoded"] == 0
+
+
+def test_mislabelled_upload_is_named_by_its_real_container():
+    backend = LocalWhisperBackend()
+    service = WhisperService(backend=backend)
+    asyncio.run(service.transcribe_audio(WAV, filename="voice.webm"))
+    assert backend.calls[0][0] == "voice.wav"
+
+
+def test_unknown_formats_are_transcoded_over_pipes(tmp_path, monkeypatch):
+    # `cat` echoes stdin to stdout, proving the bytes travel through the pipes
+    monkeypatch.setenv("FFMPEG_BINARY", fake_ffmpeg(tmp_path, "cat"))
+    backend = LocalWhisperBackend()
+    service = WhisperService(backend=backend)
+
+    asyncio.run(service.transcribe_audio(AMR, filename="memo.amr"))
+
+    assert backend.calls == [("memo.ogg", len(AMR), None)]
+    assert service.get_stats()["transcoded"] == 1
+
+
+def test_transcode_failures_become_400(tmp_path, monkeypatch):
+    monkeypatch.setenv("FFMPEG_BINARY", fake_ffmpeg(tmp_path, "echo 'Invalid data found' >&2; exit 1"))
+    service = WhisperService(backend=LocalWhisperBackend())
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.transcribe_audio(AMR))
+    assert error.value.status_code == 400
+
+    with pytest.raises(AudioFormatError, match="Invalid data found"):
+        asyncio.run(transcode_to_ogg(AMR))
+    with pytest.raises(AudioFormatError, match="not installed"):
+        asyncio.run(transcode_to_ogg(AMR, ffmpeg=str(tmp_path / "missing-ffmpeg")))
+
+
+def test_transcode_timeout_kills_ffmpeg(tmp_path):
+    with pytest.raises(AudioFormatError, match="longer than"):
+        asyncio.run(transcode_to_ogg(AMR, ffmpeg=fake_ffmpeg(tmp_path, "exec sleep 5"), timeout=0.2))
+
+
+def test_concurrency_is_bounded():
+    active = {"now": 0, "peak": 0}
+
+    class TrackingBackend(LocalWhisperBackend):
+        async def transcribe(self, audio, filename, language):
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            try:
+                await asyncio.sleep(0.01)
+                return await super().transcribe(audio, filename, language)
+            finally:
+                active["now"] -= 1
+
+    service = WhisperService(backend=TrackingBackend(), max_concurrency=2)
+
+    async def main():
+        await asyncio.gather(*[service.transcribe_audio(WEBM) for _ in range(6)])
+
+    asyncio.run(main())
+    assert active["peak"] == 2
+
+
+def test_missing_api_key_is_a_configuration_error(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    service = WhisperService(backend=OpenAIWhisperBackend())
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.transcribe_audio(WEBM))
+    assert error.value.status_code == 500